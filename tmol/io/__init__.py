@@ -1,5 +1,5 @@
 import torch
-from typing import Optional, Union
+from typing import List, Optional, Union
 from tmol.types.functional import validate_args
 from tmol.pose.pose_stack import PoseStack
 
@@ -37,3 +37,34 @@ def pose_stack_from_pdb(
         residue_end=residue_end,
     )
     return pose_stack_from_canonical_form(co, pbt, **cf, **kwargs)
+
+
+@validate_args
+def pose_stack_from_pdbs(
+    pdb_lines_or_fnames: List[Union[str, list]],
+    device: torch.device,
+    *,
+    n_workers: int = 1,
+    **kwargs,
+) -> PoseStack:
+    """Construct a PoseStack with one pose for each of a list of PDB files,
+    each given as for pose_stack_from_pdb, using the full set of residue
+    types contained in tmol's chemical.yaml file.
+
+    The PDBs are parsed in this process or, if n_workers is greater than one,
+    in a pool of n_workers processes, and their canonical forms padded into
+    a single batch, so that the block-type resolution and the building of
+    missing atoms is performed once for the whole stack.
+    Any additional keyword arguments will be passed to pose_stack_from_canonical_form
+    """
+    from tmol.io.canonical_ordering import (
+        default_canonical_ordering,
+        default_packed_block_types,
+        canonical_form_from_pdbs,
+    )
+    from tmol.io.pose_stack_construction import pose_stack_from_canonical_form
+
+    co = default_canonical_ordering()
+    pbt = default_packed_block_types(device)
+    cf = canonical_form_from_pdbs(co, pdb_lines_or_fnames, device, n_workers=n_workers)
+    return pose_stack_from_canonical_form(co, pbt, **cf, **kwargs)
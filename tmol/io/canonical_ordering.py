@@ -1,3 +1,5 @@
+import concurrent.futures
+import multiprocessing
 import numpy
 import torch
 import attr
@@ -220,7 +222,7 @@ class CanonicalOrdering:
         )
 
         default_termini_mapping = cls._temp_termini_mapping()
-        termini_patch_added_atoms = defaultdict(lambda: set([]))
+        termini_patch_added_atoms = defaultdict(set)
 
         # we need to know which variants create down- and up termini
         # so we can build the right termini types
@@ -438,6 +440,92 @@ def canonical_form_from_pdb(
     return canonical_form_from_atom_records(canonical_ordering, atom_records, device)
 
 
+@validate_args
+def canonical_form_from_pdbs(
+    canonical_ordering: CanonicalOrdering,
+    pdb_lines_or_fnames: List[Union[str, List]],
+    device: torch.device,
+    *,
+    n_workers: int = 1,
+) -> Mapping:
+    """Create a single canonical form dictionary for a batch of PDBs, each
+    given as for canonical_form_from_pdb, with one pose per PDB.
+
+    The PDBs are parsed and converted into their canonical forms in this
+    process or, if n_workers is greater than one, in a pool of n_workers
+    processes; starting the pool is slow, so it only pays off for large
+    batches. The canonical forms are then padded to the length of the longest
+    pose: padding residues have a res_types sentinel of -1 and NaN coordinates.
+    """
+    n_workers = min(n_workers, len(pdb_lines_or_fnames))
+
+    if n_workers <= 1:
+        forms = [
+            _canonical_form_arrays_from_pdb(canonical_ordering, pdb)
+            for pdb in pdb_lines_or_fnames
+        ]
+    else:
+        # the workers are spawned rather than forked: torch, and perhaps
+        # CUDA, are already initialized in this process, and neither is
+        # safe to use in a forked child
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=n_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_set_worker_canonical_ordering,
+            initargs=(canonical_ordering,),
+        ) as pool:
+            forms = list(
+                pool.map(_worker_canonical_form_arrays_from_pdb, pdb_lines_or_fnames)
+            )
+
+    n_poses = len(forms)
+    max_n_res = max((cf["res_types"].shape[1] for cf in forms), default=0)
+
+    chain_id = numpy.zeros((n_poses, max_n_res), dtype=numpy.int32)
+    res_types = numpy.full((n_poses, max_n_res), -1, dtype=numpy.int32)
+    coords = numpy.full(
+        (n_poses, max_n_res, canonical_ordering.max_n_canonical_atoms, 3),
+        numpy.nan,
+        dtype=numpy.float32,
+    )
+    for i, cf in enumerate(forms):
+        n_res = cf["res_types"].shape[1]
+        chain_id[i, :n_res] = cf["chain_id"][0]
+        res_types[i, :n_res] = cf["res_types"][0]
+        coords[i, :n_res] = cf["coords"][0]
+
+    return dict(
+        chain_id=torch.tensor(chain_id, dtype=torch.int32, device=device),
+        res_types=torch.tensor(res_types, dtype=torch.int32, device=device),
+        coords=torch.tensor(coords, dtype=torch.float32, device=device),
+    )
+
+
+# The CanonicalOrdering used by canonical_form_from_pdbs' workers; it is
+# sent to each worker once, rather than once per PDB
+_worker_canonical_ordering = None
+
+
+def _set_worker_canonical_ordering(canonical_ordering: CanonicalOrdering):
+    global _worker_canonical_ordering
+    _worker_canonical_ordering = canonical_ordering
+
+
+def _worker_canonical_form_arrays_from_pdb(pdb_lines_or_fname):
+    return _canonical_form_arrays_from_pdb(
+        _worker_canonical_ordering, pdb_lines_or_fname
+    )
+
+
+def _canonical_form_arrays_from_pdb(
+    canonical_ordering: CanonicalOrdering, pdb_lines_or_fname
+):
+    cf = canonical_form_from_pdb(
+        canonical_ordering, pdb_lines_or_fname, torch.device("cpu")
+    )
+    return {k: v.numpy() for k, v in cf.items()}
+
+
 def select_atom_records_res_subset(
     atom_records: pandas.DataFrame,
     residue_start: Optional[int],
@@ -1,9 +1,7 @@
 import numpy
 import torch
-import numba
 
 from typing import Optional
-from tmol.types.array import NDArray
 from tmol.types.torch import Tensor
 from tmol.types.functional import validate_args
 from tmol.io.canonical_ordering import CanonicalOrdering
@@ -54,101 +52,115 @@ def find_disulfides(
             restype_variants,
         )
 
-    res_types_n = res_types.cpu().numpy()
-    coords_n = coords.detach().cpu().numpy()
-    cys_pose_ind_n = cys_pose_ind.cpu().numpy()
-    cys_res_ind_n = cys_res_ind.cpu().numpy()
-
-    n_cys = cys_pose_ind.shape[0]
-    found_disulfides = numpy.zeros((n_cys, 3), dtype=numpy.int64)
-
-    if disulfides is not None and disulfides.shape[0] != 0:
-        input_disulfides_n = disulfides.cpu().numpy()
-        n_input_dslf = input_disulfides_n.shape[0]
-        found_disulfides[:n_input_dslf] = input_disulfides_n
-        restype_variants = restype_variants.cpu().numpy()
-    else:
-        n_input_dslf = 0
-        restype_variants = numpy.full_like(res_types_n, 0)
-
-    found_disulfides = find_disulf_numba(
-        coords_n,
-        n_input_dslf,
-        found_disulfides,
-        cys_pose_ind_n,
-        cys_res_ind_n,
+    if disulfides is None:
+        disulfides = torch.zeros((0, 3), dtype=torch.int64, device=res_types.device)
+
+    return _find_additional_disulfides(
+        coords,
+        cys_pose_ind,
+        cys_res_ind,
         canonical_ordering.cys_inds.sg_atom_for_co_cys,
         cutoff_dis,
+        disulfides,
         restype_variants,
     )
 
-    return (
-        torch.tensor(found_disulfides, dtype=torch.int64, device=coords.device),
-        torch.tensor(restype_variants, dtype=torch.int32, device=coords.device),
-    )
-
 
-@numba.jit(nopython=True)
-def find_disulf_numba(
-    coords: NDArray[numpy.float32][:, :, :, 3],
-    n_input_dslf: int,
-    found_dslf: NDArray[numpy.int64][:, 3],
-    cys_pose_ind: NDArray[numpy.int64][:],
-    cys_res_ind: NDArray[numpy.int64][:],
+def _find_additional_disulfides(
+    coords: Tensor[torch.float32][:, :, :, 3],
+    cys_pose_ind: Tensor[torch.int64][:],
+    cys_res_ind: Tensor[torch.int64][:],
     sg_atom_for_co_cys: int,
     cutoff_dis: float,
-    restype_variants: NDArray[numpy.int32][:, :],
+    disulfides: Tensor[torch.int64][:, 3],
+    restype_variants: Tensor[torch.int32][:, :],
 ):
-    # TEMP: Implement this in numpy/numba on the CPU to start
-
     # algorithm for CYD matching:
     # greedy
     # process the cys pairs in order from n->c
     # for cys i,
     #    take the closest as-of-yet unpaired SG to i's SG w/i 2.5A
     #    mark the two as now paired
+    #
+    # The cys of each pose are laid out in a row of an
+    # n-poses x max-n-cys tensor, and the i-th cys of every pose is
+    # processed at once, so that the only loop is over the cys of the
+    # most cys-rich pose and the work stays on the device. Only the SG
+    # coordinates are gathered.
+    device = coords.device
+    n_poses = coords.shape[0]
+
+    n_cys_for_pose = torch.bincount(cys_pose_ind, minlength=n_poses)
+    max_n_cys = int(torch.max(n_cys_for_pose))
+    cys_offset_for_pose = torch.cumsum(n_cys_for_pose, dim=0) - n_cys_for_pose
+    cys_slot = (
+        torch.arange(cys_pose_ind.shape[0], dtype=torch.int64, device=device)
+        - cys_offset_for_pose[cys_pose_ind]
+    )
+
+    cys_res_for_slot = torch.full(
+        (n_poses, max_n_cys), -1, dtype=torch.int64, device=device
+    )
+    cys_res_for_slot[cys_pose_ind, cys_slot] = cys_res_ind
+    real_slot = cys_res_for_slot != -1
+    sg_coords = torch.full(
+        (n_poses, max_n_cys, 3), numpy.nan, dtype=torch.float32, device=device
+    )
+    sg_coords[cys_pose_ind, cys_slot] = coords[
+        cys_pose_ind, cys_res_ind, sg_atom_for_co_cys
+    ].detach()
+
+    # a cys may only pair with a later cys in the same pose w/i the cutoff;
+    # comparisons against the NaN coordinates of missing SGs or of the
+    # padding slots are always false
+    dis2 = torch.sum(
+        torch.square(sg_coords.unsqueeze(2) - sg_coords.unsqueeze(1)), dim=3
+    )
+    later = torch.triu(
+        torch.ones((max_n_cys, max_n_cys), dtype=torch.bool, device=device),
+        diagonal=1,
+    )
+    candidate = torch.logical_and(dis2 < cutoff_dis * cutoff_dis, later.unsqueeze(0))
+
+    already_paired = torch.zeros((n_poses, max_n_cys), dtype=torch.bool, device=device)
+    already_paired[cys_pose_ind, cys_slot] = (
+        restype_variants[cys_pose_ind, cys_res_ind] == 1
+    )
+    partner = torch.full((n_poses, max_n_cys), -1, dtype=torch.int64, device=device)
+    pose_arange = torch.arange(n_poses, dtype=torch.int64, device=device)
+    for i in range(max_n_cys):
+        available = torch.logical_and(
+            candidate[:, i], torch.logical_not(already_paired)
+        )
+        # argmin takes the first of equally-close SGs, as the serial
+        # algorithm does
+        closest = torch.argmin(
+            torch.where(available, dis2[:, i], torch.full_like(dis2[:, i], numpy.inf)),
+            dim=1,
+        )
+        found = torch.logical_and(
+            torch.any(available, dim=1),
+            torch.logical_and(real_slot[:, i], torch.logical_not(already_paired[:, i])),
+        )
+        already_paired[:, i] = torch.logical_or(already_paired[:, i], found)
+        already_paired[pose_arange, closest] = torch.logical_or(
+            already_paired[pose_arange, closest], found
+        )
+        partner[:, i] = torch.where(found, closest, partner[:, i])
+
+    found_pose_ind, found_slot = torch.nonzero(partner != -1, as_tuple=True)
+    found_disulfides = torch.stack(
+        (
+            found_pose_ind,
+            cys_res_for_slot[found_pose_ind, found_slot],
+            cys_res_for_slot[found_pose_ind, partner[found_pose_ind, found_slot]],
+        ),
+        dim=1,
+    )
+
+    # mark these pairs as disulfides
+    restype_variants = restype_variants.clone()
+    restype_variants[found_disulfides[:, 0], found_disulfides[:, 1]] = 1
+    restype_variants[found_disulfides[:, 0], found_disulfides[:, 2]] = 1
 
-    n_cys = cys_pose_ind.shape[0]
-    # oops -- doesn't work in nopython mode
-    # already_paired = restype_variants[cys_pose_ind, cys_res_ind] == 1
-    already_paired = numpy.zeros(n_cys, dtype=numpy.int32)
-    for i in range(n_cys):
-        already_paired[i] = restype_variants[cys_pose_ind[i], cys_res_ind[i]]
-    n_found_dslf = n_input_dslf
-    cutoff_dis2 = cutoff_dis * cutoff_dis
-
-    for i in range(n_cys):
-        if already_paired[i]:
-            continue
-        i_pose = cys_pose_ind[i]
-        i_res = cys_res_ind[i]
-        closest_match = -1
-        closest_match_res = -1
-        closest_dis2 = -1.0
-        i_coord = coords[i_pose, i_res, sg_atom_for_co_cys]
-        for j in range(i + 1, cys_pose_ind.shape[0]):
-            j_pose = cys_pose_ind[j]
-            if j_pose != i_pose:
-                break
-            j_res = cys_res_ind[j]
-            if already_paired[j]:
-                continue
-            dis2 = numpy.sum(
-                numpy.square(i_coord - coords[j_pose, j_res, sg_atom_for_co_cys])
-            )
-            if dis2 < cutoff_dis2 and (closest_dis2 < 0 or dis2 < closest_dis2):
-                closest_dis2 = dis2
-                closest_match = j
-                closest_match_res = j_res
-        if closest_match >= 0:
-            already_paired[i] = 1
-            already_paired[closest_match] = 1
-            found_dslf[n_found_dslf, 0] = i_pose
-            found_dslf[n_found_dslf, 1] = i_res
-            found_dslf[n_found_dslf, 2] = closest_match_res
-            # mark these two as disulfides
-            restype_variants[i_pose, i_res] = 1
-            restype_variants[i_pose, closest_match_res] = 1
-            n_found_dslf += 1
-    found_dslf = found_dslf[:n_found_dslf]
-    return found_dslf
+    return (torch.cat((disulfides, found_disulfides), dim=0), restype_variants)
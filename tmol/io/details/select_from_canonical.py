@@ -23,6 +23,7 @@ def assign_block_types(
 ) -> Tuple[
     Tensor[torch.int64][:, :],
     Tensor[torch.int64][:, :, :, 2],
+    Tensor[torch.int32][:, :, :],
     Tensor[torch.int32][:, :, :, :, :],
 ]:
     pbt = packed_block_types
@@ -166,32 +167,23 @@ def assign_block_types(
 
     # now that we have the inter-residue connections established,
     # proceed with the rest of the PoseStackBuilder's steps
-    # in constructing the inter_block_bondsep tensor using the
-    # all-pairs-shortest-path algorithm
-    # 3a
+    # in constructing the sparse inter_block_bondsep tensors using
+    # a bounded search out from each inter-residue connection
+    # 3
     (
-        pconn_matrix,
-        pconn_offsets,
-        block_n_conn,
-        pose_n_pconn,
-    ) = PoseStackBuilder._take_real_conn_conn_intrablock_pairs(
-        pbt, block_type_ind64, is_real_res
+        inter_block_bondsep_neighbors,
+        inter_block_bondsep_sparse,
+    ) = PoseStackBuilder._calculate_sparse_interblock_bondsep(
+        pbt, block_type_ind64, inter_residue_connections64
     )
 
-    # 3b
-    PoseStackBuilder._incorporate_inter_residue_connections_into_connectivity_graph(
-        inter_residue_connections64, pconn_offsets, pconn_matrix
+    return (
+        block_type_ind64,
+        inter_residue_connections64,
+        inter_block_bondsep_neighbors,
+        inter_block_bondsep_sparse,
     )
 
-    # 4
-    # bad naming because python indentation- and line-wrapping rules are annoying:
-    # inter_block_bondsep64 == ibb64
-    ibb64 = PoseStackBuilder._calculate_interblock_bondsep_from_connectivity_graph(
-        pbt, block_n_conn, pose_n_pconn, pconn_matrix
-    )
-
-    return (block_type_ind64, inter_residue_connections64, ibb64)
-
 
 @validate_args
 def determine_chain_ending_status(
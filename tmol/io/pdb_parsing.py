@@ -20,6 +20,7 @@ Atom records are DataFrames with the records:
     "b"
 
 """
+import mmap
 import pandas
 import numpy
 from os import path
@@ -52,61 +53,230 @@ def parse_pdb(pdb_lines) -> pandas.DataFrame:
     pdb_lines : Iterable lines, a string filename, or a string of lines in PDB format.
     """
 
-    if isinstance(pdb_lines, str):
-        if path.exists(pdb_lines):
-            # Open files by default
-            pdb_lines = open(pdb_lines).readlines()
-        else:
-            # Split single strings by line
-            pdb_lines = pdb_lines.split("\n")
+    return _parse_pdb_buffer(_pdb_buffer(pdb_lines))
 
-    model_name = ""
 
-    atom_lines = []
+def parse_pdb_models(pdb_lines):
+    """Yields the atom records of a pdb file one MODEL at a time.
 
-    chain_breaks = []
+    pdb_lines : Iterable lines, a string filename, or a string of lines in PDB format.
+
+    Files are memory mapped and each model is parsed only when it is
+    requested, so that very large multi-model files need not fit in memory.
+    Concatenating the yielded DataFrames gives the atom records that
+    parse_pdb returns for the whole file.
+    """
+
+    buf = _pdb_buffer(pdb_lines)
+    modeli_offset = 0
+    chaini_offset = 0
+    for model_start, model_end in _model_spans(buf):
+        entries = _parse_pdb_buffer(
+            buf[model_start:model_end],
+            modeli_offset=modeli_offset,
+            chaini_offset=chaini_offset,
+        )
+        if len(entries) == 0:
+            continue
+        modeli_offset = entries["modeli"].iat[-1] + 1
+        chaini_offset = entries["chaini"].iat[-1] + 1
+        yield entries
+
+
+def _pdb_buffer(pdb_lines):
+    """The contents of a pdb file, filename or lines as a bytes-like buffer."""
+
+    if isinstance(pdb_lines, str) and path.exists(pdb_lines):
+        # Open files by default, mapping rather than reading them; the map
+        # is released once the buffer and any arrays viewing it are freed
+        if path.getsize(pdb_lines) == 0:
+            # empty files cannot be mapped
+            return b""
+        with open(pdb_lines, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    elif isinstance(pdb_lines, str):
+        # Parse single strings directly
+        return pdb_lines.encode()
+    else:
+        return "\n".join(l.rstrip("\n") for l in pdb_lines).encode()
+
+
+def _model_spans(buf):
+    """Yields the (start, end) byte offsets of each MODEL in the buffer; lines
+    preceding the first MODEL record are part of the first span."""
+
+    model_start = 0
+    search_start = 1 if buf[:5] == b"MODEL" else 0
+    while True:
+        next_model = buf.find(b"\nMODEL", search_start)
+        if next_model == -1:
+            yield model_start, len(buf)
+            return
+        yield model_start, next_model + 1
+        model_start = next_model + 1
+        search_start = next_model + 1
+
+
+def _line_bounds(buf):
+    """The start and end offsets of every line in the buffer."""
+
+    chars = numpy.frombuffer(buf, dtype=numpy.uint8)
+    newlines = numpy.flatnonzero(chars == ord("\n"))
+    starts = numpy.concatenate(([0], newlines + 1))
+    ends = numpy.concatenate((newlines, [len(chars)]))
+    if len(starts) > 1 and starts[-1] == len(chars):
+        # drop the empty "line" following a trailing newline
+        starts = starts[:-1]
+        ends = ends[:-1]
+    return chars, starts, ends
+
+
+def _columns(chars, starts, ends, width):
+    """The first width fixed-width columns of the given lines as a
+    [width x n_lines] byte array, with the columns past the end of a short
+    line, and any carriage returns, read as blanks.
+
+    Columns, rather than lines, are contiguous so that each field can be
+    parsed for every line at once.
+    """
+
+    if len(chars) == 0:
+        return numpy.full((width, len(starts)), ord(" "), dtype=numpy.uint8)
+
+    columns = numpy.empty((width, len(starts)), dtype=numpy.uint8)
+    for col in range(width):
+        inds = starts + col
+        columns[col] = numpy.where(
+            inds < ends, chars[numpy.minimum(inds, len(chars) - 1)], ord(" ")
+        )
+    columns[columns == ord("\r")] = ord(" ")
+    return columns
+
+
+def _bytes_field(columns, first, last):
+    """The columns [first, last) of each line as a bytes array."""
+
+    field = numpy.ascontiguousarray(columns[first:last].T)
+    return field.view("S{}".format(last - first))[:, 0]
+
+
+def _str_field(columns, first, last):
+    """The whitespace-stripped columns [first, last) as a str array."""
+
+    # fields such as atom and residue names take few distinct values, so
+    # strip and decode each of those once
+    values, inverse = numpy.unique(
+        _bytes_field(columns, first, last), return_inverse=True
+    )
+    return numpy.char.strip(values).astype(str)[inverse]
+
+
+def _numeric_field(columns, first, last, dtype):
+    """Parses the columns [first, last) of each line as a decimal number.
+
+    The digits are accumulated into an integer, one column at a time for
+    every line at once, and then scaled by the number of digits following
+    the decimal point; this gives the same, correctly rounded, value as
+    parsing the text. Only fields of the form [blanks][sign]digits[.digits]
+    [blanks] are parsed this way; the rest (e.g. exponents, but also blank
+    or malformed fields) are handed to numpy's string conversion, which
+    raises a ValueError for the malformed ones as int() and float() do.
+    """
+
+    n_lines = columns.shape[1]
+    mantissa = numpy.zeros(n_lines, dtype=numpy.int64)
+    n_decimals = numpy.zeros(n_lines, dtype=numpy.int64)
+    past_point = numpy.zeros(n_lines, dtype=bool)
+    negative = numpy.zeros(n_lines, dtype=bool)
+    started = numpy.zeros(n_lines, dtype=bool)
+    ended = numpy.zeros(n_lines, dtype=bool)
+    any_digit = numpy.zeros(n_lines, dtype=bool)
+    simple = numpy.ones(n_lines, dtype=bool)
+
+    for col in columns[first:last]:
+        digit = col.astype(numpy.int64) - ord("0")
+        is_digit = (digit >= 0) & (digit <= 9)
+        is_point = col == ord(".")
+        is_minus = col == ord("-")
+        is_sign = is_minus | (col == ord("+"))
+        is_blank = col == ord(" ")
+
+        # a sign may only lead the number, a point may appear once (and
+        # not at all in an integer), and nothing may follow a trailing blank
+        simple &= is_digit | is_point | is_sign | is_blank
+        simple &= ~(is_sign & started)
+        simple &= ~(is_point & (past_point | (dtype is int)))
+        simple &= ~(ended & ~is_blank)
+
+        mantissa = numpy.where(is_digit, mantissa * 10 + digit, mantissa)
+        n_decimals += is_digit & past_point
+        past_point |= is_point
+        negative |= is_minus
+        any_digit |= is_digit
+        ended |= is_blank & started
+        started |= ~is_blank
+    simple &= any_digit
+
+    if dtype is int:
+        values = mantissa
+    else:
+        values = mantissa / (10.0**n_decimals)
+    values = numpy.where(negative, -values, values)
+
+    if not numpy.all(simple):
+        values[~simple] = _bytes_field(columns[:, ~simple], first, last).astype(dtype)
+    return values
 
-    model_breaks = []
-    model_names = []
 
-    # Accumulate atom lines, flagging model/chain breaks on the
-    # last atom of the model/chain
-    for l in pdb_lines:
-        if l.startswith("MODEL"):
-            if model_breaks:
-                model_breaks[-1] = True
+def _parse_pdb_buffer(buf, modeli_offset=0, chaini_offset=0) -> pandas.DataFrame:
+    chars, starts, ends = _line_bounds(buf)
 
-            if chain_breaks:
-                chain_breaks[-1] = True
+    record = _columns(chars, starts, ends, 6)
+    is_atom = _bytes_field(record, 0, 6) == b"ATOM  "
+    is_model = _bytes_field(record, 0, 5) == b"MODEL"
+    is_ter = _bytes_field(record, 0, 3) == b"TER"
 
-            model_name = l[6:].strip()
-        elif l.startswith("TER"):
-            if chain_breaks:
-                chain_breaks[-1] = True
-        elif l.startswith("ATOM  "):
-            atom_lines.append(l)
+    atom_line_inds = numpy.flatnonzero(is_atom)
+    entries = _parse_atom_fields(chars, starts[is_atom], ends[is_atom])
+    n_atoms = len(atom_line_inds)
 
-            chain_breaks.append(False)
+    # the number of atoms preceding each line; a MODEL or TER record
+    # closes the model/chain of the atom preceding it
+    n_atoms_before_line = numpy.cumsum(is_atom) - is_atom
 
-            model_names.append(model_name)
-            model_breaks.append(False)
+    chain_breaks = numpy.zeros(n_atoms, dtype=bool)
+    model_breaks = numpy.zeros(n_atoms, dtype=bool)
 
-    entries = parse_atom_lines(atom_lines)
+    model_line_atoms = n_atoms_before_line[is_model]
+    model_line_atoms = model_line_atoms[model_line_atoms > 0] - 1
+    model_breaks[model_line_atoms] = True
+    chain_breaks[model_line_atoms] = True
+
+    ter_line_atoms = n_atoms_before_line[is_ter]
+    chain_breaks[ter_line_atoms[ter_line_atoms > 0] - 1] = True
 
     # Mark additional breaks if the chain code changes.
-    chain_breaks = numpy.array(chain_breaks, dtype=bool)
     chain_breaks[:-1][entries["chain"][:-1] != entries["chain"][1:]] = True
 
-    model_breaks = numpy.array(model_breaks, dtype=bool)
+    # each atom belongs to the model named by the preceding MODEL record
+    model_line_inds = numpy.flatnonzero(is_model)
+    model_names = numpy.array(
+        [""]
+        + [
+            bytes(buf[starts[i] + 6 : ends[i]]).decode().strip()
+            for i in model_line_inds
+        ]
+    )
+    atom_model = numpy.searchsorted(model_line_inds, atom_line_inds)
 
     def end_flags_to_segment_idx(end_flags):
         starts = numpy.zeros_like(end_flags, dtype=bool)
         starts[1:] = end_flags[:-1]
         return numpy.cumsum(starts)
 
-    entries["model"] = model_names
-    entries["modeli"] = end_flags_to_segment_idx(model_breaks)
-    entries["chaini"] = end_flags_to_segment_idx(chain_breaks)
+    entries["model"] = model_names[atom_model]
+    entries["modeli"] = end_flags_to_segment_idx(model_breaks) + modeli_offset
+    entries["chaini"] = end_flags_to_segment_idx(chain_breaks) + chaini_offset
 
     return pandas.DataFrame(entries)
 
@@ -131,40 +301,42 @@ def parse_atom_lines(lines):
     77 - 78        LString(2)      Element symbol, right-justified.
     79 - 80        LString(2)      Charge on the atom.
     """
-    results = numpy.empty(len(lines), dtype=atom_record_dtype)
+    buf = "\n".join(l.rstrip("\n") for l in lines).encode()
+    chars, starts, ends = _line_bounds(buf)
+    if len(lines) == 0:
+        starts = starts[:0]
+        ends = ends[:0]
+    return _parse_atom_fields(chars, starts, ends)
+
 
-    results["record_name"] = numpy.vectorize(lambda s: (s[0:6]), otypes=[str])(lines)
-    results["atomi"] = numpy.vectorize(lambda s: int(s[6:11]), otypes=[int])(lines)
+def _parse_atom_fields(chars, starts, ends):
+    """Parses the ATOM lines at the given offsets into a dict of field arrays.
+
+    Each fixed-width field is sliced out of every line at once; see
+    parse_atom_lines for the column layout.
+    """
+
+    block = _columns(chars, starts, ends, 66)
+
+    results = numpy.empty(len(starts), dtype=atom_record_dtype)
+
+    results["record_name"] = _bytes_field(block, 0, 6).astype(str)
+    results["atomi"] = _numeric_field(block, 6, 11, int)
     # atomn are directly compared in modeling software, specifically rosetta, without
     # stripping whitespace, however most users use whitespace-insensitive comparisons
     #
     # atomn will be reformatted to pdb standard during output
-    results["atomn"] = numpy.vectorize(lambda s: str.strip(s[12:16]), otypes=[str])(
-        lines
-    )
-    results["location"] = numpy.vectorize(lambda s: str.strip(s[16:17]), otypes=[str])(
-        lines
-    )
-    results["resn"] = numpy.vectorize(lambda s: str.strip(s[17:20]), otypes=[str])(
-        lines
-    )
-    results["chain"] = numpy.vectorize(lambda s: str.strip(s[21:22]), otypes=[str])(
-        lines
-    )
-    results["resi"] = numpy.vectorize(lambda s: int(s[22:26]), otypes=[int])(lines)
-    results["insert"] = numpy.vectorize(lambda s: str.strip(s[26:27]), otypes=[str])(
-        lines
-    )
-    results["x"] = numpy.vectorize(lambda s: float(s[30:38]), otypes=[float])(lines)
-    results["y"] = numpy.vectorize(lambda s: float(s[38:46]), otypes=[float])(lines)
-    results["z"] = numpy.vectorize(lambda s: float(s[46:54]), otypes=[float])(lines)
-    results["occupancy"] = numpy.vectorize(lambda s: float(s[54:60]), otypes=[float])(
-        lines
-    )
-    results["b"] = numpy.vectorize(lambda s: float(s[60:66]), otypes=[float])(lines)
-    # results["segi"]       = numpy.vectorize(lambda s: str.strip(s[72:76]), otypes = [numpy.str])(lines)
-    # results["element"]    = numpy.vectorize(lambda s: str.strip(s[76:78]), otypes = [numpy.str])(lines)
-    # results["charge"]     = numpy.vectorize(lambda s: float(s[78:80]), otypes     = [numpy.float])(lines)
+    results["atomn"] = _str_field(block, 12, 16)
+    results["location"] = _str_field(block, 16, 17)
+    results["resn"] = _str_field(block, 17, 20)
+    results["chain"] = _str_field(block, 21, 22)
+    results["resi"] = _numeric_field(block, 22, 26, int)
+    results["insert"] = _str_field(block, 26, 27)
+    results["x"] = _numeric_field(block, 30, 38, float)
+    results["y"] = _numeric_field(block, 38, 46, float)
+    results["z"] = _numeric_field(block, 46, 54, float)
+    results["occupancy"] = _numeric_field(block, 54, 60, float)
+    results["b"] = _numeric_field(block, 60, 66, float)
 
     return results
 
@@ -1,8 +1,14 @@
+import attr
 import torch
 from tmol.types.torch import Tensor
 from typing import Optional
 from tmol.types.functional import validate_args
-from tmol.pose.pose_stack import PoseStack
+from tmol.pose.pose_stack import (
+    PoseStack,
+    expand_pose_topology,
+    first_pose_for_topology,
+    topology_to_poses,
+)
 from tmol.pose.packed_block_types import PackedBlockTypes
 from tmol.io.canonical_ordering import CanonicalOrdering
 
@@ -136,7 +142,8 @@ def pose_stack_from_canonical_form(
     # step 3: resolve disulfides
     # step 4: resolve his tautomer
     # step 5: resolve termini variants, assign block-types to each input
-    #         residue, and populate the inter-block connectivity tensors
+    #         residue, and populate the inter-block connectivity tensors,
+    #         once for each distinct topology
     # step 6: select the atoms from the canonically-ordered input tensors
     #         (the coords and atom_is_present tensors) that belong to the
     #         now-assigned block types, discarding/ignoring
@@ -180,21 +187,50 @@ def pose_stack_from_canonical_form(
         canonical_ordering, res_types, res_type_variants, coords, atom_is_present
     )
 
-    # 5
+    # 5: poses that request the same residues, variants, atoms and
+    # connections, e.g. the members of a decoy set, get the same topology,
+    # so it is assigned once for each distinct topology and then shared
+    topology_ind_for_pose, first_pose = _canonical_topologies(
+        chain_id,
+        res_types,
+        res_type_variants,
+        resolved_atom_is_present,
+        found_disulfides,
+        res_not_connected,
+    )
+
+    def for_topologies(x):
+        return x if first_pose is None or x is None else x[first_pose]
+
+    def for_poses(x):
+        if topology_ind_for_pose is None:
+            return x
+        return topology_to_poses(x, topology_ind_for_pose)
+
+    if first_pose is not None:
+        is_first_pose_dslf = (
+            first_pose[topology_ind_for_pose[found_disulfides[:, 0]]]
+            == found_disulfides[:, 0]
+        )
+        found_disulfides = found_disulfides[is_first_pose_dslf]
+        found_disulfides[:, 0] = topology_ind_for_pose[found_disulfides[:, 0]]
+
     (
         block_types64,
         inter_residue_connections64,
-        inter_block_bondsep,
+        inter_block_bondsep_neighbors,
+        inter_block_bondsep_sparse,
     ) = assign_block_types(
         canonical_ordering,
         pbt,
-        resolved_atom_is_present,
-        chain_id,
-        res_types,
-        res_type_variants,
+        for_topologies(resolved_atom_is_present),
+        for_topologies(chain_id),
+        for_topologies(res_types),
+        for_topologies(res_type_variants),
         found_disulfides,
-        res_not_connected,
+        for_topologies(res_not_connected),
     )
+    inter_residue_connections = inter_residue_connections64.to(torch.int32)
 
     # 6
     (
@@ -203,18 +239,17 @@ def pose_stack_from_canonical_form(
         real_atoms,
         real_canonical_atom_inds,
     ) = take_block_type_atoms_from_canonical(
-        pbt, block_types64, coords, atom_is_present
+        pbt, for_poses(block_types64), coords, atom_is_present
     )
 
     # 7
-    inter_residue_connections = inter_residue_connections64.to(torch.int32)
     pose_stack_coords, block_coord_offset = build_missing_leaf_atoms(
         pbt,
-        block_types64,
+        for_poses(block_types64),
         real_atoms,
         block_coords,
         missing_atoms,
-        inter_residue_connections,
+        for_poses(inter_residue_connections),
     )
 
     def i64(x):
@@ -228,15 +263,16 @@ def pose_stack_from_canonical_form(
     ps = PoseStack(
         packed_block_types=pbt,
         coords=pose_stack_coords,
-        block_coord_offset=block_coord_offset,
-        block_coord_offset64=block_coord_offset64,
+        block_coord_offset=for_topologies(block_coord_offset),
+        block_coord_offset64=for_topologies(block_coord_offset64),
         inter_residue_connections=inter_residue_connections,
         inter_residue_connections64=inter_residue_connections64,
-        inter_block_bondsep=inter_block_bondsep,
-        inter_block_bondsep64=i64(inter_block_bondsep),
+        inter_block_bondsep_neighbors=inter_block_bondsep_neighbors,
+        inter_block_bondsep_sparse=inter_block_bondsep_sparse,
         block_type_ind=i32(block_types64),
         block_type_ind64=block_types64,
         device=pbt.device,
+        topology_ind_for_pose=topology_ind_for_pose,
     )
 
     # 9
@@ -285,3 +321,120 @@ def pose_stack_from_canonical_form(
             return (ps, can_atom_mapping, ps_atom_mapping)
         else:
             return ps
+
+
+def _canonical_topologies(
+    chain_id: Tensor[torch.int32][:, :],
+    res_types: Tensor[torch.int32][:, :],
+    res_type_variants: Tensor[torch.int32][:, :],
+    atom_is_present: Tensor[torch.bool][:, :, :],
+    found_disulfides: Tensor[torch.int64][:, 3],
+    res_not_connected: Optional[Tensor[torch.bool][:, :, 2]],
+):
+    """Number the distinct topologies that the poses of the canonical form
+    request, returning the index of each pose's topology and the first pose
+    with each topology, or (None, None) if no two poses share a topology
+    """
+    n_poses, max_n_res = chain_id.shape
+    device = chain_id.device
+
+    disulfide_partner = torch.full(
+        (n_poses, max_n_res), -1, dtype=torch.int32, device=device
+    )
+    disulfide_partner[found_disulfides[:, 0], found_disulfides[:, 1]] = (
+        found_disulfides[:, 2].to(torch.int32)
+    )
+    disulfide_partner[found_disulfides[:, 0], found_disulfides[:, 2]] = (
+        found_disulfides[:, 1].to(torch.int32)
+    )
+    key_tensors = [
+        chain_id,
+        res_types,
+        res_type_variants,
+        disulfide_partner,
+        atom_is_present,
+    ]
+    if res_not_connected is not None:
+        key_tensors.append(res_not_connected)
+    key = torch.cat(
+        [t.flatten(start_dim=1).to(torch.int32) for t in key_tensors], dim=1
+    )
+
+    # the common case: a stack of conformations of a single sequence
+    if n_poses > 1 and torch.all(key == key[:1]):
+        topology_ind_for_pose = torch.zeros(
+            (n_poses,), dtype=torch.int64, device=device
+        )
+        return topology_ind_for_pose, topology_ind_for_pose[:1]
+
+    _, topology_ind_for_pose = torch.unique(key, dim=0, return_inverse=True)
+    n_topologies = int(torch.max(topology_ind_for_pose)) + 1 if n_poses else 0
+    if n_topologies == n_poses:
+        return None, None
+    first_pose = first_pose_for_topology(topology_ind_for_pose)
+    return topology_ind_for_pose, first_pose
+
+
+@validate_args
+def pose_stack_with_canonical_coords(
+    pose_stack: PoseStack,
+    coords: Tensor[torch.float32][:, :, :, 3],
+) -> PoseStack:
+    """Create a PoseStack for new conformations of the poses in an existing
+    PoseStack, reusing all of its topology tensors; only the selection of
+    the block-type atoms from the canonically-ordered coordinates and the
+    building of any missing leaf atoms is performed. This is much cheaper
+    than pose_stack_from_canonical_form for rescoring trajectories.
+
+    Arguments:
+    pose_stack: the template; either a PoseStack holding one pose for every
+        pose in the coords tensor or a PoseStack with a single pose, whose
+        topology will then be shared by every pose in the new PoseStack.
+        Its PackedBlockTypes must have been annotated with the canonical
+        ordering, as is done by pose_stack_from_canonical_form.
+    coords: an n-pose x max-n-blocks x max-n-canonical-atoms tensor giving
+        the coordinates in canonical order, with NaN marking atoms that are
+        not being provided, as for pose_stack_from_canonical_form. Unlike
+        that function's input, the residues must already be laid out as the
+        blocks of the template: left justified, with one residue per block.
+        Because the his tautomer of each residue is already known from the
+        template, the coordinates of HIS protons must be given for the
+        atoms of that tautomer.
+    """
+    from tmol.io.details.select_from_canonical import (
+        take_block_type_atoms_from_canonical,
+    )
+    from tmol.io.details.build_missing_leaf_atoms import build_missing_leaf_atoms
+
+    n_poses = coords.shape[0]
+    assert pose_stack.n_poses == n_poses or pose_stack.n_poses == 1
+    assert coords.shape[1] == pose_stack.max_n_blocks
+    assert coords.device == pose_stack.device
+
+    pbt = pose_stack.packed_block_types
+    block_types64 = pose_stack.block_type_ind64.expand(n_poses, -1)
+    inter_residue_connections = pose_stack.inter_residue_connections.expand(
+        n_poses, -1, -1, -1
+    )
+
+    atom_is_present = torch.all(torch.logical_not(torch.isnan(coords)), dim=3)
+    (
+        block_coords,
+        missing_atoms,
+        real_atoms,
+        _,
+    ) = take_block_type_atoms_from_canonical(
+        pbt, block_types64, coords, atom_is_present
+    )
+    pose_stack_coords, _ = build_missing_leaf_atoms(
+        pbt,
+        block_types64,
+        real_atoms,
+        block_coords,
+        missing_atoms,
+        inter_residue_connections,
+    )
+
+    if pose_stack.n_poses != n_poses:
+        return expand_pose_topology(pose_stack, pose_stack_coords)
+    return attr.evolve(pose_stack, coords=pose_stack_coords)
@@ -389,3 +389,440 @@ class LBFGS_Armijo(Optimizer):
         state["prev_loss"] = prev_loss
 
         return orig_loss
+
+
+def stacked_armijo_linesearch(
+    func,
+    derphi0,
+    phi0,
+    alpha0,
+    active,
+    factor=0.5,
+    sigma_decrease=0.1,
+    sigma_increase=0.8,
+    minstep=1e-12,
+):
+    """The Armijo line search of armijo_linesearch carried out independently
+    for each member of a stack of problems.
+
+    Arguments:
+        func (callable): f(alphas, needed), the function values for each
+            member of the stack after stepping each member by its own
+            stepsize; only the values of the members marked in the boolean
+            mask needed are used, and func may skip evaluating the others
+        derphi0 : (tensor) the directional derivative for each member
+        phi0 : (tensor) func(0) for each member
+        alpha0 : (tensor) the initial stepsize for each member
+        active : (tensor) boolean mask of the members to search; the others
+            are given a stepsize of 0 and are left where they are
+
+    Returns:
+        stepsizes - the accepted stepsize for each member
+        f_vals - the final function value for each member
+
+    Notes
+        Each member follows exactly the sequence of steps that
+        armijo_linesearch would take for it alone; the members that finish
+        early simply hold their accepted stepsize while the others continue,
+        and are left out of the later evaluations of func.
+    """
+    zero = torch.zeros_like(alpha0)
+    alpha = torch.where(active, alpha0, zero)
+    phi = torch.where(active, func(alpha, active), phi0)
+
+    # first, we check if we can increase the stepsize
+    #     (if the func is still behaving linearly)
+    increase = active & (phi <= phi0 + alpha * sigma_increase * derphi0)
+    if torch.any(increase):
+        # attempt to increase stepsize; step back where that does not help
+        alpha1 = torch.where(increase, alpha / factor, alpha)
+        phi_a1 = func(alpha1, increase)
+        take_alpha1 = increase & (phi_a1 < phi)
+        alpha = torch.where(take_alpha1, alpha1, alpha)
+        phi = torch.where(take_alpha1, phi_a1, phi)
+
+    # next, we check if we need to decrease the stepsize
+    searching = active & ~increase & (phi > phi0 + alpha * sigma_decrease * derphi0)
+    while torch.any(searching):
+        # see armijo_linesearch for the handling of search failure
+        at_minstep = searching & (alpha < minstep)
+        failed = at_minstep & (phi >= phi0)
+        if torch.any(failed):
+            print(
+                "Inaccurate G! Step=",
+                alpha[failed],
+                " Deriv=",
+                derphi0[failed],
+                " Finite=",
+                (phi[failed] - phi0[failed]) / alpha[failed],
+            )
+        alpha = torch.where(failed, zero, alpha)
+        phi = torch.where(failed, phi0, phi)
+        searching = searching & ~at_minstep
+        if not torch.any(searching):
+            break
+
+        # decrease by factor^2
+        alpha = torch.where(searching, alpha * (factor * factor), alpha)
+        phi = torch.where(searching, func(alpha, searching), phi)
+        searching = searching & (phi > phi0 + alpha * sigma_decrease * derphi0)
+
+    return alpha, phi
+
+
+class LBFGS_Armijo_Stacked(Optimizer):
+    """
+    L-BFGS with Armijo line search, run independently for each pose in a stack.
+
+    LBFGS_Armijo treats all of its parameters as one problem: one line search
+    and one convergence test on the summed energy, so that a single strained
+    pose keeps every other pose iterating. Here each pose keeps its own L-BFGS
+    history, its own Armijo stepsize, and its own convergence test; poses
+    that have converged are frozen and masked out of the remaining
+    iterations. The trajectory of each pose is the one that LBFGS_Armijo
+    would take for that pose alone.
+
+    The closure is called with a boolean mask of shape [n_poses] marking the
+    poses whose energies are needed; it must return the energy of each pose
+    as a tensor of shape [n_poses] after populating the gradients (e.g. by
+    calling backward on the sum of the energies). The entries for the
+    unmarked poses are ignored, so the closure should skip scoring them,
+    e.g. by handing the mask to the scoring module: as poses converge, the
+    cost of each evaluation falls to that of the poses still being
+    minimized.
+
+    Parameters:
+        pose_inds (list of tensors): for each parameter, the index of the
+            pose that each entry along the parameter's first dimension
+            belongs to
+        n_poses (int): the number of poses in the stack
+        lr (float): learning rate (default: 1)
+        max_iter (int): maximal number of iterations (default: 200)
+        rtol (float): relative tolerance (default: 1e-6)
+        atol (float): absolute tolerance (default: 0)
+        gradtol (float): an absolute tolerance on max_i df/dx_i (default: 1e-4)
+        history_size (int): update history size (default: 128).
+    """
+
+    def __init__(
+        self,
+        params,
+        pose_inds,
+        n_poses,
+        lr=1,
+        max_iter=200,
+        rtol=1e-6,
+        atol=0,
+        gradtol=1e-4,
+        history_size=128,
+    ):
+        defaults = dict(
+            lr=lr,
+            max_iter=max_iter,
+            rtol=rtol,
+            atol=atol,
+            gradtol=gradtol,
+            history_size=history_size,
+        )
+        super(LBFGS_Armijo_Stacked, self).__init__(params, defaults)
+
+        if len(self.param_groups) != 1:
+            raise ValueError(
+                "LBFGS doesn't support per-parameter options " "(parameter groups)"
+            )
+
+        self._params = self.param_groups[0]["params"]
+        if len(pose_inds) != len(self._params):
+            raise ValueError("pose_inds must give one tensor for each parameter")
+        self.n_poses = n_poses
+
+        # Each pose's parameters are packed into one row of an
+        # [n_poses x max_n_dofs] tensor, so that all of the L-BFGS
+        # arithmetic can be done for every pose at once. Record the row
+        # and column for each entry of the flattened parameters.
+        device = self._params[0].device
+        dof_pose = torch.cat(
+            [
+                torch.repeat_interleave(
+                    pose_ind.to(device=device, dtype=torch.int64),
+                    p[0].numel() if p.dim() > 0 and p.shape[0] > 0 else 0,
+                )
+                for p, pose_ind in zip(self._params, pose_inds)
+            ]
+        )
+        n_dofs_for_pose = torch.bincount(dof_pose, minlength=n_poses)
+        order = torch.argsort(dof_pose, stable=True)
+        dof_col = torch.empty_like(dof_pose)
+        dof_col[order] = torch.arange(
+            dof_pose.shape[0], dtype=torch.int64, device=device
+        ) - torch.repeat_interleave(
+            torch.cumsum(n_dofs_for_pose, 0) - n_dofs_for_pose, n_dofs_for_pose
+        )
+        max_n_dofs = int(torch.max(n_dofs_for_pose)) if n_poses > 0 else 0
+
+        self._dof_pose = dof_pose
+        self._dof_col = dof_col
+        self._real_dofs = torch.zeros(
+            (n_poses, max_n_dofs), dtype=torch.bool, device=device
+        )
+        self._real_dofs[dof_pose, dof_col] = True
+
+    # pack a flat tensor into the [n_poses x max_n_dofs] layout
+    def _stack_flat(self, flat):
+        stacked = flat.new_zeros(self._real_dofs.shape)
+        stacked[self._dof_pose, self._dof_col] = flat
+        return stacked
+
+    # pack gradients into a single stacked tensor
+    def _gather_stacked_grad(self):
+        views = []
+        for p in self._params:
+            if p.grad is None:
+                view = p.data.new(p.data.numel()).zero_()
+            else:
+                view = p.grad.data.reshape(-1)
+            views.append(view)
+        return self._stack_flat(torch.cat(views, 0))
+
+    # pack the current location into a single stacked tensor
+    def _gather_stacked_x(self):
+        return self._stack_flat(torch.cat([p.data.reshape(-1) for p in self._params]))
+
+    # unpack a new location
+    def _set_x_from_stacked(self, update):
+        flat = update[self._dof_pose, self._dof_col]
+        offset = 0
+        for p in self._params:
+            numel = p.numel()
+            p.data.copy_(flat[offset : offset + numel].view_as(p.data))
+            offset += numel
+
+    def step(self, closure):
+        """
+        The LBFGS minimization algorithm, for each pose.
+
+        Arguments:
+            func (callable): a function that evaluates the energy of the
+                poses marked in the mask it is given
+
+        Returns:
+            orig_loss: the energy (loss) of each pose before optimization
+
+        Notes:
+            Despite the name, this performs the full LBFGS minimization
+            trajectory. The poses that converged are marked in
+            self.state[...]["converged"].
+        """
+        assert len(self.param_groups) == 1
+
+        group = self.param_groups[0]
+        lr = group["lr"]
+        max_iter = group["max_iter"]
+        rtol = group["rtol"]
+        atol = group["atol"]
+        gradtol = group["gradtol"]
+        history_size = group["history_size"]
+
+        real_dofs = self._real_dofs
+        n_poses = self.n_poses
+        pose_range = torch.arange(n_poses, dtype=torch.int64, device=real_dofs.device)
+
+        # NOTE: state is registered for the first param, as in LBFGS_Armijo
+        state = self.state[self._params[0]]
+        state.setdefault("func_evals", 0)
+        state.setdefault("n_iter", 0)
+
+        # poses still being minimized
+        active = torch.ones(n_poses, dtype=torch.bool, device=real_dofs.device)
+
+        # evaluate initial f(x)
+        orig_loss = closure(active)
+        loss = orig_loss.detach().clone()
+        state["func_evals"] += 1
+
+        # ... and df/dx
+        x = self._gather_stacked_x()
+        flat_grad = self._gather_stacked_grad()
+
+        def max_grad_for_pose(grad):
+            return torch.max(
+                torch.where(real_dofs, grad, torch.full_like(grad, -float("inf"))),
+                dim=1,
+            )[0]
+
+        def dot(a, b):
+            return torch.sum(a * b, dim=1)
+
+        # tensors cached in state
+        d = state.get("d")  # search direction
+        t = state.get("t")  # stepsize
+
+        # history of directions and steps for each pose: a ring buffer
+        # of history_size entries where head is the next entry to
+        # write and n_old is the number of entries in use
+        old_dirs = state.get("old_dirs")
+        old_stps = state.get("old_stps")
+        ro = state.get("ro")
+        head = state.get("head")
+        n_old = state.get("n_old")
+
+        prev_flat_grad = state.get("prev_flat_grad")  # previous grad
+        prev_loss = state.get("prev_loss")  # previous energy
+
+        if state["n_iter"] == 0:
+            old_dirs = x.new_zeros((history_size,) + x.shape)
+            old_stps = x.new_zeros((history_size,) + x.shape)
+            ro = x.new_zeros((history_size, n_poses))
+            head = torch.zeros_like(pose_range)
+            n_old = torch.zeros_like(pose_range)
+
+        n_iter = 0
+
+        while n_iter < max_iter and torch.any(active):
+            n_iter += 1
+            state["n_iter"] += 1
+
+            ## LBFGS updates taken from torch LBFGS
+            if state["n_iter"] == 1:
+                # initialize
+                d = flat_grad.neg()
+            else:
+                # do lbfgs update (update memory)
+                y = flat_grad.sub(prev_flat_grad)
+                s = d.mul(t[:, None])
+                ys = dot(y, s)  # y*s
+                update = active & (ys > 1e-10)
+
+                # store new direction/step, overwriting the oldest entry
+                # once the history is full (limited-memory)
+                old_dirs[head[update], pose_range[update]] = y[update]
+                old_stps[head[update], pose_range[update]] = s[update]
+                ro[head[update], pose_range[update]] = 1.0 / ys[update]
+                head = torch.where(update, (head + 1) % history_size, head)
+                n_old = torch.where(
+                    update, torch.clamp(n_old + 1, max=history_size), n_old
+                )
+
+                # compute the approximate (L-BFGS) inverse Hessian
+                # multiplied by the gradient, newest history entries first
+                # and then oldest first, as in LBFGS_Armijo
+                al = x.new_zeros((history_size, n_poses))
+                q = flat_grad.neg()
+                for i in range(history_size):
+                    ind = (head - 1 - i) % history_size
+                    in_use = i < n_old
+                    if not torch.any(in_use):
+                        break
+                    al[i] = torch.where(
+                        in_use,
+                        dot(old_stps[ind, pose_range], q) * ro[ind, pose_range],
+                        al[i],
+                    )
+                    q -= al[i][:, None] * old_dirs[ind, pose_range]
+
+                # r/d is the final direction
+                r = q
+                for i in range(history_size - 1, -1, -1):
+                    ind = (head - 1 - i) % history_size
+                    in_use = i < n_old
+                    if not torch.any(in_use):
+                        continue
+                    be_i = dot(old_dirs[ind, pose_range], r) * ro[ind, pose_range]
+                    r += (
+                        torch.where(in_use, al[i] - be_i, torch.zeros_like(be_i))[
+                            :, None
+                        ]
+                        * old_stps[ind, pose_range]
+                    )
+                d = torch.where(active[:, None], r, d)
+
+            if prev_flat_grad is None:
+                prev_flat_grad = flat_grad.clone()
+            else:
+                prev_flat_grad.copy_(flat_grad)
+            prev_loss = loss.clone()
+
+            # Armijo updates will track step length during optimization
+            # thus, "learning rate" is only applied for the initial step
+            if state["n_iter"] == 1:
+                t = torch.full_like(loss, lr)
+
+            # directional derivative
+            gtd = dot(flat_grad, d)  # g * d
+
+            # (fd) this is some hacky stuff I put in R3 that is not typically part
+            # (fd)   of lbfgs because the bfgs update had us frequently searching
+            # (fd)   in positive grad directions
+            # check 1: if dir. deriv. is positive, flip signs of positive components
+            flip = active & (gtd > -1e-5)
+            d = torch.where(flip[:, None], d * -torch.sign(flat_grad * d), d)
+            gtd = dot(flat_grad, d)
+
+            # check 2: if derivative is still positive, reset Hessian
+            reset = active & (gtd > -1e-5)
+            d = torch.where(reset[:, None], flat_grad.neg(), d)
+            n_old = torch.where(reset, torch.zeros_like(n_old), n_old)
+            gtd = dot(flat_grad, d)
+
+            # define the line search function
+            # we do not need to compute gradients in here
+            self.ls_func_evals = 0
+
+            def linefn(alpha_test, needed):
+                self.ls_func_evals += 1
+                self._set_x_from_stacked(x + alpha_test[:, None] * d)
+                E = closure(needed)
+                return E.detach().to(dtype=gtd.dtype)
+
+            # do the line search for each of the active poses
+            t_active, loss = stacked_armijo_linesearch(
+                linefn,  # callback for energy eval
+                gtd,  # directional derivative
+                prev_loss,  # current function value (at x)
+                t,  # stepsize
+                active,
+                factor=0.5,
+                sigma_decrease=0.1,
+                sigma_increase=0.8,
+                minstep=1e-12,
+            )
+            t = torch.where(active, t_active, t)
+
+            # update
+            x = x + t_active[:, None] * d
+            self._set_x_from_stacked(x)
+            closure(
+                active
+            )  # fd: needed for derivatives, but adds an extra func eval...
+            flat_grad = torch.where(
+                active[:, None], self._gather_stacked_grad(), flat_grad
+            )
+
+            # update func eval
+            state["func_evals"] += self.ls_func_evals
+
+            # converge check 1: gradient
+            converged = max_grad_for_pose(flat_grad) <= gradtol
+
+            # converge check 2: abs tol
+            converged |= torch.abs(loss - prev_loss) <= atol
+
+            # converge check 3: rel tol
+            converged |= 2 * torch.abs(loss - prev_loss) <= rtol * (
+                torch.abs(loss) + torch.abs(prev_loss) + 1e-10
+            )
+
+            active &= ~converged
+
+        state["d"] = d
+        state["t"] = t
+        state["old_dirs"] = old_dirs
+        state["old_stps"] = old_stps
+        state["ro"] = ro
+        state["head"] = head
+        state["n_old"] = n_old
+        state["prev_flat_grad"] = prev_flat_grad
+        state["prev_loss"] = prev_loss
+        state["converged"] = ~active
+
+        return orig_loss
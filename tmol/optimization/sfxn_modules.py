@@ -1,7 +1,12 @@
 import torch
 
 from tmol.pose.pose_stack import PoseStack
+from tmol.pose.pose_kinematics import construct_pose_stack_kinforest
 from tmol.score.score_function import ScoreFunction
+from tmol.kinematics.fold_forest import FoldForest
+from tmol.kinematics.metadata import DOFMetadata, DOFTypes
+from tmol.kinematics.dof_modules import KinematicModule
+from tmol.kinematics.compiled import inverse_kin
 
 
 class CartesianSfxnNetwork(torch.nn.Module):
@@ -24,21 +29,102 @@ class CartesianSfxnNetwork(torch.nn.Module):
         self.coord_mask = coord_mask
 
         self.masked_coords = torch.nn.Parameter(self.full_coords[self.coord_mask])
+        # the pose that each of the masked coordinates belongs to, for
+        # optimizers that minimize each pose independently
+        self.pose_ind = torch.nonzero(self.coord_mask)[:, 0]
         self.count = 0
 
-    def forward(self):
+    def forward(self, active_poses=None):
         self.count += 1
         self.full_coords = self.full_coords.detach()
         self.full_coords[self.coord_mask] = self.masked_coords
-        return self.whole_pose_scoring_module(self.full_coords)
-
-
-# class KinematicSfxnNetwork(torch.nn.Module):
-#     def __init__(self, score_function, pose_stack, dof_mask=None):
-#         super(KinematicSfxnNetwork, self).__init__()
-#
-#         self.whole_pose_scoring_module = (
-#             score_function.render_whole_pose_scoring_module(pose_stack)
-#         )
-#         self.dof_mask = dof_mask
-#         # TO DO!!!
+        return self.whole_pose_scoring_module(self.full_coords, active_poses)
+
+
+class KinematicSfxnNetwork(torch.nn.Module):
+    """Minimize a PoseStack in torsion space.
+
+    The kinematic forest for the whole stack is built once from the
+    FoldForest (by default, one polymeric tree per pose) and the starting
+    coordinates are converted into internal coordinates ("DOFs"). The
+    DOFs selected by dof_mask are the parameters of the network; each
+    evaluation refolds every pose in the stack in a single pass of the
+    forward-kinematics operator and scores the resulting coordinates;
+    given a mask of the poses whose scores are needed, as
+    LBFGS_Armijo_Stacked provides, only those poses are scored.
+
+    dof_mask is a boolean tensor of [n_kinforest_nodes x 9]; by default
+    the torsions and the rigid-body jump DOFs are minimized and the bond
+    lengths and angles are held fixed.
+    """
+
+    def __init__(
+        self,
+        score_function: ScoreFunction,
+        pose_stack: PoseStack,
+        fold_forest: FoldForest = None,
+        dof_mask=None,
+    ):
+        super(KinematicSfxnNetwork, self).__init__()
+
+        wpsm = score_function.render_whole_pose_scoring_module(pose_stack)
+        self.whole_pose_scoring_module = wpsm
+
+        if fold_forest is None:
+            fold_forest = FoldForest.polymeric_forest(
+                pose_stack.n_res_per_pose.cpu().numpy()
+            )
+        kinforest = construct_pose_stack_kinforest(pose_stack, fold_forest)
+        if dof_mask is None:
+            dof_metadata = DOFMetadata.for_kinforest(kinforest)
+            minimizable = (dof_metadata.dof_type == DOFTypes.bond_torsion) | (
+                dof_metadata.dof_type == DOFTypes.jump
+            )
+            dof_mask = torch.zeros(
+                (kinforest.id.shape[0], 9), dtype=torch.bool, device=kinforest.id.device
+            )
+            dof_mask[
+                dof_metadata.node_idx[minimizable], dof_metadata.dof_idx[minimizable]
+            ] = True
+
+        device = pose_stack.device
+        self.kin_module = KinematicModule(kinforest).to(device)
+        self.kinforest = kinforest.to(device)
+        self.dof_mask = dof_mask.to(device)
+
+        # the index of each kinforest node's atom in the flattened coordinates;
+        # node 0 is the root of the forest and has no atom
+        self.kin_atom_ind = self.kinforest.id[1:].to(torch.int64)
+
+        self.full_coords = pose_stack.coords
+        kincoords = self.full_coords.new_zeros((self.kinforest.id.shape[0], 3))
+        kincoords[1:] = self.full_coords.reshape(-1, 3)[self.kin_atom_ind]
+        self.full_dofs = inverse_kin(
+            kincoords,
+            self.kinforest.parent,
+            self.kinforest.frame_x,
+            self.kinforest.frame_y,
+            self.kinforest.frame_z,
+            self.kinforest.doftype,
+        ).detach()
+
+        self.masked_dofs = torch.nn.Parameter(self.full_dofs[self.dof_mask])
+        # the pose that each of the masked dofs belongs to, for
+        # optimizers that minimize each pose independently
+        node_pose_ind = torch.zeros_like(self.kinforest.id, dtype=torch.int64)
+        node_pose_ind[1:] = torch.div(
+            self.kin_atom_ind, pose_stack.max_n_pose_atoms, rounding_mode="floor"
+        )
+        self.pose_ind = node_pose_ind[torch.nonzero(self.dof_mask)[:, 0]]
+        self.count = 0
+
+    def forward(self, active_poses=None):
+        self.count += 1
+        self.full_dofs = self.full_dofs.detach()
+        self.full_dofs[self.dof_mask] = self.masked_dofs
+        kincoords = self.kin_module(self.full_dofs)
+
+        full_coords = self.full_coords.detach().reshape(-1, 3).clone()
+        full_coords[self.kin_atom_ind] = kincoords[1:]
+        self.full_coords = full_coords.reshape(self.full_coords.shape)
+        return self.whole_pose_scoring_module(self.full_coords, active_poses)
@@ -0,0 +1,32 @@
+def pack(
+    pose_stack,
+    score_function,
+    task,
+    n_traj_per_pose: int = 1,
+    schedule=None,
+    n_quench_passes: int = 0,
+    replica_exchange=None,
+    pruning=None,
+    packer=None,
+):
+    """Repack the poses of a PoseStack with the rotamers a PackerTask allows,
+    returning the repacked PoseStack and the energies of each pose's
+    n_traj_per_pose annealing trajectories; see tmol.pack.packer.pack. To
+    reuse the annealer's buffers over repeated calls, pass the same
+    tmol.pack.packer.Packer to each
+    """
+
+    # deferred so that importing tmol.pack does not build the annealer
+    from .packer import pack
+
+    return pack(
+        pose_stack,
+        score_function,
+        task,
+        n_traj_per_pose,
+        schedule,
+        n_quench_passes,
+        replica_exchange,
+        pruning,
+        packer,
+    )
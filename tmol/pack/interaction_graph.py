@@ -0,0 +1,514 @@
+import attr
+import torch
+
+from typing import Optional
+
+from tmol.types.attrs import ValidateAttrs
+from tmol.types.torch import Tensor
+from tmol.chemical.constants import MAX_SIG_BOND_SEPARATION
+from tmol.pose.packed_block_types import PackedBlockTypes
+from tmol.pose.pose_stack import PoseStack, sparse_inter_block_bondsep
+from tmol.score.score_function import ScoreFunction
+from tmol.pack.rotamer.build_rotamers import RotamerSet
+from tmol.pack.rotamer.bounding_spheres import create_rotamer_bounding_spheres
+from tmol.pack.rotamer.rotamer_trie import build_rotamer_trie, trie_vs_trie_energies
+
+
+@attr.s(auto_attribs=True, slots=True, frozen=True)
+class InteractionGraph(ValidateAttrs):
+    """The precomputed energies of the rotamers in a RotamerSet.
+
+    The energy of a pose whose packable blocks (those with rotamers)
+    have each been assigned a rotamer is the sum of three parts:
+    the energy among its fixed blocks (background_energy, one per pose),
+    the one-body energies of the assigned rotamers, which include their
+    interactions with the fixed blocks (energy1b, one per rotamer), and
+    the two-body energies between the rotamers assigned to neighboring
+    packable blocks.
+
+    The two-body energies are stored sparsely, only for pairs of blocks
+    whose rotamers can come into contact: pair_neighbors is an
+    [n_poses x max_n_blocks x max_n_neighbors] tensor listing the
+    neighboring packable blocks of each packable block (sentinel of -1),
+    and pair_offsets gives for each of those neighbors the offset into
+    energy2b of the table of energies for the block pair. The table for
+    blocks i < j holding n_i and n_j rotamers is an n_i x n_j row-major
+    block: the energy of the i's rotamer a (counting from the first
+    rotamer at i) with j's rotamer b is at offset + a * n_j + b.
+    """
+
+    background_energy: Tensor[torch.float32][:]
+    energy1b: Tensor[torch.float32][:]
+    pair_neighbors: Tensor[torch.int32][:, :, :]
+    pair_offsets: Tensor[torch.int64][:, :, :]
+    energy2b: Tensor[torch.float32][:]
+
+
+def build_interaction_graph(
+    score_function: ScoreFunction,
+    poses: PoseStack,
+    rotamer_set: RotamerSet,
+    bounding_spheres: Optional[Tensor[torch.float32][:, :, 4]] = None,
+    interaction_distance: float = 6.0,
+    max_n_blocks_per_batch: int = 8192,
+    use_rotamer_tries: bool = True,
+) -> InteractionGraph:
+    """Evaluate all of the rotamer energies the annealer will need.
+
+    The poses must be the ones returned by build_rotamers alongside the
+    rotamer set. Two packable blocks are neighbors if they are chemically
+    bonded or if the bounding spheres of their rotamers come within
+    interaction_distance of each other. The energies come from the score
+    function's block-pair energies: the two-body energies are evaluated
+    on two-block poses, one per pair of rotamers, and the one-body energies
+    on copies of the full poses with a single rotamer placed, scoring at
+    most max_n_blocks_per_batch blocks at a time. With use_rotamer_tries,
+    the terms that can evaluate the atom pairs of blocks that are not
+    chemically bonded (by a nonbonded_atom_pair_energies method) take
+    their two-body energies for such blocks from tries of the rotamers
+    instead, evaluating the atom pairs that rotamers share only once; see
+    tmol.pack.rotamer.rotamer_trie.
+    """
+    device = poses.device
+    n_poses = poses.n_poses
+    max_n_blocks = poses.max_n_blocks
+
+    if bounding_spheres is None:
+        bounding_spheres = create_rotamer_bounding_spheres(poses, rotamer_set)
+
+    n_rots_for_block = rotamer_set.n_rots_for_block
+    packable = n_rots_for_block > 0
+    fixed = torch.logical_and(poses.block_type_ind64 != -1, torch.logical_not(packable))
+    expanded_coords, _ = poses.expand_coords()
+
+    with torch.no_grad():
+        # the energy among the fixed blocks
+        pose_energies = _block_pair_energies(score_function, poses)
+        fixed_pairs = torch.logical_and(fixed.unsqueeze(2), fixed.unsqueeze(1))
+        background_energy = torch.sum(
+            torch.where(fixed_pairs, pose_energies, 0).flatten(start_dim=1), dim=1
+        )
+
+        # the one-body energies: place each rotamer into its pose and take
+        # its interactions with itself and the fixed blocks
+        n_rots = rotamer_set.block_ind_for_rot.shape[0]
+        energy1b = torch.zeros((n_rots,), dtype=torch.float32, device=device)
+        batch_size = max(1, max_n_blocks_per_batch // max_n_blocks)
+        for start in range(0, n_rots, batch_size):
+            rots = torch.arange(
+                start, min(start + batch_size, n_rots), dtype=torch.int64, device=device
+            )
+            n_batch = rots.shape[0]
+            batch_arange = torch.arange(n_batch, dtype=torch.int64, device=device)
+            pose_ind = rotamer_set.pose_for_rot[rots]
+            block_ind = rotamer_set.block_ind_for_rot[rots].to(torch.int64)
+            block_rot = torch.full(
+                (n_batch, max_n_blocks), -1, dtype=torch.int64, device=device
+            )
+            block_rot[batch_arange, block_ind] = rots
+
+            rot_poses = _poses_with_rotamers(
+                poses, rotamer_set, expanded_coords, pose_ind, block_rot
+            )
+            energies = _block_pair_energies(score_function, rot_poses)
+            with_fixed = (
+                energies[batch_arange, block_ind] + energies[batch_arange, :, block_ind]
+            )
+            energy1b[rots] = energies[batch_arange, block_ind, block_ind] + torch.sum(
+                torch.where(fixed[pose_ind], with_fixed, 0), dim=1
+            )
+
+        # the pairs of packable blocks whose rotamers can interact
+        centers = bounding_spheres[:, :, :3]
+        radii = bounding_spheres[:, :, 3]
+        near = torch.cdist(centers, centers) < (
+            radii.unsqueeze(2) + radii.unsqueeze(1) + interaction_distance
+        )
+        bondsep_neighbors = poses.inter_block_bondsep_neighbors.to(torch.int64)
+        bonded = torch.zeros_like(near)
+        nz_pose, nz_block, nz_slot = torch.nonzero(
+            bondsep_neighbors != -1, as_tuple=True
+        )
+        bonded[nz_pose, nz_block, bondsep_neighbors[nz_pose, nz_block, nz_slot]] = True
+        block_arange = torch.arange(max_n_blocks, dtype=torch.int64, device=device)
+        is_edge = torch.logical_and(
+            torch.logical_or(near, bonded),
+            torch.logical_and(
+                torch.logical_and(packable.unsqueeze(2), packable.unsqueeze(1)),
+                block_arange.unsqueeze(1) < block_arange.unsqueeze(0),
+            ),
+        )
+        edge_pose, edge_block1, edge_block2 = torch.nonzero(is_edge, as_tuple=True)
+        edge_n_rots1 = n_rots_for_block[edge_pose, edge_block1]
+        edge_n_rots2 = n_rots_for_block[edge_pose, edge_block2]
+        edge_size = edge_n_rots1 * edge_n_rots2
+        edge_offset = torch.cumsum(edge_size, dim=0) - edge_size
+        n_pair_energies = int(torch.sum(edge_size))
+
+        # both blocks of a pair list each other as neighbors
+        is_neighbor = torch.logical_or(is_edge, is_edge.transpose(1, 2))
+        n_neighbors = torch.sum(is_neighbor, dim=2)
+        neighbor_slot = torch.cumsum(is_neighbor, dim=2) - 1
+        max_n_neighbors = max(1, int(torch.max(n_neighbors)))
+        pair_neighbors = torch.full(
+            (n_poses, max_n_blocks, max_n_neighbors),
+            -1,
+            dtype=torch.int32,
+            device=device,
+        )
+        pair_offsets = torch.full(
+            (n_poses, max_n_blocks, max_n_neighbors),
+            -1,
+            dtype=torch.int64,
+            device=device,
+        )
+        for block, neighbor in ((edge_block1, edge_block2), (edge_block2, edge_block1)):
+            slot = neighbor_slot[edge_pose, block, neighbor]
+            pair_neighbors[edge_pose, block, slot] = neighbor.to(torch.int32)
+            pair_offsets[edge_pose, block, slot] = edge_offset
+
+        # the two-body energies, from two-block poses for each rotamer pair
+        # or, for the terms that can, from the tries of the rotamers at
+        # blocks that are not chemically bonded
+        energy2b = torch.zeros((n_pair_energies,), dtype=torch.float32, device=device)
+        trie_terms = [
+            term
+            for term in score_function.two_body_terms()
+            if use_rotamer_tries and hasattr(term, "nonbonded_atom_pair_energies")
+        ]
+        is_trie_edge = torch.logical_not(bonded[edge_pose, edge_block1, edge_block2])
+        if len(trie_terms) == 0:
+            is_trie_edge[:] = False
+        pair_batch_size = max(1, max_n_blocks_per_batch // 2)
+
+        def _add_generic_pair_energies(sfxn, edges):
+            energy2b.add_(
+                _rotamer_pair_energies(
+                    sfxn,
+                    poses,
+                    rotamer_set,
+                    expanded_coords,
+                    edge_pose[edges],
+                    edge_block1[edges],
+                    edge_block2[edges],
+                    edge_offset[edges],
+                    n_pair_energies,
+                    pair_batch_size,
+                )
+            )
+
+        if not torch.all(is_trie_edge):
+            _add_generic_pair_energies(score_function, torch.logical_not(is_trie_edge))
+        if torch.any(is_trie_edge):
+            trie_edges = torch.nonzero(is_trie_edge, as_tuple=True)[0]
+            other_terms = score_function.without_terms(trie_terms)
+            if len(other_terms.all_terms()) > 0:
+                _add_generic_pair_energies(other_terms, trie_edges)
+            trie_energies = trie_vs_trie_energies(
+                build_rotamer_trie(
+                    poses.packed_block_types,
+                    rotamer_set,
+                    poses.packed_block_types.atom_types,
+                ),
+                rotamer_set,
+                _weighted_atom_pair_energies(
+                    score_function, trie_terms, poses.packed_block_types
+                ),
+                edge_pose[trie_edges],
+                edge_block1[trie_edges],
+                edge_block2[trie_edges],
+                interaction_distance,
+            )
+            trie_offset = (
+                torch.cumsum(edge_size[trie_edges], dim=0) - edge_size[trie_edges]
+            )
+            energy2b[
+                torch.repeat_interleave(
+                    edge_offset[trie_edges] - trie_offset, edge_size[trie_edges]
+                )
+                + torch.arange(trie_energies.shape[0], dtype=torch.int64, device=device)
+            ] += trie_energies
+
+    return InteractionGraph(
+        background_energy=background_energy,
+        energy1b=energy1b,
+        pair_neighbors=pair_neighbors,
+        pair_offsets=pair_offsets,
+        energy2b=energy2b,
+    )
+
+
+def assignment_energies(
+    interaction_graph: InteractionGraph,
+    rotamer_set: RotamerSet,
+    assignment: Tensor[torch.int64][:, :],
+    pose_ind: Optional[Tensor[torch.int64][:]] = None,
+) -> Tensor[torch.float32][:]:
+    """The total energy of each pose given an [n_poses x max_n_blocks]
+    assignment of (global) rotamer indices to its packable blocks
+
+    Several assignments may be evaluated for the same pose by giving the
+    pose of each row of the assignment in pose_ind.
+    """
+    ig = interaction_graph
+    device = assignment.device
+    if pose_ind is None:
+        pose_ind = torch.arange(assignment.shape[0], dtype=torch.int64, device=device)
+    max_n_blocks = ig.pair_neighbors.shape[1]
+    block_arange = torch.arange(max_n_blocks, dtype=torch.int64, device=device)
+    n_rots_for_block = rotamer_set.n_rots_for_block[pose_ind]
+    rot_offset_for_block = rotamer_set.rot_offset_for_block[pose_ind]
+
+    packable = n_rots_for_block > 0
+    energies = ig.background_energy[pose_ind] + torch.sum(
+        torch.where(packable, ig.energy1b[assignment.clamp(min=0)], 0), dim=1
+    )
+
+    # visit each pair of neighbors from its lower-indexed block
+    neighbors = ig.pair_neighbors[pose_ind].to(torch.int64)
+    counted = neighbors > block_arange.view(1, -1, 1)
+    nz_row, nz_block1, nz_slot = torch.nonzero(counted, as_tuple=True)
+    nz_block2 = neighbors[nz_row, nz_block1, nz_slot]
+    local_rot1 = assignment[nz_row, nz_block1] - rot_offset_for_block[nz_row, nz_block1]
+    local_rot2 = assignment[nz_row, nz_block2] - rot_offset_for_block[nz_row, nz_block2]
+    pair_energies = ig.energy2b[
+        ig.pair_offsets[pose_ind[nz_row], nz_block1, nz_slot]
+        + local_rot1 * n_rots_for_block[nz_row, nz_block2]
+        + local_rot2
+    ]
+    return energies.index_add(0, nz_row, pair_energies)
+
+
+def _rotamer_pair_energies(
+    score_function: ScoreFunction,
+    poses: PoseStack,
+    rotamer_set: RotamerSet,
+    expanded_coords: Tensor[torch.float32][:, :, :, 3],
+    edge_pose: Tensor[torch.int64][:],
+    edge_block1: Tensor[torch.int64][:],
+    edge_block2: Tensor[torch.int64][:],
+    edge_offset: Tensor[torch.int64][:],
+    n_pair_energies: int,
+    batch_size: int,
+) -> Tensor[torch.float32][:]:
+    """The energies between the rotamers of the given pairs of blocks,
+    placed at the edges' offsets into an energy2b of n_pair_energies,
+    evaluated on two-block poses, batch_size at a time
+    """
+    device = poses.device
+    energy2b = torch.zeros((n_pair_energies,), dtype=torch.float32, device=device)
+    n_rots_for_block = rotamer_set.n_rots_for_block
+    rot_offset_for_block = rotamer_set.rot_offset_for_block
+    edge_n_rots2 = n_rots_for_block[edge_pose, edge_block2]
+    edge_size = n_rots_for_block[edge_pose, edge_block1] * edge_n_rots2
+    edge_start = torch.cumsum(edge_size, dim=0) - edge_size
+    n_edge_pair_energies = int(torch.sum(edge_size))
+    for start in range(0, n_edge_pair_energies, batch_size):
+        pair_ind = torch.arange(
+            start,
+            min(start + batch_size, n_edge_pair_energies),
+            dtype=torch.int64,
+            device=device,
+        )
+        edge = torch.searchsorted(edge_start, pair_ind, right=True) - 1
+        local_ind = pair_ind - edge_start[edge]
+        pose_ind = edge_pose[edge]
+        block_ind = torch.stack((edge_block1[edge], edge_block2[edge]), dim=1)
+        rots = torch.stack(
+            (
+                rot_offset_for_block[pose_ind, block_ind[:, 0]]
+                + torch.div(local_ind, edge_n_rots2[edge], rounding_mode="floor"),
+                rot_offset_for_block[pose_ind, block_ind[:, 1]]
+                + torch.remainder(local_ind, edge_n_rots2[edge]),
+            ),
+            dim=1,
+        )
+        pair_poses = _rotamer_pair_poses(
+            poses, rotamer_set, expanded_coords, pose_ind, block_ind, rots
+        )
+        energies = _block_pair_energies(score_function, pair_poses)
+        energy2b[edge_offset[edge] + local_ind] = energies[:, 0, 1] + energies[:, 1, 0]
+    return energy2b
+
+
+def _weighted_atom_pair_energies(
+    score_function: ScoreFunction, terms, packed_block_types: PackedBlockTypes
+):
+    """The weighted sum of the given terms' nonbonded_atom_pair_energies"""
+    weights = [
+        torch.tensor(
+            [score_function.weight(st) for st in term.score_types()],
+            dtype=torch.float32,
+            device=packed_block_types.device,
+        )
+        for term in terms
+    ]
+
+    def atom_pair_energies(block_type1, atom1, coords1, block_type2, atom2, coords2):
+        return sum(
+            w
+            @ term.nonbonded_atom_pair_energies(
+                packed_block_types,
+                block_type1,
+                atom1,
+                coords1,
+                block_type2,
+                atom2,
+                coords2,
+            )
+            for w, term in zip(weights, terms)
+        )
+
+    return atom_pair_energies
+
+
+def _block_pair_energies(score_function: ScoreFunction, poses: PoseStack):
+    scorer = score_function.render_block_pair_scoring_module(poses)
+    return scorer(poses.coords)
+
+
+def _substituted_blocks(
+    poses: PoseStack,
+    rotamer_set: RotamerSet,
+    expanded_coords: Tensor[torch.float32][:, :, :, 3],
+    pose_ind: Tensor[torch.int64][:],
+    block_ind: Tensor[torch.int64][:, :],
+    block_rot: Tensor[torch.int64][:, :],
+):
+    """The block types, coordinates, and coordinate offsets of new poses
+    whose blocks are either the blocks block_ind of poses pose_ind
+    (block_rot of -1) or the rotamers block_rot placed at those blocks
+    """
+    pbt = poses.packed_block_types
+    device = poses.device
+
+    has_rot = block_rot != -1
+    block_type_ind = torch.where(
+        has_rot,
+        rotamer_set.block_type_ind_for_rot[block_rot.clamp(min=0)],
+        poses.block_type_ind64[pose_ind.unsqueeze(1), block_ind],
+    )
+    n_atoms = torch.where(
+        block_type_ind != -1, pbt.n_atoms[block_type_ind.clamp(min=0)], 0
+    ).to(torch.int64)
+    block_coord_offset = torch.cumsum(n_atoms, dim=1) - n_atoms
+
+    block_coords = torch.where(
+        has_rot.view(has_rot.shape + (1, 1)),
+        rotamer_set.coords_for_rots(pbt, block_rot.clamp(min=0).flatten()).view(
+            *block_rot.shape, pbt.max_n_atoms, 3
+        ),
+        expanded_coords[pose_ind.unsqueeze(1), block_ind],
+    )
+    real_atoms = torch.arange(
+        pbt.max_n_atoms, dtype=torch.int64, device=device
+    ) < n_atoms.unsqueeze(2)
+    nz_pose, nz_block, nz_atom = torch.nonzero(real_atoms, as_tuple=True)
+    coords = torch.zeros(
+        (pose_ind.shape[0], max(1, int(torch.max(torch.sum(n_atoms, dim=1)))), 3),
+        dtype=torch.float32,
+        device=device,
+    )
+    coords[nz_pose, block_coord_offset[nz_pose, nz_block] + nz_atom] = block_coords[
+        real_atoms
+    ]
+    return block_type_ind, coords, block_coord_offset
+
+
+def _poses_with_rotamers(
+    poses: PoseStack,
+    rotamer_set: RotamerSet,
+    expanded_coords: Tensor[torch.float32][:, :, :, 3],
+    pose_ind: Tensor[torch.int64][:],
+    block_rot: Tensor[torch.int64][:, :],
+) -> PoseStack:
+    """Copies of poses pose_ind with the rotamers block_rot placed at
+    their blocks; blocks with a block_rot of -1 are left as they are
+    """
+    block_ind = torch.arange(
+        poses.max_n_blocks, dtype=torch.int64, device=poses.device
+    ).repeat(pose_ind.shape[0], 1)
+    block_type_ind, coords, block_coord_offset = _substituted_blocks(
+        poses, rotamer_set, expanded_coords, pose_ind, block_ind, block_rot
+    )
+    return PoseStack(
+        packed_block_types=poses.packed_block_types,
+        coords=coords,
+        block_coord_offset=block_coord_offset.to(torch.int32),
+        block_coord_offset64=block_coord_offset,
+        inter_residue_connections=poses.inter_residue_connections[pose_ind],
+        inter_residue_connections64=poses.inter_residue_connections64[pose_ind],
+        inter_block_bondsep_neighbors=poses.inter_block_bondsep_neighbors[pose_ind],
+        inter_block_bondsep_sparse=poses.inter_block_bondsep_sparse[pose_ind],
+        block_type_ind=block_type_ind.to(torch.int32),
+        block_type_ind64=block_type_ind,
+        device=poses.device,
+    )
+
+
+def _rotamer_pair_poses(
+    poses: PoseStack,
+    rotamer_set: RotamerSet,
+    expanded_coords: Tensor[torch.float32][:, :, :, 3],
+    pose_ind: Tensor[torch.int64][:],
+    block_ind: Tensor[torch.int64][:, 2],
+    rots: Tensor[torch.int64][:, 2],
+) -> PoseStack:
+    """Two-block poses holding the rotamers rots placed at blocks block_ind
+    of poses pose_ind. The chemical bonds and bond separations between the
+    two blocks are those between the blocks in the original poses, so the
+    blocks interact just as they would there.
+    """
+    device = poses.device
+    n_pair_poses = pose_ind.shape[0]
+    block_type_ind, coords, block_coord_offset = _substituted_blocks(
+        poses, rotamer_set, expanded_coords, pose_ind, block_ind, rots
+    )
+
+    # keep only the connections between the two blocks
+    inter_residue_connections = poses.inter_residue_connections64[
+        pose_ind.unsqueeze(1), block_ind
+    ]
+    other_block = block_ind.flip(1)
+    connected = inter_residue_connections[:, :, :, 0] == other_block.unsqueeze(2)
+    other_block_new_ind = torch.tensor([1, 0], dtype=torch.int64, device=device)
+    inter_residue_connections = torch.stack(
+        (
+            torch.where(connected, other_block_new_ind.view(1, 2, 1), -1),
+            torch.where(connected, inter_residue_connections[:, :, :, 1], -1),
+        ),
+        dim=3,
+    )
+
+    # and the bond separations among the two blocks' connections
+    bondsep_neighbors = poses.inter_block_bondsep_neighbors.to(torch.int64)[
+        pose_ind.unsqueeze(1), block_ind
+    ]
+    bondsep_sparse = poses.inter_block_bondsep_sparse[pose_ind.unsqueeze(1), block_ind]
+    max_n_conn = bondsep_sparse.shape[3]
+    inter_block_bondsep = torch.full(
+        (n_pair_poses, 2, 2, max_n_conn, max_n_conn),
+        MAX_SIG_BOND_SEPARATION,
+        dtype=torch.int32,
+        device=device,
+    )
+    is_pair_block = bondsep_neighbors.unsqueeze(3) == block_ind.view(-1, 1, 1, 2)
+    nz_pose, nz_block1, nz_slot, nz_block2 = torch.nonzero(is_pair_block, as_tuple=True)
+    inter_block_bondsep[nz_pose, nz_block1, nz_block2] = bondsep_sparse[
+        nz_pose, nz_block1, nz_slot
+    ]
+    bondsep_neighbors, bondsep_sparse = sparse_inter_block_bondsep(inter_block_bondsep)
+
+    return PoseStack(
+        packed_block_types=poses.packed_block_types,
+        coords=coords,
+        block_coord_offset=block_coord_offset.to(torch.int32),
+        block_coord_offset64=block_coord_offset,
+        inter_residue_connections=inter_residue_connections.to(torch.int32),
+        inter_residue_connections64=inter_residue_connections,
+        inter_block_bondsep_neighbors=bondsep_neighbors,
+        inter_block_bondsep_sparse=bondsep_sparse,
+        block_type_ind=block_type_ind.to(torch.int32),
+        block_type_ind64=block_type_ind,
+        device=device,
+    )
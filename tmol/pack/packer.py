@@ -0,0 +1,382 @@
+"""Repack the side chains of the poses in a PoseStack.
+
+pack() strings together the stages of packing: building the rotamers the
+PackerTask allows, precomputing their energies in an InteractionGraph,
+running several simulated-annealing trajectories per pose, and assembling
+the lowest-energy assignment of each pose into a new PoseStack.
+
+The annealer works in place on a set of device buffers sized by the number
+of trajectories, blocks, and atoms per block. pack() allocates them for each
+call; a Packer holds on to them and reuses them for later calls packing
+stacks of the same shape, so repeated packing of (e.g.) the same set of
+poses does not reallocate them.
+"""
+
+import attr
+import torch
+
+from typing import Optional, Tuple
+
+from tmol.types.torch import Tensor
+from tmol.pose.pose_stack import PoseStack
+from tmol.score.score_function import ScoreFunction
+from tmol.pack.packer_task import PackerTask
+from tmol.pack.rotamer.build_rotamers import RotamerSet, build_rotamers
+from tmol.pack.interaction_graph import build_interaction_graph, assignment_energies
+from tmol.pack.prune import RotamerPruning
+from tmol.pack.sim_anneal.annealer import InteractionGraphRPEModule
+from tmol.pack.sim_anneal.accept_final import poses_from_assigned_rotamers
+from tmol.pack.sim_anneal.schedule import AnnealingSchedule, ReplicaExchange
+from tmol.pack.sim_anneal.compiled.compiled import (
+    create_sim_annealer,
+    delete_sim_annealer,
+    register_standard_random_rotamer_picker,
+    register_standard_metropolis_accept_or_rejector,
+    register_replica_exchange_metropolis_accept_or_rejector,
+    run_sim_annealing,
+)
+
+
+def pack(
+    pose_stack: PoseStack,
+    score_function: ScoreFunction,
+    task: PackerTask,
+    n_traj_per_pose: int = 1,
+    schedule: Optional[AnnealingSchedule] = None,
+    n_quench_passes: int = 0,
+    replica_exchange: Optional[ReplicaExchange] = None,
+    pruning: Optional[RotamerPruning] = None,
+    packer: Optional["Packer"] = None,
+) -> Tuple[PoseStack, Tensor[torch.float32][:, :]]:
+    """Repack the poses, returning the repacked PoseStack and the
+    [n_poses x n_traj_per_pose] energies of the trajectories' final
+    assignments.
+
+    Each trajectory starts from a random assignment of rotamers and is
+    annealed following the schedule (by default, AnnealingSchedule()),
+    then refined by n_quench_passes further quench-only passes. With a
+    replica_exchange, the trajectories of each pose anneal together by
+    parallel tempering rather than independently. The pose returned for
+    each input pose is the one from its lowest-energy trajectory. Blocks
+    that the task does not allow to pack are left as they are.
+
+    Given a RotamerPruning, the rotamers that cannot be part of a
+    low-energy assignment are discarded before annealing begins. Given a
+    Packer, the annealer's buffers are taken from it rather than allocated
+    for this call alone.
+    """
+    assert n_traj_per_pose > 0
+    assert n_quench_passes >= 0
+    if schedule is None:
+        schedule = AnnealingSchedule()
+    poses, rotamer_set = build_rotamers(
+        pose_stack, task, pose_stack.packed_block_types.chem_db
+    )
+    interaction_graph = build_interaction_graph(score_function, poses, rotamer_set)
+    if pruning is not None:
+        rotamer_set, interaction_graph, _ = pruning(interaction_graph, rotamer_set)
+
+    pbt = poses.packed_block_types
+    device = poses.device
+    n_poses = poses.n_poses
+    buffers = (
+        AnnealerBuffers.allocate if packer is None else packer._annealer_buffers
+    )(device, n_poses, n_traj_per_pose, poses.max_n_blocks, pbt.max_n_atoms)
+    pose_id_for_context64 = buffers.pose_id_for_context.to(torch.int64)
+    initial_assignment = _random_assignment(rotamer_set, pose_id_for_context64)
+    buffers.initialize(poses, rotamer_set, initial_assignment)
+
+    # the annealer holds views of these tensors; keep them alive until it is done
+    n_rots_for_pose = rotamer_set.n_rots_for_pose.to(torch.int32)
+    rot_offset_for_pose = rotamer_set.rot_offset_for_pose.to(torch.int32)
+    block_type_ind_for_rot = rotamer_set.block_type_ind_for_rot.to(torch.int32)
+    block_ind_for_rot = rotamer_set.block_ind_for_rot.to(torch.int32)
+    rotamer_coord_offsets = rotamer_set.coord_offset_for_rot.to(torch.int32)
+    block_type_n_atoms = pbt.n_atoms.to(torch.int32)
+    ig_rpe = InteractionGraphRPEModule(
+        interaction_graph, rotamer_set, buffers.pose_id_for_context
+    )
+
+    if replica_exchange is not None:
+        # each trajectory starts on the rung of its index among its pose's
+        temperature_ladder = replica_exchange.temperature_ladder(
+            n_traj_per_pose, device
+        )
+        replica_rung = torch.arange(
+            n_traj_per_pose, dtype=torch.int32, device=device
+        ).repeat(n_poses)
+        context_for_rung = torch.arange(
+            n_poses * n_traj_per_pose, dtype=torch.int32, device=device
+        ).view(n_poses, n_traj_per_pose)
+        context_energies = assignment_energies(
+            interaction_graph, rotamer_set, initial_assignment, pose_id_for_context64
+        )
+
+    def anneal(schedule, replica_exchange=None):
+        annealer = torch.zeros((1,), dtype=torch.int64)
+        create_sim_annealer(annealer)
+        try:
+            register_standard_random_rotamer_picker(
+                buffers.context_coords,
+                buffers.context_coord_offsets,
+                buffers.context_block_type,
+                buffers.pose_id_for_context,
+                n_rots_for_pose,
+                rot_offset_for_pose,
+                block_type_ind_for_rot,
+                block_ind_for_rot,
+                rotamer_set.coords,
+                rotamer_coord_offsets,
+                rotamer_set.mainchain_coords,
+                pbt.rotamer_sidechain_atom_ind,
+                pbt.rotamer_mainchain_atom_ind,
+                buffers.alternate_coords,
+                buffers.alternate_coord_offsets,
+                buffers.alternate_id,
+                buffers.random_rots,
+                block_type_n_atoms,
+                pbt.max_n_atoms,
+                buffers.annealer_event,
+                annealer,
+            )
+            metropolis_args = (
+                buffers.temperature,
+                buffers.context_coords,
+                buffers.context_coord_offsets,
+                buffers.context_block_type,
+                buffers.alternate_coords,
+                buffers.alternate_coord_offsets,
+                buffers.alternate_id,
+                buffers.rotamer_component_energies,
+                buffers.accepted,
+                block_type_n_atoms,
+                pbt.max_n_atoms,
+                buffers.score_events,
+            )
+            if replica_exchange is None:
+                register_standard_metropolis_accept_or_rejector(
+                    *metropolis_args, annealer
+                )
+            else:
+                register_replica_exchange_metropolis_accept_or_rejector(
+                    *metropolis_args,
+                    temperature_ladder,
+                    replica_rung,
+                    context_for_rung,
+                    context_energies,
+                    replica_exchange.exchange_interval,
+                    annealer,
+                )
+            ig_rpe.register_with_sim_annealer(
+                buffers.context_rot_for_block,
+                buffers.accepted,
+                buffers.random_rots,
+                buffers.rotamer_component_energies[0],
+                annealer,
+            )
+            schedule.set_for_annealer(annealer)
+            return run_sim_annealing(annealer)
+        finally:
+            delete_sim_annealer(annealer)
+
+    buffers.n_outer_cycles_run.copy_(anneal(schedule, replica_exchange))
+    for _ in range(n_quench_passes):
+        anneal(AnnealingSchedule.quench())
+
+    energies = assignment_energies(
+        interaction_graph,
+        rotamer_set,
+        buffers.context_rot_for_block.to(torch.int64),
+        pose_id_for_context64,
+    ).view(n_poses, n_traj_per_pose)
+
+    best_context = n_traj_per_pose * torch.arange(
+        n_poses, dtype=torch.int64, device=device
+    ) + torch.argmin(energies, dim=1)
+    repacked_poses = poses_from_assigned_rotamers(
+        poses,
+        pbt,
+        buffers.pose_id_for_context[best_context],
+        buffers.context_coords[best_context],
+        buffers.context_coord_offsets[best_context],
+        buffers.context_block_type[best_context],
+    )
+    return repacked_poses, energies
+
+
+@attr.s(auto_attribs=True, slots=True, frozen=True)
+class AnnealerBuffers:
+    """The tensors the annealer reads and writes as it runs.
+
+    Each trajectory ("context") holds a copy of its pose's coordinates,
+    with room for the largest block type at every block, the type of
+    each of its blocks, and the rotamer assigned to each of its packable
+    blocks (-1 for the others). n_outer_cycles_run records how many of
+    its schedule's outer cycles the last anneal ran before the quench passes.
+    """
+
+    pose_id_for_context: Tensor[torch.int32][:]
+    context_coords: Tensor[torch.float32][:, :, 3]
+    context_coord_offsets: Tensor[torch.int32][:, :]
+    context_block_type: Tensor[torch.int32][:, :]
+    context_rot_for_block: Tensor[torch.int32][:, :]
+    alternate_coords: Tensor[torch.float32][:, 3]
+    alternate_coord_offsets: Tensor[torch.int32][:]
+    alternate_id: Tensor[torch.int32][:, 3]
+    random_rots: Tensor[torch.int32][:]
+    accepted: Tensor[torch.int32][:]
+    rotamer_component_energies: Tensor[torch.float32][:, :]
+    temperature: Tensor[torch.float32][:]
+    n_outer_cycles_run: Tensor[torch.int64][:]
+    annealer_event: Tensor[torch.int64][:]
+    score_events: Tensor[torch.int64][:]
+
+    @classmethod
+    def allocate(
+        cls,
+        device: torch.device,
+        n_poses: int,
+        n_traj_per_pose: int,
+        max_n_blocks: int,
+        max_n_atoms: int,
+    ):
+        n_contexts = n_poses * n_traj_per_pose
+
+        def _i32_arange(n):
+            return torch.arange(n, dtype=torch.int32, device=device)
+
+        def _zeros(shape, dtype, device=device):
+            return torch.zeros(shape, dtype=dtype, device=device)
+
+        return cls(
+            pose_id_for_context=torch.repeat_interleave(
+                _i32_arange(n_poses), n_traj_per_pose
+            ),
+            context_coords=_zeros(
+                (n_contexts, max_n_blocks * max_n_atoms, 3), torch.float32
+            ),
+            context_coord_offsets=max_n_atoms
+            * _i32_arange(max_n_blocks).repeat(n_contexts, 1),
+            context_block_type=_zeros((n_contexts, max_n_blocks), torch.int32),
+            context_rot_for_block=_zeros((n_contexts, max_n_blocks), torch.int32),
+            alternate_coords=_zeros((2 * n_contexts * max_n_atoms, 3), torch.float32),
+            alternate_coord_offsets=max_n_atoms * _i32_arange(2 * n_contexts),
+            alternate_id=_zeros((2 * n_contexts, 3), torch.int32),
+            random_rots=_zeros((n_contexts,), torch.int32),
+            accepted=_zeros((n_contexts,), torch.int32),
+            rotamer_component_energies=_zeros((1, 2 * n_contexts), torch.float32),
+            # the annealer's bookkeeping lives on the host
+            temperature=_zeros((1,), torch.float32, torch.device("cpu")),
+            n_outer_cycles_run=_zeros((1,), torch.int64, torch.device("cpu")),
+            annealer_event=_zeros((1,), torch.int64, torch.device("cpu")),
+            score_events=_zeros((1,), torch.int64, torch.device("cpu")),
+        )
+
+    def initialize(
+        self,
+        poses: PoseStack,
+        rotamer_set: RotamerSet,
+        assignment: Tensor[torch.int64][:, :],
+    ):
+        """Start each context from its pose with the rotamers in the
+        [n_contexts x max_n_blocks] assignment placed at its packable blocks
+        """
+        pose_id_for_context64 = self.pose_id_for_context.to(torch.int64)
+        n_contexts = pose_id_for_context64.shape[0]
+        packable = assignment != -1
+        assigned_rots = assignment[packable]
+
+        expanded_coords, _ = poses.expand_coords()
+        context_coords = expanded_coords[pose_id_for_context64]
+        context_coords[packable] = rotamer_set.coords_for_rots(
+            poses.packed_block_types, assigned_rots
+        )
+        self.context_coords.copy_(context_coords.view(n_contexts, -1, 3))
+
+        context_block_type = poses.block_type_ind[pose_id_for_context64]
+        context_block_type[packable] = rotamer_set.block_type_ind_for_rot[
+            assigned_rots
+        ].to(torch.int32)
+        self.context_block_type.copy_(context_block_type)
+        self.context_rot_for_block.copy_(assignment)
+
+        self.accepted.zero_()
+        self.rotamer_component_energies.zero_()
+
+
+class Packer:
+    """Repack PoseStacks one after another, reusing the annealer's device
+    buffers from one call to the next while the stacks packed have the same
+    shape. Only the buffers for the latest shape are kept; they are freed
+    along with the Packer, or by release().
+
+    The annealer writes to the buffers as it runs, so a Packer must not be
+    used by two threads at once: give each thread its own.
+    """
+
+    def __init__(self):
+        self._buffers_shape = None
+        self._buffers = None
+
+    def pack(
+        self,
+        pose_stack: PoseStack,
+        score_function: ScoreFunction,
+        task: PackerTask,
+        n_traj_per_pose: int = 1,
+        schedule: Optional[AnnealingSchedule] = None,
+        n_quench_passes: int = 0,
+        replica_exchange: Optional[ReplicaExchange] = None,
+        pruning: Optional[RotamerPruning] = None,
+    ) -> Tuple[PoseStack, Tensor[torch.float32][:, :]]:
+        """Repack the poses; see pack"""
+        return pack(
+            pose_stack,
+            score_function,
+            task,
+            n_traj_per_pose,
+            schedule,
+            n_quench_passes,
+            replica_exchange,
+            pruning,
+            packer=self,
+        )
+
+    def release(self):
+        """Free the annealer's buffers"""
+        self._buffers_shape = None
+        self._buffers = None
+
+    def _annealer_buffers(
+        self,
+        device: torch.device,
+        n_poses: int,
+        n_traj_per_pose: int,
+        max_n_blocks: int,
+        max_n_atoms: int,
+    ) -> AnnealerBuffers:
+        shape = (device, n_poses, n_traj_per_pose, max_n_blocks, max_n_atoms)
+        if shape != self._buffers_shape:
+            # free the old buffers before allocating their replacements
+            self.release()
+            self._buffers = AnnealerBuffers.allocate(*shape)
+            self._buffers_shape = shape
+        return self._buffers
+
+
+def _random_assignment(
+    rotamer_set: RotamerSet, pose_id_for_context: Tensor[torch.int64][:]
+) -> Tensor[torch.int64][:, :]:
+    """A rotamer chosen uniformly at random for each packable block of each
+    context, and -1 for the other blocks
+    """
+    n_rots_for_block = rotamer_set.n_rots_for_block[pose_id_for_context]
+    local_rot = torch.floor(
+        torch.rand(n_rots_for_block.shape, device=n_rots_for_block.device)
+        * n_rots_for_block
+    ).to(torch.int64)
+    return torch.where(
+        n_rots_for_block > 0,
+        rotamer_set.rot_offset_for_block[pose_id_for_context] + local_rot,
+        -1,
+    )
@@ -0,0 +1,347 @@
+"""Discard rotamers that cannot be part of a low-energy assignment.
+
+Pruning sits between building the rotamers' InteractionGraph and
+annealing. It first drops the rotamers whose one-body energy (their energy
+with themselves and the fixed blocks) is above a threshold, then runs
+Goldstein dead-end elimination (DEE) on what remains: rotamer r at a block
+is eliminated if some other rotamer t at the block has a lower energy than
+r against every choice of rotamers at the neighboring blocks,
+
+    E1(r) - E1(t) + sum_j min_u [E2(r, u) - E2(t, u)] > 0,
+
+where j runs over the block's neighbors and u over the rotamers still
+standing at j. DEE never eliminates the lowest-energy assignment. The
+surviving rotamers are compacted into a new RotamerSet and
+InteractionGraph that take the place of the originals.
+"""
+
+import attr
+import torch
+
+from typing import Optional, Tuple
+
+from tmol.types.torch import Tensor
+from tmol.utility.tensor.common_operations import exclusive_cumsum1d
+from tmol.pack.rotamer.build_rotamers import RotamerSet
+from tmol.pack.interaction_graph import InteractionGraph
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class RotamerPruning:
+    """The settings for prune_rotamers; an energy_threshold of None keeps
+    every rotamer's one-body energy, and max_n_dee_passes of 0 skips DEE
+    """
+
+    energy_threshold: Optional[float] = None
+    max_n_dee_passes: int = 10
+
+    def __call__(
+        self, interaction_graph: InteractionGraph, rotamer_set: RotamerSet
+    ) -> Tuple[RotamerSet, InteractionGraph, Tensor[torch.int64][:]]:
+        return prune_rotamers(
+            interaction_graph,
+            rotamer_set,
+            energy_threshold=self.energy_threshold,
+            max_n_dee_passes=self.max_n_dee_passes,
+        )
+
+
+def prune_rotamers(
+    interaction_graph: InteractionGraph,
+    rotamer_set: RotamerSet,
+    energy_threshold: Optional[float] = None,
+    max_n_dee_passes: int = 10,
+    max_batch_size: int = 1 << 24,
+) -> Tuple[RotamerSet, InteractionGraph, Tensor[torch.int64][:]]:
+    """Prune the rotamers, returning the compacted RotamerSet and
+    InteractionGraph along with the index in the original rotamer set of
+    each surviving rotamer.
+
+    Every packable block keeps at least its lowest one-body-energy rotamer.
+    DEE is repeated until a pass eliminates nothing or max_n_dee_passes
+    passes have run, evaluating at most max_batch_size rotamer-pair
+    differences at a time.
+    """
+    ig = interaction_graph
+    keep = torch.ones_like(ig.energy1b, dtype=torch.bool)
+
+    if energy_threshold is not None:
+        keep = torch.logical_or(
+            ig.energy1b <= energy_threshold, _is_best_at_block(ig, rotamer_set)
+        )
+
+    for _ in range(max_n_dee_passes):
+        survivors = _goldstein_survivors(ig, rotamer_set, keep, max_batch_size)
+        if torch.equal(survivors, keep):
+            break
+        keep = survivors
+
+    kept_rots = torch.nonzero(keep, as_tuple=True)[0]
+    pruned_rotamer_set = _compact_rotamer_set(rotamer_set, kept_rots)
+    pruned_ig = _compact_interaction_graph(
+        ig, rotamer_set, pruned_rotamer_set, kept_rots
+    )
+    return pruned_rotamer_set, pruned_ig, kept_rots
+
+
+def _is_best_at_block(
+    ig: InteractionGraph, rotamer_set: RotamerSet
+) -> Tensor[torch.bool][:]:
+    """Whether each rotamer is the (first) lowest one-body-energy rotamer
+    at its block
+    """
+    n_rots = ig.energy1b.shape[0]
+    device = ig.energy1b.device
+    max_n_blocks = rotamer_set.n_rots_for_block.shape[1]
+    block_for_rot = (
+        rotamer_set.pose_for_rot * max_n_blocks
+        + rotamer_set.block_ind_for_rot.to(torch.int64)
+    )
+    best_energy = torch.full(
+        (rotamer_set.n_rots_for_block.numel(),),
+        float("inf"),
+        dtype=ig.energy1b.dtype,
+        device=device,
+    ).scatter_reduce(0, block_for_rot, ig.energy1b, reduce="amin")
+    is_best = ig.energy1b == best_energy[block_for_rot]
+    first_best = torch.full(
+        best_energy.shape, n_rots, dtype=torch.int64, device=device
+    ).scatter_reduce(
+        0,
+        block_for_rot,
+        torch.where(is_best, torch.arange(n_rots, device=device), n_rots),
+        reduce="amin",
+    )
+    return first_best[block_for_rot] == torch.arange(n_rots, device=device)
+
+
+def _goldstein_survivors(
+    ig: InteractionGraph,
+    rotamer_set: RotamerSet,
+    alive: Tensor[torch.bool][:],
+    max_batch_size: int,
+) -> Tensor[torch.bool][:]:
+    """One pass of Goldstein DEE over every packable block at once.
+
+    The rotamers of each block are laid out along a padded axis of length
+    max_n_rots; for every block i, entry [r, t] of the accumulated bound
+    is sum_j min_u [E2(r, u) - E2(t, u)] over i's neighbors j. The r, t and
+    u axes are cut into tiles, and the blocks and their neighbor edges into
+    batches, so that no intermediate holds more than max_batch_size
+    entries.
+    """
+    device = alive.device
+    n_rots_for_block = rotamer_set.n_rots_for_block
+    rot_offset_for_block = rotamer_set.rot_offset_for_block
+    max_n_blocks = n_rots_for_block.shape[1]
+    max_n_rots = max(1, int(torch.max(n_rots_for_block)))
+    rot_arange = torch.arange(max_n_rots, dtype=torch.int64, device=device)
+
+    # the padded rotamers of each (pose, block)
+    block_n_rots = n_rots_for_block.flatten()
+    n_blocks = block_n_rots.shape[0]
+    block_rots = rot_offset_for_block.flatten().unsqueeze(1) + rot_arange
+    block_real = rot_arange < block_n_rots.unsqueeze(1)
+    block_rots = torch.where(block_real, block_rots, 0)
+    block_alive = torch.logical_and(block_real, alive[block_rots])
+    block_energy1b = ig.energy1b[block_rots]
+
+    # each block's neighbors, in both directions, ordered by block
+    pose, block, slot = torch.nonzero(ig.pair_neighbors != -1, as_tuple=True)
+    neighbor = ig.pair_neighbors[pose, block, slot].to(torch.int64)
+    offset = ig.pair_offsets[pose, block, slot]
+    block_global = pose * max_n_blocks + block
+    neighbor_global = pose * max_n_blocks + neighbor
+
+    def pair_energies(edges, i_rots, j_rots):
+        # the [n_edges x len(i_rots) x len(j_rots)] energies of block i's
+        # rotamers with block j's; the pair table is laid out with the
+        # lower-indexed block's rotamers along its rows
+        n_i = block_n_rots[block_global[edges]].view(-1, 1, 1)
+        n_j = block_n_rots[neighbor_global[edges]].view(-1, 1, 1)
+        r = i_rots.view(1, -1, 1)
+        u = j_rots.view(1, 1, -1)
+        i_lower = (block[edges] < neighbor[edges]).view(-1, 1, 1)
+        table_ind = offset[edges].view(-1, 1, 1) + torch.where(
+            i_lower, r * n_j + u, u * n_i + r
+        )
+        real = torch.logical_and(r < n_i, u < n_j)
+        return ig.energy2b[torch.where(real, table_ind, 0)]
+
+    # the longest tile of the rotamer axis whose cube fits in a batch
+    tile = max(1, int(round(max_batch_size ** (1 / 3))))
+    while tile > 1 and tile**3 > max_batch_size:
+        tile -= 1
+    rot_tiles = [
+        slice(start, min(start + tile, max_n_rots))
+        for start in range(0, max_n_rots, tile)
+    ]
+    n_edges_per_batch = max(1, max_batch_size // min(tile, max_n_rots) ** 3)
+
+    eliminated = torch.zeros_like(block_alive)
+    for r_tile in rot_tiles:
+        for t_tile in rot_tiles:
+            tile_shape = (r_tile.stop - r_tile.start, t_tile.stop - t_tile.start)
+            n_blocks_per_batch = max(
+                1, max_batch_size // (tile_shape[0] * tile_shape[1])
+            )
+            for block_start in range(0, n_blocks, n_blocks_per_batch):
+                block_stop = min(block_start + n_blocks_per_batch, n_blocks)
+                edge_start, edge_stop = torch.searchsorted(
+                    block_global,
+                    torch.tensor([block_start, block_stop], device=device),
+                ).tolist()
+
+                bound = torch.zeros(
+                    (block_stop - block_start,) + tile_shape,
+                    dtype=ig.energy1b.dtype,
+                    device=device,
+                )
+                for start in range(edge_start, edge_stop, n_edges_per_batch):
+                    edges = slice(start, min(start + n_edges_per_batch, edge_stop))
+
+                    # min over j's standing rotamers u of E2(r, u) - E2(t, u),
+                    # one tile of u at a time
+                    min_diff = None
+                    for u_tile in rot_tiles:
+                        u = rot_arange[u_tile]
+                        energy2b_r = pair_energies(edges, rot_arange[r_tile], u)
+                        energy2b_t = pair_energies(edges, rot_arange[t_tile], u)
+                        diff = energy2b_r.unsqueeze(2) - energy2b_t.unsqueeze(1)
+                        u_alive = block_alive[neighbor_global[edges]][:, u_tile]
+                        tile_min_diff = torch.min(
+                            torch.where(u_alive[:, None, None, :], diff, float("inf")),
+                            dim=3,
+                        ).values
+                        min_diff = (
+                            tile_min_diff
+                            if min_diff is None
+                            else torch.minimum(min_diff, tile_min_diff)
+                        )
+                    bound.index_add_(0, block_global[edges] - block_start, min_diff)
+
+                # r is eliminated by a standing rotamer t != r that always
+                # beats it
+                blocks = slice(block_start, block_stop)
+                dominated = (
+                    block_energy1b[blocks, r_tile].unsqueeze(2)
+                    - block_energy1b[blocks, t_tile].unsqueeze(1)
+                    + bound
+                    > 0
+                )
+                dominated = torch.logical_and(
+                    dominated, block_alive[blocks, t_tile].unsqueeze(1)
+                )
+                eliminated[blocks, r_tile] |= torch.any(dominated, dim=2)
+
+    eliminated = torch.logical_and(eliminated, block_alive)
+    survivors = alive.clone()
+    survivors[block_rots[eliminated]] = False
+    return survivors
+
+
+def _compact_rotamer_set(
+    rotamer_set: RotamerSet, kept_rots: Tensor[torch.int64][:]
+) -> RotamerSet:
+    n_poses, max_n_blocks = rotamer_set.n_rots_for_block.shape
+    pose_for_rot = rotamer_set.pose_for_rot[kept_rots]
+    block_ind_for_rot = rotamer_set.block_ind_for_rot[kept_rots]
+
+    n_rots_for_pose = torch.bincount(pose_for_rot, minlength=n_poses)
+    n_rots_for_block = torch.bincount(
+        pose_for_rot * max_n_blocks + block_ind_for_rot.to(torch.int64),
+        minlength=n_poses * max_n_blocks,
+    ).reshape(n_poses, max_n_blocks)
+
+    # gather the kept rotamers' ragged sidechain coordinates
+    n_coords_for_rot = torch.diff(
+        rotamer_set.coord_offset_for_rot,
+        append=torch.full_like(
+            rotamer_set.coord_offset_for_rot[:1], rotamer_set.coords.shape[0]
+        ),
+    )[kept_rots]
+    coord_offset_for_rot = exclusive_cumsum1d(n_coords_for_rot)
+    coord_ind = torch.repeat_interleave(
+        rotamer_set.coord_offset_for_rot[kept_rots] - coord_offset_for_rot,
+        n_coords_for_rot,
+    ) + torch.arange(
+        int(torch.sum(n_coords_for_rot)), dtype=torch.int64, device=kept_rots.device
+    )
+
+    return RotamerSet(
+        n_rots_for_pose=n_rots_for_pose,
+        rot_offset_for_pose=exclusive_cumsum1d(n_rots_for_pose),
+        n_rots_for_block=n_rots_for_block,
+        rot_offset_for_block=exclusive_cumsum1d(n_rots_for_block.flatten()).reshape(
+            n_poses, max_n_blocks
+        ),
+        pose_for_rot=pose_for_rot,
+        block_type_ind_for_rot=rotamer_set.block_type_ind_for_rot[kept_rots],
+        block_ind_for_rot=block_ind_for_rot,
+        coords=rotamer_set.coords[coord_ind],
+        coord_offset_for_rot=coord_offset_for_rot,
+        mainchain_coords=rotamer_set.mainchain_coords,
+    )
+
+
+def _compact_interaction_graph(
+    ig: InteractionGraph,
+    rotamer_set: RotamerSet,
+    pruned_rotamer_set: RotamerSet,
+    kept_rots: Tensor[torch.int64][:],
+) -> InteractionGraph:
+    """Cut the surviving rows and columns out of each block pair's table"""
+    device = kept_rots.device
+
+    # the block pairs, from their lower-indexed blocks
+    block_arange = torch.arange(
+        ig.pair_neighbors.shape[1], dtype=torch.int64, device=device
+    )
+    neighbors = ig.pair_neighbors.to(torch.int64)
+    pose, block1, slot = torch.nonzero(
+        neighbors > block_arange.view(1, -1, 1), as_tuple=True
+    )
+    block2 = neighbors[pose, block1, slot]
+    old_offset = ig.pair_offsets[pose, block1, slot]
+    old_n_rots2 = rotamer_set.n_rots_for_block[pose, block2]
+    new_n_rots1 = pruned_rotamer_set.n_rots_for_block[pose, block1]
+    new_n_rots2 = pruned_rotamer_set.n_rots_for_block[pose, block2]
+    new_size = new_n_rots1 * new_n_rots2
+    new_offset = torch.cumsum(new_size, dim=0) - new_size
+
+    # each entry of the new tables, and where it came from in the old ones
+    n_pair_energies = int(torch.sum(new_size))
+    pair_ind = torch.arange(n_pair_energies, dtype=torch.int64, device=device)
+    edge = torch.searchsorted(new_offset, pair_ind, right=True) - 1
+    local_ind = pair_ind - new_offset[edge]
+    new_rot1 = pruned_rotamer_set.rot_offset_for_block[
+        pose[edge], block1[edge]
+    ] + torch.div(local_ind, new_n_rots2[edge], rounding_mode="floor")
+    new_rot2 = pruned_rotamer_set.rot_offset_for_block[
+        pose[edge], block2[edge]
+    ] + torch.remainder(local_ind, new_n_rots2[edge])
+    old_local1 = (
+        kept_rots[new_rot1] - rotamer_set.rot_offset_for_block[pose[edge], block1[edge]]
+    )
+    old_local2 = (
+        kept_rots[new_rot2] - rotamer_set.rot_offset_for_block[pose[edge], block2[edge]]
+    )
+    energy2b = ig.energy2b[
+        old_offset[edge] + old_local1 * old_n_rots2[edge] + old_local2
+    ]
+
+    # both blocks of a pair point at its new table
+    sorted_old_offset, order = torch.sort(old_offset)
+    has_table = ig.pair_offsets != -1
+    pair_offsets = torch.full_like(ig.pair_offsets, -1)
+    pair_offsets[has_table] = new_offset[
+        order[torch.searchsorted(sorted_old_offset, ig.pair_offsets[has_table])]
+    ]
+
+    return InteractionGraph(
+        background_energy=ig.background_energy,
+        energy1b=ig.energy1b[kept_rots],
+        pair_neighbors=ig.pair_neighbors,
+        pair_offsets=pair_offsets,
+        energy2b=energy2b,
+    )
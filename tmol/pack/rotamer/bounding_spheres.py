@@ -22,59 +22,62 @@ def create_rotamer_bounding_spheres(poses: PoseStack, rotamer_set: RotamerSet):
         rotamer_set.pose_for_rot * max_n_blocks
         + rotamer_set.block_ind_for_rot.to(torch.int64)
     )
-    max_n_block_atoms = poses.packed_block_types.max_n_atoms
+    pbt = poses.packed_block_types
+    max_n_block_atoms = pbt.max_n_atoms
+
+    # the rotamers' atoms: their own sidechain atoms and the mainchain
+    # atoms they share with the other rotamers at their positions
+    n_sc_ats_for_rot = pbt.n_rotamer_sidechain_atoms[rotamer_set.block_type_ind_for_rot]
+    rot_for_sc_atom = torch.repeat_interleave(
+        torch.arange(n_rots, dtype=torch.int64, device=torch_device),
+        n_sc_ats_for_rot,
+    )
+    n_mc_ats_for_block_type = torch.sum(pbt.rotamer_mainchain_atom_ind != -1, dim=1)
+    rot_for_mc_atom, mc_slot = torch.nonzero(
+        torch.arange(
+            pbt.max_n_rotamer_mainchain_atoms, dtype=torch.int64, device=torch_device
+        )
+        < n_mc_ats_for_block_type[rotamer_set.block_type_ind_for_rot].unsqueeze(1),
+        as_tuple=True,
+    )
+    rot_for_atom = torch.cat((rot_for_sc_atom, rot_for_mc_atom))
+    rot_atom_coords = torch.cat(
+        (
+            rotamer_set.coords,
+            rotamer_set.mainchain_coords[
+                rotamer_set.pose_for_rot[rot_for_mc_atom],
+                rotamer_set.block_ind_for_rot[rot_for_mc_atom].to(torch.int64),
+                mc_slot,
+            ],
+        )
+    )
+    global_block_ind_for_atom = global_block_ind_for_rot[rot_for_atom]
+
     centers_of_mass = torch.zeros(
         (n_poses * max_n_blocks, 3), dtype=torch.float32, device=torch_device
     )
-    centers_of_mass.index_add_(
-        0,
-        stretch(global_block_ind_for_rot, max_n_block_atoms),
-        rotamer_set.coords.reshape(-1, 3),
-    )
-    n_ats_for_rot = poses.packed_block_types.n_atoms[rotamer_set.block_type_ind_for_rot]
+    centers_of_mass.index_add_(0, global_block_ind_for_atom, rot_atom_coords)
     n_ats = torch.zeros(
         (n_poses * max_n_blocks,), dtype=torch.int32, device=torch_device
     )
-    n_ats.index_add_(0, global_block_ind_for_rot, n_ats_for_rot)
+    n_ats.index_add_(
+        0,
+        global_block_ind_for_atom,
+        torch.ones_like(global_block_ind_for_atom, dtype=torch.int32),
+    )
 
     centers_of_mass[n_ats != 0] = centers_of_mass[n_ats != 0] / n_ats[
         n_ats != 0
     ].unsqueeze(1).to(torch.float32)
-    # print("centers_of_mass[:10]")
-    # print(centers_of_mass[:10])
-    at_is_real = torch.arange(
-        max_n_block_atoms, dtype=torch.int32, device=torch_device
-    ).repeat(n_rots).reshape(n_rots, max_n_block_atoms) < n_ats_for_rot.unsqueeze(dim=1)
-    diff_w_com = torch.zeros_like(rotamer_set.coords)
-
-    diff_w_com[at_is_real] = (
-        centers_of_mass[stretch(global_block_ind_for_rot, max_n_block_atoms)].reshape(
-            n_rots, max_n_block_atoms, 3
-        )[at_is_real]
-        - rotamer_set.coords[at_is_real]
-    )
-    atom_dist_to_com = torch.norm(diff_w_com, dim=2)
-    rot_dist_to_com = torch.max(atom_dist_to_com, dim=1)[0]
-
-    # now I need to get the max for all the rotamers at a single position, and I
-    # don't know how to do that except 1) segmented scan on max in c++, or
-    # 2) create an overly-large tensor of n-poses x max-n-blocks x max-n-rots
-    # and then populate that tensor with rot_dist_to_com
-    max_n_rots_per_block = torch.max(rotamer_set.n_rots_for_block)
-    rot_dist_to_com_big = torch.zeros(
-        (n_poses * max_n_blocks, max_n_rots_per_block),
-        dtype=torch.float32,
-        device=torch_device,
-    )
 
-    rot_dist_to_com_big[
-        global_block_ind_for_rot,
-        (
-            torch.arange(n_rots, dtype=torch.int64, device=torch_device)
-            - rotamer_set.rot_offset_for_block.flatten()[global_block_ind_for_rot]
-        ),
-    ] = rot_dist_to_com
-    sphere_radius = torch.max(rot_dist_to_com_big, dim=1)[0]
+    # the radius at each position: the farthest any rotamer atom lies
+    # from the center of mass
+    atom_dist_to_com = torch.norm(
+        centers_of_mass[global_block_ind_for_atom] - rot_atom_coords, dim=1
+    )
+    sphere_radius = torch.zeros(
+        (n_poses * max_n_blocks,), dtype=torch.float32, device=torch_device
+    ).scatter_reduce(0, global_block_ind_for_atom, atom_dist_to_com, "amax")
     bounding_spheres = torch.zeros(
         (n_poses * max_n_blocks, 4), dtype=torch.float32, device=torch_device
     )
@@ -96,14 +99,16 @@ def create_rotamer_bounding_spheres(poses: PoseStack, rotamer_set: RotamerSet):
     ] / background_n_ats[pbti != -1].unsqueeze(1).to(torch.float32)
     pose_diff_w_com = torch.zeros_like(expanded_coords).reshape(-1, 3)
 
-    pose_diff_w_com[real_expanded_pose_ats.view(-1)] = background_centers_of_mass[
+    pose_diff_w_com[real_expanded_pose_ats.reshape(-1)] = background_centers_of_mass[
         stretch(
             torch.arange(
                 n_poses * max_n_blocks, dtype=torch.int64, device=torch_device
             ),
             max_n_block_atoms,
         )
-    ][real_expanded_pose_ats.view(-1)] - expanded_coords[real_expanded_pose_ats].view(
+    ][real_expanded_pose_ats.reshape(-1)] - expanded_coords[
+        real_expanded_pose_ats
+    ].view(
         -1, 3
     )
     pose_diff_w_com = pose_diff_w_com.view(n_poses * max_n_blocks, max_n_block_atoms, 3)
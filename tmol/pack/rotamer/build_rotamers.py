@@ -45,7 +45,63 @@ class RotamerSet(ValidateAttrs):
     pose_for_rot: Tensor[torch.int64][:]
     block_type_ind_for_rot: Tensor[torch.int64][:]
     block_ind_for_rot: Tensor[torch.int32][:]
-    coords: Tensor[torch.float32][:, :, :]
+
+    # The coordinates of a rotamer's sidechain atoms -- those not among its
+    # block type's mainchain atoms -- are stored contiguously, beginning at
+    # coord_offset_for_rot; the mainchain atoms, shared by all the rotamers
+    # at a position, are stored once per (pose, block) in mainchain_coords.
+    # See annotate_rotamer_coord_layout
+    coords: Tensor[torch.float32][:, 3]
+    coord_offset_for_rot: Tensor[torch.int64][:]
+    mainchain_coords: Tensor[torch.float32][:, :, :, 3]
+
+    def coords_for_rots(
+        self, pbt: PackedBlockTypes, rots: Tensor[torch.int64][:]
+    ) -> Tensor[torch.float32][:, :, 3]:
+        """The coordinates of all the atoms of the given rotamers,
+        n-rots x max-n-atoms x 3, with the padding atoms set to 0
+        """
+        block_type = self.block_type_ind_for_rot[rots]
+        sc_ind = pbt.rotamer_sidechain_atom_ind[block_type].to(torch.int64)
+        mc_ind = pbt.rotamer_mainchain_atom_ind[block_type].to(torch.int64)
+        is_sc = sc_ind != -1
+        is_mc = mc_ind != -1
+
+        coords = torch.zeros(
+            (rots.shape[0], pbt.max_n_atoms, 3),
+            dtype=torch.float32,
+            device=self.coords.device,
+        )
+        coords[is_sc] = self.coords[
+            (self.coord_offset_for_rot[rots].unsqueeze(1) + sc_ind)[is_sc]
+        ]
+        mc_rot, _ = torch.nonzero(is_mc, as_tuple=True)
+        coords[is_mc] = self.mainchain_coords[
+            self.pose_for_rot[rots][mc_rot],
+            self.block_ind_for_rot[rots].to(torch.int64)[mc_rot],
+            mc_ind[is_mc],
+        ]
+        return coords
+
+    def atom_coords_for_rots(
+        self,
+        pbt: PackedBlockTypes,
+        rots: Tensor[torch.int64][:],
+        atoms: Tensor[torch.int64][:],
+    ) -> Tensor[torch.float32][:, 3]:
+        """The coordinates of one atom of each of the given rotamers"""
+        block_type = self.block_type_ind_for_rot[rots]
+        sc_ind = pbt.rotamer_sidechain_atom_ind[block_type, atoms].to(torch.int64)
+        mc_ind = pbt.rotamer_mainchain_atom_ind[block_type, atoms].to(torch.int64)
+        return torch.where(
+            (sc_ind != -1).unsqueeze(1),
+            self.coords[self.coord_offset_for_rot[rots] + sc_ind.clamp(min=0)],
+            self.mainchain_coords[
+                self.pose_for_rot[rots],
+                self.block_ind_for_rot[rots].to(torch.int64),
+                mc_ind.clamp(min=0),
+            ],
+        )
 
 
 # from tmol.system.restype import RefinedResidueType
@@ -161,9 +217,45 @@ def annotate_restype(
     annotate_residue_type_with_sampler_fingerprints(restype, samplers, chem_db)
 
 
+def annotate_rotamer_coord_layout(pbt: PackedBlockTypes):
+    """Record, for each atom of each block type, either its index among the
+    block type's mainchain atoms, whose coordinates a rotamer shares with
+    the other rotamers at its position, or its index among the remaining
+    (sidechain) atoms, whose coordinates each rotamer stores for itself
+    """
+    if hasattr(pbt, "rotamer_mainchain_atom_ind"):
+        return
+
+    mc_ind = numpy.full((pbt.n_types, pbt.max_n_atoms), -1, dtype=numpy.int32)
+    sc_ind = numpy.full((pbt.n_types, pbt.max_n_atoms), -1, dtype=numpy.int32)
+    n_sc_atoms = numpy.zeros((pbt.n_types,), dtype=numpy.int32)
+    for i, bt in enumerate(pbt.active_block_types):
+        polymer = bt.properties.polymer
+        mc_at_names = polymer.mainchain_atoms if polymer is not None else None
+        mc_atoms = numpy.array(
+            [bt.atom_to_idx[at] for at in mc_at_names or ()], dtype=numpy.int64
+        )
+        mc_ind[i, mc_atoms] = numpy.arange(mc_atoms.shape[0], dtype=numpy.int32)
+        is_sc = numpy.ones((bt.n_atoms,), dtype=bool)
+        is_sc[mc_atoms] = False
+        n_sc_atoms[i] = numpy.sum(is_sc)
+        sc_ind[i, numpy.nonzero(is_sc)[0]] = numpy.arange(
+            n_sc_atoms[i], dtype=numpy.int32
+        )
+
+    def _t(arr):
+        return torch.tensor(arr, dtype=torch.int32, device=pbt.device)
+
+    setattr(pbt, "rotamer_mainchain_atom_ind", _t(mc_ind))
+    setattr(pbt, "rotamer_sidechain_atom_ind", _t(sc_ind))
+    setattr(pbt, "n_rotamer_sidechain_atoms", _t(n_sc_atoms))
+    setattr(pbt, "max_n_rotamer_mainchain_atoms", max(1, int(numpy.max(mc_ind)) + 1))
+
+
 def annotate_packed_block_types(pbt: PackedBlockTypes):
     coalesce_single_residue_kinforests(pbt)
     find_unique_fingerprints(pbt)
+    annotate_rotamer_coord_layout(pbt)
 
 
 def annotate_everything(
@@ -435,7 +527,7 @@ def measure_pose_dofs(poses):
     # -- then call measure_dofs_from_orig_coords
 
     pbt = poses.packed_block_types
-    pbti = poses.block_type_ind.view(-1)
+    pbti = poses.block_type_ind.reshape(-1)
     orig_res_block_type_ind = pbti[pbti != -1]
     real_poses_blocks = pbti != -1
 
@@ -607,7 +699,7 @@ def create_dof_inds_to_copy_from_orig_to_rotamers(
 
     sampler_ind_for_rot = sampler_ind_mapping[sampler_for_rotamer]
     orig_block_type_ind = (
-        poses.block_type_ind[poses.block_type_ind != -1].view(-1).to(torch.int64)
+        poses.block_type_ind[poses.block_type_ind != -1].reshape(-1).to(torch.int64)
     )
 
     poses_res_to_real_poses_res = torch.full(
@@ -616,7 +708,7 @@ def create_dof_inds_to_copy_from_orig_to_rotamers(
         dtype=torch.int64,
         device=poses.device,
     )
-    poses_res_to_real_poses_res[poses.block_type_ind.view(-1) != -1] = torch.arange(
+    poses_res_to_real_poses_res[poses.block_type_ind.reshape(-1) != -1] = torch.arange(
         orig_block_type_ind.shape[0], dtype=torch.int64, device=poses.device
     )
 
@@ -825,7 +917,6 @@ def assign_dofs_from_samples(
 
 def calculate_rotamer_coords(
     pbt: PackedBlockTypes,
-    n_rots: int,
     rot_kinforest: KinForest,
     nodes: NDArray[numpy.int32][:],
     scans: NDArray[numpy.int32][:],
@@ -859,13 +950,61 @@ def calculate_rotamer_coords(
         rot_dofs_kto, _p(_t(nodes)), _p(_t(scans)), _p(_tcpu(gens)), kinforest_stack
     )
 
-    new_coords_rto = torch.zeros(
-        (n_rots * pbt.max_n_atoms, 3), dtype=torch.float32, device=pbt.device
+    return new_coords_kto
+
+
+def condense_rotamer_coords(
+    pbt: PackedBlockTypes,
+    rot_kinforest: KinForest,
+    new_coords_kto: Tensor[torch.float32][:, 3],
+    block_type_ind_for_rot: Tensor[torch.int64][:],
+    pose_for_rot: Tensor[torch.int64][:],
+    block_ind_for_rot: Tensor[torch.int32][:],
+    n_poses: int,
+    max_n_blocks: int,
+):
+    """Split the coordinates of the rotamers' atoms in kinforest order into
+    the ragged per-rotamer sidechain coordinates and the per-position
+    mainchain coordinates that a RotamerSet holds
+    """
+    # skip the kinforest root; rotamer i's atom j has id i * max_n_atoms + j
+    kin_id = rot_kinforest.id[1:].to(torch.int64).to(pbt.device)
+    kin_coords = new_coords_kto[1:]
+    rot_for_atom = torch.div(kin_id, pbt.max_n_atoms, rounding_mode="floor")
+    atom_ind = torch.remainder(kin_id, pbt.max_n_atoms)
+    block_type_for_atom = block_type_ind_for_rot[rot_for_atom]
+    mc_ind = pbt.rotamer_mainchain_atom_ind[block_type_for_atom, atom_ind]
+    sc_ind = pbt.rotamer_sidechain_atom_ind[block_type_for_atom, atom_ind]
+    is_mc = mc_ind != -1
+    is_sc = sc_ind != -1
+
+    n_sc_atoms_for_rot = pbt.n_rotamer_sidechain_atoms[block_type_ind_for_rot]
+    coord_offset_for_rot = exclusive_cumsum1d(n_sc_atoms_for_rot).to(torch.int64)
+    sc_coords = torch.zeros(
+        (int(torch.sum(n_sc_atoms_for_rot)), 3),
+        dtype=torch.float32,
+        device=pbt.device,
+    )
+    sc_coords[coord_offset_for_rot[rot_for_atom[is_sc]] + sc_ind[is_sc]] = kin_coords[
+        is_sc
+    ]
+
+    # every rotamer at a position was built from the same mainchain dofs,
+    # so whichever of them writes a mainchain atom last writes the same
+    # coordinate as the others
+    mainchain_coords = torch.zeros(
+        (n_poses, max_n_blocks, pbt.max_n_rotamer_mainchain_atoms, 3),
+        dtype=torch.float32,
+        device=pbt.device,
     )
+    mc_rot = rot_for_atom[is_mc]
+    mainchain_coords[
+        pose_for_rot[mc_rot],
+        block_ind_for_rot[mc_rot].to(torch.int64),
+        mc_ind[is_mc].to(torch.int64),
+    ] = kin_coords[is_mc]
 
-    new_coords_rto[rot_kinforest.id.to(torch.int64)] = new_coords_kto
-    new_coords_rto = new_coords_rto.view(n_rots, pbt.max_n_atoms, 3)
-    return new_coords_rto
+    return sc_coords, coord_offset_for_rot, mainchain_coords
 
 
 def get_rotamer_origin_data(task: PackerTask, rt_for_rot: Tensor[torch.int32][:]):
@@ -1005,8 +1144,8 @@ def build_rotamers(poses: PoseStack, task: PackerTask, chem_db: ChemicalDatabase
         rot_dofs_kto,
     )
 
-    rotamer_coords = calculate_rotamer_coords(
-        pbt, n_rots, rot_kinforest, nodes, scans, gens, rot_dofs_kto
+    rotamer_coords_kto = calculate_rotamer_coords(
+        pbt, rot_kinforest, nodes, scans, gens, rot_dofs_kto
     )
 
     (
@@ -1018,6 +1157,17 @@ def build_rotamers(poses: PoseStack, task: PackerTask, chem_db: ChemicalDatabase
         block_ind_for_rot,
     ) = get_rotamer_origin_data(task, rt_for_rot_torch)
 
+    rotamer_coords, coord_offset_for_rot, mainchain_coords = condense_rotamer_coords(
+        pbt,
+        rot_kinforest,
+        rotamer_coords_kto,
+        block_type_ind_for_rot_torch,
+        pose_for_rot,
+        block_ind_for_rot,
+        n_rots_for_block.shape[0],
+        n_rots_for_block.shape[1],
+    )
+
     return (
         poses,
         RotamerSet(
@@ -1029,5 +1179,7 @@ def build_rotamers(poses: PoseStack, task: PackerTask, chem_db: ChemicalDatabase
             block_type_ind_for_rot=block_type_ind_for_rot_torch,
             block_ind_for_rot=block_ind_for_rot,
             coords=rotamer_coords,
+            coord_offset_for_rot=coord_offset_for_rot,
+            mainchain_coords=mainchain_coords,
         ),
     )
@@ -0,0 +1,428 @@
+import attr
+import numpy
+import torch
+
+from typing import Callable
+
+from tmol.types.attrs import ValidateAttrs
+from tmol.types.torch import Tensor
+from tmol.pose.packed_block_types import PackedBlockTypes
+from tmol.pack.rotamer.build_rotamers import (
+    RotamerSet,
+    annotate_rotamer_coord_layout,
+)
+
+
+@attr.s(auto_attribs=True, slots=True, frozen=True)
+class RotamerTrie(ValidateAttrs):
+    """The rotamers of a RotamerSet merged, block by block, into tries of
+    their atoms.
+
+    Each rotamer is a path from one of its block's root nodes with one node
+    per atom, its atoms taken in the order of pbt.rotamer_trie_atom_order.
+    Rotamers at the same block whose first atoms have the same types and
+    the same coordinates share the nodes for those atoms, so that the
+    interactions of a shared atom need only be evaluated once for all of
+    them. The nodes are numbered depth by depth and, within a depth, in
+    the order of their parents, so that the children of a node (and the
+    roots of a block) are a contiguous range of nodes.
+
+    The rotamers of each block are ordered ("trie order") so that those
+    passing through a node are the contiguous range
+    [node_first_rot, node_end_rot) of the block's rotamers;
+    trie_order_for_rot gives each rotamer's place in its block's order.
+    node_subtree_radius bounds the distance from a node's atom to the atoms
+    of all of its descendants.
+    """
+
+    node_coords: Tensor[torch.float32][:, 3]
+    node_block_type: Tensor[torch.int64][:]
+    node_atom: Tensor[torch.int64][:]
+    node_subtree_radius: Tensor[torch.float32][:]
+    node_first_child: Tensor[torch.int64][:]
+    node_n_children: Tensor[torch.int64][:]
+    node_first_rot: Tensor[torch.int64][:]
+    node_end_rot: Tensor[torch.int64][:]
+    block_first_root: Tensor[torch.int64][:, :]
+    block_n_roots: Tensor[torch.int64][:, :]
+    trie_order_for_rot: Tensor[torch.int64][:]
+
+
+def annotate_rotamer_trie_atom_order(pbt: PackedBlockTypes):
+    """Record the order in which the atoms of each block type's rotamers
+    are added to the tries: the mainchain atoms and their hydrogens first,
+    as every rotamer at a position shares them, then the other heavy atoms,
+    each followed by its hydrogens, so that a hydrogen shares the nodes of
+    the atoms that place it
+    """
+    if hasattr(pbt, "rotamer_trie_atom_order"):
+        return
+    annotate_rotamer_coord_layout(pbt)
+
+    is_mc = pbt.rotamer_mainchain_atom_ind.cpu().numpy() != -1
+    is_h = pbt.atom_is_hydrogen.cpu().numpy() != 0
+    order = numpy.full((pbt.n_types, pbt.max_n_atoms), -1, dtype=numpy.int32)
+    for i, bt in enumerate(pbt.active_block_types):
+        hydrogens = [[] for _ in range(bt.n_atoms)]
+        for at1, at2 in bt.bond_indices:
+            if is_h[i, at2] and not is_h[i, at1] and not is_mc[i, at2]:
+                hydrogens[at1].append(at2)
+
+        mc_atoms = [at for at in range(bt.n_atoms) if is_mc[i, at]]
+        bt_order = mc_atoms + [h for at in mc_atoms for h in hydrogens[at]]
+        for at in range(bt.n_atoms):
+            if not is_mc[i, at] and not is_h[i, at]:
+                bt_order += [at] + hydrogens[at]
+        placed = set(bt_order)
+        bt_order += [at for at in range(bt.n_atoms) if at not in placed]
+        order[i, : bt.n_atoms] = bt_order
+
+    setattr(
+        pbt,
+        "rotamer_trie_atom_order",
+        torch.tensor(order, dtype=torch.int32, device=pbt.device),
+    )
+
+
+def build_rotamer_trie(
+    pbt: PackedBlockTypes,
+    rotamer_set: RotamerSet,
+    atom_key: Tensor[torch.int32][:, :],
+) -> RotamerTrie:
+    """Merge the rotamers at each block into a trie. Two rotamers share the
+    node for an atom if they share the node of the previous atom and the
+    atoms have the same atom_key (n-block-types x max-n-atoms, e.g., their
+    atom types) and bitwise-identical coordinates.
+    """
+    annotate_rotamer_trie_atom_order(pbt)
+    device = rotamer_set.coords.device
+    n_poses, max_n_blocks = rotamer_set.n_rots_for_block.shape
+    n_rots = rotamer_set.block_ind_for_rot.shape[0]
+    block_type_for_rot = rotamer_set.block_type_ind_for_rot
+    block_ind_for_rot = rotamer_set.block_ind_for_rot.to(torch.int64)
+    n_atoms_for_rot = pbt.n_atoms[block_type_for_rot].to(torch.int64)
+    atom_order = pbt.rotamer_trie_atom_order.to(torch.int64)
+    atom_key = atom_key.to(torch.int64)
+
+    # the path of each rotamer: its node at each depth, -1 past its last atom
+    node_for_rot = torch.full(
+        (pbt.max_n_atoms, n_rots), -1, dtype=torch.int64, device=device
+    )
+    parent_for_rot = rotamer_set.pose_for_rot * max_n_blocks + block_ind_for_rot
+    node_coords = []
+    node_block_type = []
+    node_atom = []
+    node_parent = []
+    n_nodes_for_depth = []
+    n_nodes = 0
+    for depth in range(pbt.max_n_atoms):
+        rots = torch.nonzero(n_atoms_for_rot > depth, as_tuple=True)[0]
+        if rots.shape[0] == 0:
+            break
+        block_type = block_type_for_rot[rots]
+        atom = atom_order[block_type, depth]
+        coords = rotamer_set.atom_coords_for_rots(pbt, rots, atom)
+
+        # rows sort by parent first, keeping the children of each node together
+        key = torch.cat(
+            (
+                parent_for_rot[rots].unsqueeze(1),
+                atom_key[block_type, atom].unsqueeze(1),
+                coords.view(torch.int32).to(torch.int64),
+            ),
+            dim=1,
+        )
+        unique_keys, rot_node = torch.unique(key, dim=0, return_inverse=True)
+        n_depth_nodes = unique_keys.shape[0]
+        first_rot = torch.full(
+            (n_depth_nodes,), rots.shape[0], dtype=torch.int64, device=device
+        ).scatter_reduce(
+            0,
+            rot_node,
+            torch.arange(rots.shape[0], dtype=torch.int64, device=device),
+            reduce="amin",
+        )
+
+        node_coords.append(coords[first_rot])
+        node_block_type.append(block_type[first_rot])
+        node_atom.append(atom[first_rot])
+        node_parent.append(unique_keys[:, 0])
+        n_nodes_for_depth.append(n_depth_nodes)
+        node_for_rot[depth, rots] = n_nodes + rot_node
+        parent_for_rot[rots] = n_nodes + rot_node
+        n_nodes += n_depth_nodes
+
+    node_coords = torch.cat(node_coords)
+    node_block_type = torch.cat(node_block_type)
+    node_atom = torch.cat(node_atom)
+    n_roots = n_nodes_for_depth[0]
+    root_block = node_parent[0]
+    node_parent = torch.cat(node_parent[1:])
+
+    # the children of the nodes follow the roots in the order of their parents
+    node_n_children = torch.bincount(node_parent, minlength=n_nodes)
+    node_first_child = n_roots + torch.cumsum(node_n_children, dim=0) - node_n_children
+    block_n_roots = torch.bincount(root_block, minlength=n_poses * max_n_blocks)
+    block_first_root = torch.cumsum(block_n_roots, dim=0) - block_n_roots
+
+    # bound the subtree radii from the leaves up
+    node_subtree_radius = torch.zeros((n_nodes,), dtype=torch.float32, device=device)
+    depth_end = n_nodes
+    for n_depth_nodes in reversed(n_nodes_for_depth[1:]):
+        nodes = torch.arange(
+            depth_end - n_depth_nodes, depth_end, dtype=torch.int64, device=device
+        )
+        parents = node_parent[nodes - n_roots]
+        node_subtree_radius.scatter_reduce_(
+            0,
+            parents,
+            torch.norm(node_coords[nodes] - node_coords[parents], dim=1)
+            + node_subtree_radius[nodes],
+            reduce="amax",
+        )
+        depth_end -= n_depth_nodes
+
+    # sort each block's rotamers by their paths, deepest node last, so that
+    # a rotamer precedes those extending it; the roots' order keeps the
+    # blocks in the order of the rotamer set
+    trie_sort = torch.arange(n_rots, dtype=torch.int64, device=device)
+    for depth in reversed(range(len(n_nodes_for_depth))):
+        trie_sort = trie_sort[
+            torch.sort(node_for_rot[depth, trie_sort], stable=True)[1]
+        ]
+    trie_order_for_rot = torch.empty_like(trie_sort)
+    trie_order_for_rot[trie_sort] = torch.arange(
+        n_rots, dtype=torch.int64, device=device
+    )
+    trie_order_for_rot -= rotamer_set.rot_offset_for_block[
+        rotamer_set.pose_for_rot, block_ind_for_rot
+    ]
+
+    nz_depth, nz_rot = torch.nonzero(node_for_rot != -1, as_tuple=True)
+    path_nodes = node_for_rot[nz_depth, nz_rot]
+    node_first_rot = torch.full(
+        (n_nodes,), n_rots, dtype=torch.int64, device=device
+    ).scatter_reduce(0, path_nodes, trie_order_for_rot[nz_rot], reduce="amin")
+    node_end_rot = torch.zeros(
+        (n_nodes,), dtype=torch.int64, device=device
+    ).scatter_reduce(0, path_nodes, trie_order_for_rot[nz_rot] + 1, reduce="amax")
+
+    return RotamerTrie(
+        node_coords=node_coords,
+        node_block_type=node_block_type,
+        node_atom=node_atom,
+        node_subtree_radius=node_subtree_radius,
+        node_first_child=node_first_child,
+        node_n_children=node_n_children,
+        node_first_rot=node_first_rot,
+        node_end_rot=node_end_rot,
+        block_first_root=block_first_root.view(n_poses, max_n_blocks),
+        block_n_roots=block_n_roots.view(n_poses, max_n_blocks),
+        trie_order_for_rot=trie_order_for_rot,
+    )
+
+
+def trie_vs_trie_energies(
+    trie: RotamerTrie,
+    rotamer_set: RotamerSet,
+    atom_pair_energies: Callable,
+    edge_pose: Tensor[torch.int64][:],
+    edge_block1: Tensor[torch.int64][:],
+    edge_block2: Tensor[torch.int64][:],
+    interaction_distance: float = 6.0,
+    max_n_pair_energies_per_batch: int = 1 << 22,
+) -> Tensor[torch.float32][:]:
+    """The energies between the rotamers of pairs of blocks (edges)
+    evaluated atom pair by atom pair from their tries.
+
+    atom_pair_energies(block_type1, atom1, coords1, block_type2, atom2,
+    coords2) gives the energies of a set of atom pairs. Each pair of trie
+    nodes is evaluated once, its energy counting toward every pair of
+    rotamers passing through both nodes, and pairs of subtrees whose
+    bounding spheres are farther than interaction_distance apart are not
+    visited. The result holds, edge after edge, the n1 x n2 row-major
+    tables of the energies between the edge's n1 and n2 rotamers, as in
+    the InteractionGraph.
+    """
+    device = trie.node_coords.device
+    n_rots1 = rotamer_set.n_rots_for_block[edge_pose, edge_block1]
+    n_rots2 = rotamer_set.n_rots_for_block[edge_pose, edge_block2]
+    table_size = n_rots1 * n_rots2
+    table_offset = torch.cumsum(table_size, dim=0) - table_size
+    energies = torch.zeros(
+        (int(torch.sum(table_size)),), dtype=torch.float32, device=device
+    )
+
+    # batch the edges by the size of the tables they fill
+    batch_starts = [0]
+    batch_size = 0
+    for i, size in enumerate(table_size.tolist()):
+        if batch_size > 0 and batch_size + size > max_n_pair_energies_per_batch:
+            batch_starts.append(i)
+            batch_size = 0
+        batch_size += size
+    batch_starts.append(edge_pose.shape[0])
+
+    for start, end in zip(batch_starts[:-1], batch_starts[1:]):
+        if start == end:
+            continue
+        edges = torch.arange(start, end, dtype=torch.int64, device=device)
+        tables = _trie_vs_trie_tables(
+            trie,
+            atom_pair_energies,
+            edge_pose[edges],
+            edge_block1[edges],
+            edge_block2[edges],
+            int(torch.max(n_rots1[edges])),
+            int(torch.max(n_rots2[edges])),
+            interaction_distance,
+        )
+
+        # gather the tables from trie order into the rotamer set's order
+        batch_edge = torch.repeat_interleave(
+            torch.arange(end - start, dtype=torch.int64, device=device),
+            table_size[edges],
+        )
+        entry = (
+            torch.arange(batch_edge.shape[0], dtype=torch.int64, device=device)
+            - (table_offset[edges] - table_offset[start])[batch_edge]
+        )
+        edge = edges[batch_edge]
+        rot1 = rotamer_set.rot_offset_for_block[
+            edge_pose[edge], edge_block1[edge]
+        ] + torch.div(entry, n_rots2[edge], rounding_mode="floor")
+        rot2 = rotamer_set.rot_offset_for_block[
+            edge_pose[edge], edge_block2[edge]
+        ] + torch.remainder(entry, n_rots2[edge])
+        energies[
+            table_offset[start]
+            + torch.arange(batch_edge.shape[0], dtype=torch.int64, device=device)
+        ] = tables[
+            batch_edge,
+            trie.trie_order_for_rot[rot1],
+            trie.trie_order_for_rot[rot2],
+        ].to(
+            torch.float32
+        )
+
+    return energies
+
+
+def _trie_vs_trie_tables(
+    trie: RotamerTrie,
+    atom_pair_energies: Callable,
+    edge_pose: Tensor[torch.int64][:],
+    edge_block1: Tensor[torch.int64][:],
+    edge_block2: Tensor[torch.int64][:],
+    max_n_rots1: int,
+    max_n_rots2: int,
+    interaction_distance: float,
+) -> Tensor[torch.float64][:, :, :]:
+    """The n-edges x max-n-rots1 x max-n-rots2 tables of energies between
+    the rotamers of the edges' blocks, in trie order.
+
+    The traversal keeps a frontier of node pairs (u, v) of two kinds:
+    a "subtree" pair stands for all the pairs of the subtrees of u and v,
+    and a "node" pair for the pairs of u with the subtree of v. A subtree
+    pair (u, v) expands into the subtree pairs of u's children with v and
+    the node pairs of u with v's children; a node pair into the node pairs
+    of u with v's children. Each pair of nodes is thus reached once. The
+    energy of a pair counts toward the rectangle of rotamer pairs passing
+    through both nodes, accumulated into difference tables that a pair of
+    cumulative sums then integrates.
+    """
+    device = trie.node_coords.device
+    n_edges = edge_pose.shape[0]
+    n_roots1 = trie.block_n_roots[edge_pose, edge_block1]
+    n_roots2 = trie.block_n_roots[edge_pose, edge_block2]
+    first_root1 = trie.block_first_root[edge_pose, edge_block1]
+    first_root2 = trie.block_first_root[edge_pose, edge_block2]
+
+    # one extra row and column for the ends of the last rotamers' ranges
+    table_shape = (n_edges, max_n_rots1 + 1, max_n_rots2 + 1)
+    differences = torch.zeros(
+        table_shape[0] * table_shape[1] * table_shape[2],
+        dtype=torch.float64,
+        device=device,
+    )
+
+    # start from all the pairs of roots of each edge
+    edge, root_pair = _expand(
+        torch.arange(n_edges, dtype=torch.int64, device=device),
+        n_roots1 * n_roots2,
+    )
+    u = first_root1[edge] + torch.div(root_pair, n_roots2[edge], rounding_mode="floor")
+    v = first_root2[edge] + torch.remainder(root_pair, n_roots2[edge])
+    is_subtree_pair = torch.ones_like(u, dtype=torch.bool)
+
+    while u.shape[0] > 0:
+        pair_energies = atom_pair_energies(
+            trie.node_block_type[u],
+            trie.node_atom[u],
+            trie.node_coords[u],
+            trie.node_block_type[v],
+            trie.node_atom[v],
+            trie.node_coords[v],
+        ).to(torch.float64)
+        nz = torch.nonzero(pair_energies != 0, as_tuple=True)[0]
+        for rot1, rot2, sign in (
+            (trie.node_first_rot, trie.node_first_rot, 1),
+            (trie.node_first_rot, trie.node_end_rot, -1),
+            (trie.node_end_rot, trie.node_first_rot, -1),
+            (trie.node_end_rot, trie.node_end_rot, 1),
+        ):
+            differences.index_add_(
+                0,
+                (edge[nz] * table_shape[1] + rot1[u[nz]]) * table_shape[2]
+                + rot2[v[nz]],
+                sign * pair_energies[nz],
+            )
+
+        # keep the pairs whose subtrees can still come within reach
+        dist = torch.norm(trie.node_coords[u] - trie.node_coords[v], dim=1)
+        reach = (
+            torch.where(is_subtree_pair, trie.node_subtree_radius[u], 0)
+            + trie.node_subtree_radius[v]
+            + interaction_distance
+        )
+        keep = torch.nonzero(dist <= reach, as_tuple=True)[0]
+        edge, u, v, is_subtree_pair = (
+            edge[keep],
+            u[keep],
+            v[keep],
+            is_subtree_pair[keep],
+        )
+
+        subtree_pair = torch.nonzero(is_subtree_pair, as_tuple=True)[0]
+        from_u, u_child = _expand(subtree_pair, trie.node_n_children[u[subtree_pair]])
+        from_v, v_child = _expand(
+            torch.arange(u.shape[0], dtype=torch.int64, device=device),
+            trie.node_n_children[v],
+        )
+        edge = torch.cat((edge[from_u], edge[from_v]))
+        u, v = (
+            torch.cat((trie.node_first_child[u[from_u]] + u_child, u[from_v])),
+            torch.cat((v[from_u], trie.node_first_child[v[from_v]] + v_child)),
+        )
+        is_subtree_pair = torch.cat(
+            (
+                torch.ones_like(from_u, dtype=torch.bool),
+                torch.zeros_like(from_v, dtype=torch.bool),
+            )
+        )
+
+    tables = differences.view(table_shape).cumsum(dim=1).cumsum(dim=2)
+    return tables[:, :max_n_rots1, :max_n_rots2]
+
+
+def _expand(parents: Tensor[torch.int64][:], n_children: Tensor[torch.int64][:]):
+    """For each of the children of the given parents, the parent and the
+    child's index among its siblings
+    """
+    parent = torch.repeat_interleave(parents, n_children)
+    child = torch.arange(
+        parent.shape[0], dtype=torch.int64, device=parents.device
+    ) - torch.repeat_interleave(
+        torch.cumsum(n_children, dim=0) - n_children, n_children
+    )
+    return parent, child
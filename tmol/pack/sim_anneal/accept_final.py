@@ -69,7 +69,8 @@ def poses_from_assigned_rotamers(
     block_for_atom = cs_atom_begin - 1
 
     context_for_atom64 = stretch(
-        torch.arange(n_poses, dtype=torch.int64), max_context_coords_n_atoms
+        torch.arange(n_poses, dtype=torch.int64, device=device),
+        max_context_coords_n_atoms,
     ).view(n_poses, max_context_coords_n_atoms)
     block_type_for_atom64 = context_block_type64[
         context_for_atom64, block_for_atom
@@ -114,8 +115,10 @@ def poses_from_assigned_rotamers(
         block_coord_offset64=n_atoms_offset.to(torch.int64),
         inter_residue_connections=orig_poses.inter_residue_connections[pid4c_64],
         inter_residue_connections64=orig_poses.inter_residue_connections64[pid4c_64],
-        inter_block_bondsep=orig_poses.inter_block_bondsep[pid4c_64],
-        inter_block_bondsep64=orig_poses.inter_block_bondsep64[pid4c_64],
+        inter_block_bondsep_neighbors=orig_poses.inter_block_bondsep_neighbors[
+            pid4c_64
+        ],
+        inter_block_bondsep_sparse=orig_poses.inter_block_bondsep_sparse[pid4c_64],
         block_type_ind=context_block_type,
         block_type_ind64=context_block_type64,
         device=orig_poses.device,
@@ -4,6 +4,7 @@ import torch
 from tmol.pack.sim_anneal.compiled.compiled import (
     pick_random_rotamers,
     metropolis_accept_reject,
+    register_interaction_graph_rotamer_pair_energy_eval,
     # create_sim_annealer,
     # delete_sim_annealer,
     # register_standard_random_rotamer_picker,
@@ -24,6 +25,9 @@ class SelectRanRotModule:
         block_ind_for_rot,
         rotamer_coords,
         rotamer_coord_offsets,
+        rotamer_mainchain_coords,
+        block_type_sidechain_atom_ind,
+        block_type_mainchain_atom_ind,
         alternate_coords,
         alternate_coord_offsets,
         alternate_block_id,
@@ -40,6 +44,9 @@ class SelectRanRotModule:
         assert block_ind_for_rot.device == dev
         assert rotamer_coords.device == dev
         assert rotamer_coord_offsets.device == dev
+        assert rotamer_mainchain_coords.device == dev
+        assert block_type_sidechain_atom_ind.device == dev
+        assert block_type_mainchain_atom_ind.device == dev
         assert alternate_coords.device == dev
         assert alternate_coord_offsets.device == dev
         assert alternate_block_id.device == dev
@@ -60,6 +67,13 @@ class SelectRanRotModule:
         self.block_ind_for_rot = _p(block_ind_for_rot.to(torch.int32))
         self.rotamer_coords = _p(rotamer_coords)
         self.rotamer_coord_offsets = _p(rotamer_coord_offsets)
+        self.rotamer_mainchain_coords = _p(rotamer_mainchain_coords)
+        self.block_type_sidechain_atom_ind = _p(
+            block_type_sidechain_atom_ind.to(torch.int32)
+        )
+        self.block_type_mainchain_atom_ind = _p(
+            block_type_mainchain_atom_ind.to(torch.int32)
+        )
         self.alternate_coords = _p(alternate_coords)
         self.alternate_coord_offsets = _p(alternate_coord_offsets)
         self.alternate_block_id = _p(alternate_block_id)
@@ -86,6 +100,9 @@ class SelectRanRotModule:
             self.block_ind_for_rot,
             self.rotamer_coords,
             self.rotamer_coord_offsets,
+            self.rotamer_mainchain_coords,
+            self.block_type_sidechain_atom_ind,
+            self.block_type_mainchain_atom_ind,
             self.alternate_coords,
             self.alternate_coord_offsets,
             self.alternate_block_id,
@@ -178,3 +195,58 @@ class MCAcceptRejectModule:
             self.block_type_n_atoms,
             self.max_n_atoms,
         )
+
+
+class InteractionGraphRPEModule:
+    """Evaluate rotamer energies during annealing by lookup in a precomputed
+    InteractionGraph (see tmol.pack.interaction_graph) instead of from the
+    rotamers' coordinates.
+    """
+
+    def __init__(self, interaction_graph, rotamer_set, pose_id_for_context):
+        super().__init__()
+
+        def _p(t):
+            return torch.nn.Parameter(t, requires_grad=False)
+
+        ig = interaction_graph
+        self.pose_id_for_context = _p(pose_id_for_context.to(torch.int32))
+        self.block_ind_for_rot = _p(rotamer_set.block_ind_for_rot.to(torch.int32))
+        self.n_rots_for_block = _p(rotamer_set.n_rots_for_block.to(torch.int32))
+        self.rot_offset_for_block = _p(rotamer_set.rot_offset_for_block.to(torch.int32))
+        self.energy1b = _p(ig.energy1b)
+        self.pair_neighbors = _p(ig.pair_neighbors)
+        self.pair_offsets = _p(ig.pair_offsets)
+        self.energy2b = _p(ig.energy2b)
+
+    def register_with_sim_annealer(
+        self,
+        context_rot_for_block,
+        accepted,
+        random_rots,
+        output_energies,
+        annealer,
+    ):
+        """Add the lookup to the annealer's score components.
+
+        context_rot_for_block, an int32 [n_contexts x max_n_blocks] tensor,
+        must hold the (global) index of the rotamer initially assigned to
+        each packable block of each context, and -1 for the other blocks;
+        it is kept up to date as substitutions are accepted, so after
+        annealing it holds the final assignment.
+        """
+        register_interaction_graph_rotamer_pair_energy_eval(
+            context_rot_for_block,
+            accepted,
+            self.pose_id_for_context,
+            random_rots,
+            self.block_ind_for_rot,
+            self.n_rots_for_block,
+            self.rot_offset_for_block,
+            self.energy1b,
+            self.pair_neighbors,
+            self.pair_offsets,
+            self.energy2b,
+            output_energies,
+            annealer,
+        )
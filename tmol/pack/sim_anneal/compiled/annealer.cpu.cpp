@@ -1,11 +1,14 @@
 #include <tmol/pack/sim_anneal/compiled/annealer.hh>
+#include <tmol/pack/sim_anneal/compiled/annealing_progress.hh>
+#include <tmol/score/common/device_operations.hh>
 #include <tmol/utility/function_dispatch/aten.hh>
 #include <tmol/score/common/forall_dispatch.hh>
 #include <tmol/utility/tensor/TensorCast.h>
 
 #include <tmol/score/common/forall_dispatch.cpu.impl.hh>
 
-#include <chrono>
+#include <algorithm>
+#include <cmath>
 
 namespace tmol {
 namespace pack {
@@ -33,6 +36,9 @@ class CPUPickRotamersStep : public PickRotamersStep {
       TView<Int, 1, D> block_ind_for_rot,
       TView<Real, 2, D> rotamer_coords,
       TView<Int, 1, D> rotamer_coord_offsets,
+      TView<Real, 4, D> rotamer_mainchain_coords,
+      TView<Int, 2, D> block_type_sidechain_atom_ind,
+      TView<Int, 2, D> block_type_mainchain_atom_ind,
       TView<Real, 2, D> alternate_coords,
       TView<Int, 1, D> alternate_coord_offsets,
       TView<Int, 2, D> alternate_id,
@@ -50,22 +56,23 @@ class CPUPickRotamersStep : public PickRotamersStep {
         block_ind_for_rot_(block_ind_for_rot),
         rotamer_coords_(rotamer_coords),
         rotamer_coord_offsets_(rotamer_coord_offsets),
+        rotamer_mainchain_coords_(rotamer_mainchain_coords),
+        block_type_sidechain_atom_ind_(block_type_sidechain_atom_ind),
+        block_type_mainchain_atom_ind_(block_type_mainchain_atom_ind),
         alternate_coords_(alternate_coords),
         alternate_coord_offsets_(alternate_coord_offsets),
         alternate_id_(alternate_id),
         random_rots_(random_rots),
         block_type_n_atoms_(block_type_n_atoms),
         max_n_atoms_(max_n_atoms),
-        annealer_event_(annealer_event) {
-    std::cout << "CPUPickRotamersStep" << std::endl;
-  }
+        annealer_event_(annealer_event) {}
 
   int max_n_rotamers() const override {
     int const n_poses = n_rots_for_pose_.size(0);
     int max_n_rots = -1;
     for (int i = 0; i < n_poses; ++i) {
       int i_nrots = n_rots_for_pose_[i];
-      if (i_nrots < max_n_rots) {
+      if (i_nrots > max_n_rots) {
         max_n_rots = i_nrots;
       }
     }
@@ -84,6 +91,9 @@ class CPUPickRotamersStep : public PickRotamersStep {
         block_ind_for_rot_,
         rotamer_coords_,
         rotamer_coord_offsets_,
+        rotamer_mainchain_coords_,
+        block_type_sidechain_atom_ind_,
+        block_type_mainchain_atom_ind_,
         alternate_coords_,
         alternate_coord_offsets_,
         alternate_id_,
@@ -104,6 +114,9 @@ class CPUPickRotamersStep : public PickRotamersStep {
   TView<Int, 1, D> block_ind_for_rot_;
   TView<Real, 2, D> rotamer_coords_;
   TView<Int, 1, D> rotamer_coord_offsets_;
+  TView<Real, 4, D> rotamer_mainchain_coords_;
+  TView<Int, 2, D> block_type_sidechain_atom_ind_;
+  TView<Int, 2, D> block_type_mainchain_atom_ind_;
   TView<Real, 2, D> alternate_coords_;
   TView<Int, 1, D> alternate_coord_offsets_;
   TView<Int, 2, D> alternate_id_;
@@ -133,23 +146,37 @@ class CPUMetropolisAcceptRejectStep : public MetropolisAcceptRejectStep {
       TView<Int, 1, D> accept,
       TView<Int, 1, D> block_type_n_atoms,
       Int max_n_atoms,
-      TView<int64_t, 1, tmol::Device::CPU> score_events)
+      TView<int64_t, 1, tmol::Device::CPU> score_events,
+      TView<Real, 1, D> temperature_ladder = TView<Real, 1, D>(),
+      TView<Int, 1, D> replica_rung = TView<Int, 1, D>(),
+      TView<Int, 2, D> context_for_rung = TView<Int, 2, D>(),
+      TView<Real, 1, D> context_energies = TView<Real, 1, D>(),
+      Int exchange_interval = 0)
       : temperature_(temperature),
         context_coords_(context_coords),
         context_coord_offsets_(context_coord_offsets),
         context_block_type_(context_block_type),
         alternate_coords_(alternate_coords),
+        alternate_coord_offsets_(alternate_coord_offsets),
         alternate_id_(alternate_id),
         rotamer_component_energies_(rotamer_component_energies),
         accept_(accept),
         block_type_n_atoms_(block_type_n_atoms),
         max_n_atoms_(max_n_atoms),
         score_events_(score_events),
+        temperature_ladder_(temperature_ladder),
+        replica_rung_(replica_rung),
+        context_for_rung_(context_for_rung),
+        context_energies_(context_energies),
+        exchange_interval_(exchange_interval),
+        n_steps_since_exchange_(0),
+        exchange_parity_(0),
         last_outer_iteration_(-1) {}
 
   void set_temperature_scheduler(
       std::shared_ptr<TemperatureScheduler> temp_sched) {
     temp_sched_ = temp_sched;
+    last_outer_iteration_ = -1;
   }
 
   void accept_reject(int outer_iteration) override {
@@ -171,7 +198,23 @@ class CPUMetropolisAcceptRejectStep : public MetropolisAcceptRejectStep {
         accept_,
         block_type_n_atoms_,
         max_n_atoms_,
-        score_events_);
+        score_events_,
+        temperature_ladder_,
+        replica_rung_,
+        context_energies_);
+
+    if (exchange_interval_ > 0
+        && ++n_steps_since_exchange_ == exchange_interval_) {
+      MetropolisAcceptReject<ForallDispatch, D, Real, Int>::exchange_replicas(
+          temperature_,
+          temperature_ladder_,
+          replica_rung_,
+          context_for_rung_,
+          context_energies_,
+          exchange_parity_);
+      n_steps_since_exchange_ = 0;
+      exchange_parity_ = 1 - exchange_parity_;
+    }
   }
 
   void final_op() override {}
@@ -189,6 +232,13 @@ class CPUMetropolisAcceptRejectStep : public MetropolisAcceptRejectStep {
   TView<Int, 1, D> block_type_n_atoms_;
   Int max_n_atoms_;
   TView<int64_t, 1, tmol::Device::CPU> score_events_;
+  TView<Real, 1, D> temperature_ladder_;
+  TView<Int, 1, D> replica_rung_;
+  TView<Int, 2, D> context_for_rung_;
+  TView<Real, 1, D> context_energies_;
+  Int exchange_interval_;
+  Int n_steps_since_exchange_;
+  Int exchange_parity_;
   std::shared_ptr<TemperatureScheduler> temp_sched_;
   int last_outer_iteration_;
 };
@@ -210,6 +260,9 @@ void PickRotamersStepRegistrator<DeviceDispatch, D, Real, Int>::f(
     TView<Int, 1, D> block_ind_for_rot,
     TView<Real, 2, D> rotamer_coords,
     TView<Int, 1, D> rotamer_coord_offsets,
+    TView<Real, 4, D> rotamer_mainchain_coords,
+    TView<Int, 2, D> block_type_sidechain_atom_ind,
+    TView<Int, 2, D> block_type_mainchain_atom_ind,
     TView<Real, 2, D> alternate_coords,
     TView<Int, 1, D> alternate_coord_offsets,
     TView<Int, 2, D> alternate_id,
@@ -232,6 +285,9 @@ void PickRotamersStepRegistrator<DeviceDispatch, D, Real, Int>::f(
           block_ind_for_rot,
           rotamer_coords,
           rotamer_coord_offsets,
+          rotamer_mainchain_coords,
+          block_type_sidechain_atom_ind,
+          block_type_mainchain_atom_ind,
           alternate_coords,
           alternate_coord_offsets,
           alternate_id,
@@ -282,13 +338,80 @@ void MetropolisAcceptRejectStepRegistrator<DeviceDispatch, D, Real, Int>::f(
           score_events);
 
   sim_annealer->set_metropolis_accept_reject_step(metropolis_step);
+
+  // follow the contexts' progress in case the schedule stops them early
+  AnnealingProgressRegistrator<score::common::DeviceOperations, D, Real, Int>::
+      f(rotamer_component_energies, alternate_id, accept, annealer);
+}
+
+template <
+    template <tmol::Device>
+    class DeviceDispatch,
+    tmol::Device D,
+    typename Real,
+    typename Int>
+void ReplicaExchangeStepRegistrator<DeviceDispatch, D, Real, Int>::f(
+    TView<Real, 1, tmol::Device::CPU> temperature,
+    TView<Real, 3, D> context_coords,
+    TView<Int, 2, D> context_coord_offsets,
+    TView<Int, 2, D> context_block_type,
+    TView<Real, 2, D> alternate_coords,
+    TView<Int, 1, D> alternate_coord_offsets,
+    TView<Int, 2, D> alternate_id,
+    TView<Real, 2, D> rotamer_component_energies,
+    TView<Int, 1, D> accept,
+    TView<Int, 1, D> block_type_n_atoms,
+    Int max_n_atoms,
+    TView<int64_t, 1, tmol::Device::CPU> score_events,
+    TView<Real, 1, D> temperature_ladder,
+    TView<Int, 1, D> replica_rung,
+    TView<Int, 2, D> context_for_rung,
+    TView<Real, 1, D> context_energies,
+    Int exchange_interval,
+    TView<int64_t, 1, tmol::Device::CPU> annealer) {
+  int64_t annealer_uint = annealer[0];
+  SimAnnealer *sim_annealer = reinterpret_cast<SimAnnealer *>(annealer_uint);
+  std::shared_ptr<MetropolisAcceptRejectStep> metropolis_step =
+      std::make_shared<
+          CPUMetropolisAcceptRejectStep<DeviceDispatch, D, Real, Int>>(
+          temperature,
+          context_coords,
+          context_coord_offsets,
+          context_block_type,
+          alternate_coords,
+          alternate_coord_offsets,
+          alternate_id,
+          rotamer_component_energies,
+          accept,
+          block_type_n_atoms,
+          max_n_atoms,
+          score_events,
+          temperature_ladder,
+          replica_rung,
+          context_for_rung,
+          context_energies,
+          exchange_interval);
+
+  sim_annealer->set_metropolis_accept_reject_step(metropolis_step);
+
+  AnnealingProgressRegistrator<score::common::DeviceOperations, D, Real, Int>::
+      f(rotamer_component_energies, alternate_id, accept, annealer);
 }
 
 TemperatureScheduler::TemperatureScheduler(
-    int n_outer_iterations, float max_temp, float min_temp)
+    int n_outer_iterations,
+    float max_temp,
+    float min_temp,
+    int n_quench_iterations,
+    float inner_iterations_per_rotamer)
     : n_iterations_(n_outer_iterations),
       max_temp_(max_temp),
-      min_temp_(min_temp) {}
+      min_temp_(min_temp),
+      n_quench_iterations_(n_quench_iterations),
+      inner_iterations_per_rotamer_(inner_iterations_per_rotamer),
+      min_accept_rate_(0),
+      energy_tolerance_(0),
+      patience_(0) {}
 
 float TemperatureScheduler::temp(int outer_iteration) const {
   if (quench(outer_iteration)) {
@@ -298,7 +421,44 @@ float TemperatureScheduler::temp(int outer_iteration) const {
 }
 
 bool TemperatureScheduler::quench(int outer_iteration) const {
-  return outer_iteration == n_iterations_ - 1;
+  return outer_iteration >= n_iterations_ - n_quench_iterations_;
+}
+
+void TemperatureScheduler::set_plateau_criteria(
+    float min_accept_rate, float energy_tolerance, int patience) {
+  min_accept_rate_ = min_accept_rate;
+  energy_tolerance_ = energy_tolerance;
+  patience_ = patience;
+}
+
+int TemperatureScheduler::n_inner_iterations(int max_n_rotamers) const {
+  return std::max(
+      1, (int)std::ceil(inner_iterations_per_rotamer_ * max_n_rotamers));
+}
+
+float LinearTemperatureScheduler::temp(int outer_iteration) const {
+  if (quench(outer_iteration)) {
+    return 0;
+  }
+  int const n_cooling = n_iterations_ - n_quench_iterations_;
+  if (n_cooling < 2) {
+    return max_temp_;
+  }
+  return max_temp_
+         + (min_temp_ - max_temp_) * outer_iteration / (n_cooling - 1);
+}
+
+float GeometricTemperatureScheduler::temp(int outer_iteration) const {
+  if (quench(outer_iteration)) {
+    return 0;
+  }
+  int const n_cooling = n_iterations_ - n_quench_iterations_;
+  if (n_cooling < 2) {
+    return max_temp_;
+  }
+  return max_temp_
+         * std::pow(
+             min_temp_ / max_temp_, float(outer_iteration) / (n_cooling - 1));
 }
 
 SimAnnealer::SimAnnealer() {}
@@ -319,50 +479,71 @@ void SimAnnealer::add_score_component(
   score_calculators_.push_back(score_calculator);
 }
 
-void SimAnnealer::run_annealer() {
-  int const max_n_rots = pick_step_->max_n_rotamers();
+void SimAnnealer::set_temperature_scheduler(
+    std::shared_ptr<TemperatureScheduler> temp_sched) {
+  temp_sched_ = temp_sched;
+}
 
-  int const n_outer_cycles = 20;
-  int const n_inner_cycles = 5 * max_n_rots;
+void SimAnnealer::set_annealing_progress(
+    std::shared_ptr<AnnealingProgress> progress) {
+  progress_ = progress;
+}
 
-  auto temp_sched =
-      std::make_shared<TemperatureScheduler>(n_outer_cycles, 100.0, 0.3);
-  acc_rej_step_->set_temperature_scheduler(temp_sched);
+int SimAnnealer::run_annealer() {
+  if (!temp_sched_) {
+    temp_sched_ = std::make_shared<TemperatureScheduler>(20, 100.0, 0.3);
+  }
+  int const n_outer_cycles = temp_sched_->n_outer_iterations();
+  int const n_inner_cycles =
+      temp_sched_->n_inner_iterations(pick_step_->max_n_rotamers());
+  int const first_quench_cycle =
+      n_outer_cycles - temp_sched_->n_quench_iterations();
+  acc_rej_step_->set_temperature_scheduler(temp_sched_);
+
+  bool const stop_early = progress_ && temp_sched_->stops_early();
+  if (stop_early) {
+    progress_->reset();
+  }
 
-  clock_t start_clock = clock();
-  time_t start_time = time(NULL);
-  using namespace std::chrono;
-  auto start_chrono = high_resolution_clock::now();
+  int n_outer_cycles_run = 0;
   for (int i = 0; i < n_outer_cycles; ++i) {
+    ++n_outer_cycles_run;
     for (int j = 0; j < n_inner_cycles; ++j) {
-      if (i * n_inner_cycles + j % 100 == 0) {
-        pick_step_->pick_rotamers();
-      }
+      pick_step_->pick_rotamers();
       for (auto const &rpe_calc : score_calculators_) {
         rpe_calc->calc_energies();
       }
-      // std::cout << "." << std::flush;
+      if (stop_early) {
+        progress_->before_accept_reject();
+      }
       acc_rej_step_->accept_reject(i);
+      if (stop_early) {
+        progress_->after_accept_reject();
+      }
+    }
+
+    if (stop_early) {
+      int const n_active = progress_->end_outer_iteration(
+          temp_sched_->min_accept_rate(),
+          temp_sched_->energy_tolerance(),
+          temp_sched_->patience());
+      if (i + 1 == first_quench_cycle) {
+        // every trajectory is quenched, plateaued or not
+        progress_->reset();
+      } else if (n_active == 0) {
+        if (i >= first_quench_cycle) {
+          break;
+        }
+        i = first_quench_cycle - 1;
+        progress_->reset();
+      }
     }
   }
   acc_rej_step_->final_op();
-
-  clock_t stop_clock = clock();
-  time_t stop_time = time(NULL);
-  auto stop_chrono = high_resolution_clock::now();
-  auto duration_us = duration_cast<microseconds>(stop_chrono - start_chrono);
-  auto duration_ms = duration_cast<milliseconds>(stop_chrono - start_chrono);
-
-  int const n_cycles = n_outer_cycles * n_inner_cycles;
-  std::cout << n_cycles << " cycles of simA in ";
-  std::cout << (double)duration_us.count() / n_cycles
-            << " us per iteration (chrono) ";
-  std::cout << (double)duration_ms.count() / 1000 << " s (chrono) "
-            << std::endl;
-  std::cout << ((double)stop_clock - start_clock) / (n_cycles * CLOCKS_PER_SEC)
-            << " s (clock) ";
-  std::cout << ((double)stop_time - start_time) / (n_cycles)
-            << " s (wall time) " << std::endl;
+  for (auto const &rpe_calc : score_calculators_) {
+    rpe_calc->finalize();
+  }
+  return n_outer_cycles_run;
 }
 
 std::shared_ptr<PickRotamersStep> SimAnnealer::pick_step() {
@@ -398,6 +579,16 @@ template struct MetropolisAcceptRejectStepRegistrator<
     tmol::Device::CPU,
     double,
     int>;
+template struct ReplicaExchangeStepRegistrator<
+    ForallDispatch,
+    tmol::Device::CPU,
+    float,
+    int>;
+template struct ReplicaExchangeStepRegistrator<
+    ForallDispatch,
+    tmol::Device::CPU,
+    double,
+    int>;
 
 }  // namespace compiled
 }  // namespace sim_anneal
@@ -1,12 +1,12 @@
 #include <tmol/utility/tensor/TensorCast.h>
 #include <tmol/pack/sim_anneal/compiled/annealer.hh>
+#include <tmol/pack/sim_anneal/compiled/annealing_progress.hh>
+#include <tmol/score/common/device_operations.hh>
 #include <tmol/score/common/forall_dispatch.cuda.impl.cuh>
 #include <tmol/utility/function_dispatch/aten.hh>
 
 #include <moderngpu/kernel_reduce.hxx>
 
-#include <chrono>
-
 namespace tmol {
 namespace pack {
 namespace sim_anneal {
@@ -33,6 +33,9 @@ class CUDAPickRotamersStep : public PickRotamersStep {
       TView<Int, 1, D> block_ind_for_rot,
       TView<Real, 2, D> rotamer_coords,
       TView<Int, 1, D> rotamer_coord_offsets,
+      TView<Real, 4, D> rotamer_mainchain_coords,
+      TView<Int, 2, D> block_type_sidechain_atom_ind,
+      TView<Int, 2, D> block_type_mainchain_atom_ind,
       TView<Real, 2, D> alternate_coords,
       TView<Int, 1, D> alternate_coord_offsets,
       TView<Int, 2, D> alternate_id,
@@ -50,15 +53,16 @@ class CUDAPickRotamersStep : public PickRotamersStep {
         block_ind_for_rot_(block_ind_for_rot),
         rotamer_coords_(rotamer_coords),
         rotamer_coord_offsets_(rotamer_coord_offsets),
+        rotamer_mainchain_coords_(rotamer_mainchain_coords),
+        block_type_sidechain_atom_ind_(block_type_sidechain_atom_ind),
+        block_type_mainchain_atom_ind_(block_type_mainchain_atom_ind),
         alternate_coords_(alternate_coords),
         alternate_coord_offsets_(alternate_coord_offsets),
         alternate_id_(alternate_id),
         random_rots_(random_rots),
         block_type_n_atoms_(block_type_n_atoms),
         max_n_atoms_(max_n_atoms),
-        annealer_event_(annealer_event) {
-    std::cout << "CUDAPickRotamersStep" << std::endl;
-  }
+        annealer_event_(annealer_event) {}
 
   int max_n_rotamers() const override {
     int const n_poses = n_rots_for_pose_.size(0);
@@ -83,7 +87,6 @@ class CUDAPickRotamersStep : public PickRotamersStep {
     cudaMemcpy(
         &max_n_rots, &max_n_rots_tv[0], sizeof(Int), cudaMemcpyDeviceToHost);
 
-    std::cout << "Max n rots: " << max_n_rots << " test" << std::endl;
     return max_n_rots;
   }
 
@@ -102,6 +105,9 @@ class CUDAPickRotamersStep : public PickRotamersStep {
         block_ind_for_rot_,
         rotamer_coords_,
         rotamer_coord_offsets_,
+        rotamer_mainchain_coords_,
+        block_type_sidechain_atom_ind_,
+        block_type_mainchain_atom_ind_,
         alternate_coords_,
         alternate_coord_offsets_,
         alternate_id_,
@@ -157,6 +163,9 @@ class CUDAPickRotamersStep : public PickRotamersStep {
   TView<Int, 1, D> block_ind_for_rot_;
   TView<Real, 2, D> rotamer_coords_;
   TView<Int, 1, D> rotamer_coord_offsets_;
+  TView<Real, 4, D> rotamer_mainchain_coords_;
+  TView<Int, 2, D> block_type_sidechain_atom_ind_;
+  TView<Int, 2, D> block_type_mainchain_atom_ind_;
   TView<Real, 2, D> alternate_coords_;
   TView<Int, 1, D> alternate_coord_offsets_;
   TView<Int, 2, D> alternate_id_;
@@ -187,7 +196,12 @@ class CUDAMetropolisAcceptRejectStep : public MetropolisAcceptRejectStep {
       TView<Int, 1, D> accept,
       TView<Int, 1, D> block_type_n_atoms,
       Int max_n_atoms,
-      TView<int64_t, 1, tmol::Device::CPU> score_events)
+      TView<int64_t, 1, tmol::Device::CPU> score_events,
+      TView<Real, 1, D> temperature_ladder = TView<Real, 1, D>(),
+      TView<Int, 1, D> replica_rung = TView<Int, 1, D>(),
+      TView<Int, 2, D> context_for_rung = TView<Int, 2, D>(),
+      TView<Real, 1, D> context_energies = TView<Real, 1, D>(),
+      Int exchange_interval = 0)
       : temperature_(temperature),
         context_coords_(context_coords),
         context_coord_offsets_(context_coord_offsets),
@@ -200,11 +214,19 @@ class CUDAMetropolisAcceptRejectStep : public MetropolisAcceptRejectStep {
         block_type_n_atoms_(block_type_n_atoms),
         max_n_atoms_(max_n_atoms),
         score_events_(score_events),
+        temperature_ladder_(temperature_ladder),
+        replica_rung_(replica_rung),
+        context_for_rung_(context_for_rung),
+        context_energies_(context_energies),
+        exchange_interval_(exchange_interval),
+        n_steps_since_exchange_(0),
+        exchange_parity_(0),
         last_outer_iteration_(-1) {}
 
   void set_temperature_scheduler(
       std::shared_ptr<TemperatureScheduler> temp_sched) {
     temp_sched_ = temp_sched;
+    last_outer_iteration_ = -1;
   }
 
   void accept_reject(int outer_iteration) override {
@@ -212,7 +234,6 @@ class CUDAMetropolisAcceptRejectStep : public MetropolisAcceptRejectStep {
 
     if (outer_iteration != last_outer_iteration_) {
       Real temperature = temp_sched_->temp(outer_iteration);
-      std::cout << "Setting new temperature: " << temperature << std::endl;
       last_outer_iteration_ = outer_iteration;
       temperature_[0] = temperature;
     }
@@ -229,7 +250,23 @@ class CUDAMetropolisAcceptRejectStep : public MetropolisAcceptRejectStep {
         accept_,
         block_type_n_atoms_,
         max_n_atoms_,
-        score_events_);
+        score_events_,
+        temperature_ladder_,
+        replica_rung_,
+        context_energies_);
+
+    if (exchange_interval_ > 0
+        && ++n_steps_since_exchange_ == exchange_interval_) {
+      MetropolisAcceptReject<ForallDispatch, D, Real, Int>::exchange_replicas(
+          temperature_,
+          temperature_ladder_,
+          replica_rung_,
+          context_for_rung_,
+          context_energies_,
+          exchange_parity_);
+      n_steps_since_exchange_ = 0;
+      exchange_parity_ = 1 - exchange_parity_;
+    }
   }
 
   void final_op() override { FinalOp<ForallDispatch, D, Real, Int>::f(); }
@@ -247,6 +284,13 @@ class CUDAMetropolisAcceptRejectStep : public MetropolisAcceptRejectStep {
   TView<Int, 1, D> block_type_n_atoms_;
   Int max_n_atoms_;
   TView<int64_t, 1, tmol::Device::CPU> score_events_;
+  TView<Real, 1, D> temperature_ladder_;
+  TView<Int, 1, D> replica_rung_;
+  TView<Int, 2, D> context_for_rung_;
+  TView<Real, 1, D> context_energies_;
+  Int exchange_interval_;
+  Int n_steps_since_exchange_;
+  Int exchange_parity_;
   // std::list<cudaEvent_t> events_;
   int last_outer_iteration_;
   std::shared_ptr<TemperatureScheduler> temp_sched_;
@@ -269,6 +313,9 @@ void PickRotamersStepRegistrator<DeviceDispatch, D, Real, Int>::f(
     TView<Int, 1, D> block_ind_for_rot,
     TView<Real, 2, D> rotamer_coords,
     TView<Int, 1, D> rotamer_coord_offsets,
+    TView<Real, 4, D> rotamer_mainchain_coords,
+    TView<Int, 2, D> block_type_sidechain_atom_ind,
+    TView<Int, 2, D> block_type_mainchain_atom_ind,
     TView<Real, 2, D> alternate_coords,
     TView<Int, 1, D> alternate_coord_offsets,
     TView<Int, 2, D> alternate_id,
@@ -291,6 +338,9 @@ void PickRotamersStepRegistrator<DeviceDispatch, D, Real, Int>::f(
           block_ind_for_rot,
           rotamer_coords,
           rotamer_coord_offsets,
+          rotamer_mainchain_coords,
+          block_type_sidechain_atom_ind,
+          block_type_mainchain_atom_ind,
           alternate_coords,
           alternate_coord_offsets,
           alternate_id,
@@ -341,6 +391,64 @@ void MetropolisAcceptRejectStepRegistrator<DeviceDispatch, D, Real, Int>::f(
           score_events);
 
   sim_annealer->set_metropolis_accept_reject_step(metropolis_step);
+
+  // follow the contexts' progress in case the schedule stops them early
+  AnnealingProgressRegistrator<score::common::DeviceOperations, D, Real, Int>::
+      f(rotamer_component_energies, alternate_id, accept, annealer);
+}
+
+template <
+    template <tmol::Device>
+    class DeviceDispatch,
+    tmol::Device D,
+    typename Real,
+    typename Int>
+void ReplicaExchangeStepRegistrator<DeviceDispatch, D, Real, Int>::f(
+    TView<Real, 1, tmol::Device::CPU> temperature,
+    TView<Real, 3, D> context_coords,
+    TView<Int, 2, D> context_coord_offsets,
+    TView<Int, 2, D> context_block_type,
+    TView<Real, 2, D> alternate_coords,
+    TView<Int, 1, D> alternate_coord_offsets,
+    TView<Int, 2, D> alternate_id,
+    TView<Real, 2, D> rotamer_component_energies,
+    TView<Int, 1, D> accept,
+    TView<Int, 1, D> block_type_n_atoms,
+    Int max_n_atoms,
+    TView<int64_t, 1, tmol::Device::CPU> score_events,
+    TView<Real, 1, D> temperature_ladder,
+    TView<Int, 1, D> replica_rung,
+    TView<Int, 2, D> context_for_rung,
+    TView<Real, 1, D> context_energies,
+    Int exchange_interval,
+    TView<int64_t, 1, tmol::Device::CPU> annealer) {
+  int64_t annealer_uint = annealer[0];
+  SimAnnealer *sim_annealer = reinterpret_cast<SimAnnealer *>(annealer_uint);
+  std::shared_ptr<MetropolisAcceptRejectStep> metropolis_step =
+      std::make_shared<
+          CUDAMetropolisAcceptRejectStep<DeviceDispatch, D, Real, Int>>(
+          temperature,
+          context_coords,
+          context_coord_offsets,
+          context_block_type,
+          alternate_coords,
+          alternate_coord_offsets,
+          alternate_id,
+          rotamer_component_energies,
+          accept,
+          block_type_n_atoms,
+          max_n_atoms,
+          score_events,
+          temperature_ladder,
+          replica_rung,
+          context_for_rung,
+          context_energies,
+          exchange_interval);
+
+  sim_annealer->set_metropolis_accept_reject_step(metropolis_step);
+
+  AnnealingProgressRegistrator<score::common::DeviceOperations, D, Real, Int>::
+      f(rotamer_component_energies, alternate_id, accept, annealer);
 }
 
 template struct PickRotamersStepRegistrator<
@@ -374,6 +482,16 @@ template struct MetropolisAcceptRejectStepRegistrator<
     tmol::Device::CUDA,
     double,
     int>;
+template struct ReplicaExchangeStepRegistrator<
+    ForallDispatch,
+    tmol::Device::CUDA,
+    float,
+    int>;
+template struct ReplicaExchangeStepRegistrator<
+    ForallDispatch,
+    tmol::Device::CUDA,
+    double,
+    int>;
 // template struct MetropolisAcceptRejectStepRegistrator<
 //     ForallDispatch,
 //     tmol::Device::CUDA,
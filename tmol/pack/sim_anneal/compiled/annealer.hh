@@ -29,6 +29,9 @@ struct PickRotamers {
       TView<Int, 1, D> block_ind_for_rot,
       TView<Real, 2, D> rotamer_coords,
       TView<Int, 1, D> rotamer_coord_offsets,
+      TView<Real, 4, D> rotamer_mainchain_coords,
+      TView<Int, 2, D> block_type_sidechain_atom_ind,
+      TView<Int, 2, D> block_type_mainchain_atom_ind,
       TView<Real, 2, D> alternate_coords,
       TView<Int, 1, D> alternate_coord_offsets,
       TView<Int, 2, D> alternate_id,
@@ -45,6 +48,13 @@ template <
     typename Real,
     typename Int>
 struct MetropolisAcceptReject {
+  // Accept or reject each context's substitution at the current
+  // temperature. For parallel tempering ("replica exchange"), the
+  // contexts of a pose instead each run at a rung of a ladder of
+  // temperatures: context c runs at temperature[0] *
+  // temperature_ladder[replica_rung[c]], and context_energies[c] follows
+  // the energy of its assignment. Without tempering, these three are
+  // empty.
   static auto f(
       TView<Real, 1, tmol::Device::CPU> temperature,
       TView<Real, 3, D> context_coords,
@@ -57,21 +67,89 @@ struct MetropolisAcceptReject {
       TView<Int, 1, D> accept,
       TView<Int, 1, D> block_type_n_atoms,
       Int max_n_atoms,
-      TView<int64_t, 1, tmol::Device::CPU> score_events) -> void;
+      TView<int64_t, 1, tmol::Device::CPU> score_events,
+      TView<Real, 1, D> temperature_ladder,
+      TView<Int, 1, D> replica_rung,
+      TView<Real, 1, D> context_energies) -> void;
+
+  // Propose swapping the rungs of the contexts of each pose that hold
+  // neighboring rungs (rungs 2k + parity and 2k + 1 + parity) and accept
+  // each swap by the Metropolis criterion on their energies. The contexts
+  // keep their assignments; the temperatures move between them.
+  // context_for_rung[p][k] is the context of pose p on rung k.
+  static auto exchange_replicas(
+      TView<Real, 1, tmol::Device::CPU> temperature,
+      TView<Real, 1, D> temperature_ladder,
+      TView<Int, 1, D> replica_rung,
+      TView<Int, 2, D> context_for_rung,
+      TView<Real, 1, D> context_energies,
+      Int parity) -> void;
 };
 
+// The annealing schedule: how many outer iterations to run, how many
+// inner iterations (substitutions per trajectory) to run in each, and the
+// temperature of each outer iteration. The last n_quench_iterations outer
+// iterations are run at a temperature of 0 ("quenched"), accepting only
+// substitutions that lower the energy. The base class cools exponentially
+// from max_temp toward min_temp.
+//
+// A trajectory may also stop early once it has plateaued: once, for
+// patience consecutive outer iterations, it has accepted at most
+// min_accept_rate of its substitutions and its best energy has not dropped
+// by more than energy_tolerance. When every trajectory has plateaued, the
+// annealer skips ahead to the quench iterations (or, when quenching,
+// finishes). A patience of 0 disables early stopping.
 class TemperatureScheduler {
  public:
-  TemperatureScheduler(int n_outer_iterations, float max_temp, float min_temp);
+  TemperatureScheduler(
+      int n_outer_iterations,
+      float max_temp,
+      float min_temp,
+      int n_quench_iterations = 1,
+      float inner_iterations_per_rotamer = 5);
+  virtual ~TemperatureScheduler() = default;
 
   virtual float temp(int outer_iteration) const;
 
   virtual bool quench(int outer_iteration) const;
 
- private:
+  void set_plateau_criteria(
+      float min_accept_rate, float energy_tolerance, int patience);
+
+  int n_outer_iterations() const { return n_iterations_; }
+  int n_quench_iterations() const { return n_quench_iterations_; }
+  int n_inner_iterations(int max_n_rotamers) const;
+
+  bool stops_early() const { return patience_ > 0; }
+  float min_accept_rate() const { return min_accept_rate_; }
+  float energy_tolerance() const { return energy_tolerance_; }
+  int patience() const { return patience_; }
+
+ protected:
   int n_iterations_;
   float max_temp_;
   float min_temp_;
+  int n_quench_iterations_;
+  float inner_iterations_per_rotamer_;
+  float min_accept_rate_;
+  float energy_tolerance_;
+  int patience_;
+};
+
+// Cool linearly from max_temp to min_temp over the iterations before the
+// quench
+class LinearTemperatureScheduler : public TemperatureScheduler {
+ public:
+  using TemperatureScheduler::TemperatureScheduler;
+  float temp(int outer_iteration) const override;
+};
+
+// Cool geometrically from max_temp to min_temp (both positive) over the
+// iterations before the quench
+class GeometricTemperatureScheduler : public TemperatureScheduler {
+ public:
+  using TemperatureScheduler::TemperatureScheduler;
+  float temp(int outer_iteration) const override;
 };
 
 template <
@@ -118,6 +196,9 @@ struct PickRotamersStepRegistrator {
       TView<Int, 1, D> block_ind_for_rot,
       TView<Real, 2, D> rotamer_coords,
       TView<Int, 1, D> rotamer_coord_offsets,
+      TView<Real, 4, D> rotamer_mainchain_coords,
+      TView<Int, 2, D> block_type_sidechain_atom_ind,
+      TView<Int, 2, D> block_type_mainchain_atom_ind,
       TView<Real, 2, D> alternate_coords,
       TView<Int, 1, D> alternate_coord_offsets,
       TView<Int, 2, D> alternate_id,
@@ -151,6 +232,37 @@ struct MetropolisAcceptRejectStepRegistrator {
       TView<int64_t, 1, tmol::Device::CPU> annealer);
 };
 
+// The Metropolis step for parallel tempering: the contexts exchange
+// temperatures every exchange_interval substitutions; see
+// MetropolisAcceptReject::exchange_replicas
+template <
+    template <tmol::Device>
+    class DeviceDispatch,
+    tmol::Device D,
+    typename Real,
+    typename Int>
+struct ReplicaExchangeStepRegistrator {
+  static void f(
+      TView<Real, 1, tmol::Device::CPU> temperature,
+      TView<Real, 3, D> context_coords,
+      TView<Int, 2, D> context_coord_offsets,
+      TView<Int, 2, D> context_block_type,
+      TView<Real, 2, D> alternate_coords,
+      TView<Int, 1, D> alternate_coord_offsets,
+      TView<Int, 2, D> alternate_id,
+      TView<Real, 2, D> rotamer_component_energies,
+      TView<Int, 1, D> accept,
+      TView<Int, 1, D> block_type_n_atoms,
+      Int max_n_atoms,
+      TView<int64_t, 1, tmol::Device::CPU> score_events,
+      TView<Real, 1, D> temperature_ladder,
+      TView<Int, 1, D> replica_rung,
+      TView<Int, 2, D> context_for_rung,
+      TView<Real, 1, D> context_energies,
+      Int exchange_interval,
+      TView<int64_t, 1, tmol::Device::CPU> annealer);
+};
+
 // class PickRotamersStep {
 //  public:
 //   PickRotamersStep(
@@ -220,6 +332,24 @@ class RPECalc {
   virtual void finalize() = 0;
 };
 
+// Follows each trajectory's energy and acceptance rate through annealing
+// to tell when it has plateaued; see TemperatureScheduler. Trajectories
+// that have plateaued ("inactive" ones) reject every substitution.
+class AnnealingProgress {
+ public:
+  virtual ~AnnealingProgress() {}
+  // Mark every trajectory active and forget its history
+  virtual void reset() = 0;
+  // Called between the energy calculations and the Metropolis step
+  virtual void before_accept_reject() = 0;
+  // Called after the Metropolis step
+  virtual void after_accept_reject() = 0;
+  // Called at the end of each outer iteration; returns the number of
+  // trajectories still active
+  virtual int end_outer_iteration(
+      float min_accept_rate, float energy_tolerance, int patience) = 0;
+};
+
 class SimAnnealer {
  public:
   SimAnnealer();
@@ -233,7 +363,15 @@ class SimAnnealer {
 
   virtual void add_score_component(std::shared_ptr<RPECalc> score_calculator);
 
-  virtual void run_annealer();
+  virtual void set_temperature_scheduler(
+      std::shared_ptr<TemperatureScheduler> temp_sched);
+
+  virtual void set_annealing_progress(
+      std::shared_ptr<AnnealingProgress> progress);
+
+  // Returns the number of outer iterations run, fewer than the schedule's
+  // when every trajectory plateaus early
+  virtual int run_annealer();
 
  protected:
   std::shared_ptr<PickRotamersStep> pick_step();
@@ -244,6 +382,8 @@ class SimAnnealer {
   std::shared_ptr<PickRotamersStep> pick_step_;
   std::shared_ptr<MetropolisAcceptRejectStep> acc_rej_step_;
   std::list<std::shared_ptr<RPECalc>> score_calculators_;
+  std::shared_ptr<TemperatureScheduler> temp_sched_;
+  std::shared_ptr<AnnealingProgress> progress_;
 };
 
 }  // namespace compiled
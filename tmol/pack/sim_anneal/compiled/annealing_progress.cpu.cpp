@@ -0,0 +1,35 @@
+#include <tmol/score/common/device_operations.cpu.impl.hh>
+
+#include "annealing_progress.impl.hh"
+
+namespace tmol {
+namespace pack {
+namespace sim_anneal {
+namespace compiled {
+
+template struct AnnealingProgressDispatch<
+    score::common::DeviceOperations,
+    tmol::Device::CPU,
+    float,
+    int32_t>;
+template struct AnnealingProgressDispatch<
+    score::common::DeviceOperations,
+    tmol::Device::CPU,
+    double,
+    int32_t>;
+
+template struct AnnealingProgressRegistrator<
+    score::common::DeviceOperations,
+    tmol::Device::CPU,
+    float,
+    int32_t>;
+template struct AnnealingProgressRegistrator<
+    score::common::DeviceOperations,
+    tmol::Device::CPU,
+    double,
+    int32_t>;
+
+}  // namespace compiled
+}  // namespace sim_anneal
+}  // namespace pack
+}  // namespace tmol
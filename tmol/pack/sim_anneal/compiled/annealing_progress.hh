@@ -0,0 +1,73 @@
+#pragma once
+
+#include <tmol/utility/tensor/TensorAccessor.h>
+#include <tmol/utility/tensor/TensorPack.h>
+
+namespace tmol {
+namespace pack {
+namespace sim_anneal {
+namespace compiled {
+
+// The per-trajectory ("context") kernels behind AnnealingProgress; see
+// annealer.hh. Each context's energy is followed relative to its energy at
+// the start of annealing by summing the energy changes of the
+// substitutions it accepts.
+template <
+    template <tmol::Device>
+    class DeviceOps,
+    tmol::Device D,
+    typename Real,
+    typename Int>
+struct AnnealingProgressDispatch {
+  // Record the change in energy each context's proposed substitution
+  // would make and withdraw the substitutions of the inactive contexts so
+  // that the Metropolis step rejects them
+  static auto before_accept_reject(
+      TView<Real, 2, D> rotamer_component_energies,
+      TView<Int, 2, D> alternate_id,
+      TView<Int, 1, D> active,
+      TView<Real, 1, D> delta_energy) -> void;
+
+  // Fold the accepted substitutions into the contexts' energies, best
+  // energies, and counts of accepted substitutions
+  static auto after_accept_reject(
+      TView<Int, 1, D> accept,
+      TView<Int, 1, D> active,
+      TView<Real, 1, D> delta_energy,
+      TView<Real, 1, D> energy,
+      TView<Real, 1, D> best_energy,
+      TView<Int, 1, D> n_accepted,
+      TView<Int, 1, D> n_steps) -> void;
+
+  // Deactivate the contexts that have plateaued for patience outer
+  // iterations and restart the counts for the next outer iteration
+  static auto end_outer_iteration(
+      Real min_accept_rate,
+      Real energy_tolerance,
+      Int patience,
+      TView<Real, 1, D> best_energy,
+      TView<Real, 1, D> last_best_energy,
+      TView<Int, 1, D> n_accepted,
+      TView<Int, 1, D> n_steps,
+      TView<Int, 1, D> n_stalled,
+      TView<Int, 1, D> active) -> void;
+};
+
+template <
+    template <tmol::Device>
+    class DeviceOps,
+    tmol::Device D,
+    typename Real,
+    typename Int>
+struct AnnealingProgressRegistrator {
+  static auto f(
+      TView<Real, 2, D> rotamer_component_energies,
+      TView<Int, 2, D> alternate_id,
+      TView<Int, 1, D> accept,
+      TView<int64_t, 1, tmol::Device::CPU> annealer) -> void;
+};
+
+}  // namespace compiled
+}  // namespace sim_anneal
+}  // namespace pack
+}  // namespace tmol
@@ -0,0 +1,236 @@
+#pragma once
+
+#include <tmol/utility/tensor/TensorAccessor.h>
+#include <tmol/utility/tensor/TensorPack.h>
+#include <tmol/utility/nvtx.hh>
+
+#include <tmol/score/common/diamond_macros.hh>
+#include <tmol/score/common/launch_box_macros.hh>
+
+#include <tmol/pack/sim_anneal/compiled/annealer.hh>
+
+#include "annealing_progress.hh"
+
+namespace tmol {
+namespace pack {
+namespace sim_anneal {
+namespace compiled {
+
+template <
+    template <tmol::Device>
+    class DeviceOps,
+    tmol::Device D,
+    typename Real,
+    typename Int>
+auto AnnealingProgressDispatch<DeviceOps, D, Real, Int>::before_accept_reject(
+    TView<Real, 2, D> rotamer_component_energies,
+    TView<Int, 2, D> alternate_id,
+    TView<Int, 1, D> active,
+    TView<Real, 1, D> delta_energy) -> void {
+  int const n_contexts = active.size(0);
+  int const n_terms = rotamer_component_energies.size(0);
+
+  assert(rotamer_component_energies.size(1) == 2 * n_contexts);
+  assert(alternate_id.size(0) == 2 * n_contexts);
+  assert(delta_energy.size(0) == n_contexts);
+
+  LAUNCH_BOX_32;
+
+  auto record_for_context = ([=] TMOL_DEVICE_FUNC(int context) {
+    Real delta = 0;
+    for (int ii = 0; ii < n_terms; ++ii) {
+      delta += rotamer_component_energies[ii][2 * context + 1]
+               - rotamer_component_energies[ii][2 * context];
+    }
+    delta_energy[context] = delta;
+    if (!active[context]) {
+      alternate_id[2 * context + 1][1] = -1;
+    }
+  });
+
+  DeviceOps<D>::template forall<launch_t>(n_contexts, record_for_context);
+}
+
+template <
+    template <tmol::Device>
+    class DeviceOps,
+    tmol::Device D,
+    typename Real,
+    typename Int>
+auto AnnealingProgressDispatch<DeviceOps, D, Real, Int>::after_accept_reject(
+    TView<Int, 1, D> accept,
+    TView<Int, 1, D> active,
+    TView<Real, 1, D> delta_energy,
+    TView<Real, 1, D> energy,
+    TView<Real, 1, D> best_energy,
+    TView<Int, 1, D> n_accepted,
+    TView<Int, 1, D> n_steps) -> void {
+  int const n_contexts = active.size(0);
+
+  LAUNCH_BOX_32;
+
+  auto update_for_context = ([=] TMOL_DEVICE_FUNC(int context) {
+    if (!active[context]) {
+      return;
+    }
+    n_steps[context] += 1;
+    if (accept[context]) {
+      Real const context_energy = energy[context] + delta_energy[context];
+      energy[context] = context_energy;
+      if (context_energy < best_energy[context]) {
+        best_energy[context] = context_energy;
+      }
+      n_accepted[context] += 1;
+    }
+  });
+
+  DeviceOps<D>::template forall<launch_t>(n_contexts, update_for_context);
+}
+
+template <
+    template <tmol::Device>
+    class DeviceOps,
+    tmol::Device D,
+    typename Real,
+    typename Int>
+auto AnnealingProgressDispatch<DeviceOps, D, Real, Int>::end_outer_iteration(
+    Real min_accept_rate,
+    Real energy_tolerance,
+    Int patience,
+    TView<Real, 1, D> best_energy,
+    TView<Real, 1, D> last_best_energy,
+    TView<Int, 1, D> n_accepted,
+    TView<Int, 1, D> n_steps,
+    TView<Int, 1, D> n_stalled,
+    TView<Int, 1, D> active) -> void {
+  int const n_contexts = active.size(0);
+
+  LAUNCH_BOX_32;
+
+  auto check_for_context = ([=] TMOL_DEVICE_FUNC(int context) {
+    if (!active[context]) {
+      return;
+    }
+    bool const improved =
+        last_best_energy[context] - best_energy[context] > energy_tolerance;
+    bool const accepting =
+        n_accepted[context] > min_accept_rate * n_steps[context];
+    n_stalled[context] = improved || accepting ? 0 : n_stalled[context] + 1;
+    if (n_stalled[context] >= patience) {
+      active[context] = 0;
+    }
+
+    last_best_energy[context] = best_energy[context];
+    n_accepted[context] = 0;
+    n_steps[context] = 0;
+  });
+
+  DeviceOps<D>::template forall<launch_t>(n_contexts, check_for_context);
+}
+
+template <
+    template <tmol::Device>
+    class DeviceOps,
+    tmol::Device D,
+    typename Real,
+    typename Int>
+class AnnealingProgressTracker : public AnnealingProgress {
+ public:
+  AnnealingProgressTracker(
+      TView<Real, 2, D> rotamer_component_energies,
+      TView<Int, 2, D> alternate_id,
+      TView<Int, 1, D> accept)
+      : rotamer_component_energies_(rotamer_component_energies),
+        alternate_id_(alternate_id),
+        accept_(accept),
+        active_tp_(TPack<Int, 1, D>::zeros({accept.size(0)})),
+        delta_energy_tp_(TPack<Real, 1, D>::zeros({accept.size(0)})),
+        energy_tp_(TPack<Real, 1, D>::zeros({accept.size(0)})),
+        best_energy_tp_(TPack<Real, 1, D>::zeros({accept.size(0)})),
+        last_best_energy_tp_(TPack<Real, 1, D>::zeros({accept.size(0)})),
+        n_accepted_tp_(TPack<Int, 1, D>::zeros({accept.size(0)})),
+        n_steps_tp_(TPack<Int, 1, D>::zeros({accept.size(0)})),
+        n_stalled_tp_(TPack<Int, 1, D>::zeros({accept.size(0)})) {}
+
+  void reset() override {
+    active_tp_.tensor.fill_(1);
+    energy_tp_.tensor.zero_();
+    best_energy_tp_.tensor.zero_();
+    last_best_energy_tp_.tensor.zero_();
+    n_accepted_tp_.tensor.zero_();
+    n_steps_tp_.tensor.zero_();
+    n_stalled_tp_.tensor.zero_();
+  }
+
+  void before_accept_reject() override {
+    AnnealingProgressDispatch<DeviceOps, D, Real, Int>::before_accept_reject(
+        rotamer_component_energies_,
+        alternate_id_,
+        active_tp_.view,
+        delta_energy_tp_.view);
+  }
+
+  void after_accept_reject() override {
+    AnnealingProgressDispatch<DeviceOps, D, Real, Int>::after_accept_reject(
+        accept_,
+        active_tp_.view,
+        delta_energy_tp_.view,
+        energy_tp_.view,
+        best_energy_tp_.view,
+        n_accepted_tp_.view,
+        n_steps_tp_.view);
+  }
+
+  int end_outer_iteration(
+      float min_accept_rate, float energy_tolerance, int patience) override {
+    AnnealingProgressDispatch<DeviceOps, D, Real, Int>::end_outer_iteration(
+        min_accept_rate,
+        energy_tolerance,
+        patience,
+        best_energy_tp_.view,
+        last_best_energy_tp_.view,
+        n_accepted_tp_.view,
+        n_steps_tp_.view,
+        n_stalled_tp_.view,
+        active_tp_.view);
+    return active_tp_.tensor.sum().template item<int64_t>();
+  }
+
+ private:
+  TView<Real, 2, D> rotamer_component_energies_;
+  TView<Int, 2, D> alternate_id_;
+  TView<Int, 1, D> accept_;
+  TPack<Int, 1, D> active_tp_;
+  TPack<Real, 1, D> delta_energy_tp_;
+  TPack<Real, 1, D> energy_tp_;
+  TPack<Real, 1, D> best_energy_tp_;
+  TPack<Real, 1, D> last_best_energy_tp_;
+  TPack<Int, 1, D> n_accepted_tp_;
+  TPack<Int, 1, D> n_steps_tp_;
+  TPack<Int, 1, D> n_stalled_tp_;
+};
+
+template <
+    template <tmol::Device>
+    class DeviceOps,
+    tmol::Device D,
+    typename Real,
+    typename Int>
+auto AnnealingProgressRegistrator<DeviceOps, D, Real, Int>::f(
+    TView<Real, 2, D> rotamer_component_energies,
+    TView<Int, 2, D> alternate_id,
+    TView<Int, 1, D> accept,
+    TView<int64_t, 1, tmol::Device::CPU> annealer) -> void {
+  int64_t annealer_uint = annealer[0];
+  SimAnnealer *sim_annealer = reinterpret_cast<SimAnnealer *>(annealer_uint);
+  std::shared_ptr<AnnealingProgress> progress =
+      std::make_shared<AnnealingProgressTracker<DeviceOps, D, Real, Int>>(
+          rotamer_component_energies, alternate_id, accept);
+
+  sim_annealer->set_annealing_progress(progress);
+}
+
+}  // namespace compiled
+}  // namespace sim_anneal
+}  // namespace pack
+}  // namespace tmol
@@ -30,6 +30,9 @@ struct PickRotamers {
       TView<Int, 1, D> block_ind_for_rot,
       TView<Real, 2, D> rotamer_coords,
       TView<Int, 1, D> rotamer_coord_offsets,
+      TView<Real, 4, D> rotamer_mainchain_coords,
+      TView<Int, 2, D> block_type_sidechain_atom_ind,
+      TView<Int, 2, D> block_type_mainchain_atom_ind,
       TView<Real, 2, D> alternate_coords,
       TView<Int, 1, D> alternate_coord_offsets,
       TView<Int, 2, D> alternate_id,
@@ -42,7 +45,7 @@ struct PickRotamers {
     // int const max_n_blocks = context_coords.size(1);
     int const max_n_blocks = context_coord_offsets.size(1);
     // int const max_n_atoms_per_block = context_coords.size(2);???
-    int const n_poses = pose_id_for_context.size(0);
+    int const n_poses = n_rots_for_pose.size(0);
     int const n_rots = block_type_ind_for_rot.size(0);
 
     assert(context_coords.size(2) == 3);
@@ -50,12 +53,18 @@ struct PickRotamers {
 
     assert(context_block_type.size(0) == n_contexts);
     assert(context_block_type.size(1) == max_n_blocks);
+    assert(pose_id_for_context.size(0) == n_contexts);
     assert(n_rots_for_pose.size(0) == n_poses);
     assert(rot_offset_for_pose.size(0) == n_poses);
     assert(block_type_ind_for_rot.size(0) == n_rots);  // tautological
     assert(block_ind_for_rot.size(0) == n_rots);
     assert(rotamer_coords.size(1) == 3);
     assert(rotamer_coord_offsets.size(0) == n_rots);
+    assert(rotamer_mainchain_coords.size(0) == n_poses);
+    assert(rotamer_mainchain_coords.size(3) == 3);
+    assert(
+        block_type_sidechain_atom_ind.size(0)
+        == block_type_mainchain_atom_ind.size(0));
     assert(random_rots.size(0) == n_contexts);
     assert(alternate_coords.size(1) == 3);
     assert(alternate_coord_offsets.size(0) == 2 * n_contexts);
@@ -119,15 +128,26 @@ struct PickRotamers {
         alternate_coords[alt_offset + atom_id][2] =
             context_coords[i_context][context_offset + atom_id][2];
       } else {
+        // the rotamer's mainchain atoms are shared by every rotamer
+        // at its position; only its sidechain atoms are its own
         int const alt_offset = alternate_coord_offsets[alt_id];
         Int i_rot = random_rots[i_context];
-        int const rotamer_offset = rotamer_coord_offsets[i_rot];
-        alternate_coords[alt_offset + atom_id][0] =
-            rotamer_coords[rotamer_offset + atom_id][0];
-        alternate_coords[alt_offset + atom_id][1] =
-            rotamer_coords[rotamer_offset + atom_id][1];
-        alternate_coords[alt_offset + atom_id][2] =
-            rotamer_coords[rotamer_offset + atom_id][2];
+        Int i_pose = pose_id_for_context[i_context];
+        Int const mc_ind = block_type_mainchain_atom_ind[i_block_type][atom_id];
+        if (mc_ind >= 0) {
+          for (int j = 0; j < 3; ++j) {
+            alternate_coords[alt_offset + atom_id][j] =
+                rotamer_mainchain_coords[i_pose][i_block][mc_ind][j];
+          }
+        } else {
+          Int const sc_ind =
+              block_type_sidechain_atom_ind[i_block_type][atom_id];
+          int const rotamer_offset = rotamer_coord_offsets[i_rot] + sc_ind;
+          for (int j = 0; j < 3; ++j) {
+            alternate_coords[alt_offset + atom_id][j] =
+                rotamer_coords[rotamer_offset][j];
+          }
+        }
       }
     };
 
@@ -155,8 +175,10 @@ struct MetropolisAcceptReject {
       TView<Int, 1, D> accept,
       TView<Int, 1, D> block_type_n_atoms,
       Int max_n_atoms_per_block,
-      TView<int64_t, 1, tmol::Device::CPU> /*score_events*/
-      ) -> void {
+      TView<int64_t, 1, tmol::Device::CPU> /*score_events*/,
+      TView<Real, 1, D> temperature_ladder,
+      TView<Int, 1, D> replica_rung,
+      TView<Real, 1, D> context_energies) -> void {
     int const n_contexts = context_coords.size(0);
     int const n_terms = rotamer_component_energies.size(0);
     // int const max_n_atoms = context_coords.size(2);
@@ -168,6 +190,9 @@ struct MetropolisAcceptReject {
     assert(alternate_coord_offsets.size(0) == 2 * n_contexts);
     assert(alternate_id.size(0) == 2 * n_contexts);
     assert(accept.size(0) == n_contexts);
+    bool const tempering = temperature_ladder.size(0) > 0;
+    assert(!tempering || replica_rung.size(0) == n_contexts);
+    assert(!tempering || context_energies.size(0) == n_contexts);
 
     auto accept_reject = [=](int i) {
       Real altE = 0;
@@ -181,11 +206,19 @@ struct MetropolisAcceptReject {
       Real deltaE = altE - currE;
       Real rand_unif = ((Real)rand()) / RAND_MAX;
       Real temp = temperature[0];
-      Real prob_accept = std::exp(-1 * deltaE / temp);
-      accept[i] = deltaE < 0 || rand_unif < prob_accept;
+      if (tempering) {
+        temp *= temperature_ladder[replica_rung[i]];
+      }
+      Real prob_accept = temp > 0 ? std::exp(-1 * deltaE / temp) : 0;
+      // contexts without rotamers have no substitution to accept
+      accept[i] = alternate_id[2 * i + 1][1] != -1
+                  && (deltaE < 0 || rand_unif < prob_accept);
       if (accept[i]) {
         int block_id = alternate_id[2 * i + 1][1];
         context_block_type[i][block_id] = alternate_id[2 * i + 1][2];
+        if (tempering) {
+          context_energies[i] += deltaE;
+        }
       }
     };
 
@@ -216,6 +249,51 @@ struct MetropolisAcceptReject {
         n_contexts * max_n_atoms_per_block, copy_accepted_coords);
     return;
   }
+
+  static auto exchange_replicas(
+      TView<Real, 1, tmol::Device::CPU> temperature,
+      TView<Real, 1, D> temperature_ladder,
+      TView<Int, 1, D> replica_rung,
+      TView<Int, 2, D> context_for_rung,
+      TView<Real, 1, D> context_energies,
+      Int parity) -> void {
+    int const n_poses = context_for_rung.size(0);
+    int const n_rungs = context_for_rung.size(1);
+    int const n_pairs = (n_rungs - parity) / 2;
+
+    assert(temperature_ladder.size(0) == n_rungs);
+    assert(replica_rung.size(0) == context_energies.size(0));
+
+    Real const temp = temperature[0];
+    if (temp <= 0 || n_pairs <= 0) {
+      // quenching: every rung is at a temperature of 0
+      return;
+    }
+
+    auto exchange = [=](int i) {
+      int const pose = i / n_pairs;
+      int const lo_rung = 2 * (i % n_pairs) + parity;
+      int const hi_rung = lo_rung + 1;
+      Int const lo_context = context_for_rung[pose][lo_rung];
+      Int const hi_context = context_for_rung[pose][hi_rung];
+
+      Real const delta_beta = 1 / (temp * temperature_ladder[lo_rung])
+                              - 1 / (temp * temperature_ladder[hi_rung]);
+      Real const delta_energy =
+          context_energies[hi_context] - context_energies[lo_context];
+      // accept with probability min(1, exp(delta_beta * -delta_energy))
+      Real const log_prob_accept = -1 * delta_beta * delta_energy;
+      Real rand_unif = ((Real)rand()) / RAND_MAX;
+      if (log_prob_accept >= 0 || rand_unif < std::exp(log_prob_accept)) {
+        context_for_rung[pose][lo_rung] = hi_context;
+        context_for_rung[pose][hi_rung] = lo_context;
+        replica_rung[lo_context] = hi_rung;
+        replica_rung[hi_context] = lo_rung;
+      }
+    };
+
+    Dispatch<D>::forall(n_poses * n_pairs, exchange);
+  }
 };
 
 template <
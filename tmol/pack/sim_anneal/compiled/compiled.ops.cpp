@@ -9,9 +9,11 @@
 #include <tmol/utility/tensor/TensorCast.h>
 #include <tmol/utility/function_dispatch/aten.hh>
 
+#include <tmol/score/common/device_operations.hh>
 #include <tmol/score/common/forall_dispatch.hh>
 
 #include "annealer.hh"
+#include "interaction_graph.hh"
 #include "simulated_annealing.hh"
 
 namespace tmol {
@@ -80,6 +82,9 @@ Tensor register_standard_random_rotamer_picker(
     Tensor block_ind_for_rot,
     Tensor rotamer_coords,
     Tensor rotamer_coord_offsets,
+    Tensor rotamer_mainchain_coords,
+    Tensor block_type_sidechain_atom_ind,
+    Tensor block_type_mainchain_atom_ind,
     Tensor alternate_coords,
     Tensor alternate_coord_offsets,
     Tensor alternate_id,
@@ -107,6 +112,9 @@ Tensor register_standard_random_rotamer_picker(
               TCAST(block_ind_for_rot),
               TCAST(rotamer_coords),
               TCAST(rotamer_coord_offsets),
+              TCAST(rotamer_mainchain_coords),
+              TCAST(block_type_sidechain_atom_ind),
+              TCAST(block_type_mainchain_atom_ind),
               TCAST(alternate_coords),
               TCAST(alternate_coord_offsets),
               TCAST(alternate_id),
@@ -182,15 +190,163 @@ Tensor register_standard_metropolis_accept_or_rejector(
   return annealer;
 }
 
-Tensor run_sim_annealing(Tensor annealer) {
+Tensor register_replica_exchange_metropolis_accept_or_rejector(
+    Tensor temperature,
+    Tensor context_coords,
+    Tensor context_coord_offsets,
+    Tensor context_block_type,
+    Tensor alternate_coords,
+    Tensor alternate_coord_offsets,
+    Tensor alternate_ids,
+    Tensor rotamer_component_energies,
+    Tensor accepted,
+    Tensor block_type_n_atoms,
+    int64_t max_n_atoms,
+    Tensor score_events,
+    Tensor temperature_ladder,
+    Tensor replica_rung,
+    Tensor context_for_rung,
+    Tensor context_energies,
+    int64_t exchange_interval,
+    Tensor annealer) {
+  using Int = int32_t;
+  try {
+    TMOL_DISPATCH_FLOATING_DEVICE(
+        context_coords.type(), "register_replica_exchange", ([&] {
+          using Real = scalar_t;
+          constexpr tmol::Device Dev = device_t;
+
+          using tmol::score::common::ForallDispatch;
+          ReplicaExchangeStepRegistrator<ForallDispatch, Dev, Real, Int>::f(
+              TCAST(temperature),
+              TCAST(context_coords),
+              TCAST(context_coord_offsets),
+              TCAST(context_block_type),
+              TCAST(alternate_coords),
+              TCAST(alternate_coord_offsets),
+              TCAST(alternate_ids),
+              TCAST(rotamer_component_energies),
+              TCAST(accepted),
+              TCAST(block_type_n_atoms),
+              Int(max_n_atoms),
+              TCAST(score_events),
+              TCAST(temperature_ladder),
+              TCAST(replica_rung),
+              TCAST(context_for_rung),
+              TCAST(context_energies),
+              Int(exchange_interval),
+              TCAST(annealer));
+        }));
+  } catch (at::Error err) {
+    std::cerr << "caught exception:\n"
+              << err.what_without_backtrace() << std::endl;
+    throw err;
+  } catch (c10::Error err) {
+    std::cerr << "caught exception:\n"
+              << err.what_without_backtrace() << std::endl;
+    throw err;
+  }
+
+  return annealer;
+}
+
+Tensor register_interaction_graph_rotamer_pair_energy_eval(
+    Tensor context_rot_for_block,
+    Tensor accepted,
+    Tensor pose_id_for_context,
+    Tensor random_rotamers,
+    Tensor block_ind_for_rot,
+    Tensor n_rots_for_block,
+    Tensor rot_offset_for_block,
+    Tensor energy1b,
+    Tensor pair_neighbors,
+    Tensor pair_offsets,
+    Tensor energy2b,
+    Tensor output_energies,
+    Tensor annealer) {
+  using Int = int32_t;
+  try {
+    TMOL_DISPATCH_FLOATING_DEVICE(
+        energy1b.type(), "register_ig_rpe", ([&] {
+          using Real = scalar_t;
+          constexpr tmol::Device Dev = device_t;
+
+          using tmol::score::common::DeviceOperations;
+          InteractionGraphRPERegistrator<DeviceOperations, Dev, Real, Int>::f(
+              TCAST(context_rot_for_block),
+              TCAST(accepted),
+              TCAST(pose_id_for_context),
+              TCAST(random_rotamers),
+              TCAST(block_ind_for_rot),
+              TCAST(n_rots_for_block),
+              TCAST(rot_offset_for_block),
+              TCAST(energy1b),
+              TCAST(pair_neighbors),
+              TCAST(pair_offsets),
+              TCAST(energy2b),
+              TCAST(output_energies),
+              TCAST(annealer));
+        }));
+  } catch (at::Error err) {
+    std::cerr << "caught exception:\n"
+              << err.what_without_backtrace() << std::endl;
+    throw err;
+  } catch (c10::Error err) {
+    std::cerr << "caught exception:\n"
+              << err.what_without_backtrace() << std::endl;
+    throw err;
+  }
+
+  return annealer;
+}
+
+// cooling: 0 for exponential, 1 for linear, 2 for geometric; see
+// tmol.pack.sim_anneal.schedule.Cooling
+Tensor set_sim_annealer_schedule(
+    Tensor annealer,
+    int64_t cooling,
+    int64_t n_outer_iterations,
+    int64_t n_quench_iterations,
+    double inner_iterations_per_rotamer,
+    double max_temp,
+    double min_temp,
+    double min_accept_rate,
+    double energy_tolerance,
+    int64_t patience) {
   try {
     auto annealer_tp = TPack<int64_t, 1, tmol::Device::CPU>(
         annealer,
         view_tensor<int64_t, 1, tmol::Device::CPU>(annealer, "annealer"));
 
+    std::shared_ptr<TemperatureScheduler> temp_sched;
+    if (cooling == 1) {
+      temp_sched = std::make_shared<LinearTemperatureScheduler>(
+          n_outer_iterations,
+          max_temp,
+          min_temp,
+          n_quench_iterations,
+          inner_iterations_per_rotamer);
+    } else if (cooling == 2) {
+      temp_sched = std::make_shared<GeometricTemperatureScheduler>(
+          n_outer_iterations,
+          max_temp,
+          min_temp,
+          n_quench_iterations,
+          inner_iterations_per_rotamer);
+    } else {
+      temp_sched = std::make_shared<TemperatureScheduler>(
+          n_outer_iterations,
+          max_temp,
+          min_temp,
+          n_quench_iterations,
+          inner_iterations_per_rotamer);
+    }
+    temp_sched->set_plateau_criteria(
+        min_accept_rate, energy_tolerance, patience);
+
     int64_t annealer_uint = annealer_tp.view[0];
     SimAnnealer *sim_annealer = reinterpret_cast<SimAnnealer *>(annealer_uint);
-    sim_annealer->run_annealer();
+    sim_annealer->set_temperature_scheduler(temp_sched);
   } catch (at::Error err) {
     std::cerr << "caught exception:\n"
               << err.what_without_backtrace() << std::endl;
@@ -203,6 +359,29 @@ Tensor run_sim_annealing(Tensor annealer) {
   return annealer;
 }
 
+// Returns the number of outer iterations the annealer ran
+Tensor run_sim_annealing(Tensor annealer) {
+  auto n_outer_cycles_run = TPack<int64_t, 1, tmol::Device::CPU>::zeros({1});
+  try {
+    auto annealer_tp = TPack<int64_t, 1, tmol::Device::CPU>(
+        annealer,
+        view_tensor<int64_t, 1, tmol::Device::CPU>(annealer, "annealer"));
+
+    int64_t annealer_uint = annealer_tp.view[0];
+    SimAnnealer *sim_annealer = reinterpret_cast<SimAnnealer *>(annealer_uint);
+    n_outer_cycles_run.view[0] = sim_annealer->run_annealer();
+  } catch (at::Error err) {
+    std::cerr << "caught exception:\n"
+              << err.what_without_backtrace() << std::endl;
+    throw err;
+  } catch (c10::Error err) {
+    std::cerr << "caught exception:\n"
+              << err.what_without_backtrace() << std::endl;
+    throw err;
+  }
+  return n_outer_cycles_run.tensor;
+}
+
 template <template <tmol::Device> class DispatchMethod>
 Tensor pick_random_rotamers(
     Tensor context_coords,
@@ -215,6 +394,9 @@ Tensor pick_random_rotamers(
     Tensor block_ind_for_rot,
     Tensor rotamer_coords,
     Tensor rotamer_coord_offsets,
+    Tensor rotamer_mainchain_coords,
+    Tensor block_type_sidechain_atom_ind,
+    Tensor block_type_mainchain_atom_ind,
     Tensor alternate_coords,
     Tensor alternate_coord_offsets,
     Tensor alternate_id,
@@ -242,6 +424,9 @@ Tensor pick_random_rotamers(
               TCAST(block_ind_for_rot),
               TCAST(rotamer_coords),
               TCAST(rotamer_coord_offsets),
+              TCAST(rotamer_mainchain_coords),
+              TCAST(block_type_sidechain_atom_ind),
+              TCAST(block_type_mainchain_atom_ind),
               TCAST(alternate_coords),
               TCAST(alternate_coord_offsets),
               TCAST(alternate_id),
@@ -297,7 +482,10 @@ Tensor metropolis_accept_reject(
               TCAST(accepted),
               TCAST(block_type_n_atoms),
               Int(max_n_atoms),
-              empty_score_event_tensor.view);
+              empty_score_event_tensor.view,
+              TView<Real, 1, Dev>(),
+              TView<Int, 1, Dev>(),
+              TView<Real, 1, Dev>());
         }));
   } catch (at::Error err) {
     std::cerr << "caught exception:\n"
@@ -330,6 +518,13 @@ TORCH_LIBRARY_(TORCH_EXTENSION_NAME, m) {
   m.def(
       "register_standard_metropolis_accept_or_rejector",
       &register_standard_metropolis_accept_or_rejector);
+  m.def(
+      "register_replica_exchange_metropolis_accept_or_rejector",
+      &register_replica_exchange_metropolis_accept_or_rejector);
+  m.def(
+      "register_interaction_graph_rotamer_pair_energy_eval",
+      &register_interaction_graph_rotamer_pair_energy_eval);
+  m.def("set_sim_annealer_schedule", &set_sim_annealer_schedule);
   m.def("run_sim_annealing", &run_sim_annealing);
 }
 
@@ -9,9 +9,13 @@ load(
             [
                 "annealer.cpu.cpp",
                 "annealer.cuda.cu",
+                "annealing_progress.cpu.cpp",
+                "annealing_progress.cuda.cu",
                 "compiled.ops.cpp",
                 "compiled.cpu.cpp",
                 "compiled.cuda.cu",
+                "interaction_graph.cpu.cpp",
+                "interaction_graph.cuda.cu",
             ],
         )
     ),
@@ -28,4 +32,11 @@ register_standard_random_rotamer_picker = _ops.register_standard_random_rotamer_
 register_standard_metropolis_accept_or_rejector = (
     _ops.register_standard_metropolis_accept_or_rejector
 )
+register_replica_exchange_metropolis_accept_or_rejector = (
+    _ops.register_replica_exchange_metropolis_accept_or_rejector
+)
+register_interaction_graph_rotamer_pair_energy_eval = (
+    _ops.register_interaction_graph_rotamer_pair_energy_eval
+)
+set_sim_annealer_schedule = _ops.set_sim_annealer_schedule
 run_sim_annealing = _ops.run_sim_annealing
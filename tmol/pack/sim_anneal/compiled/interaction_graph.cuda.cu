@@ -0,0 +1,35 @@
+#include <tmol/score/common/device_operations.cuda.impl.cuh>
+
+#include "interaction_graph.impl.hh"
+
+namespace tmol {
+namespace pack {
+namespace sim_anneal {
+namespace compiled {
+
+template struct InteractionGraphRPEDispatch<
+    score::common::DeviceOperations,
+    tmol::Device::CUDA,
+    float,
+    int32_t>;
+template struct InteractionGraphRPEDispatch<
+    score::common::DeviceOperations,
+    tmol::Device::CUDA,
+    double,
+    int32_t>;
+
+template struct InteractionGraphRPERegistrator<
+    score::common::DeviceOperations,
+    tmol::Device::CUDA,
+    float,
+    int32_t>;
+template struct InteractionGraphRPERegistrator<
+    score::common::DeviceOperations,
+    tmol::Device::CUDA,
+    double,
+    int32_t>;
+
+}  // namespace compiled
+}  // namespace sim_anneal
+}  // namespace pack
+}  // namespace tmol
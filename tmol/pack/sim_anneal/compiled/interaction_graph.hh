@@ -0,0 +1,82 @@
+#pragma once
+
+#include <tmol/utility/tensor/TensorAccessor.h>
+#include <tmol/utility/tensor/TensorPack.h>
+
+namespace tmol {
+namespace pack {
+namespace sim_anneal {
+namespace compiled {
+
+// Evaluate the energies of the current and alternate rotamers of each
+// trajectory ("context") by looking them up in a precomputed interaction
+// graph (see tmol.pack.interaction_graph) rather than by recomputing them
+// from the rotamers' coordinates. The rotamer each context has assigned
+// to each block is tracked in context_rot_for_block (-1 for fixed
+// blocks); since the energies are computed before the Metropolis step
+// decides which substitutions to accept, the substitution proposed in
+// the previous step, held in last_rots, is folded into
+// context_rot_for_block first if it was accepted.
+//
+// The energy of rotamer r at block i is its one-body energy plus its
+// two-body energies with the rotamers assigned to i's neighbors. The
+// current rotamer's energy is added to output[2 * context] and the
+// alternate rotamer's energy to output[2 * context + 1].
+template <
+    template <tmol::Device>
+    class DeviceOps,
+    tmol::Device D,
+    typename Real,
+    typename Int>
+struct InteractionGraphRPEDispatch {
+  static auto f(
+      TView<Int, 2, D> context_rot_for_block,
+      TView<Int, 1, D> last_rots,
+      TView<Int, 1, D> accept,
+      TView<Int, 1, D> pose_id_for_context,
+      TView<Int, 1, D> random_rots,
+      TView<Int, 1, D> block_ind_for_rot,
+      TView<Int, 2, D> n_rots_for_block,
+      TView<Int, 2, D> rot_offset_for_block,
+      TView<Real, 1, D> energy1b,
+      TView<Int, 3, D> pair_neighbors,
+      TView<int64_t, 3, D> pair_offsets,
+      TView<Real, 1, D> energy2b,
+      TView<Real, 1, D> output) -> void;
+
+  // Fold the last proposed substitutions, if accepted, into
+  // context_rot_for_block once annealing has finished
+  static auto commit_accepted(
+      TView<Int, 2, D> context_rot_for_block,
+      TView<Int, 1, D> last_rots,
+      TView<Int, 1, D> accept,
+      TView<Int, 1, D> block_ind_for_rot) -> void;
+};
+
+template <
+    template <tmol::Device>
+    class DeviceOps,
+    tmol::Device D,
+    typename Real,
+    typename Int>
+struct InteractionGraphRPERegistrator {
+  static auto f(
+      TView<Int, 2, D> context_rot_for_block,
+      TView<Int, 1, D> accept,
+      TView<Int, 1, D> pose_id_for_context,
+      TView<Int, 1, D> random_rots,
+      TView<Int, 1, D> block_ind_for_rot,
+      TView<Int, 2, D> n_rots_for_block,
+      TView<Int, 2, D> rot_offset_for_block,
+      TView<Real, 1, D> energy1b,
+      TView<Int, 3, D> pair_neighbors,
+      TView<int64_t, 3, D> pair_offsets,
+      TView<Real, 1, D> energy2b,
+      TView<Real, 1, D> output,
+      TView<int64_t, 1, tmol::Device::CPU> annealer) -> void;
+};
+
+}  // namespace compiled
+}  // namespace sim_anneal
+}  // namespace pack
+}  // namespace tmol
@@ -0,0 +1,294 @@
+#pragma once
+
+#include <tmol/utility/tensor/TensorAccessor.h>
+#include <tmol/utility/tensor/TensorPack.h>
+#include <tmol/utility/nvtx.hh>
+
+#include <tmol/score/common/diamond_macros.hh>
+#include <tmol/score/common/launch_box_macros.hh>
+
+#include <tmol/pack/sim_anneal/compiled/annealer.hh>
+
+#include "interaction_graph.hh"
+
+namespace tmol {
+namespace pack {
+namespace sim_anneal {
+namespace compiled {
+
+template <tmol::Device D, typename Int>
+TMOL_DEVICE_FUNC void commit_substitution(
+    int context,
+    TView<Int, 2, D> context_rot_for_block,
+    TView<Int, 1, D> last_rots,
+    TView<Int, 1, D> accept,
+    TView<Int, 1, D> block_ind_for_rot) {
+  Int const rot = last_rots[context];
+  if (rot >= 0 && accept[context]) {
+    context_rot_for_block[context][block_ind_for_rot[rot]] = rot;
+  }
+}
+
+// The energy of rotamer rot at block block in a context: its one-body
+// energy plus its two-body energies with the rotamers the context has
+// assigned to the block's neighbors
+template <tmol::Device D, typename Real, typename Int>
+TMOL_DEVICE_FUNC Real rotamer_energy(
+    int context,
+    int pose,
+    int block,
+    int rot,
+    TView<Int, 2, D> context_rot_for_block,
+    TView<Int, 2, D> n_rots_for_block,
+    TView<Int, 2, D> rot_offset_for_block,
+    TView<Real, 1, D> energy1b,
+    TView<Int, 3, D> pair_neighbors,
+    TView<int64_t, 3, D> pair_offsets,
+    TView<Real, 1, D> energy2b) {
+  int const max_n_neighbors = pair_neighbors.size(2);
+  int const n_rots = n_rots_for_block[pose][block];
+  int const local_rot = rot - rot_offset_for_block[pose][block];
+
+  Real energy = energy1b[rot];
+  for (int ii = 0; ii < max_n_neighbors; ++ii) {
+    int const neighb = pair_neighbors[pose][block][ii];
+    if (neighb < 0) {
+      break;
+    }
+    int const neighb_rot = context_rot_for_block[context][neighb];
+    if (neighb_rot < 0) {
+      continue;
+    }
+    int const neighb_n_rots = n_rots_for_block[pose][neighb];
+    int const neighb_local_rot =
+        neighb_rot - rot_offset_for_block[pose][neighb];
+
+    // the table for a block pair is laid out with the rotamers of the
+    // lower-indexed block along its rows
+    int64_t const offset = pair_offsets[pose][block][ii];
+    energy +=
+        block < neighb
+            ? energy2b[offset + local_rot * neighb_n_rots + neighb_local_rot]
+            : energy2b[offset + neighb_local_rot * n_rots + local_rot];
+  }
+  return energy;
+}
+
+template <
+    template <tmol::Device>
+    class DeviceOps,
+    tmol::Device D,
+    typename Real,
+    typename Int>
+auto InteractionGraphRPEDispatch<DeviceOps, D, Real, Int>::f(
+    TView<Int, 2, D> context_rot_for_block,
+    TView<Int, 1, D> last_rots,
+    TView<Int, 1, D> accept,
+    TView<Int, 1, D> pose_id_for_context,
+    TView<Int, 1, D> random_rots,
+    TView<Int, 1, D> block_ind_for_rot,
+    TView<Int, 2, D> n_rots_for_block,
+    TView<Int, 2, D> rot_offset_for_block,
+    TView<Real, 1, D> energy1b,
+    TView<Int, 3, D> pair_neighbors,
+    TView<int64_t, 3, D> pair_offsets,
+    TView<Real, 1, D> energy2b,
+    TView<Real, 1, D> output) -> void {
+  NVTXRange _function(__FUNCTION__);
+
+  int const n_contexts = context_rot_for_block.size(0);
+
+  assert(last_rots.size(0) == n_contexts);
+  assert(accept.size(0) == n_contexts);
+  assert(pose_id_for_context.size(0) == n_contexts);
+  assert(random_rots.size(0) == n_contexts);
+  assert(pair_offsets.size(0) == pair_neighbors.size(0));
+  assert(pair_offsets.size(2) == pair_neighbors.size(2));
+  assert(output.size(0) == 2 * n_contexts);
+
+  LAUNCH_BOX_32;
+
+  auto eval_for_context = ([=] TMOL_DEVICE_FUNC(int context) {
+    commit_substitution<D, Int>(
+        context, context_rot_for_block, last_rots, accept, block_ind_for_rot);
+
+    Int const alt_rot = random_rots[context];
+    last_rots[context] = alt_rot;
+    if (alt_rot < 0) {
+      return;
+    }
+
+    int const pose = pose_id_for_context[context];
+    int const block = block_ind_for_rot[alt_rot];
+    int const curr_rot = context_rot_for_block[context][block];
+
+    auto energy = [&](int rot) {
+      return rotamer_energy<D, Real, Int>(
+          context,
+          pose,
+          block,
+          rot,
+          context_rot_for_block,
+          n_rots_for_block,
+          rot_offset_for_block,
+          energy1b,
+          pair_neighbors,
+          pair_offsets,
+          energy2b);
+    };
+    output[2 * context] += energy(curr_rot);
+    output[2 * context + 1] += energy(alt_rot);
+  });
+
+  // each context reads and writes only its own entries
+  DeviceOps<D>::template forall<launch_t>(
+      n_contexts,
+      eval_for_context,
+      DeviceOps<D>::parallel_accumulation_targets());
+}
+
+template <
+    template <tmol::Device>
+    class DeviceOps,
+    tmol::Device D,
+    typename Real,
+    typename Int>
+auto InteractionGraphRPEDispatch<DeviceOps, D, Real, Int>::commit_accepted(
+    TView<Int, 2, D> context_rot_for_block,
+    TView<Int, 1, D> last_rots,
+    TView<Int, 1, D> accept,
+    TView<Int, 1, D> block_ind_for_rot) -> void {
+  int const n_contexts = context_rot_for_block.size(0);
+
+  LAUNCH_BOX_32;
+
+  auto commit_for_context = ([=] TMOL_DEVICE_FUNC(int context) {
+    commit_substitution<D, Int>(
+        context, context_rot_for_block, last_rots, accept, block_ind_for_rot);
+    last_rots[context] = -1;
+  });
+
+  DeviceOps<D>::template forall<launch_t>(n_contexts, commit_for_context);
+}
+
+template <
+    template <tmol::Device>
+    class DeviceOps,
+    tmol::Device D,
+    typename Real,
+    typename Int>
+class InteractionGraphRPECalc : public RPECalc {
+ public:
+  InteractionGraphRPECalc(
+      TView<Int, 2, D> context_rot_for_block,
+      TView<Int, 1, D> accept,
+      TView<Int, 1, D> pose_id_for_context,
+      TView<Int, 1, D> random_rots,
+      TView<Int, 1, D> block_ind_for_rot,
+      TView<Int, 2, D> n_rots_for_block,
+      TView<Int, 2, D> rot_offset_for_block,
+      TView<Real, 1, D> energy1b,
+      TView<Int, 3, D> pair_neighbors,
+      TView<int64_t, 3, D> pair_offsets,
+      TView<Real, 1, D> energy2b,
+      TView<Real, 1, D> output)
+      : context_rot_for_block_(context_rot_for_block),
+        last_rots_tp_(
+            TPack<Int, 1, D>::full({context_rot_for_block.size(0)}, Int(-1))),
+        accept_(accept),
+        pose_id_for_context_(pose_id_for_context),
+        random_rots_(random_rots),
+        block_ind_for_rot_(block_ind_for_rot),
+        n_rots_for_block_(n_rots_for_block),
+        rot_offset_for_block_(rot_offset_for_block),
+        energy1b_(energy1b),
+        pair_neighbors_(pair_neighbors),
+        pair_offsets_(pair_offsets),
+        energy2b_(energy2b),
+        output_(output) {}
+
+  void calc_energies() override {
+    InteractionGraphRPEDispatch<DeviceOps, D, Real, Int>::f(
+        context_rot_for_block_,
+        last_rots_tp_.view,
+        accept_,
+        pose_id_for_context_,
+        random_rots_,
+        block_ind_for_rot_,
+        n_rots_for_block_,
+        rot_offset_for_block_,
+        energy1b_,
+        pair_neighbors_,
+        pair_offsets_,
+        energy2b_,
+        output_);
+  }
+
+  void finalize() override {
+    InteractionGraphRPEDispatch<DeviceOps, D, Real, Int>::commit_accepted(
+        context_rot_for_block_,
+        last_rots_tp_.view,
+        accept_,
+        block_ind_for_rot_);
+  }
+
+ private:
+  TView<Int, 2, D> context_rot_for_block_;
+  TPack<Int, 1, D> last_rots_tp_;
+  TView<Int, 1, D> accept_;
+  TView<Int, 1, D> pose_id_for_context_;
+  TView<Int, 1, D> random_rots_;
+  TView<Int, 1, D> block_ind_for_rot_;
+  TView<Int, 2, D> n_rots_for_block_;
+  TView<Int, 2, D> rot_offset_for_block_;
+  TView<Real, 1, D> energy1b_;
+  TView<Int, 3, D> pair_neighbors_;
+  TView<int64_t, 3, D> pair_offsets_;
+  TView<Real, 1, D> energy2b_;
+  TView<Real, 1, D> output_;
+};
+
+template <
+    template <tmol::Device>
+    class DeviceOps,
+    tmol::Device D,
+    typename Real,
+    typename Int>
+auto InteractionGraphRPERegistrator<DeviceOps, D, Real, Int>::f(
+    TView<Int, 2, D> context_rot_for_block,
+    TView<Int, 1, D> accept,
+    TView<Int, 1, D> pose_id_for_context,
+    TView<Int, 1, D> random_rots,
+    TView<Int, 1, D> block_ind_for_rot,
+    TView<Int, 2, D> n_rots_for_block,
+    TView<Int, 2, D> rot_offset_for_block,
+    TView<Real, 1, D> energy1b,
+    TView<Int, 3, D> pair_neighbors,
+    TView<int64_t, 3, D> pair_offsets,
+    TView<Real, 1, D> energy2b,
+    TView<Real, 1, D> output,
+    TView<int64_t, 1, tmol::Device::CPU> annealer) -> void {
+  int64_t annealer_uint = annealer[0];
+  SimAnnealer *sim_annealer = reinterpret_cast<SimAnnealer *>(annealer_uint);
+  std::shared_ptr<RPECalc> calc =
+      std::make_shared<InteractionGraphRPECalc<DeviceOps, D, Real, Int>>(
+          context_rot_for_block,
+          accept,
+          pose_id_for_context,
+          random_rots,
+          block_ind_for_rot,
+          n_rots_for_block,
+          rot_offset_for_block,
+          energy1b,
+          pair_neighbors,
+          pair_offsets,
+          energy2b,
+          output);
+
+  sim_annealer->add_score_component(calc);
+}
+
+}  // namespace compiled
+}  // namespace sim_anneal
+}  // namespace pack
+}  // namespace tmol
@@ -0,0 +1,125 @@
+"""The schedule by which the simulated annealer cools.
+
+An AnnealingSchedule runs n_outer_cycles outer cycles, each of
+inner_cycles_per_rotamer * (the most rotamers any pose has) substitution
+attempts per trajectory. The temperature falls from max_temperature to
+min_temperature over the outer cycles, and the last n_quench_cycles are
+run at a temperature of 0 ("quenched"), accepting only substitutions that
+lower the energy.
+
+With a patience above 0, a trajectory stops early once it has plateaued:
+once, for patience consecutive outer cycles, it has accepted at most
+min_accept_rate of its substitution attempts and its best energy has not
+dropped by more than energy_tolerance. Once every trajectory has
+plateaued, the annealer moves on to the quench cycles.
+
+A ReplicaExchange instead spreads the trajectories of each pose across a
+ladder of temperatures that they trade among themselves.
+"""
+
+import attr
+import enum
+import torch
+
+from tmol.pack.sim_anneal.compiled.compiled import set_sim_annealer_schedule
+
+
+class Cooling(enum.IntEnum):
+    # the annealer's original schedule: T_i = min_T + (max_T - min_T) * exp(-i)
+    exponential = 0
+    linear = enum.auto()
+    geometric = enum.auto()
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class AnnealingSchedule:
+    cooling: Cooling = Cooling.exponential
+    n_outer_cycles: int = 20
+    n_quench_cycles: int = 1
+    inner_cycles_per_rotamer: float = 5.0
+    max_temperature: float = 100.0
+    min_temperature: float = 0.3
+    patience: int = 0
+    min_accept_rate: float = 0.0
+    energy_tolerance: float = 0.0
+
+    def __attrs_post_init__(self):
+        if self.n_outer_cycles < 1:
+            raise ValueError("an AnnealingSchedule needs at least one outer cycle")
+        if not 0 <= self.n_quench_cycles <= self.n_outer_cycles:
+            raise ValueError(
+                "n_quench_cycles must be between 0 and n_outer_cycles, not %d"
+                % self.n_quench_cycles
+            )
+        if self.inner_cycles_per_rotamer <= 0:
+            raise ValueError("inner_cycles_per_rotamer must be positive")
+        if self.min_temperature > self.max_temperature:
+            raise ValueError("min_temperature must not exceed max_temperature")
+        if self.cooling == Cooling.geometric and self.min_temperature <= 0:
+            raise ValueError("geometric cooling needs a positive min_temperature")
+        if self.patience < 0:
+            raise ValueError("patience must not be negative")
+
+    @classmethod
+    def linear(cls, **kwargs):
+        return cls(cooling=Cooling.linear, **kwargs)
+
+    @classmethod
+    def geometric(cls, **kwargs):
+        return cls(cooling=Cooling.geometric, **kwargs)
+
+    @classmethod
+    def quench(cls, n_cycles: int = 1, **kwargs):
+        """A refinement schedule that only ever accepts downhill substitutions"""
+        return cls(n_outer_cycles=n_cycles, n_quench_cycles=n_cycles, **kwargs)
+
+    @property
+    def stops_early(self) -> bool:
+        return self.patience > 0
+
+    def set_for_annealer(self, annealer: torch.Tensor):
+        """Have the annealer created into annealer follow this schedule"""
+        set_sim_annealer_schedule(
+            annealer,
+            int(self.cooling),
+            self.n_outer_cycles,
+            self.n_quench_cycles,
+            self.inner_cycles_per_rotamer,
+            self.max_temperature,
+            self.min_temperature,
+            self.min_accept_rate,
+            self.energy_tolerance,
+            self.patience,
+        )
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class ReplicaExchange:
+    """Parallel tempering across the trajectories of each pose.
+
+    Rather than following the schedule's temperature in lockstep, the n
+    trajectories of a pose run at a ladder of n temperatures: the
+    schedule's temperature times a factor rising geometrically from 1 to
+    max_temperature_ratio. Every exchange_interval substitution attempts,
+    trajectories on neighboring rungs propose to trade temperatures and
+    accept by the Metropolis criterion, so that low-energy assignments
+    found while hot drift down to the cold rungs.
+    """
+
+    max_temperature_ratio: float = 10.0
+    exchange_interval: int = 50
+
+    def __attrs_post_init__(self):
+        if self.max_temperature_ratio < 1:
+            raise ValueError("max_temperature_ratio must be at least 1")
+        if self.exchange_interval < 1:
+            raise ValueError("exchange_interval must be positive")
+
+    def temperature_ladder(self, n_rungs: int, device: torch.device) -> torch.Tensor:
+        """The factors by which each rung scales the schedule's temperature"""
+        if n_rungs == 1:
+            return torch.ones((1,), dtype=torch.float32, device=device)
+        return torch.pow(
+            torch.tensor(self.max_temperature_ratio, dtype=torch.float32),
+            torch.arange(n_rungs, dtype=torch.float32) / (n_rungs - 1),
+        ).to(device)
@@ -0,0 +1,18 @@
+#include <tmol/score/common/device_operations.cpu.impl.hh>
+
+#include "interblock_bondsep.impl.hh"
+
+namespace tmol {
+namespace pose {
+
+template struct InterBlockBondSepDispatch<
+    score::common::DeviceOperations,
+    tmol::Device::CPU,
+    int32_t>;
+template struct InterBlockBondSepDispatch<
+    score::common::DeviceOperations,
+    tmol::Device::CPU,
+    int64_t>;
+
+}  // namespace pose
+}  // namespace tmol
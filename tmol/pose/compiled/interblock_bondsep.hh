@@ -0,0 +1,53 @@
+#pragma once
+
+#include <tmol/utility/tensor/TensorAccessor.h>
+#include <tmol/utility/tensor/TensorPack.h>
+
+namespace tmol {
+namespace pose {
+
+// The longest path, in number of inter-block chemical bonds, that the
+// bounded search will follow; the search cutoff may not exceed this
+int constexpr MAX_N_INTERBLOCK_PATH_STEPS = 16;
+
+// Find every pair of inter-block connections that lie fewer than
+// max_bondsep chemical bonds apart by walking outward from each
+// connection along the inter-residue connections. Rather than building
+// and solving an all-pairs-shortest-path problem on a dense
+// n-connections x n-connections matrix, each connection's search
+// is bounded by max_bondsep, so the work grows linearly with the number
+// of connections.
+//
+// The search proceeds in two passes: first the number of connections
+// reached from each connection ("path ends") is counted, and then,
+// after the caller has computed the offsets for each connection's
+// path ends, the path ends themselves are recorded as rows of
+// (pose, block1, conn1, block2, conn2, bond separation). The same
+// pair of connections may be reached along several paths and so
+// may appear in several rows; the shortest separation among them
+// is the true separation.
+template <
+    template <tmol::Device>
+    class DeviceOps,
+    tmol::Device D,
+    typename Int>
+struct InterBlockBondSepDispatch {
+  static auto count_path_ends(
+      TView<Int, 2, D> pose_stack_block_type,
+      TView<Int, 4, D> pose_stack_inter_residue_connections,
+      TView<Int, 1, D> block_type_n_conn,
+      TView<Int, 3, D> block_type_conn_bondsep,
+      int max_bondsep) -> TPack<Int, 3, D>;
+
+  static auto gather_path_ends(
+      TView<Int, 2, D> pose_stack_block_type,
+      TView<Int, 4, D> pose_stack_inter_residue_connections,
+      TView<Int, 1, D> block_type_n_conn,
+      TView<Int, 3, D> block_type_conn_bondsep,
+      TView<Int, 3, D> path_end_offsets,
+      int n_path_ends,
+      int max_bondsep) -> TPack<Int, 2, D>;
+};
+
+}  // namespace pose
+}  // namespace tmol
@@ -0,0 +1,232 @@
+#pragma once
+
+#include <tmol/utility/tensor/TensorAccessor.h>
+#include <tmol/utility/tensor/TensorPack.h>
+#include <tmol/utility/nvtx.hh>
+
+#include <tmol/score/common/diamond_macros.hh>
+#include <tmol/score/common/launch_box_macros.hh>
+
+#include "interblock_bondsep.hh"
+
+namespace tmol {
+namespace pose {
+
+// Depth-first walk out from connection conn_ind on block block_ind,
+// calling f(block, conn, separation) for every connection reached
+// fewer than max_bondsep chemical bonds away, including the starting
+// connection itself. A path alternates between crossing a block (from
+// the connection it entered through to one of the block's connections,
+// a step whose length is read from the block type) and crossing an
+// inter-residue chemical bond (a step of length 1); since each bond
+// crossing lengthens the path, the depth of the walk is bounded by
+// max_bondsep. The walk keeps an explicit, fixed-size stack so that
+// it can run in a single GPU thread.
+template <tmol::Device D, typename Int, typename Func>
+EIGEN_DEVICE_FUNC void for_each_interblock_path_end(
+    int pose_ind,
+    int block_ind,
+    int conn_ind,
+    int max_bondsep,
+    TView<Int, 2, D> pose_stack_block_type,
+    TView<Int, 4, D> pose_stack_inter_residue_connections,
+    TView<Int, 1, D> block_type_n_conn,
+    TView<Int, 3, D> block_type_conn_bondsep,
+    Func f) {
+  // for each block along the current path: its index, its type, the
+  // connection through which the path entered it, the separation at
+  // that connection, and the next connection to try leaving through
+  int path_block[MAX_N_INTERBLOCK_PATH_STEPS];
+  int path_block_type[MAX_N_INTERBLOCK_PATH_STEPS];
+  int path_conn_in[MAX_N_INTERBLOCK_PATH_STEPS];
+  int path_sep[MAX_N_INTERBLOCK_PATH_STEPS];
+  int path_next_conn[MAX_N_INTERBLOCK_PATH_STEPS];
+
+  int depth = -1;
+  int enter_block = block_ind;
+  int enter_conn = conn_ind;
+  int enter_sep = 0;
+  bool entering = true;
+
+  while (true) {
+    if (entering) {
+      entering = false;
+      int const block_type = pose_stack_block_type[pose_ind][enter_block];
+      int const n_conn = block_type_n_conn[block_type];
+      for (int ii = 0; ii < n_conn; ++ii) {
+        int const ii_sep =
+            enter_sep + block_type_conn_bondsep[block_type][enter_conn][ii];
+        if (ii_sep < max_bondsep) {
+          f(enter_block, ii, ii_sep);
+        }
+      }
+      ++depth;
+      path_block[depth] = enter_block;
+      path_block_type[depth] = block_type;
+      path_conn_in[depth] = enter_conn;
+      path_sep[depth] = enter_sep;
+      path_next_conn[depth] = 0;
+    }
+
+    int const block = path_block[depth];
+    int const block_type = path_block_type[depth];
+    int const conn_out = path_next_conn[depth]++;
+    if (conn_out >= block_type_n_conn[block_type]) {
+      if (depth == 0) {
+        break;
+      }
+      --depth;
+      continue;
+    }
+    if (depth > 0 && conn_out == path_conn_in[depth]) {
+      // do not walk back across the bond we just crossed
+      continue;
+    }
+    int const neighb_block =
+        pose_stack_inter_residue_connections[pose_ind][block][conn_out][0];
+    if (neighb_block < 0) {
+      continue;
+    }
+    int const neighb_sep =
+        path_sep[depth]
+        + block_type_conn_bondsep[block_type][path_conn_in[depth]][conn_out]
+        + 1;
+    if (neighb_sep >= max_bondsep || depth + 1 >= MAX_N_INTERBLOCK_PATH_STEPS) {
+      continue;
+    }
+    enter_block = neighb_block;
+    enter_conn =
+        pose_stack_inter_residue_connections[pose_ind][block][conn_out][1];
+    enter_sep = neighb_sep;
+    entering = true;
+  }
+}
+
+template <
+    template <tmol::Device>
+    class DeviceOps,
+    tmol::Device D,
+    typename Int>
+auto InterBlockBondSepDispatch<DeviceOps, D, Int>::count_path_ends(
+    TView<Int, 2, D> pose_stack_block_type,
+    TView<Int, 4, D> pose_stack_inter_residue_connections,
+    TView<Int, 1, D> block_type_n_conn,
+    TView<Int, 3, D> block_type_conn_bondsep,
+    int max_bondsep) -> TPack<Int, 3, D> {
+  NVTXRange _function(__FUNCTION__);
+
+  int const n_poses = pose_stack_block_type.size(0);
+  int const max_n_blocks = pose_stack_block_type.size(1);
+  int const max_n_conn = pose_stack_inter_residue_connections.size(2);
+
+  assert(pose_stack_inter_residue_connections.size(0) == n_poses);
+  assert(pose_stack_inter_residue_connections.size(1) == max_n_blocks);
+  assert(block_type_conn_bondsep.size(0) == block_type_n_conn.size(0));
+
+  auto n_path_ends_t =
+      TPack<Int, 3, D>::zeros({n_poses, max_n_blocks, max_n_conn});
+  auto n_path_ends = n_path_ends_t.view;
+
+  LAUNCH_BOX_32;
+
+  auto count_for_conn = ([=] TMOL_DEVICE_FUNC(int ind) {
+    int const pose_ind = ind / (max_n_blocks * max_n_conn);
+    int const block_ind = (ind / max_n_conn) % max_n_blocks;
+    int const conn_ind = ind % max_n_conn;
+    int const block_type = pose_stack_block_type[pose_ind][block_ind];
+    if (block_type < 0 || conn_ind >= block_type_n_conn[block_type]) {
+      return;
+    }
+
+    int count = 0;
+    for_each_interblock_path_end<D, Int>(
+        pose_ind,
+        block_ind,
+        conn_ind,
+        max_bondsep,
+        pose_stack_block_type,
+        pose_stack_inter_residue_connections,
+        block_type_n_conn,
+        block_type_conn_bondsep,
+        [&](int, int, int) { ++count; });
+    n_path_ends[pose_ind][block_ind][conn_ind] = count;
+  });
+
+  // every connection writes only its own entry, so the searches may
+  // be spread across threads
+  DeviceOps<D>::template forall<launch_t>(
+      n_poses * max_n_blocks * max_n_conn,
+      count_for_conn,
+      DeviceOps<D>::parallel_accumulation_targets());
+
+  return n_path_ends_t;
+}
+
+template <
+    template <tmol::Device>
+    class DeviceOps,
+    tmol::Device D,
+    typename Int>
+auto InterBlockBondSepDispatch<DeviceOps, D, Int>::gather_path_ends(
+    TView<Int, 2, D> pose_stack_block_type,
+    TView<Int, 4, D> pose_stack_inter_residue_connections,
+    TView<Int, 1, D> block_type_n_conn,
+    TView<Int, 3, D> block_type_conn_bondsep,
+    TView<Int, 3, D> path_end_offsets,
+    int n_path_ends,
+    int max_bondsep) -> TPack<Int, 2, D> {
+  NVTXRange _function(__FUNCTION__);
+
+  int const n_poses = pose_stack_block_type.size(0);
+  int const max_n_blocks = pose_stack_block_type.size(1);
+  int const max_n_conn = pose_stack_inter_residue_connections.size(2);
+
+  assert(path_end_offsets.size(0) == n_poses);
+  assert(path_end_offsets.size(1) == max_n_blocks);
+  assert(path_end_offsets.size(2) == max_n_conn);
+
+  auto path_ends_t = TPack<Int, 2, D>::zeros({n_path_ends, 6});
+  auto path_ends = path_ends_t.view;
+
+  LAUNCH_BOX_32;
+
+  auto gather_for_conn = ([=] TMOL_DEVICE_FUNC(int ind) {
+    int const pose_ind = ind / (max_n_blocks * max_n_conn);
+    int const block_ind = (ind / max_n_conn) % max_n_blocks;
+    int const conn_ind = ind % max_n_conn;
+    int const block_type = pose_stack_block_type[pose_ind][block_ind];
+    if (block_type < 0 || conn_ind >= block_type_n_conn[block_type]) {
+      return;
+    }
+
+    int offset = path_end_offsets[pose_ind][block_ind][conn_ind];
+    for_each_interblock_path_end<D, Int>(
+        pose_ind,
+        block_ind,
+        conn_ind,
+        max_bondsep,
+        pose_stack_block_type,
+        pose_stack_inter_residue_connections,
+        block_type_n_conn,
+        block_type_conn_bondsep,
+        [&](int neighb_block, int neighb_conn, int sep) {
+          path_ends[offset][0] = pose_ind;
+          path_ends[offset][1] = block_ind;
+          path_ends[offset][2] = conn_ind;
+          path_ends[offset][3] = neighb_block;
+          path_ends[offset][4] = neighb_conn;
+          path_ends[offset][5] = sep;
+          ++offset;
+        });
+  });
+
+  DeviceOps<D>::template forall<launch_t>(
+      n_poses * max_n_blocks * max_n_conn,
+      gather_for_conn,
+      DeviceOps<D>::parallel_accumulation_targets());
+
+  return path_ends_t;
+}
+
+}  // namespace pose
+}  // namespace tmol
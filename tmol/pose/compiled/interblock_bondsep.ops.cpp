@@ -0,0 +1,79 @@
+#include <torch/torch.h>
+#include <torch/script.h>
+
+#include <tmol/utility/tensor/TensorCast.h>
+#include <tmol/utility/function_dispatch/aten.hh>
+
+#include <tmol/score/common/device_operations.hh>
+
+#include "interblock_bondsep.hh"
+
+namespace tmol {
+namespace pose {
+
+using torch::Tensor;
+
+Tensor interblock_bondsep_path_ends_op(
+    Tensor pose_stack_block_type,
+    Tensor pose_stack_inter_residue_connections,
+    Tensor block_type_n_conn,
+    Tensor block_type_conn_bondsep,
+    int64_t max_bondsep) {
+  TORCH_CHECK(
+      max_bondsep <= MAX_N_INTERBLOCK_PATH_STEPS,
+      "interblock_bondsep_path_ends: max_bondsep may not exceed ",
+      MAX_N_INTERBLOCK_PATH_STEPS);
+
+  at::Tensor path_ends;
+
+  TMOL_DISPATCH_INDEX_DEVICE(
+      pose_stack_block_type.type(), "interblock_bondsep_path_ends_op", ([&] {
+        using Int = index_t;
+        constexpr tmol::Device Dev = device_t;
+        using Dispatch = InterBlockBondSepDispatch<
+            score::common::DeviceOperations,
+            Dev,
+            Int>;
+
+        auto n_path_ends = Dispatch::count_path_ends(
+            TCAST(pose_stack_block_type),
+            TCAST(pose_stack_inter_residue_connections),
+            TCAST(block_type_n_conn),
+            TCAST(block_type_conn_bondsep),
+            int(max_bondsep));
+
+        Tensor n_path_ends_cumsum =
+            torch::cumsum(n_path_ends.tensor.flatten(), 0);
+        int const n_path_ends_total =
+            n_path_ends_cumsum.numel() == 0
+                ? 0
+                : n_path_ends_cumsum[-1].item<int64_t>();
+        Tensor path_end_offsets =
+            (n_path_ends_cumsum - n_path_ends.tensor.flatten())
+                .to(n_path_ends.tensor.dtype())
+                .view(n_path_ends.tensor.sizes());
+
+        auto result = Dispatch::gather_path_ends(
+            TCAST(pose_stack_block_type),
+            TCAST(pose_stack_inter_residue_connections),
+            TCAST(block_type_n_conn),
+            TCAST(block_type_conn_bondsep),
+            TCAST(path_end_offsets),
+            n_path_ends_total,
+            int(max_bondsep));
+
+        path_ends = result.tensor;
+      }));
+
+  return path_ends;
+}
+
+// Macro indirection to force TORCH_EXTENSION_NAME macro expansion
+// See https://stackoverflow.com/a/3221914
+#define TORCH_LIBRARY_(ns, m) TORCH_LIBRARY(ns, m)
+TORCH_LIBRARY_(TORCH_EXTENSION_NAME, m) {
+  m.def("interblock_bondsep_path_ends", &interblock_bondsep_path_ends_op);
+}
+
+}  // namespace pose
+}  // namespace tmol
@@ -0,0 +1,46 @@
+import torch
+from tmol.utility.cpp_extension import load, relpaths, modulename, cuda_if_available
+
+load(
+    modulename(__name__),
+    cuda_if_available(
+        relpaths(
+            __file__,
+            [
+                "interblock_bondsep.ops.cpp",
+                "interblock_bondsep.cpu.cpp",
+                "interblock_bondsep.cuda.cu",
+            ],
+        )
+    ),
+    is_python_module=False,
+)
+
+_ops = getattr(torch.ops, modulename(__name__))
+
+
+def interblock_bondsep_path_ends(
+    pose_stack_block_type,
+    pose_stack_inter_residue_connections,
+    block_type_n_conn,
+    block_type_conn_bondsep,
+    max_bondsep,
+):
+    """Find the pairs of inter-block connections that are separated by fewer
+    than max_bondsep chemical bonds with a search outward from each connection
+    that stops once that many bonds have been crossed; the cost of the search
+    is thus linear in the number of connections rather than cubic as it would
+    be for all-pairs-shortest-paths on the dense connection-by-connection graph.
+
+    Returns an [n-path-ends x 6] tensor whose rows are
+    (pose, block1, conn1, block2, conn2, bond separation); a pair of
+    connections reached along more than one path appears in more than
+    one row, and the smallest separation among those rows is the true one.
+    """
+    return _ops.interblock_bondsep_path_ends(
+        pose_stack_block_type,
+        pose_stack_inter_residue_connections,
+        block_type_n_conn,
+        block_type_conn_bondsep,
+        max_bondsep,
+    )
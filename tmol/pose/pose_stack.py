@@ -1,7 +1,11 @@
 import attr
 import torch
 
+from functools import cached_property
+from typing import Optional, Tuple
+
 from tmol.types.torch import Tensor
+from tmol.chemical.constants import MAX_SIG_BOND_SEPARATION
 from tmol.chemical.restypes import RefinedResidueType
 from tmol.pose.packed_block_types import PackedBlockTypes
 
@@ -43,15 +47,27 @@ class PoseStack:
     defined) and the connection-point index it is connected to
     (sentinel of -1, also).
 
-    inter_block_bondsep: a integer tensor of shape
-    [n_poses x max_n_residues x max_n_residues x max_n_conn x max_n_conn]
-    stating the number of chemical bonds that separate every pair of
-    inter-residue connections for every pair of residues -- up to a
-    maximum inter-residue separation of
+    inter_block_bondsep_neighbors, inter_block_bondsep_sparse: a sparse
+    representation of the number of chemical bonds that separate every
+    pair of inter-residue connections for every pair of residues -- up to
+    a maximum inter-residue separation of
     tmol.chemical.MAX_SIG_BOND_SEPARATION (6 as of March 2024) --
     so that the number of chemical bonds separating arbitrary
     atom pairs may be rapidly computed for the interatomic energy
-    calculations
+    calculations. Nearly every pair of residues is at least
+    MAX_SIG_BOND_SEPARATION chemical bonds apart, so only the pairs
+    that are closer are stored: inter_block_bondsep_neighbors is an
+    integer tensor of [n_poses x max_n_residues x max_n_bondsep_neighbors]
+    listing, in increasing order, the indices of the residues whose
+    connections are within MAX_SIG_BOND_SEPARATION chemical bonds of the
+    connections on each residue (sentinel of -1 for "no neighbor"), and
+    inter_block_bondsep_sparse is an integer tensor of
+    [n_poses x max_n_residues x max_n_bondsep_neighbors x max_n_conn x
+    max_n_conn] holding the connection-pair separations for each of those
+    neighbors. The dense tensors of shape
+    [n_poses x max_n_residues x max_n_residues x max_n_conn x max_n_conn],
+    inter_block_bondsep and inter_block_bondsep64, are built from these
+    on demand.
 
     block_type_ind: the integer index for each block type (residue type)
     referring to the order in which that block type appears in the
@@ -59,6 +75,19 @@ class PoseStack:
     where there is no block type.
 
     device: the torch.device that this collection of structures lives on
+
+    topology_ind_for_pose: for a PoseStack whose poses share topologies
+    (see share_pose_topologies), a tensor of [n_poses] holding the index of
+    each pose's topology -- its block types, block coordinate offsets,
+    inter-residue connections and inter-block bond separations; None if
+    each pose has a topology of its own. The PoseStack holds a single copy
+    of each topology, so that a stack of many conformations of a few
+    sequences spends memory on coordinates only. The per-pose topology
+    tensors above are then built from them the first time they are
+    requested, as ordinary contiguous tensors, and held. Code that only
+    reads the topology should instead work one topology at a time (see
+    topology_stack) or read the per-pose tensors through topology_view,
+    which does not copy a topology that every pose shares.
     """
 
     packed_block_types: PackedBlockTypes
@@ -71,20 +100,25 @@ class PoseStack:
     # block_coord_offset tensor [n-poses x max-n-blocks]
     coords: Tensor[torch.float32][:, :, 3]
 
-    block_coord_offset: Tensor[torch.int32][:, :]
-    block_coord_offset64: Tensor[torch.int64][:, :]
+    # the topology tensors hold one row for each topology (see
+    # topology_ind_for_pose); read them per pose through the properties of
+    # the same names below
+    _block_coord_offset: Tensor[torch.int32][:, :]
+    _block_coord_offset64: Tensor[torch.int64][:, :]
 
-    inter_residue_connections: Tensor[torch.int32][:, :, :, 2]
-    inter_residue_connections64: Tensor[torch.int64][:, :, :, 2]
+    _inter_residue_connections: Tensor[torch.int32][:, :, :, 2]
+    _inter_residue_connections64: Tensor[torch.int64][:, :, :, 2]
 
-    inter_block_bondsep: Tensor[torch.int32][:, :, :, :, :]
-    inter_block_bondsep64: Tensor[torch.int64][:, :, :, :, :]
+    _inter_block_bondsep_neighbors: Tensor[torch.int32][:, :, :]
+    _inter_block_bondsep_sparse: Tensor[torch.int32][:, :, :, :, :]
 
-    block_type_ind: Tensor[torch.int32][:, :]
-    block_type_ind64: Tensor[torch.int64][:, :]
+    _block_type_ind: Tensor[torch.int32][:, :]
+    _block_type_ind64: Tensor[torch.int64][:, :]
 
     device: torch.device
 
+    topology_ind_for_pose: Optional[Tensor[torch.int64][:]] = None
+
     #################### PROPERTIES #####################
 
     def __len__(self):
@@ -97,7 +131,7 @@ class PoseStack:
 
     @property
     def max_n_blocks(self):
-        return self.block_coord_offset.shape[1]
+        return self._block_coord_offset.shape[1]
 
     @property
     def max_n_atoms(self):
@@ -114,70 +148,402 @@ class PoseStack:
         return self.coords.shape[1]
 
     @property
-    def n_ats_per_block(self) -> Tensor[torch.int64][:, :]:
-        """Return the number of atoms in each block"""
+    def n_topologies(self) -> int:
+        """The number of distinct topologies held in this stack"""
+        return self._block_type_ind.shape[0]
+
+    @cached_property
+    def first_pose_for_topology(self) -> Tensor[torch.int64][:]:
+        """The index of the first pose with each topology"""
+        if self.topology_ind_for_pose is None:
+            return torch.arange(self.n_poses, dtype=torch.int64, device=self.device)
+        return first_pose_for_topology(self.topology_ind_for_pose)
+
+    def topology_to_poses(self, per_topology: Tensor) -> Tensor:
+        """Map a tensor holding a row for each topology onto the poses;
+        when there is only one topology, the result is a stride-0 view
+        """
+        if self.topology_ind_for_pose is None:
+            return per_topology
+        return topology_to_poses(per_topology, self.topology_ind_for_pose)
+
+    def _per_pose(self, per_topology: Tensor) -> Tensor:
+        """Map a tensor holding a row for each topology onto the poses as a
+        contiguous tensor of its own"""
+        if self.topology_ind_for_pose is None:
+            return per_topology
+        return self.topology_to_poses(per_topology).contiguous()
+
+    def topology_view(self, name: str) -> Tensor:
+        """The per-pose form of the named topology tensor (e.g.
+        "block_type_ind"), mapped from the single copy of each topology
+        without being held: a stride-0 view when every pose shares one
+        topology. Unlike the property of the same name, the result need not
+        be contiguous and must not be written to; it is meant for readers,
+        such as the compiled kernels, that take strided tensors
+        """
+        return self.topology_to_poses(getattr(self, "_" + name))
+
+    @property
+    def topology_stack(self) -> "PoseStack":
+        """A PoseStack with one pose for each of this stack's topologies,
+        sharing its topology tensors, with the coordinates of the first pose
+        with that topology
+        """
+        if self.topology_ind_for_pose is None:
+            return self
+        return attr.evolve(
+            self,
+            coords=self.coords[self.first_pose_for_topology],
+            topology_ind_for_pose=None,
+        )
+
+    @cached_property
+    def block_coord_offset(self) -> Tensor[torch.int32][:, :]:
+        return self._per_pose(self._block_coord_offset)
+
+    @cached_property
+    def block_coord_offset64(self) -> Tensor[torch.int64][:, :]:
+        return self._per_pose(self._block_coord_offset64)
+
+    @cached_property
+    def inter_residue_connections(self) -> Tensor[torch.int32][:, :, :, 2]:
+        return self._per_pose(self._inter_residue_connections)
+
+    @cached_property
+    def inter_residue_connections64(self) -> Tensor[torch.int64][:, :, :, 2]:
+        return self._per_pose(self._inter_residue_connections64)
+
+    @cached_property
+    def inter_block_bondsep_neighbors(self) -> Tensor[torch.int32][:, :, :]:
+        return self._per_pose(self._inter_block_bondsep_neighbors)
+
+    @cached_property
+    def inter_block_bondsep_sparse(self) -> Tensor[torch.int32][:, :, :, :, :]:
+        return self._per_pose(self._inter_block_bondsep_sparse)
+
+    @cached_property
+    def block_type_ind(self) -> Tensor[torch.int32][:, :]:
+        return self._per_pose(self._block_type_ind)
+
+    @cached_property
+    def block_type_ind64(self) -> Tensor[torch.int64][:, :]:
+        return self._per_pose(self._block_type_ind64)
+
+    # The tensors derived from the topology alone are computed once for each
+    # topology the first time they are requested and then held: the topology
+    # of a PoseStack does not change over its lifetime. Callers must not
+    # write to them.
+
+    @cached_property
+    def _inter_block_bondsep_for_topology(self) -> Tensor[torch.int32][:, :, :, :, :]:
+        return dense_inter_block_bondsep(
+            self._inter_block_bondsep_neighbors, self._inter_block_bondsep_sparse
+        )
+
+    @cached_property
+    def _inter_block_bondsep64_for_topology(
+        self,
+    ) -> Tensor[torch.int64][:, :, :, :, :]:
+        return self._inter_block_bondsep_for_topology.to(torch.int64)
+
+    @property
+    def inter_block_bondsep(self) -> Tensor[torch.int32][:, :, :, :, :]:
+        """The dense form of the inter-block bond separations. Prefer the
+        sparse form where possible: this tensor grows quadratically with the
+        number of blocks
+        """
+        return self._per_pose(self._inter_block_bondsep_for_topology)
 
+    @property
+    def inter_block_bondsep64(self) -> Tensor[torch.int64][:, :, :, :, :]:
+        return self._per_pose(self._inter_block_bondsep64_for_topology)
+
+    @cached_property
+    def _n_ats_per_block_for_topology(self) -> Tensor[torch.int64][:, :]:
+        block_type_ind = self._block_type_ind64
         n_ats_per_block = torch.zeros(
-            (self.n_poses, self.max_n_blocks), dtype=torch.int64, device=self.device
+            block_type_ind.shape, dtype=torch.int64, device=self.device
         )
-        n_ats_per_block[self.block_type_ind != -1] = self.packed_block_types.n_atoms[
-            self.block_type_ind[self.block_type_ind != -1].to(torch.int64)
+        n_ats_per_block[block_type_ind != -1] = self.packed_block_types.n_atoms[
+            block_type_ind[block_type_ind != -1]
         ].to(torch.int64)
         return n_ats_per_block
 
+    @property
+    def n_ats_per_block(self) -> Tensor[torch.int64][:, :]:
+        """Return the number of atoms in each block"""
+        return self._per_pose(self._n_ats_per_block_for_topology)
+
+    @cached_property
+    def _real_atoms_for_topology(self) -> Tensor[torch.bool][:, :]:
+        n_ats_per_pose = torch.sum(self._n_ats_per_block_for_topology, dim=1)
+        return torch.arange(
+            self.max_n_pose_atoms, dtype=torch.int64, device=self.device
+        ).unsqueeze(0) < n_ats_per_pose.unsqueeze(1)
+
     @property
     def real_atoms(self):
         """return the boolean vector of the real atoms in the coords tensor"""
-        # get the list of real atoms to read out of pose coords
-        n_ats_per_pose_arange_expanded = (
-            torch.arange(self.max_n_pose_atoms, dtype=torch.int64, device=self.device)
-            .repeat(self.n_poses)
-            .view(self.n_poses, self.max_n_pose_atoms)
+        return self._per_pose(self._real_atoms_for_topology)
+
+    @cached_property
+    def _real_expanded_pose_ats_for_topology(self) -> Tensor[torch.bool][:, :, :]:
+        return torch.arange(
+            self.max_n_block_atoms, dtype=torch.int64, device=self.device
+        ) < self._n_ats_per_block_for_topology.unsqueeze(2)
+
+    @property
+    def real_expanded_pose_ats(self) -> Tensor[torch.bool][:, :, :]:
+        """The mask of the real atoms in the
+        n_poses x max_n_blocks x max_n_atoms_per_block layout of expand_coords
+        """
+        return self._per_pose(self._real_expanded_pose_ats_for_topology)
+
+    @cached_property
+    def _expand_coords_index_for_topology(self) -> Tensor[torch.int32][:, :]:
+        # for each slot of the expanded layout, the index of its atom among
+        # its pose's coordinates; filler slots read the pose's first atom
+        # and are zeroed after the gather
+        block_atom = torch.arange(
+            self.max_n_block_atoms, dtype=torch.int32, device=self.device
+        )
+        index = self._block_coord_offset.unsqueeze(2) + block_atom.view(1, 1, -1)
+        index = torch.where(
+            self._real_expanded_pose_ats_for_topology, index, torch.zeros_like(index)
         )
-        n_ats_per_pose = torch.sum(self.n_ats_per_block, dim=1).unsqueeze(1)
-        return n_ats_per_pose_arange_expanded < n_ats_per_pose
+        return index.flatten(start_dim=1)
 
-    def expand_coords(self):
+    def expand_coords(self, out=None):
         """Load the coordinates into a 4D tensor:
         n_poses x max_n_blocks x max_n_atoms_per_block x 3
         making it possible to perform simple operations on the
-        per-block level in python/torch
+        per-block level in python/torch. If given, the expanded coordinates
+        are written into out, a tensor of that shape, so that repeated
+        expansions (outside of autograd) can reuse a single buffer
         """
 
-        # get the list of real atoms that we will be writing to in the 4D tensor
-        n_ats_per_block_arange_expanded = (
-            torch.arange(self.max_n_block_atoms, dtype=torch.int64, device=self.device)
-            .repeat(self.n_poses * self.max_n_blocks)
-            .view(self.n_poses, self.max_n_blocks, self.max_n_block_atoms)
+        pose_offset = (
+            torch.arange(self.n_poses, dtype=torch.int64, device=self.device)
+            * self.max_n_pose_atoms
         )
-
-        # n_ats_per_block = self.n_ats_per_block.to(torch.int64)
-        real_expanded_pose_ats = (
-            n_ats_per_block_arange_expanded < self.n_ats_per_block.unsqueeze(2)
+        index = (
+            self.topology_to_poses(self._expand_coords_index_for_topology)
+            + pose_offset.unsqueeze(1)
+        ).flatten()
+
+        real_expanded_pose_ats = self.real_expanded_pose_ats
+        flat_coords = self.coords.reshape(-1, 3)
+        if out is None:
+            expanded_coords = torch.index_select(flat_coords, 0, index)
+        else:
+            expanded_coords = torch.index_select(
+                flat_coords, 0, index, out=out.view(-1, 3)
+            )
+        expanded_coords = expanded_coords.view(
+            self.n_poses, self.max_n_blocks, self.max_n_block_atoms, 3
         )
-
-        # now perform the actual copy
-        expanded_coords = torch.zeros(
-            (self.n_poses, self.max_n_blocks, self.max_n_block_atoms, 3),
-            dtype=torch.float32,
-            device=self.device,
+        expanded_coords.masked_fill_(
+            torch.logical_not(real_expanded_pose_ats).unsqueeze(3), 0
         )
-        expanded_coords[real_expanded_pose_ats] = self.coords[self.real_atoms]
         return expanded_coords, real_expanded_pose_ats
 
     @property
     def n_res_per_pose(self):
-        return torch.sum(self.block_type_ind >= 0, dim=1)
+        return self._per_pose(torch.sum(self._block_type_ind >= 0, dim=1))
+
+    def _topology_for_pose(self, pose_ind: int) -> int:
+        if self.topology_ind_for_pose is None:
+            return pose_ind
+        return self.topology_ind_for_pose[pose_ind]
 
     def is_real_block(self, pose_ind: int, block_ind: int) -> bool:
         """Report whether a particular block on a particular pose is
         real or just filler
         """
-        return self.block_type_ind[pose_ind, block_ind] >= 0
+        return self._block_type_ind[self._topology_for_pose(pose_ind), block_ind] >= 0
 
     def block_type(self, pose_ind: int, block_ind: int) -> RefinedResidueType:
         """Look up the block type for a particular pose and block and retrieve it
         from the PackedBlockTypes object. is_real_block must return True"""
         return self.packed_block_types.active_block_types[
-            self.block_type_ind[pose_ind, block_ind]
+            self._block_type_ind[self._topology_for_pose(pose_ind), block_ind]
         ]
+
+
+def sparse_inter_block_bondsep(
+    inter_block_bondsep: Tensor[torch.int32][:, :, :, :, :]
+) -> Tuple[Tensor[torch.int32][:, :, :], Tensor[torch.int32][:, :, :, :, :]]:
+    """Compress a dense
+    [n_poses x max_n_blocks x max_n_blocks x max_n_conn x max_n_conn]
+    tensor of inter-block bond separations into the per-block neighbor
+    lists described in the PoseStack docstring. Separations of
+    MAX_SIG_BOND_SEPARATION or more are all recorded as
+    MAX_SIG_BOND_SEPARATION.
+    """
+    n_poses = inter_block_bondsep.shape[0]
+    max_n_blocks = inter_block_bondsep.shape[1]
+    max_n_conn = inter_block_bondsep.shape[3]
+    device = inter_block_bondsep.device
+
+    inter_block_bondsep = torch.clamp(
+        inter_block_bondsep, max=MAX_SIG_BOND_SEPARATION
+    ).to(torch.int32)
+    is_neighbor = torch.any(
+        (inter_block_bondsep < MAX_SIG_BOND_SEPARATION).flatten(start_dim=3), dim=3
+    )
+    n_neighbors = torch.sum(is_neighbor, dim=2)
+    neighbor_slot = torch.cumsum(is_neighbor, dim=2) - 1
+    max_n_neighbors = max(1, int(torch.max(n_neighbors)) if n_neighbors.numel() else 1)
+
+    nz_pose, nz_block1, nz_block2 = torch.nonzero(is_neighbor, as_tuple=True)
+    nz_slot = neighbor_slot[is_neighbor]
+
+    neighbors = torch.full(
+        (n_poses, max_n_blocks, max_n_neighbors), -1, dtype=torch.int32, device=device
+    )
+    neighbors[nz_pose, nz_block1, nz_slot] = nz_block2.to(torch.int32)
+    sparse = torch.full(
+        (n_poses, max_n_blocks, max_n_neighbors, max_n_conn, max_n_conn),
+        MAX_SIG_BOND_SEPARATION,
+        dtype=torch.int32,
+        device=device,
+    )
+    sparse[nz_pose, nz_block1, nz_slot] = inter_block_bondsep[is_neighbor]
+    return neighbors, sparse
+
+
+def dense_inter_block_bondsep(
+    inter_block_bondsep_neighbors: Tensor[torch.int32][:, :, :],
+    inter_block_bondsep_sparse: Tensor[torch.int32][:, :, :, :, :],
+) -> Tensor[torch.int32][:, :, :, :, :]:
+    """Expand the per-block neighbor lists of inter-block bond separations
+    into a dense
+    [n_poses x max_n_blocks x max_n_blocks x max_n_conn x max_n_conn] tensor
+    """
+    n_poses, max_n_blocks, _ = inter_block_bondsep_neighbors.shape
+    max_n_conn = inter_block_bondsep_sparse.shape[3]
+
+    inter_block_bondsep = torch.full(
+        (n_poses, max_n_blocks, max_n_blocks, max_n_conn, max_n_conn),
+        MAX_SIG_BOND_SEPARATION,
+        dtype=torch.int32,
+        device=inter_block_bondsep_neighbors.device,
+    )
+    real = inter_block_bondsep_neighbors != -1
+    nz_pose, nz_block1, _ = torch.nonzero(real, as_tuple=True)
+    inter_block_bondsep[
+        nz_pose, nz_block1, inter_block_bondsep_neighbors[real].to(torch.int64)
+    ] = inter_block_bondsep_sparse[real]
+    return inter_block_bondsep
+
+
+# the PoseStack datamembers that describe the poses' topologies
+_topology_tensor_names = (
+    "block_coord_offset",
+    "block_coord_offset64",
+    "inter_residue_connections",
+    "inter_residue_connections64",
+    "inter_block_bondsep_neighbors",
+    "inter_block_bondsep_sparse",
+    "block_type_ind",
+    "block_type_ind64",
+)
+
+
+def first_pose_for_topology(
+    topology_ind_for_pose: Tensor[torch.int64][:],
+) -> Tensor[torch.int64][:]:
+    n_poses = topology_ind_for_pose.shape[0]
+    n_topologies = int(torch.max(topology_ind_for_pose)) + 1
+    return torch.full(
+        (n_topologies,), n_poses, dtype=torch.int64, device=topology_ind_for_pose.device
+    ).scatter_reduce_(
+        0,
+        topology_ind_for_pose,
+        torch.arange(n_poses, dtype=torch.int64, device=topology_ind_for_pose.device),
+        reduce="amin",
+    )
+
+
+def topology_to_poses(
+    per_topology: Tensor, topology_ind_for_pose: Tensor[torch.int64][:]
+) -> Tensor:
+    if per_topology.shape[0] == 1:
+        return per_topology.expand(
+            (topology_ind_for_pose.shape[0],) + per_topology.shape[1:]
+        )
+    return per_topology[topology_ind_for_pose]
+
+
+def unique_topologies(
+    block_type_ind: Tensor[torch.int32][:, :],
+    inter_residue_connections: Tensor[torch.int32][:, :, :, 2],
+) -> Tensor[torch.int64][:]:
+    """Number the distinct topologies among a set of rows of topology
+    tensors, returning the index of each row's topology. The block types
+    and the inter-residue connections determine the rest of a topology, so
+    only they are compared.
+    """
+    n_rows = block_type_ind.shape[0]
+    key = torch.cat(
+        (
+            block_type_ind.flatten(start_dim=1),
+            inter_residue_connections.flatten(start_dim=1),
+        ),
+        dim=1,
+    )
+
+    # the common case: a stack of conformations of a single sequence
+    if torch.all(key == key[:1]):
+        return torch.zeros((n_rows,), dtype=torch.int64, device=key.device)
+    _, topology_ind = torch.unique(key, dim=0, return_inverse=True)
+    return topology_ind
+
+
+def share_pose_topologies(pose_stack: PoseStack) -> PoseStack:
+    """Return a PoseStack with the same poses as the input in which the
+    poses with identical topologies share a single copy of them; see the
+    topology_ind_for_pose datamember of PoseStack. The coordinates are
+    not copied
+    """
+    if pose_stack.n_poses == 0:
+        return pose_stack
+
+    topology_ind = unique_topologies(
+        pose_stack._block_type_ind, pose_stack._inter_residue_connections
+    )
+    n_topologies = int(torch.max(topology_ind)) + 1
+    if n_topologies == pose_stack.n_topologies:
+        return pose_stack
+
+    first_row = first_pose_for_topology(topology_ind)
+    if pose_stack.topology_ind_for_pose is not None:
+        topology_ind = topology_ind[pose_stack.topology_ind_for_pose]
+    return attr.evolve(
+        pose_stack,
+        topology_ind_for_pose=topology_ind,
+        **{
+            name: getattr(pose_stack, "_" + name)[first_row]
+            for name in _topology_tensor_names
+        },
+    )
+
+
+def expand_pose_topology(
+    pose_stack: PoseStack, coords: Tensor[torch.float32][:, :, 3]
+) -> PoseStack:
+    """Return a PoseStack with the given coordinates, one pose for each of
+    their rows, in which every pose shares the topology of the single pose
+    in the input PoseStack
+    """
+    assert pose_stack.n_poses == 1
+    assert coords.shape[1] == pose_stack.max_n_pose_atoms
+
+    return attr.evolve(
+        pose_stack,
+        coords=coords,
+        topology_ind_for_pose=torch.zeros(
+            (coords.shape[0],), dtype=torch.int64, device=pose_stack.device
+        ),
+    )
@@ -25,7 +25,10 @@ from tmol.chemical.restypes import (
 )
 
 from tmol.pose.packed_block_types import PackedBlockTypes, residue_types_from_residues
-from tmol.pose.pose_stack import PoseStack
+from tmol.pose.pose_stack import (
+    PoseStack,
+    share_pose_topologies,
+)
 
 
 # from tmol.system.datatypes import connection_metadata_dtype
@@ -70,14 +73,22 @@ class PoseStackBuilder:
         inter_residue_connections = cls._create_inter_residue_connections(
             res, residue_connections, device
         )
-        inter_block_bondsep = cls._determine_single_structure_inter_block_bondsep(
-            res, residue_connections, device
-        )
 
         block_type_ind = torch.tensor(
             packed_block_types.inds_for_res(res), dtype=torch.int32, device=device
         ).unsqueeze(0)
 
+        # the bounded search reads the connections, so that the dense
+        # block-by-block bond separations are never built
+        (
+            inter_block_bondsep_neighbors,
+            inter_block_bondsep_sparse,
+        ) = cls._calculate_sparse_interblock_bondsep(
+            packed_block_types,
+            block_type_ind.to(torch.int64),
+            inter_residue_connections.to(torch.int64),
+        )
+
         # real_blocks = block_type_ind != -1
         # n_ats = torch.zeros_like(block_type_ind)
         # n_ats[real_blocks] = packed_block_types.n_atoms[
@@ -101,8 +112,8 @@ class PoseStackBuilder:
             block_coord_offset64=i64(block_coord_offset),
             inter_residue_connections=inter_residue_connections,
             inter_residue_connections64=i64(inter_residue_connections),
-            inter_block_bondsep=inter_block_bondsep,
-            inter_block_bondsep64=i64(inter_block_bondsep),
+            inter_block_bondsep_neighbors=inter_block_bondsep_neighbors,
+            inter_block_bondsep_sparse=inter_block_bondsep_sparse,
             block_type_ind=block_type_ind,
             block_type_ind64=i64(block_type_ind),
             device=device,
@@ -140,40 +151,72 @@ class PoseStackBuilder:
             )
 
         max_n_blocks = max(pose_stack.max_n_blocks for pose_stack in pose_stacks)
-        coords, block_coord_offset = cls._pack_pose_stack_coords(
-            packed_block_types, pose_stacks, max_n_blocks, device
-        )
+        coords = cls._pack_pose_stack_coords(pose_stacks, device)
 
-        ps_offset = exclusive_cumsum1d(
-            torch.tensor([len(ps) for ps in pose_stacks], dtype=torch.int64)
+        # the topology tensors are built once for each topology of each
+        # distinct input PoseStack, however many of its poses share them and
+        # however many times it appears in the input
+        unique_stacks = list({id(ps): ps for ps in pose_stacks}.values())
+        topology_stacks = [ps.topology_stack for ps in unique_stacks]
+        ts_offset = exclusive_cumsum1d(
+            torch.tensor([len(ts) for ts in topology_stacks], dtype=torch.int64)
         )
-        # block_coord_offset_cpu = block_coord_offset.cpu()
 
+        block_coord_offset = cls._block_coord_offset_from_pose_stacks(
+            topology_stacks, ts_offset, max_n_blocks, device
+        )
         inter_residue_connections = cls._inter_residue_connections_from_pose_stacks(
-            packed_block_types, pose_stacks, ps_offset, max_n_blocks, device
+            packed_block_types, topology_stacks, ts_offset, max_n_blocks, device
         )
-        inter_block_bondsep = cls._interblock_bondsep_from_pose_stacks(
-            packed_block_types, pose_stacks, ps_offset, max_n_blocks, device
+        (
+            inter_block_bondsep_neighbors,
+            inter_block_bondsep_sparse,
+        ) = cls._interblock_bondsep_from_pose_stacks(
+            packed_block_types, topology_stacks, ts_offset, max_n_blocks, device
         )
         block_type_ind = cls._resolve_block_type_ind(
-            packed_block_types, pose_stacks, ps_offset, max_n_blocks, device
+            packed_block_types, topology_stacks, ts_offset, max_n_blocks, device
         )
 
+        if len(unique_stacks) == len(pose_stacks) and all(
+            ps.topology_ind_for_pose is None for ps in pose_stacks
+        ):
+            topology_ind_for_pose = None
+        else:
+            ts_offset_for_stack = {
+                id(ps): int(offset) for ps, offset in zip(unique_stacks, ts_offset)
+            }
+            topology_ind_for_pose = torch.cat(
+                [
+                    ts_offset_for_stack[id(ps)]
+                    + (
+                        torch.arange(len(ps), dtype=torch.int64, device=device)
+                        if ps.topology_ind_for_pose is None
+                        else ps.topology_ind_for_pose.to(device)
+                    )
+                    for ps in pose_stacks
+                ]
+            )
+
         def i64(t):
             return t.to(torch.int64)
 
-        return PoseStack(
-            packed_block_types=packed_block_types,
-            coords=coords,
-            block_coord_offset=block_coord_offset,
-            block_coord_offset64=i64(block_coord_offset),
-            inter_residue_connections=inter_residue_connections,
-            inter_residue_connections64=i64(inter_residue_connections),
-            inter_block_bondsep=inter_block_bondsep,
-            inter_block_bondsep64=i64(inter_block_bondsep),
-            block_type_ind=block_type_ind,
-            block_type_ind64=i64(block_type_ind),
-            device=device,
+        # decoy sets of a single sequence share one copy of their topology
+        return share_pose_topologies(
+            PoseStack(
+                packed_block_types=packed_block_types,
+                coords=coords,
+                block_coord_offset=block_coord_offset,
+                block_coord_offset64=i64(block_coord_offset),
+                inter_residue_connections=inter_residue_connections,
+                inter_residue_connections64=i64(inter_residue_connections),
+                inter_block_bondsep_neighbors=inter_block_bondsep_neighbors,
+                inter_block_bondsep_sparse=inter_block_bondsep_sparse,
+                block_type_ind=block_type_ind,
+                block_type_ind64=i64(block_type_ind),
+                device=device,
+                topology_ind_for_pose=topology_ind_for_pose,
+            )
         )
 
     @classmethod
@@ -212,9 +255,12 @@ class PoseStackBuilder:
         # residue on each pose, except the first and last residues. This will
         # give us the inter_residue_connections tensor
         #
-        # 2) if we know the down-to-up chemical bond separation for each block type
-        # then we can use scan to compute the number of chemical bonds separating
-        # every pair of residues, this will give us the inter_block_bondsep tensor
+        # 2) we then search outward from each connection point, crossing
+        # residues using the intra-residue connection distances read out of
+        # the PBT object and crossing chemical bonds using the
+        # inter_residue_connections64 tensor, until MAX_SIG_BOND_SEPARATION
+        # bonds have been crossed; the connection points reached give the
+        # (sparse) inter-block bond separations
 
         # with flake8 and black working against each other, if you want to give
         # a variable a descriptive name, you often have to assign it to a temporary
@@ -226,8 +272,11 @@ class PoseStackBuilder:
         )
         inter_residue_connections64 = irc64
 
-        inter_block_bondsep64 = cls._find_inter_block_separation_for_polymeric_monomers(
-            pbt, n_poses, max_n_res, real_res, block_type_ind64
+        (
+            inter_block_bondsep_neighbors,
+            inter_block_bondsep_sparse,
+        ) = cls._calculate_sparse_interblock_bondsep(
+            pbt, block_type_ind64, inter_residue_connections64
         )
 
         n_atoms = torch.zeros((n_poses, max_n_res), dtype=torch.int32, device=device)
@@ -245,8 +294,8 @@ class PoseStackBuilder:
             block_coord_offset64=block_coord_offset.to(torch.int64),
             inter_residue_connections=inter_residue_connections64.to(torch.int32),
             inter_residue_connections64=inter_residue_connections64,
-            inter_block_bondsep=inter_block_bondsep64.to(torch.int32),
-            inter_block_bondsep64=inter_block_bondsep64,
+            inter_block_bondsep_neighbors=inter_block_bondsep_neighbors,
+            inter_block_bondsep_sparse=inter_block_bondsep_sparse,
             block_type_ind=block_type_ind64.to(torch.int32),
             block_type_ind64=block_type_ind64,
             device=device,
@@ -313,14 +362,12 @@ class PoseStackBuilder:
         # to this set of inter-residue connections the ones given to us
         # in the connection-annotated sequence.
         #
-        # 3) Then, we will construct a graph representing the edge weights
-        # between all pairs of connection points. a) Intra-residue connection
-        # distances are read out of the PBT object (after an initial annotation)
-        # b) the inter-residue connections will then be added from the inter-residue
-        # connections noted in the inter_residue_connections64 tensor.
-        #
-        # 4) Finally, we invoke all-pairs-shortest-path and then read out the
-        # intra-block bond separations
+        # 3) Finally, we search outward from each connection point, crossing
+        # residues using the intra-residue connection distances read out of
+        # the PBT object (after an initial annotation) and crossing chemical
+        # bonds using the inter_residue_connections64 tensor, until
+        # MAX_SIG_BOND_SEPARATION bonds have been crossed; the connection
+        # points reached give the (sparse) inter-block bond separations
 
         # 1
         resolved_expoly_connections = cls._find_connection_pairs_for_residue_subset(
@@ -338,24 +385,13 @@ class PoseStackBuilder:
             resolved_expoly_connections, inter_residue_connections64
         )
 
-        # 3a
+        # 3
         (
-            pconn_matrix,
-            pconn_offsets,
-            block_n_conn,
-            pose_n_pconn,
-        ) = cls._take_real_conn_conn_intrablock_pairs(pbt, block_type_ind64, real_res)
-
-        # 3b
-        cls._incorporate_inter_residue_connections_into_connectivity_graph(
-            inter_residue_connections64, pconn_offsets, pconn_matrix
-        )
-
-        # 4
-        ibb64 = cls._calculate_interblock_bondsep_from_connectivity_graph(
-            pbt, block_n_conn, pose_n_pconn, pconn_matrix
+            inter_block_bondsep_neighbors,
+            inter_block_bondsep_sparse,
+        ) = cls._calculate_sparse_interblock_bondsep(
+            pbt, block_type_ind64, inter_residue_connections64
         )
-        inter_block_bondsep64 = ibb64
 
         n_atoms = torch.zeros((n_poses, max_n_res), dtype=torch.int32, device=device)
         n_atoms[real_res] = pbt.n_atoms[block_type_ind64[real_res]]
@@ -372,8 +408,8 @@ class PoseStackBuilder:
             block_coord_offset64=block_coord_offset.to(torch.int64),
             inter_residue_connections=inter_residue_connections64.to(torch.int32),
             inter_residue_connections64=inter_residue_connections64,
-            inter_block_bondsep=inter_block_bondsep64.to(torch.int32),
-            inter_block_bondsep64=inter_block_bondsep64,
+            inter_block_bondsep_neighbors=inter_block_bondsep_neighbors,
+            inter_block_bondsep_sparse=inter_block_bondsep_sparse,
             block_type_ind=block_type_ind64.to(torch.int32),
             block_type_ind64=block_type_ind64,
             device=device,
@@ -447,14 +483,12 @@ class PoseStackBuilder:
         # in the connection-annotated sequence. c. Then we will remove the
         # chemical bonds for i-to-i+1 connections that span chains
         #
-        # 3) Then, we will construct a graph representing the edge weights
-        # between all pairs of connection points. a) Intra-residue connection
-        # distances are read out of the PBT object (after an initial annotation)
-        # b) the inter-residue connections will then be added from the inter-residue
-        # connections noted in the inter_residue_connections64 tensor.
-        #
-        # 4) Finally, we invoke all-pairs-shortest-path and then read out the
-        # intra-block bond separations
+        # 3) Finally, we search outward from each connection point, crossing
+        # residues using the intra-residue connection distances read out of
+        # the PBT object (after an initial annotation) and crossing chemical
+        # bonds using the inter_residue_connections64 tensor, until
+        # MAX_SIG_BOND_SEPARATION bonds have been crossed; the connection
+        # points reached give the (sparse) inter-block bond separations
 
         # 1
         resolved_expoly_connections = cls._find_connection_pairs_for_residue_subset(
@@ -472,24 +506,13 @@ class PoseStackBuilder:
             resolved_expoly_connections, inter_residue_connections64
         )
 
-        # 3a
+        # 3
         (
-            pconn_matrix,
-            pconn_offsets,
-            block_n_conn,
-            pose_n_pconn,
-        ) = cls._take_real_conn_conn_intrablock_pairs(pbt, block_type_ind64, real_res)
-
-        # 3b
-        cls._incorporate_inter_residue_connections_into_connectivity_graph(
-            inter_residue_connections64, pconn_offsets, pconn_matrix
-        )
-
-        # 4
-        ibb64 = cls._calculate_interblock_bondsep_from_connectivity_graph(
-            pbt, block_n_conn, pose_n_pconn, pconn_matrix
+            inter_block_bondsep_neighbors,
+            inter_block_bondsep_sparse,
+        ) = cls._calculate_sparse_interblock_bondsep(
+            pbt, block_type_ind64, inter_residue_connections64
         )
-        inter_block_bondsep64 = ibb64
 
         n_atoms = torch.zeros((n_poses, max_n_res), dtype=torch.int32, device=device)
         n_atoms[real_res] = pbt.n_atoms[block_type_ind64[real_res]]
@@ -506,8 +529,8 @@ class PoseStackBuilder:
             block_coord_offset64=block_coord_offset.to(torch.int64),
             inter_residue_connections=inter_residue_connections64.to(torch.int32),
             inter_residue_connections64=inter_residue_connections64,
-            inter_block_bondsep=inter_block_bondsep64.to(torch.int32),
-            inter_block_bondsep64=inter_block_bondsep64,
+            inter_block_bondsep_neighbors=inter_block_bondsep_neighbors,
+            inter_block_bondsep_sparse=inter_block_bondsep_sparse,
             block_type_ind=block_type_ind64.to(torch.int32),
             block_type_ind64=block_type_ind64,
             device=device,
@@ -530,16 +553,18 @@ class PoseStackBuilder:
         #     for res in pose_res_list:
         #         assert res.residue_type in packed_block_types.active_block_types
         # orig_pose_bt_ind = ps.block_type_ind.cpu()
-        for i in range(ps.n_poses):
-            for j in range(ps.max_n_blocks):
-                if ps.is_real_block(i, j):
-                    bt = ps.block_type(i, j)
+        # the block types are remapped once for each of the poses' topologies
+        ts = ps.topology_stack
+        for i in range(ts.n_poses):
+            for j in range(ts.max_n_blocks):
+                if ts.is_real_block(i, j):
+                    bt = ts.block_type(i, j)
                     assert numpy.all(packed_block_types.inds_for_restypes([bt]) != -1)
 
         coords = ps.coords.clone()
 
         block_type_ind = torch.full_like(
-            ps.block_type_ind, -1, device=torch.device("cpu")
+            ts.block_type_ind, -1, device=torch.device("cpu")
         )
         # this could be more efficient if we mapped orig_block_type to new_block_type
         # for i, res in enumerate(ps.residues):
@@ -548,9 +573,9 @@ class PoseStackBuilder:
         #         dtype=torch.int32,
         #         device=ps.device,
         #     )
-        for i in range(ps.n_poses):
-            for j in range(ps.max_n_blocks):
-                orig_bt_ind = ps.block_type_ind64[i, j]
+        for i in range(ts.n_poses):
+            for j in range(ts.max_n_blocks):
+                orig_bt_ind = ts.block_type_ind64[i, j]
                 if orig_bt_ind >= 0:
                     bt = ps.packed_block_types.active_block_types[orig_bt_ind]
                     block_type_ind[i, j] = packed_block_types.inds_for_restypes(
@@ -572,15 +597,16 @@ class PoseStackBuilder:
             # residues=residues,
             # residue_coords=residue_coords,
             coords=coords,
-            block_coord_offset=ps.block_coord_offset,
-            block_coord_offset64=ps.block_coord_offset64,
-            inter_residue_connections=ps.inter_residue_connections,
-            inter_residue_connections64=ps.inter_residue_connections64,
-            inter_block_bondsep=ps.inter_block_bondsep,
-            inter_block_bondsep64=ps.inter_block_bondsep64,
+            block_coord_offset=ts.block_coord_offset,
+            block_coord_offset64=ts.block_coord_offset64,
+            inter_residue_connections=ts.inter_residue_connections,
+            inter_residue_connections64=ts.inter_residue_connections64,
+            inter_block_bondsep_neighbors=ts.inter_block_bondsep_neighbors,
+            inter_block_bondsep_sparse=ts.inter_block_bondsep_sparse,
             block_type_ind=block_type_ind,
             block_type_ind64=i64(block_type_ind),
             device=ps.device,
+            topology_ind_for_pose=ps.topology_ind_for_pose,
         )
 
     ################# HELPER FUNCTIONS FOR CONSTRUCTION ###############
@@ -1117,28 +1143,40 @@ class PoseStackBuilder:
     @validate_args
     def _pack_pose_stack_coords(
         cls,
-        packed_block_types: PackedBlockTypes,
         pose_stacks,  # : List["PoseStack"],
-        max_n_blocks: int,
         device: torch.device,
-    ) -> Tuple[Tensor[torch.float32][:, :, 3], Tensor[torch.int32][:, :]]:
+    ) -> Tensor[torch.float32][:, :, 3]:
         n_poses = sum(len(ps) for ps in pose_stacks)
         max_n_atoms = max(ps.coords.shape[1] for ps in pose_stacks)
-        max_n_blocks = max(ps.block_coord_offset.shape[1] for ps in pose_stacks)
         coords = torch.zeros(
             (n_poses, max_n_atoms, 3), dtype=torch.float32, device=device
         )
-        block_coord_offset = torch.zeros(
-            (n_poses, max_n_blocks), dtype=torch.int32, device=device
-        )
         count = 0
         for p in pose_stacks:
             coords[count : (count + len(p)), : p.coords.shape[1]] = p.coords
-            block_coord_offset[
-                count : (count + len(p)), : p.block_coord_offset.shape[1]
-            ] = p.block_coord_offset
             count += len(p)
-        return coords, block_coord_offset
+        return coords
+
+    @classmethod
+    @validate_args
+    def _block_coord_offset_from_pose_stacks(
+        cls,
+        pose_stacks,  # : List["PoseStack"],
+        ps_offsets: Tensor[torch.int64][:],
+        max_n_blocks: int,
+        device: torch.device,
+    ) -> Tensor[torch.int32][:, :]:
+        n_poses = sum(len(ps) for ps in pose_stacks)
+        block_coord_offset = torch.zeros(
+            (n_poses, max_n_blocks), dtype=torch.int32, device=device
+        )
+        for i, pose_stack in enumerate(pose_stacks):
+            offset = ps_offsets[i]
+            block_coord_offset[
+                offset : (offset + len(pose_stack)),
+                : pose_stack.block_coord_offset.shape[1],
+            ] = pose_stack.block_coord_offset
+        return block_coord_offset
 
     @classmethod
     @validate_args
@@ -1198,29 +1236,44 @@ class PoseStackBuilder:
         ps_offsets: Tensor[torch.int64][:],
         max_n_blocks: int,
         device: torch.device,
-    ) -> Tensor[torch.int32][:, :, :, :, :]:
+    ) -> Tuple[Tensor[torch.int32][:, :, :], Tensor[torch.int32][:, :, :, :, :]]:
         n_poses = sum(len(ps) for ps in pose_stacks)
         max_n_conn = max(
             len(rt.connections) for rt in packed_block_types.active_block_types
         )
-        inter_block_bondsep = torch.full(
-            (n_poses, max_n_blocks, max_n_blocks, max_n_conn, max_n_conn),
-            6,
+        max_n_neighbors = max(
+            ps.inter_block_bondsep_neighbors.shape[2] for ps in pose_stacks
+        )
+        inter_block_bondsep_neighbors = torch.full(
+            (n_poses, max_n_blocks, max_n_neighbors),
+            -1,
+            dtype=torch.int32,
+            device=device,
+        )
+        inter_block_bondsep_sparse = torch.full(
+            (n_poses, max_n_blocks, max_n_neighbors, max_n_conn, max_n_conn),
+            MAX_SIG_BOND_SEPARATION,
             dtype=torch.int32,
             device=device,
         )
         for i, pose_stack in enumerate(pose_stacks):
             offset = ps_offsets[i]
-            i_nblocks = pose_stack.inter_block_bondsep.shape[1]
-            i_nconn = pose_stack.inter_block_bondsep.shape[3]
-            inter_block_bondsep[
+            i_nblocks = pose_stack.inter_block_bondsep_neighbors.shape[1]
+            i_nneighbors = pose_stack.inter_block_bondsep_neighbors.shape[2]
+            i_nconn = pose_stack.inter_block_bondsep_sparse.shape[3]
+            inter_block_bondsep_neighbors[
                 offset : (offset + len(pose_stack)),
                 :i_nblocks,
+                :i_nneighbors,
+            ] = pose_stack.inter_block_bondsep_neighbors
+            inter_block_bondsep_sparse[
+                offset : (offset + len(pose_stack)),
                 :i_nblocks,
+                :i_nneighbors,
                 :i_nconn,
                 :i_nconn,
-            ] = pose_stack.inter_block_bondsep
-        return inter_block_bondsep
+            ] = pose_stack.inter_block_bondsep_sparse
+        return inter_block_bondsep_neighbors, inter_block_bondsep_sparse
 
     @classmethod
     @validate_args
@@ -1784,6 +1837,114 @@ class PoseStackBuilder:
 
         stacked_apsp(pconn_matrix, MAX_SIG_BOND_SEPARATION)
 
+    @classmethod
+    def _calculate_sparse_interblock_bondsep(
+        cls, pbt, block_type_ind64, inter_residue_connections64
+    ):
+        cls._annotate_pbt_w_intraresidue_connection_atom_distances(pbt)
+        return cls._calculate_sparse_interblock_bondsep_heavy(
+            pbt.n_conn,
+            pbt.conn_at_intrablock_bond_sep,
+            block_type_ind64,
+            inter_residue_connections64,
+        )
+
+    @classmethod
+    @validate_args
+    def _calculate_sparse_interblock_bondsep_heavy(
+        cls,
+        pbt_n_conn: Tensor[torch.int32][:],
+        pbt_conn_at_intrablock_bond_sep: Tensor[torch.int32][:, :, :],
+        block_type_ind64: Tensor[torch.int64][:, :],
+        inter_residue_connections64: Tensor[torch.int64][:, :, :, 2],
+    ) -> Tuple[Tensor[torch.int32][:, :, :], Tensor[torch.int32][:, :, :, :, :]]:
+        """Compute the sparse inter-block bond separations (see PoseStack)
+        directly from the inter-residue connections: a bounded search out
+        from each connection finds the connections that are fewer than
+        MAX_SIG_BOND_SEPARATION chemical bonds away, and then the
+        (pose, block1, block2) triples it reaches become the neighbor lists.
+        Neither the dense connection-by-connection graph nor the dense
+        block-by-block bond-separation tensor is ever built.
+        """
+        from tmol.pose.compiled.interblock_bondsep_ops import (
+            interblock_bondsep_path_ends,
+        )
+
+        n_poses = block_type_ind64.shape[0]
+        max_n_blocks = block_type_ind64.shape[1]
+        max_n_conn = pbt_conn_at_intrablock_bond_sep.shape[1]
+        device = pbt_n_conn.device
+
+        path_ends = interblock_bondsep_path_ends(
+            block_type_ind64.to(torch.int32),
+            inter_residue_connections64.to(torch.int32),
+            pbt_n_conn,
+            pbt_conn_at_intrablock_bond_sep,
+            MAX_SIG_BOND_SEPARATION,
+        ).to(torch.int64)
+        pe_pose, pe_block1, pe_conn1, pe_block2, pe_conn2, pe_sep = torch.unbind(
+            path_ends, dim=1
+        )
+
+        # each (pose, block1, block2) triple that the search reached is
+        # a neighbor pair; torch.unique sorts them, so the neighbors of
+        # each block come out in increasing order
+        pose_block1 = pe_pose * max_n_blocks + pe_block1
+        block_pair, path_end_block_pair = torch.unique(
+            pose_block1 * max_n_blocks + pe_block2, return_inverse=True
+        )
+        block_pair_pose_block1 = torch.div(
+            block_pair, max_n_blocks, rounding_mode="floor"
+        )
+        block_pair_block2 = torch.remainder(block_pair, max_n_blocks)
+
+        # the slot for each neighbor pair is its rank among the pairs
+        # sharing the same first block
+        n_neighbors = torch.bincount(
+            block_pair_pose_block1, minlength=n_poses * max_n_blocks
+        )
+        max_n_neighbors = max(
+            1, int(torch.max(n_neighbors)) if n_neighbors.numel() > 0 else 1
+        )
+        block_pair_slot = (
+            torch.arange(block_pair.shape[0], dtype=torch.int64, device=device)
+            - exclusive_cumsum1d(n_neighbors)[block_pair_pose_block1]
+        )
+
+        inter_block_bondsep_neighbors = torch.full(
+            (n_poses * max_n_blocks, max_n_neighbors),
+            -1,
+            dtype=torch.int32,
+            device=device,
+        )
+        inter_block_bondsep_neighbors[block_pair_pose_block1, block_pair_slot] = (
+            block_pair_block2.to(torch.int32)
+        )
+
+        # a pair of connections may have been reached along several paths;
+        # keep the shortest
+        inter_block_bondsep_sparse = torch.full(
+            (n_poses * max_n_blocks * max_n_neighbors * max_n_conn * max_n_conn,),
+            MAX_SIG_BOND_SEPARATION,
+            dtype=torch.int32,
+            device=device,
+        )
+        sparse_ind = (
+            (pose_block1 * max_n_neighbors + block_pair_slot[path_end_block_pair])
+            * max_n_conn
+            + pe_conn1
+        ) * max_n_conn + pe_conn2
+        inter_block_bondsep_sparse.scatter_reduce_(
+            0, sparse_ind, pe_sep.to(torch.int32), reduce="amin"
+        )
+
+        return (
+            inter_block_bondsep_neighbors.view(n_poses, max_n_blocks, max_n_neighbors),
+            inter_block_bondsep_sparse.view(
+                n_poses, max_n_blocks, max_n_neighbors, max_n_conn, max_n_conn
+            ),
+        )
+
     @classmethod
     @validate_args
     def _find_inter_block_separation_for_polymeric_monomers(
@@ -0,0 +1,379 @@
+"""On-disk cache of the annotations score terms make on block types.
+
+Before a ScoreFunction can render its scoring modules, each of its terms
+annotates every block type in the PackedBlockTypes object ("setup_block_type")
+and then aggregates those annotations into tensors on the PackedBlockTypes
+object itself ("setup_packed_block_types"); see the PackedBlockTypes
+docstring. This work is done in Python and takes seconds for a full set of
+block types, and every new process has to redo it. This module saves the
+annotations after they are made and, in a later process, restores them onto a
+freshly constructed PackedBlockTypes object; since the terms test for their
+annotations with hasattr before making them, they then skip the work.
+
+Block types and PackedBlockTypes objects also carry annotations made while
+PoseStacks are constructed (e.g. by tmol.io); only those the terms make,
+found by comparing the attributes before and after each term's setup, are
+saved, and restoring them leaves the others as they are.
+
+A cache entry is keyed by the contents of the parameter database, the
+definitions of the block types, the chemical database, and the classes (and
+source code) of the terms doing the annotating, so editing any of these simply
+misses the cache.
+
+The cache is off unless the TMOL_ANNOTATION_CACHE environment variable names
+the directory to keep it in. Entries hold only tensors, plain containers and
+the field values of tmol attrs classes, and are loaded with torch.load's
+weights_only unpickler, so a planted entry cannot run code; it could still
+hold wrong annotations, so the directory should not be writable by others.
+
+Block types are shared by the PackedBlockTypes objects made for every device,
+so their annotations are restored on the CPU and only where a block type does
+not already have them; the annotations of the PackedBlockTypes are restored
+onto its own device.
+"""
+
+import os
+import io
+import pickle
+import importlib
+import hashlib
+import inspect
+import pathlib
+import tempfile
+import warnings
+import weakref
+from functools import lru_cache
+from typing import Optional, Sequence
+
+import attr
+import numpy
+import pandas
+import torch
+
+from tmol.database import ParameterDatabase
+from tmol.database.chemical import RawResidueType
+from tmol.pose.packed_block_types import PackedBlockTypes
+from tmol.score.energy_term import EnergyTerm
+
+# bump when the layout of the saved annotations changes
+CACHE_FORMAT_VERSION = 3
+
+_raw_residue_type_fields = tuple(f.name for f in attr.fields(RawResidueType))
+
+# the names of the annotations each term class has been seen to make on
+# block types and on PackedBlockTypes objects in this process; block types
+# annotated by an earlier ScoreFunction do not show them again
+_term_block_type_annotations = {}
+_term_packed_block_types_annotations = {}
+
+
+def annotation_cache_dir() -> Optional[pathlib.Path]:
+    """The directory holding cached annotations, or None if caching is off."""
+    cache_dir = os.environ.get("TMOL_ANNOTATION_CACHE")
+    if not cache_dir:
+        return None
+    return pathlib.Path(cache_dir)
+
+
+def annotate_packed_block_types(
+    param_db: ParameterDatabase,
+    packed_block_types: PackedBlockTypes,
+    terms: Sequence[EnergyTerm],
+):
+    """Have each term annotate the block types and the PackedBlockTypes.
+
+    Annotations are restored from the cache when possible; otherwise the
+    terms make them and the result is written to the cache.
+    """
+    term_types = frozenset(type(term) for term in terms)
+    annotated_term_types = getattr(
+        packed_block_types, "_annotated_term_types", frozenset()
+    )
+    if term_types <= annotated_term_types:
+        # the terms' own hasattr checks would make every annotation a no-op
+        return
+
+    cache_file = None
+    cache_dir = annotation_cache_dir()
+    if cache_dir is not None:
+        cache_file = cache_dir / "{}.pt".format(
+            _annotation_key(param_db, packed_block_types, terms)
+        )
+        if _load_annotations(cache_file, packed_block_types, term_types):
+            cache_file = None
+
+    for block_type in packed_block_types.active_block_types:
+        for term in terms:
+            _note_annotations(
+                _term_block_type_annotations, term, block_type, term.setup_block_type
+            )
+    for term in terms:
+        _note_annotations(
+            _term_packed_block_types_annotations,
+            term,
+            packed_block_types,
+            term.setup_packed_block_types,
+        )
+
+    if cache_file is not None:
+        _store_annotations(cache_file, packed_block_types, term_types)
+    packed_block_types._annotated_term_types = annotated_term_types | term_types
+
+
+def _note_annotations(term_annotations, term, obj, setup):
+    """Run setup(obj) and note the annotations it makes as the term's."""
+    before = set(vars(obj))
+    setup(obj)
+    made = {name for name in vars(obj) if name not in before}
+    term_annotations.setdefault(type(term), set()).update(
+        name for name in made if not name.startswith("_")
+    )
+
+
+def _term_annotations(term_annotations, term_types, obj):
+    names = set().union(*(term_annotations.get(tt, ()) for tt in term_types))
+    return {name: value for name, value in vars(obj).items() if name in names}
+
+
+class _DigestPickler(pickle.Pickler):
+    """Pickler producing the same bytes for equal objects in every process.
+
+    Sets and pandas objects pickle in an order that depends on string hashing,
+    which varies between processes, so they are written out in a fixed order;
+    arrays are replaced by their shape, dtype and a hash of their contents,
+    so that large tables (e.g. the rotamer libraries) are not copied into
+    the pickle.
+    """
+
+    def reducer_override(self, obj):
+        if isinstance(obj, (set, frozenset)):
+            return (tuple, (sorted(obj, key=repr),))
+        if isinstance(obj, pandas.Index):
+            return (tuple, (obj.tolist(),))
+        if isinstance(obj, (pandas.Series, pandas.DataFrame)):
+            return (tuple, ((obj.index, obj.to_dict()),))
+        if isinstance(obj, torch.Tensor):
+            obj = obj.detach().cpu().numpy()
+        if isinstance(obj, numpy.ndarray):
+            if obj.dtype.hasobject:
+                return (tuple, ((obj.shape, obj.dtype.str, obj.tolist()),))
+            contents = hashlib.sha256(numpy.ascontiguousarray(obj).data).digest()
+            return (tuple, ((obj.shape, obj.dtype.str, contents),))
+        return NotImplemented
+
+
+def _digest(*objs) -> str:
+    buffer = io.BytesIO()
+    _DigestPickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(objs)
+    return hashlib.sha256(buffer.getvalue()).hexdigest()
+
+
+# digests of long-lived objects (databases, block types), keyed by id and
+# guarded by a weak reference against the id being reused
+_digests = {}
+
+
+def _memoized_digest(obj, compute) -> str:
+    entry = _digests.get(id(obj))
+    if entry is not None and entry[0]() is obj:
+        return entry[1]
+    digest = compute(obj)
+    key = id(obj)
+    _digests[key] = (weakref.ref(obj, lambda _: _digests.pop(key, None)), digest)
+    return digest
+
+
+@lru_cache(maxsize=None)
+def _source_digest(source_file: str) -> str:
+    with open(source_file, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _term_digest(term_type) -> str:
+    """Digest of the source of a term class and of its tmol base classes."""
+    sources = [
+        _source_digest(inspect.getsourcefile(cls))
+        for cls in term_type.__mro__
+        if cls.__module__.startswith("tmol.")
+    ]
+    return _digest(term_type.__module__, term_type.__qualname__, sources)
+
+
+def _annotation_key(
+    param_db: ParameterDatabase,
+    packed_block_types: PackedBlockTypes,
+    terms: Sequence[EnergyTerm],
+) -> str:
+    term_types = sorted(
+        {type(term) for term in terms}, key=lambda t: (t.__module__, t.__qualname__)
+    )
+    return _digest(
+        CACHE_FORMAT_VERSION,
+        _memoized_digest(param_db, lambda db: _digest(db.scoring, db.chemical)),
+        _memoized_digest(packed_block_types.chem_db, _digest),
+        [
+            _memoized_digest(
+                bt,
+                lambda bt: _digest(
+                    *(getattr(bt, field) for field in _raw_residue_type_fields)
+                ),
+            )
+            for bt in packed_block_types.active_block_types
+        ],
+        [_term_digest(term_type) for term_type in term_types],
+        packed_block_types.device.type,
+    )
+
+
+def _encode(value):
+    """The value as nested tuples of tags, plain values and CPU tensors,
+    which torch.load can read back with weights_only set"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return ("value", value)
+    if isinstance(value, torch.Tensor):
+        return ("tensor", value.detach().cpu())
+    if isinstance(value, numpy.ndarray):
+        if value.dtype.hasobject:
+            raise TypeError(f"cannot cache an array of dtype {value.dtype}")
+        # kept as raw bytes, as not every numpy dtype has a torch counterpart
+        dtype = value.dtype.str if value.dtype.fields is None else value.dtype.descr
+        contents = torch.from_numpy(
+            numpy.frombuffer(value.tobytes(), dtype=numpy.uint8).copy()
+        )
+        return ("ndarray", dtype, value.shape, contents)
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__, [_encode(v) for v in value])
+    if isinstance(value, dict):
+        return ("dict", [(_encode(k), _encode(v)) for k, v in value.items()])
+    if attr.has(type(value)) and type(value).__module__.startswith("tmol."):
+        return (
+            "attrs",
+            type(value).__module__,
+            type(value).__qualname__,
+            {f.name: _encode(getattr(value, f.name)) for f in attr.fields(type(value))},
+        )
+    raise TypeError(f"cannot cache a {type(value)}")
+
+
+def _attrs_class(module_name: str, qualname: str):
+    if not module_name.startswith("tmol."):
+        raise ValueError(f"not a tmol class: {module_name}.{qualname}")
+    cls = importlib.import_module(module_name)
+    for name in qualname.split("."):
+        cls = getattr(cls, name)
+    if not attr.has(cls):
+        raise ValueError(f"not an attrs class: {module_name}.{qualname}")
+    return cls
+
+
+def _decode(encoded, device: torch.device):
+    tag = encoded[0]
+    if tag == "value":
+        return encoded[1]
+    if tag == "tensor":
+        return encoded[1].to(device)
+    if tag == "ndarray":
+        _, dtype, shape, contents = encoded
+        return (
+            numpy.frombuffer(contents.numpy().tobytes(), dtype=numpy.dtype(dtype))
+            .reshape(shape)
+            .copy()
+        )
+    if tag == "list":
+        return [_decode(v, device) for v in encoded[1]]
+    if tag == "tuple":
+        return tuple(_decode(v, device) for v in encoded[1])
+    if tag == "dict":
+        return {_decode(k, device): _decode(v, device) for k, v in encoded[1]}
+    if tag == "attrs":
+        _, module_name, qualname, fields = encoded
+        cls = _attrs_class(module_name, qualname)
+        # set the fields as they were saved, without rerunning the
+        # converters and validators (the classes may be frozen)
+        value = cls.__new__(cls)
+        for name, field in fields.items():
+            object.__setattr__(value, name, _decode(field, device))
+        return value
+    raise ValueError(f"unknown cache entry tag {tag!r}")
+
+
+def _load_annotations(cache_file: pathlib.Path, packed_block_types, term_types) -> bool:
+    if not cache_file.exists():
+        return False
+    try:
+        cached = torch.load(cache_file, map_location="cpu", weights_only=True)
+        block_type_names = [bt.name for bt in packed_block_types.active_block_types]
+        if cached["block_type_names"] != block_type_names:
+            return False
+        # the block types stay on the CPU; see the module docstring
+        block_type_annotations = [
+            _decode(annotations, torch.device("cpu"))
+            for annotations in cached["block_types"]
+        ]
+        packed_block_types_annotations = _decode(
+            cached["packed_block_types"], packed_block_types.device
+        )
+    except (
+        OSError,
+        EOFError,
+        RuntimeError,
+        pickle.UnpicklingError,
+        ImportError,
+        AttributeError,
+        KeyError,
+        TypeError,
+        ValueError,
+    ) as err:
+        warnings.warn(f"Ignoring unreadable annotation cache {cache_file}: {err}")
+        return False
+
+    for block_type, annotations in zip(
+        packed_block_types.active_block_types, block_type_annotations
+    ):
+        for name, value in annotations.items():
+            if not hasattr(block_type, name):
+                setattr(block_type, name, value)
+    for name, value in packed_block_types_annotations.items():
+        if not hasattr(packed_block_types, name):
+            setattr(packed_block_types, name, value)
+
+    # the terms will not be seen making what was restored, so credit it to
+    # them all, in case these block types are stored under another key
+    restored_block_type_names = set().union(*block_type_annotations)
+    for term_type in term_types:
+        _term_block_type_annotations.setdefault(term_type, set()).update(
+            restored_block_type_names
+        )
+        _term_packed_block_types_annotations.setdefault(term_type, set()).update(
+            packed_block_types_annotations
+        )
+    return True
+
+
+def _store_annotations(cache_file: pathlib.Path, packed_block_types, term_types):
+    try:
+        cached = dict(
+            block_type_names=[bt.name for bt in packed_block_types.active_block_types],
+            block_types=[
+                _encode(_term_annotations(_term_block_type_annotations, term_types, bt))
+                for bt in packed_block_types.active_block_types
+            ],
+            packed_block_types=_encode(
+                _term_annotations(
+                    _term_packed_block_types_annotations,
+                    term_types,
+                    packed_block_types,
+                )
+            ),
+        )
+    except TypeError as err:
+        warnings.warn(f"Not caching block-type annotations: {err}")
+        return
+
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=cache_file.parent, suffix=".tmp", delete=False
+    ) as f:
+        torch.save(cached, f)
+    # an atomic rename, so concurrent workers never see a partial file
+    os.replace(f.name, cache_file)
@@ -59,7 +59,8 @@ auto BackboneTorsionPoseScoreDispatch<DeviceDispatch, Dev, Real, Int>::forward(
     TView<RamaTableParams<Real>, 1, Dev> rama_table_params,
     TView<Real, 4, Dev> omega_tables,
     TView<RamaTableParams<Real>, 1, Dev> omega_table_params,
-    bool output_block_pair_energies)
+    bool output_block_pair_energies,
+    bool compute_derivs)
     -> std::tuple<TPack<Real, 4, Dev>, TPack<Vec<Real, 3>, 3, Dev>> {
   using tmol::score::common::accumulate;
   using Real3 = Vec<Real, 3>;
@@ -97,17 +98,17 @@ auto BackboneTorsionPoseScoreDispatch<DeviceDispatch, Dev, Real, Int>::forward(
   } else {
     V_t = TPack<Real, 4, Dev>::zeros({2, n_poses, 1, 1});
   }
-  auto dV_dxyz_t =
-      TPack<Vec<Real, 3>, 3, Dev>::zeros({2, n_poses, max_n_pose_atoms});
-
-  auto V = V_t.view;
-  auto dV_dxyz = dV_dxyz_t.view;
+  auto dV_dxyz_t = TPack<Vec<Real, 3>, 3, Dev>::zeros(
+      {2, n_poses, compute_derivs ? max_n_pose_atoms : 0});
 
   LAUNCH_BOX_32;
   // Define nt
   CTA_LAUNCH_T_PARAMS;
 
-  auto rama_omega_func = ([=] TMOL_DEVICE_FUNC(int ind) {
+  auto rama_omega_func = ([=] TMOL_DEVICE_FUNC(
+                              int ind,
+                              TView<Real, 4, Dev> const& V,
+                              TView<Vec<Real, 3>, 3, Dev> const& dV_dxyz) {
     int const pose_ind = ind / max_n_blocks;
     int const block_ind = ind % max_n_blocks;
     int const block_index_v = (output_block_pair_energies) ? block_ind : 0;
@@ -188,11 +189,13 @@ auto BackboneTorsionPoseScoreDispatch<DeviceDispatch, Dev, Real, Int>::forward(
           Eigen::Map<Vec<Real, 2>>(rama_table_params[rama_table_ind].bbsteps));
       accumulate<Dev, Real>::add(
           V[0][pose_ind][block_index_v][block_index_v], common::get<0>(rama));
-      for (int j = 0; j < 4; ++j) {
-        accumulate<Dev, Vec<Real, 3>>::add(
-            dV_dxyz[0][pose_ind][phi_ats[j]], common::get<1>(rama).row(j));
-        accumulate<Dev, Vec<Real, 3>>::add(
-            dV_dxyz[0][pose_ind][psi_ats[j]], common::get<2>(rama).row(j));
+      if (compute_derivs) {
+        for (int j = 0; j < 4; ++j) {
+          accumulate<Dev, Vec<Real, 3>>::add(
+              dV_dxyz[0][pose_ind][phi_ats[j]], common::get<1>(rama).row(j));
+          accumulate<Dev, Vec<Real, 3>>::add(
+              dV_dxyz[0][pose_ind][psi_ats[j]], common::get<2>(rama).row(j));
+        }
       }
     }
 
@@ -242,30 +245,37 @@ auto BackboneTorsionPoseScoreDispatch<DeviceDispatch, Dev, Real, Int>::forward(
           32.8);
       accumulate<Dev, Real>::add(
           V[1][pose_ind][block_index_v][block_index_v], common::get<0>(omega));
-      for (int j = 0; j < 4; ++j) {
-        // omega : [V, dVdphi, dVdpsi, dVdomega]
-        accumulate<Dev, Vec<Real, 3>>::add(
-            dV_dxyz[1][pose_ind][phi_ats[j]], common::get<1>(omega).row(j));
-        accumulate<Dev, Vec<Real, 3>>::add(
-            dV_dxyz[1][pose_ind][psi_ats[j]], common::get<2>(omega).row(j));
-        accumulate<Dev, Vec<Real, 3>>::add(
-            dV_dxyz[1][pose_ind][omega_ats[j]], common::get<3>(omega).row(j));
+      if (compute_derivs) {
+        for (int j = 0; j < 4; ++j) {
+          // omega : [V, dVdphi, dVdpsi, dVdomega]
+          accumulate<Dev, Vec<Real, 3>>::add(
+              dV_dxyz[1][pose_ind][phi_ats[j]], common::get<1>(omega).row(j));
+          accumulate<Dev, Vec<Real, 3>>::add(
+              dV_dxyz[1][pose_ind][psi_ats[j]], common::get<2>(omega).row(j));
+          accumulate<Dev, Vec<Real, 3>>::add(
+              dV_dxyz[1][pose_ind][omega_ats[j]], common::get<3>(omega).row(j));
+        }
       }
     } else {
       // if rama is undefined, fall back to old version
       auto omega = omega_V_dV<Dev, Real, Int>(omega_coords, 32.8);
       accumulate<Dev, Real>::add(
           V[1][pose_ind][block_index_v][block_index_v], common::get<0>(omega));
-      for (int j = 0; j < 4; ++j) {
-        // omega : [V, dVdomega]
-        accumulate<Dev, Vec<Real, 3>>::add(
-            dV_dxyz[1][pose_ind][omega_ats[j]], common::get<1>(omega).row(j));
+      if (compute_derivs) {
+        for (int j = 0; j < 4; ++j) {
+          // omega : [V, dVdomega]
+          accumulate<Dev, Vec<Real, 3>>::add(
+              dV_dxyz[1][pose_ind][omega_ats[j]], common::get<1>(omega).row(j));
+        }
       }
     }
   });
 
   int n_blocks = n_poses * max_n_blocks;
-  DeviceDispatch<Dev>::template forall<launch_t>(n_blocks, rama_omega_func);
+  auto accumulation_targets =
+      DeviceDispatch<Dev>::parallel_accumulation_targets(V_t, dV_dxyz_t);
+  DeviceDispatch<Dev>::template forall<launch_t>(
+      n_blocks, rama_omega_func, accumulation_targets);
 
   return {V_t, dV_dxyz_t};
 };
@@ -331,13 +341,13 @@ auto BackboneTorsionPoseScoreDispatch<DeviceDispatch, Dev, Real, Int>::backward(
   auto dV_dxyz_t =
       TPack<Vec<Real, 3>, 3, Dev>::zeros({2, n_poses, max_n_pose_atoms});
 
-  auto dV_dxyz = dV_dxyz_t.view;
-
   LAUNCH_BOX_32;
   // Define nt
   CTA_LAUNCH_T_PARAMS;
 
-  auto rama_omega_func = ([=] TMOL_DEVICE_FUNC(int ind) {
+  auto rama_omega_func = ([=] TMOL_DEVICE_FUNC(
+                              int ind,
+                              TView<Vec<Real, 3>, 3, Dev> const& dV_dxyz) {
     int const pose_ind = ind / max_n_blocks;
     int const block_ind = ind % max_n_blocks;
     int const block_type = pose_stack_block_type[pose_ind][block_ind];
@@ -496,7 +506,10 @@ auto BackboneTorsionPoseScoreDispatch<DeviceDispatch, Dev, Real, Int>::backward(
   });
 
   int n_blocks = n_poses * max_n_blocks;
-  DeviceDispatch<Dev>::template forall<launch_t>(n_blocks, rama_omega_func);
+  auto accumulation_targets =
+      DeviceDispatch<Dev>::parallel_accumulation_targets(dV_dxyz_t);
+  DeviceDispatch<Dev>::template forall<launch_t>(
+      n_blocks, rama_omega_func, accumulation_targets);
 
   return dV_dxyz_t;
 };
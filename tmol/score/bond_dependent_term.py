@@ -94,7 +94,23 @@ class BondDependentTerm(EnergyTerm):
         if hasattr(pose_stack, "min_block_bondsep"):
             return
 
-        min_block_bondsep, _ = torch.min(pose_stack.inter_block_bondsep, dim=4)
-        min_block_bondsep, _ = torch.min(min_block_bondsep, dim=3)
+        # read the minimum separation for each pair of blocks out of the
+        # sparse representation, once for each topology; blocks that are not
+        # listed as each other's neighbors are at least
+        # MAX_SIG_BOND_SEPARATION bonds apart
+        topologies = pose_stack.topology_stack
+        neighbors = topologies.inter_block_bondsep_neighbors
+        min_block_bondsep = torch.full(
+            (topologies.n_poses, topologies.max_n_blocks, topologies.max_n_blocks),
+            MAX_SIG_BOND_SEPARATION,
+            dtype=torch.int32,
+            device=pose_stack.device,
+        )
+        real = neighbors != -1
+        nz_pose, nz_block1, _ = torch.nonzero(real, as_tuple=True)
+        min_block_bondsep[nz_pose, nz_block1, neighbors[real].to(torch.int64)] = (
+            torch.amin(topologies.inter_block_bondsep_sparse[real], dim=(1, 2))
+        )
+        min_block_bondsep = pose_stack.topology_to_poses(min_block_bondsep)
 
         setattr(pose_stack, "min_block_bondsep", min_block_bondsep)
@@ -116,8 +116,12 @@ TMOL_DEVICE_FUNC void accumulate_result(
     Vec<Int, N> atoms,
     Real& V,
     TensorAccessor<Vec<Real, 3>, 1, D> dV,
+    bool compute_derivs,
     const Real& weight = 1.0) {
   accumulate<D, Real>::add(V, common::get<0>(to_add));
+  if (!compute_derivs) {
+    return;
+  }
   for (int i = 0; i < N; i++) {
     accumulate<D, Vec<Real, 3>>::add(
         dV[atoms[i]], common::get<1>(to_add)[i] * weight);
@@ -188,10 +192,9 @@ auto CartBondedPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
     V_t = TPack<Real, 4, D>::zeros({5, n_poses, 1, 1});
   }
 
-  auto dV_dx_t = TPack<Vec<Real, 3>, 3, D>::zeros({5, n_poses, n_max_atoms});
-
-  auto V = V_t.view;
-  auto dV_dx = dV_dx_t.view;
+  // without derivatives to compute, skip the (largest) allocation, too
+  auto dV_dx_t = TPack<Vec<Real, 3>, 3, D>::zeros(
+      {5, n_poses, compute_derivs ? n_max_atoms : 0});
 
   max_subgraphs_per_block +=
       NUM_INTER_RES_PATHS;  // Add in the inter-residue subgraphs
@@ -200,7 +203,11 @@ auto CartBondedPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
   LAUNCH_BOX_32;
 
   auto func = ([=] TMOL_DEVICE_FUNC(
-                   int pose_index, int block_index, int subgraph_index) {
+                   int pose_index,
+                   int block_index,
+                   int subgraph_index,
+                   TView<Real, 4, D> const& V,
+                   TView<Vec<Real, 3>, 3, D> const& dV_dx) {
     Real score = 0;
 
     int block_type = pose_stack_block_type[pose_index][block_index];
@@ -238,6 +245,7 @@ auto CartBondedPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
                   atoms.head(2),
                   V[score_type][pose_index][block_index_v][block_index_v],
                   dV_dx[score_type][pose_index],
+                  compute_derivs,
                   1.0);
 
               break;
@@ -251,6 +259,7 @@ auto CartBondedPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
                   atoms.head(3),
                   V[score_type][pose_index][block_index_v][block_index_v],
                   dV_dx[score_type][pose_index],
+                  compute_derivs,
                   1.0);
 
               break;
@@ -274,6 +283,7 @@ auto CartBondedPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
                   atoms.head(4),
                   V[score_type][pose_index][block_index_v][block_index_v],
                   dV_dx[score_type][pose_index],
+                  compute_derivs,
                   1.0);
 
               break;
@@ -396,8 +406,10 @@ auto CartBondedPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
     }
   });
 
+  auto accumulation_targets =
+      DeviceDispatch<D>::parallel_accumulation_targets(V_t, dV_dx_t);
   DeviceDispatch<D>::foreach_combination_triple(
-      n_poses, n_blocks, max_subgraphs_per_block, func);
+      n_poses, n_blocks, max_subgraphs_per_block, func, accumulation_targets);
 
   return {V_t, dV_dx_t};
 }
@@ -462,9 +474,6 @@ auto CartBondedPoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
 
   auto dV_dx_t = TPack<Vec<Real, 3>, 3, D>::zeros({5, n_poses, n_max_atoms});
 
-  auto V = V_t.view;
-  auto dV_dx = dV_dx_t.view;
-
   max_subgraphs_per_block +=
       NUM_INTER_RES_PATHS;  // Add in the inter-residue subgraphs
 
@@ -472,7 +481,11 @@ auto CartBondedPoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
   LAUNCH_BOX_32;
 
   auto func = ([=] TMOL_DEVICE_FUNC(
-                   int pose_index, int block_index, int subgraph_index) {
+                   int pose_index,
+                   int block_index,
+                   int subgraph_index,
+                   TView<Real, 4, D> const& V,
+                   TView<Vec<Real, 3>, 3, D> const& dV_dx) {
     Real score = 0;
 
     int block_type = pose_stack_block_type[pose_index][block_index];
@@ -511,6 +524,7 @@ auto CartBondedPoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
                   atoms.head(2),
                   V[score_type][pose_index][block_index][block_index],
                   dV_dx[score_type][pose_index],
+                  true,
                   block_weight);
 
               break;
@@ -524,6 +538,7 @@ auto CartBondedPoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
                   atoms.head(3),
                   V[score_type][pose_index][block_index][block_index],
                   dV_dx[score_type][pose_index],
+                  true,
                   block_weight);
 
               break;
@@ -547,6 +562,7 @@ auto CartBondedPoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
                   atoms.head(4),
                   V[score_type][pose_index][block_index][block_index],
                   dV_dx[score_type][pose_index],
+                  true,
                   block_weight);
 
               break;
@@ -669,8 +685,10 @@ auto CartBondedPoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
     }
   });
 
+  auto accumulation_targets =
+      DeviceDispatch<D>::parallel_accumulation_targets(V_t, dV_dx_t);
   DeviceDispatch<D>::foreach_combination_triple(
-      n_poses, n_blocks, max_subgraphs_per_block, func);
+      n_poses, n_blocks, max_subgraphs_per_block, func, accumulation_targets);
 
   return dV_dx_t;
 }  // namespace potentials
@@ -0,0 +1,81 @@
+#pragma once
+
+#include <tuple>
+
+#include <tmol/score/common/diamond_macros.hh>
+
+namespace tmol {
+namespace score {
+namespace common {
+
+// The tensors a kernel writes to through accumulate<D, T>, as handed to a
+// DeviceOperations/ForallDispatch launch. Such a launch calls its function
+// with the views of these targets appended to the usual arguments, e.g.
+// f(cta, output, dV_dcoords) for foreach_workgroup, and the function must
+// accumulate into those views rather than into views it has captured.
+//
+// On the GPU the views are the targets' own, as accumulation is atomic. On
+// the CPU, the work items may be spread across threads; every thread but
+// the first is then handed views of zeroed private copies of the targets,
+// which are added into the targets once the threads have joined (see
+// threaded_dispatch.cpu.impl.hh). The function must make any other writes
+// only to locations owned by a single work item. A launch given no targets
+// may also be spread across threads, and its function takes no extra
+// arguments.
+template <typename... TPacks>
+struct ParallelAccumulationTargets {
+  std::tuple<TPacks...> targets;
+};
+
+// A function along with the views to append to its arguments; the GPU
+// launches call this in place of the function
+template <typename Func, typename... Views>
+struct WithAccumulationViews;
+
+template <typename Func>
+struct WithAccumulationViews<Func> {
+  Func f;
+
+  template <typename... Args>
+  TMOL_DEVICE_FUNC void operator()(Args... args) const {
+    f(args...);
+  }
+};
+
+template <typename Func, typename View0>
+struct WithAccumulationViews<Func, View0> {
+  Func f;
+  View0 view0;
+
+  template <typename... Args>
+  TMOL_DEVICE_FUNC void operator()(Args... args) const {
+    f(args..., view0);
+  }
+};
+
+template <typename Func, typename View0, typename View1>
+struct WithAccumulationViews<Func, View0, View1> {
+  Func f;
+  View0 view0;
+  View1 view1;
+
+  template <typename... Args>
+  TMOL_DEVICE_FUNC void operator()(Args... args) const {
+    f(args..., view0, view1);
+  }
+};
+
+template <typename Func, typename... TPacks>
+auto with_accumulation_views(
+    Func f, ParallelAccumulationTargets<TPacks...> const& accumulation) {
+  return std::apply(
+      [&](auto const&... targets) {
+        return WithAccumulationViews<Func, decltype(targets.view)...>{
+            f, targets.view...};
+      },
+      accumulation.targets);
+}
+
+}  // namespace common
+}  // namespace score
+}  // namespace tmol
@@ -0,0 +1,31 @@
+#include <tmol/score/common/device_operations.cpu.impl.hh>
+#include <tmol/score/common/block_neighbors.impl.hh>
+
+namespace tmol {
+namespace score {
+namespace common {
+
+template struct BlockSpheresDispatch<
+    DeviceOperations,
+    tmol::Device::CPU,
+    float,
+    int>;
+template struct BlockSpheresDispatch<
+    DeviceOperations,
+    tmol::Device::CPU,
+    double,
+    int>;
+template struct BlockNeighborsDispatch<
+    DeviceOperations,
+    tmol::Device::CPU,
+    float,
+    int>;
+template struct BlockNeighborsDispatch<
+    DeviceOperations,
+    tmol::Device::CPU,
+    double,
+    int>;
+
+}  // namespace common
+}  // namespace score
+}  // namespace tmol
@@ -0,0 +1,31 @@
+#include <tmol/score/common/device_operations.cuda.impl.cuh>
+#include <tmol/score/common/block_neighbors.impl.hh>
+
+namespace tmol {
+namespace score {
+namespace common {
+
+template struct BlockSpheresDispatch<
+    DeviceOperations,
+    tmol::Device::CUDA,
+    float,
+    int>;
+template struct BlockSpheresDispatch<
+    DeviceOperations,
+    tmol::Device::CUDA,
+    double,
+    int>;
+template struct BlockNeighborsDispatch<
+    DeviceOperations,
+    tmol::Device::CUDA,
+    float,
+    int>;
+template struct BlockNeighborsDispatch<
+    DeviceOperations,
+    tmol::Device::CUDA,
+    double,
+    int>;
+
+}  // namespace common
+}  // namespace score
+}  // namespace tmol
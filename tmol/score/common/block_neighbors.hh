@@ -0,0 +1,54 @@
+#pragma once
+
+#include <Eigen/Core>
+
+#include <tmol/utility/tensor/TensorAccessor.h>
+#include <tmol/utility/tensor/TensorPack.h>
+
+namespace tmol {
+namespace score {
+namespace common {
+
+// Enclose each block in a sphere centered at the average position of its
+// atoms: the result is an [n_poses x max_n_blocks x 4] tensor holding the
+// center and radius of each block's sphere (and 0s for empty blocks). The
+// two-body terms take the list of the pairs of these spheres that come
+// within "reach" of each other, which is built from them with a cell list;
+// see tmol/score/common/block_neighbors.py
+template <
+    template <tmol::Device>
+    class DeviceOps,
+    tmol::Device D,
+    typename Real,
+    typename Int>
+struct BlockSpheresDispatch {
+  static auto f(
+      TView<Eigen::Matrix<Real, 3, 1>, 2, D> coords,
+      TView<Int, 2, D> pose_stack_block_coord_offset,
+      TView<Int, 2, D> pose_stack_block_type,
+      TView<Int, 1, D> block_type_n_atoms) -> TPack<Real, 3, D>;
+};
+
+// Determine which pairs of blocks come within "reach" of each other by
+// testing every pair of block spheres. The result is an
+// [n_poses x max_n_blocks x max_n_blocks] tensor with a 1 in the upper
+// triangle (block_ind1 <= block_ind2) for each pair of neighboring blocks
+// and 0 everywhere else; it is the reference for the cell list.
+template <
+    template <tmol::Device>
+    class DeviceOps,
+    tmol::Device D,
+    typename Real,
+    typename Int>
+struct BlockNeighborsDispatch {
+  static auto f(
+      TView<Eigen::Matrix<Real, 3, 1>, 2, D> coords,
+      TView<Int, 2, D> pose_stack_block_coord_offset,
+      TView<Int, 2, D> pose_stack_block_type,
+      TView<Int, 1, D> block_type_n_atoms,
+      Real reach) -> TPack<Int, 3, D>;
+};
+
+}  // namespace common
+}  // namespace score
+}  // namespace tmol
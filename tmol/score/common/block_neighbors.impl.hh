@@ -0,0 +1,93 @@
+#pragma once
+
+#include <tmol/utility/tensor/TensorAccessor.h>
+#include <tmol/utility/tensor/TensorPack.h>
+#include <tmol/utility/nvtx.hh>
+
+#include <tmol/score/common/sphere_overlap.impl.hh>
+
+#include "block_neighbors.hh"
+
+namespace tmol {
+namespace score {
+namespace common {
+
+template <
+    template <tmol::Device>
+    class DeviceOps,
+    tmol::Device D,
+    typename Real,
+    typename Int>
+auto BlockSpheresDispatch<DeviceOps, D, Real, Int>::f(
+    TView<Eigen::Matrix<Real, 3, 1>, 2, D> coords,
+    TView<Int, 2, D> pose_stack_block_coord_offset,
+    TView<Int, 2, D> pose_stack_block_type,
+    TView<Int, 1, D> block_type_n_atoms) -> TPack<Real, 3, D> {
+  NVTXRange _function(__FUNCTION__);
+
+  int const n_poses = coords.size(0);
+  int const max_n_blocks = pose_stack_block_type.size(1);
+
+  assert(pose_stack_block_coord_offset.size(0) == n_poses);
+  assert(pose_stack_block_coord_offset.size(1) == max_n_blocks);
+  assert(pose_stack_block_type.size(0) == n_poses);
+
+  auto block_spheres_t = TPack<Real, 3, D>::zeros({n_poses, max_n_blocks, 4});
+
+  sphere_overlap::compute_block_spheres<DeviceOps, D, Real, Int>::f(
+      coords,
+      pose_stack_block_coord_offset,
+      pose_stack_block_type,
+      block_type_n_atoms,
+      block_spheres_t.view);
+
+  return block_spheres_t;
+}
+
+template <
+    template <tmol::Device>
+    class DeviceOps,
+    tmol::Device D,
+    typename Real,
+    typename Int>
+auto BlockNeighborsDispatch<DeviceOps, D, Real, Int>::f(
+    TView<Eigen::Matrix<Real, 3, 1>, 2, D> coords,
+    TView<Int, 2, D> pose_stack_block_coord_offset,
+    TView<Int, 2, D> pose_stack_block_type,
+    TView<Int, 1, D> block_type_n_atoms,
+    Real reach) -> TPack<Int, 3, D> {
+  NVTXRange _function(__FUNCTION__);
+
+  int const n_poses = coords.size(0);
+  int const max_n_blocks = pose_stack_block_type.size(1);
+
+  assert(pose_stack_block_coord_offset.size(0) == n_poses);
+  assert(pose_stack_block_coord_offset.size(1) == max_n_blocks);
+  assert(pose_stack_block_type.size(0) == n_poses);
+
+  auto block_spheres_t = TPack<Real, 3, D>::zeros({n_poses, max_n_blocks, 4});
+  auto block_neighbors_t =
+      TPack<Int, 3, D>::zeros({n_poses, max_n_blocks, max_n_blocks});
+
+  sphere_overlap::compute_block_spheres<DeviceOps, D, Real, Int>::f(
+      coords,
+      pose_stack_block_coord_offset,
+      pose_stack_block_type,
+      block_type_n_atoms,
+      block_spheres_t.view);
+
+  sphere_overlap::detect_block_neighbors<DeviceOps, D, Real, Int>::f(
+      coords,
+      pose_stack_block_coord_offset,
+      pose_stack_block_type,
+      block_type_n_atoms,
+      block_spheres_t.view,
+      block_neighbors_t.view,
+      reach);
+
+  return block_neighbors_t;
+}
+
+}  // namespace common
+}  // namespace score
+}  // namespace tmol
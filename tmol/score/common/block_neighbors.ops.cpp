@@ -0,0 +1,82 @@
+#include <torch/torch.h>
+#include <torch/script.h>
+
+#include <tmol/utility/tensor/TensorCast.h>
+#include <tmol/utility/function_dispatch/aten.hh>
+
+#include <tmol/score/common/device_operations.hh>
+
+#include "block_neighbors.hh"
+
+namespace tmol {
+namespace score {
+namespace common {
+
+using torch::Tensor;
+
+Tensor compute_block_spheres_op(
+    Tensor coords,
+    Tensor pose_stack_block_coord_offset,
+    Tensor pose_stack_block_type,
+    Tensor block_type_n_atoms) {
+  at::Tensor block_spheres;
+
+  using Int = int32_t;
+
+  TMOL_DISPATCH_FLOATING_DEVICE(
+      coords.type(), "compute_block_spheres_op", ([&] {
+        using Real = scalar_t;
+        constexpr tmol::Device Dev = device_t;
+
+        auto result = BlockSpheresDispatch<DeviceOperations, Dev, Real, Int>::f(
+            TCAST(coords),
+            TCAST(pose_stack_block_coord_offset),
+            TCAST(pose_stack_block_type),
+            TCAST(block_type_n_atoms));
+
+        block_spheres = result.tensor;
+      }));
+
+  return block_spheres;
+}
+
+Tensor detect_block_neighbors_op(
+    Tensor coords,
+    Tensor pose_stack_block_coord_offset,
+    Tensor pose_stack_block_type,
+    Tensor block_type_n_atoms,
+    double reach) {
+  at::Tensor block_neighbors;
+
+  using Int = int32_t;
+
+  TMOL_DISPATCH_FLOATING_DEVICE(
+      coords.type(), "detect_block_neighbors_op", ([&] {
+        using Real = scalar_t;
+        constexpr tmol::Device Dev = device_t;
+
+        auto result =
+            BlockNeighborsDispatch<DeviceOperations, Dev, Real, Int>::f(
+                TCAST(coords),
+                TCAST(pose_stack_block_coord_offset),
+                TCAST(pose_stack_block_type),
+                TCAST(block_type_n_atoms),
+                static_cast<Real>(reach));
+
+        block_neighbors = result.tensor;
+      }));
+
+  return block_neighbors;
+}
+
+// Macro indirection to force TORCH_EXTENSION_NAME macro expansion
+// See https://stackoverflow.com/a/3221914
+#define TORCH_LIBRARY_(ns, m) TORCH_LIBRARY(ns, m)
+TORCH_LIBRARY_(TORCH_EXTENSION_NAME, m) {
+  m.def("compute_block_spheres", &compute_block_spheres_op);
+  m.def("detect_block_neighbors", &detect_block_neighbors_op);
+}
+
+}  // namespace common
+}  // namespace score
+}  // namespace tmol
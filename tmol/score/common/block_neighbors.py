@@ -0,0 +1,184 @@
+import torch
+
+from tmol.utility.cpp_extension import load, relpaths, modulename, cuda_if_available
+
+load(
+    modulename(__name__),
+    cuda_if_available(
+        relpaths(
+            __file__,
+            [
+                "block_neighbors.ops.cpp",
+                "block_neighbors.cpu.cpp",
+                "block_neighbors.cuda.cu",
+            ],
+        )
+    ),
+    is_python_module=False,
+)
+
+_ops = getattr(torch.ops, modulename(__name__))
+
+compute_block_spheres = _ops.compute_block_spheres
+detect_block_neighbors = _ops.detect_block_neighbors
+
+# the 27 offsets from a cell to itself and to each of the cells around it
+_adjacent_cell_offsets = torch.stack(
+    torch.meshgrid(*([torch.arange(-1, 2)] * 3), indexing="ij"), dim=3
+).view(-1, 3)
+
+
+def block_neighbor_pairs(block_spheres, pose_stack_block_types, reach: float):
+    """Find the pairs of blocks whose spheres come within "reach" of each
+    other, testing only the blocks whose centers lie in the same or adjacent
+    cells of a uniform grid rather than every pair of blocks.
+
+    Returns an [n_pairs x 3] int32 tensor of (pose, block1, block2) with
+    block1 <= block2, each real block paired with itself, in increasing
+    order; the two-body terms launch one work item per pair.
+    """
+    device = block_spheres.device
+    pose_ind, block_ind = torch.nonzero(pose_stack_block_types >= 0, as_tuple=True)
+    if pose_ind.shape[0] == 0:
+        return torch.zeros((0, 3), dtype=torch.int32, device=device)
+    centers = block_spheres[pose_ind, block_ind, :3]
+    radii = block_spheres[pose_ind, block_ind, 3]
+
+    # two neighboring blocks have centers closer than twice the largest
+    # radius plus the reach, so with cells that wide, they sit in the
+    # same or adjacent cells. The cell indices start at 1 so that those of
+    # the adjacent cells stay non-negative
+    cell_width = torch.clamp(2 * torch.max(radii) + reach, min=1.0)
+    cells = (
+        torch.floor((centers - torch.min(centers, dim=0)[0]) / cell_width).to(
+            torch.int64
+        )
+        + 1
+    )
+    grid_dims = torch.max(cells, dim=0)[0] + 2
+
+    def cell_key(pose, cell):
+        return (
+            (pose * grid_dims[0] + cell[..., 0]) * grid_dims[1] + cell[..., 1]
+        ) * grid_dims[2] + cell[..., 2]
+
+    # bucket the blocks by cell
+    keys = cell_key(pose_ind, cells)
+    keys, block_order = torch.sort(keys)
+    cell_keys, cell_n_blocks = torch.unique_consecutive(keys, return_counts=True)
+    cell_first_block = torch.cumsum(cell_n_blocks, dim=0) - cell_n_blocks
+
+    # look up the occupied cells around each block
+    adjacent_keys = cell_key(
+        pose_ind.unsqueeze(1),
+        cells.unsqueeze(1) + _adjacent_cell_offsets.to(device).unsqueeze(0),
+    )
+    adjacent_cells = torch.searchsorted(cell_keys, adjacent_keys).clamp(
+        max=cell_keys.shape[0] - 1
+    )
+    occupied = cell_keys[adjacent_cells] == adjacent_keys
+    block_for_cell, _ = torch.nonzero(occupied, as_tuple=True)
+    adjacent_cells = adjacent_cells[occupied]
+
+    # and pair each block with every block in those cells
+    n_candidates = cell_n_blocks[adjacent_cells]
+    candidate_offset = torch.cumsum(n_candidates, dim=0) - n_candidates
+    n_total = int(torch.sum(n_candidates))
+    candidate_ind = torch.arange(n_total, dtype=torch.int64, device=device)
+    first = torch.repeat_interleave(block_for_cell, n_candidates)
+    second = block_order[
+        candidate_ind
+        - torch.repeat_interleave(
+            candidate_offset - cell_first_block[adjacent_cells], n_candidates
+        )
+    ]
+
+    d2 = torch.sum((centers[first] - centers[second]) ** 2, dim=1)
+    d_threshold = radii[first] + radii[second] + reach
+    keep = torch.logical_and(
+        block_ind[first] <= block_ind[second], d2 < d_threshold * d_threshold
+    )
+    first, second = first[keep], second[keep]
+
+    # in the order of the block pairs of the dense layout, so that the
+    # accumulation order does not depend on the grid
+    max_n_blocks = pose_stack_block_types.shape[1]
+    pair_keys, _ = torch.sort(
+        (pose_ind[first] * max_n_blocks + block_ind[first]) * max_n_blocks
+        + block_ind[second]
+    )
+    return torch.stack(
+        (
+            pair_keys // (max_n_blocks * max_n_blocks),
+            (pair_keys // max_n_blocks) % max_n_blocks,
+            pair_keys % max_n_blocks,
+        ),
+        dim=1,
+    ).to(torch.int32)
+
+
+def find_block_neighbor_pairs(
+    coords,
+    pose_stack_block_coord_offset,
+    pose_stack_block_types,
+    bt_n_atoms,
+    reach: float,
+):
+    """The pairs of blocks that come within "reach" of each other in the
+    coords; see block_neighbor_pairs
+    """
+    block_spheres = compute_block_spheres(
+        coords, pose_stack_block_coord_offset, pose_stack_block_types, bt_n_atoms
+    )
+    return block_neighbor_pairs(block_spheres, pose_stack_block_types, reach)
+
+
+def mask_block_neighbor_pairs(block_neighbor_pairs, block_pair_mask):
+    """The block pairs marked by the block_pair_mask, which broadcasts to
+    [n_poses x max_n_blocks x max_n_blocks]
+    """
+    pairs = block_neighbor_pairs.to(torch.int64)
+    marked = block_pair_mask[
+        pairs[:, 0],
+        pairs[:, 1] if block_pair_mask.shape[1] > 1 else 0,
+        pairs[:, 2] if block_pair_mask.shape[2] > 1 else 0,
+    ]
+    return block_neighbor_pairs[marked != 0]
+
+
+class BlockNeighborsModule(torch.nn.Module):
+    """Compute which pairs of blocks come within "reach" of each other
+    in a set of coordinates; two blocks are neighbors if the gap between
+    the spheres that enclose them is smaller than the reach.
+
+    The result is the [n_pairs x 3] int32 tensor of (pose, block1, block2)
+    from block_neighbor_pairs. It is computed once per coordinate update by
+    the WholePoseScoringModule and then handed to each of the two-body terms
+    so that they need not each repeat the work.
+    """
+
+    def __init__(
+        self,
+        pose_stack_block_coord_offset,
+        pose_stack_block_types,
+        bt_n_atoms,
+        reach: float,
+    ):
+        super(BlockNeighborsModule, self).__init__()
+
+        def _p(t):
+            return torch.nn.Parameter(t, requires_grad=False)
+
+        self.pose_stack_block_coord_offset = _p(pose_stack_block_coord_offset)
+        self.pose_stack_block_types = _p(pose_stack_block_types)
+        self.bt_n_atoms = _p(bt_n_atoms)
+        self.reach = reach
+
+    def forward(self, coords):
+        return find_block_neighbor_pairs(
+            coords.detach(),
+            self.pose_stack_block_coord_offset,
+            self.pose_stack_block_types,
+            self.bt_n_atoms,
+            self.reach,
+        )
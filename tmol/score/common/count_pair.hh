@@ -159,6 +159,44 @@ struct CountPair {
   }
 };
 
+// Mirrors tmol.chemical.constants.MAX_SIG_BOND_SEPARATION: the connections
+// of two blocks that are not listed as each other's neighbors in the
+// sparse inter-block bond-separation tensors are at least this many
+// chemical bonds apart
+int constexpr MAX_SIG_BOND_SEPARATION = 6;
+
+// Look up the number of chemical bonds separating connection conn1 on
+// block1 from connection conn2 on block2 in the sparse representation
+// of the inter-block bond separations held by the PoseStack: for each
+// block, the list of blocks whose connections come within
+// MAX_SIG_BOND_SEPARATION chemical bonds of its own connections,
+// and for each of those neighbors, the conn-x-conn bond separations
+template <tmol::Device D, typename Int>
+EIGEN_DEVICE_FUNC int sparse_inter_block_bondsep(
+    // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors
+    TView<Int, 3, D> inter_block_bondsep_neighbors,
+    // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors x
+    // max-n-interblock-connections x max-n-interblock-connections
+    TView<Int, 5, D> inter_block_bondsep,
+    int pose_ind,
+    int block_ind1,
+    int block_ind2,
+    int conn1,
+    int conn2) {
+  int const max_n_neighbors = inter_block_bondsep_neighbors.size(2);
+  for (int ii = 0; ii < max_n_neighbors; ++ii) {
+    int const ii_neighb =
+        inter_block_bondsep_neighbors[pose_ind][block_ind1][ii];
+    if (ii_neighb == block_ind2) {
+      return inter_block_bondsep[pose_ind][block_ind1][ii][conn1][conn2];
+    } else if (ii_neighb == -1 || ii_neighb > block_ind2) {
+      // neighbor lists are sorted and padded with -1s at the end
+      break;
+    }
+  }
+  return MAX_SIG_BOND_SEPARATION;
+}
+
 // For doing inter-residue count pair entirely in shared memory
 // Templated on the number of atoms in the tile and the datatype
 // of the integer-typed T that
@@ -5,6 +5,7 @@ error_this_should_not_be_compiled();  // nvcc should not include this file
 #endif
 
 #include "device_operations.hh"
+#include "threaded_dispatch.cpu.impl.hh"
 
 namespace tmol {
 namespace score {
@@ -12,6 +13,15 @@ namespace common {
 
 template <>
 struct DeviceOperations<tmol::Device::CPU> {
+  // The launches given ParallelAccumulationTargets may spread their work
+  // items across threads; see accumulation_targets.hh and
+  // threaded_dispatch.cpu.impl.hh. The others run serially.
+  template <typename... TPacks>
+  static ParallelAccumulationTargets<TPacks...> parallel_accumulation_targets(
+      TPacks const&... targets) {
+    return {std::make_tuple(targets...)};
+  }
+
   template <typename launch_t, typename Func>
   static void forall(int N, Func f) {
     for (int i = 0; i < N; ++i) {
@@ -19,6 +29,17 @@ struct DeviceOperations<tmol::Device::CPU> {
     }
   }
 
+  template <typename launch_t, typename Func, typename... TPacks>
+  static void forall(
+      int N,
+      Func f,
+      ParallelAccumulationTargets<TPacks...> const& accumulation) {
+    threaded_forall(
+        N,
+        [&](int64_t i, auto... views) { f(int(i), views...); },
+        accumulation);
+  }
+
   template <typename Int, typename Func>
   static void forall_stacks(Int Nstacks, Int N, Func f) {
     for (int stack = 0; stack < Nstacks; ++stack) {
@@ -28,6 +49,22 @@ struct DeviceOperations<tmol::Device::CPU> {
     }
   }
 
+  template <typename Int, typename Func, typename... TPacks>
+  static void forall_stacks(
+      Int Nstacks,
+      Int N,
+      Func f,
+      ParallelAccumulationTargets<TPacks...> const& accumulation) {
+    threaded_forall(
+        int64_t(Nstacks) * N,
+        [&](int64_t index, auto... views) {
+          Int stack = index / N;
+          Int i = index % N;
+          f(stack, i, views...);
+        },
+        accumulation);
+  }
+
   template <typename Int, typename Func>
   static void foreach_combination_triple(Int dim1, Int dim2, Int dim3, Func f) {
     for (Int i = 0; i < dim1; ++i) {
@@ -39,6 +76,25 @@ struct DeviceOperations<tmol::Device::CPU> {
     }
   }
 
+  template <typename Int, typename Func, typename... TPacks>
+  static void foreach_combination_triple(
+      Int dim1,
+      Int dim2,
+      Int dim3,
+      Func f,
+      ParallelAccumulationTargets<TPacks...> const& accumulation) {
+    threaded_forall(
+        int64_t(dim1) * dim2 * dim3,
+        [&](int64_t index, auto... views) {
+          Int i = index / (int64_t(dim2) * dim3);
+          index = index % (int64_t(dim2) * dim3);
+          Int j = index / dim3;
+          Int k = index % dim3;
+          f(i, j, k, views...);
+        },
+        accumulation);
+  }
+
   template <typename launch_t, typename Func>
   static void foreach_workgroup(int n_workgroups, Func f) {
     for (int i = 0; i < n_workgroups; ++i) {
@@ -46,6 +102,17 @@ struct DeviceOperations<tmol::Device::CPU> {
     }
   }
 
+  template <typename launch_t, typename Func, typename... TPacks>
+  static void foreach_workgroup(
+      int n_workgroups,
+      Func f,
+      ParallelAccumulationTargets<TPacks...> const& accumulation) {
+    threaded_forall(
+        n_workgroups,
+        [&](int64_t i, auto... views) { f(int(i), views...); },
+        accumulation);
+  }
+
   template <int N_T, int WIDTH, typename T>
   static void copy_contiguous_data(
       T* __restrict__ dst, T* __restrict__ src, int n) {
@@ -69,7 +136,7 @@ struct DeviceOperations<tmol::Device::CPU> {
     }
   }
 
-  // No op on 1-core CPU
+  // No op; there is one thread per workgroup on the CPU
   template <int N_T, typename T, typename S, typename OP>
   static T reduce_in_workgroup(T val, S, OP) {
     return val;
@@ -86,7 +153,7 @@ struct DeviceOperations<tmol::Device::CPU> {
     return val;
   }
 
-  // No op on 1-core CPU
+  // No op; there is one thread per workgroup on the CPU
   static void synchronize_workgroup() {}
 };
 
@@ -11,6 +11,7 @@ error_this_should_not_be_compiled();  // gcc should not include this file
 #include "device_operations.hh"
 
 #include <tmol/score/common/accumulate.hh>
+#include <tmol/score/common/accumulation_targets.hh>
 
 namespace tmol {
 namespace score {
@@ -18,6 +19,15 @@ namespace common {
 
 template <>
 struct DeviceOperations<tmol::Device::CUDA> {
+  // Accumulation on the GPU is atomic: the launches given
+  // ParallelAccumulationTargets hand their functions the targets' own
+  // views; see accumulation_targets.hh
+  template <typename... TPacks>
+  static ParallelAccumulationTargets<TPacks...> parallel_accumulation_targets(
+      TPacks const&... targets) {
+    return {std::make_tuple(targets...)};
+  }
+
   template <typename launch_t, typename Func>
   static void forall(int N, Func f) {
     mgpu::standard_context_t context;
@@ -54,11 +64,52 @@ struct DeviceOperations<tmol::Device::CUDA> {
 
   template <typename launch_t, typename Func>
   static void foreach_workgroup(int n_workgroups, Func f) {
+    // e.g. a pair list with no pairs; an empty grid is not a valid launch
+    if (n_workgroups == 0) {
+      return;
+    }
     auto wrapper = ([=] __device__(int tid, int cta) { f(cta); });
     mgpu::standard_context_t context;
     mgpu::cta_launch<launch_t>(wrapper, n_workgroups, context);
   }
 
+  template <typename launch_t, typename Func, typename... TPacks>
+  static void forall(
+      int N,
+      Func f,
+      ParallelAccumulationTargets<TPacks...> const& accumulation) {
+    forall<launch_t>(N, with_accumulation_views(f, accumulation));
+  }
+
+  template <typename Int, typename Func, typename... TPacks>
+  static void forall_stacks(
+      Int Nstacks,
+      Int N,
+      Func f,
+      ParallelAccumulationTargets<TPacks...> const& accumulation) {
+    forall_stacks(Nstacks, N, with_accumulation_views(f, accumulation));
+  }
+
+  template <typename Int, typename Func, typename... TPacks>
+  static void foreach_combination_triple(
+      Int dim1,
+      Int dim2,
+      Int dim3,
+      Func f,
+      ParallelAccumulationTargets<TPacks...> const& accumulation) {
+    foreach_combination_triple(
+        dim1, dim2, dim3, with_accumulation_views(f, accumulation));
+  }
+
+  template <typename launch_t, typename Func, typename... TPacks>
+  static void foreach_workgroup(
+      int n_workgroups,
+      Func f,
+      ParallelAccumulationTargets<TPacks...> const& accumulation) {
+    foreach_workgroup<launch_t>(
+        n_workgroups, with_accumulation_views(f, accumulation));
+  }
+
   template <int N_T, int WIDTH, typename T>
   __device__ static void copy_contiguous_data(
       T* __restrict__ dst, T* __restrict__ src, int n) {
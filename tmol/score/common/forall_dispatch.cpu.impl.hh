@@ -2,6 +2,7 @@
 #pragma once
 
 #include "forall_dispatch.hh"
+#include "threaded_dispatch.cpu.impl.hh"
 
 namespace tmol {
 namespace score {
@@ -9,6 +10,15 @@ namespace common {
 
 template <>
 struct ForallDispatch<tmol::Device::CPU> {
+  // The launches given ParallelAccumulationTargets may spread their work
+  // items across threads; see accumulation_targets.hh and
+  // threaded_dispatch.cpu.impl.hh. The others run serially.
+  template <typename... TPacks>
+  static ParallelAccumulationTargets<TPacks...> parallel_accumulation_targets(
+      TPacks const&... targets) {
+    return {std::make_tuple(targets...)};
+  }
+
   template <typename Int, typename Func>
   static void forall(Int N, Func f) {
     for (Int i = 0; i < N; ++i) {
@@ -16,6 +26,17 @@ struct ForallDispatch<tmol::Device::CPU> {
     }
   }
 
+  template <typename Int, typename Func, typename... TPacks>
+  static void forall(
+      Int N,
+      Func f,
+      ParallelAccumulationTargets<TPacks...> const& accumulation) {
+    threaded_forall(
+        N,
+        [&](int64_t i, auto... views) { f(Int(i), views...); },
+        accumulation);
+  }
+
   template <typename Int, typename Func>
   static void forall_stacks(Int Nstacks, Int N, Func f) {
     for (int stack = 0; stack < Nstacks; ++stack) {
@@ -25,6 +46,22 @@ struct ForallDispatch<tmol::Device::CPU> {
     }
   }
 
+  template <typename Int, typename Func, typename... TPacks>
+  static void forall_stacks(
+      Int Nstacks,
+      Int N,
+      Func f,
+      ParallelAccumulationTargets<TPacks...> const& accumulation) {
+    threaded_forall(
+        int64_t(Nstacks) * N,
+        [&](int64_t index, auto... views) {
+          Int stack = index / N;
+          Int i = index % N;
+          f(stack, i, views...);
+        },
+        accumulation);
+  }
+
   template <typename Int, typename Func>
   static void foreach_combination_triple(Int dim1, Int dim2, Int dim3, Func f) {
     for (Int i = 0; i < dim1; ++i) {
@@ -35,6 +72,25 @@ struct ForallDispatch<tmol::Device::CPU> {
       }
     }
   }
+
+  template <typename Int, typename Func, typename... TPacks>
+  static void foreach_combination_triple(
+      Int dim1,
+      Int dim2,
+      Int dim3,
+      Func f,
+      ParallelAccumulationTargets<TPacks...> const& accumulation) {
+    threaded_forall(
+        int64_t(dim1) * dim2 * dim3,
+        [&](int64_t index, auto... views) {
+          Int i = index / (int64_t(dim2) * dim3);
+          index = index % (int64_t(dim2) * dim3);
+          Int j = index / dim3;
+          Int k = index % dim3;
+          f(i, j, k, views...);
+        },
+        accumulation);
+  }
 };
 
 }  // namespace common
@@ -4,12 +4,23 @@
 
 #include "forall_dispatch.hh"
 
+#include <tmol/score/common/accumulation_targets.hh>
+
 namespace tmol {
 namespace score {
 namespace common {
 
 template <>
 struct ForallDispatch<tmol::Device::CUDA> {
+  // Accumulation on the GPU is atomic: the launches given
+  // ParallelAccumulationTargets hand their functions the targets' own
+  // views; see accumulation_targets.hh
+  template <typename... TPacks>
+  static ParallelAccumulationTargets<TPacks...> parallel_accumulation_targets(
+      TPacks const&... targets) {
+    return {std::make_tuple(targets...)};
+  }
+
   template <typename Int, typename Func>
   static void forall(Int N, Func f) {
     mgpu::standard_context_t context;
@@ -43,6 +54,34 @@ struct ForallDispatch<tmol::Device::CUDA> {
         dim1 * dim2 * dim3,
         context);
   }
+
+  template <typename Int, typename Func, typename... TPacks>
+  static void forall(
+      Int N,
+      Func f,
+      ParallelAccumulationTargets<TPacks...> const& accumulation) {
+    forall(N, with_accumulation_views(f, accumulation));
+  }
+
+  template <typename Int, typename Func, typename... TPacks>
+  static void forall_stacks(
+      Int Nstacks,
+      Int N,
+      Func f,
+      ParallelAccumulationTargets<TPacks...> const& accumulation) {
+    forall_stacks(Nstacks, N, with_accumulation_views(f, accumulation));
+  }
+
+  template <typename Int, typename Func, typename... TPacks>
+  static void foreach_combination_triple(
+      Int dim1,
+      Int dim2,
+      Int dim3,
+      Func f,
+      ParallelAccumulationTargets<TPacks...> const& accumulation) {
+    foreach_combination_triple(
+        dim1, dim2, dim3, with_accumulation_views(f, accumulation));
+  }
 };
 
 }  // namespace common
@@ -110,8 +110,11 @@ struct compute_block_spheres {
           thread0_write_out_result);
     });
 
+    // Each block writes only its own sphere; nothing is accumulated
     DeviceDispatch<D>::template foreach_workgroup<launch_t>(
-        coords.size(0) * pose_stack_block_type.size(1), compute_spheres);
+        coords.size(0) * pose_stack_block_type.size(1),
+        compute_spheres,
+        DeviceDispatch<D>::parallel_accumulation_targets());
   }
 };
 
@@ -182,7 +185,9 @@ struct detect_block_neighbors {
                         * pose_stack_block_type.size(1);
 
     DeviceDispatch<D>::template forall<launch_t>(
-        n_block_pairs, detect_neighbors);
+        n_block_pairs,
+        detect_neighbors,
+        DeviceDispatch<D>::parallel_accumulation_targets());
   }
 };
 
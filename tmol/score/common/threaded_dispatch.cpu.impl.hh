@@ -0,0 +1,98 @@
+#pragma once
+
+#ifdef __NVCC__
+error_this_should_not_be_compiled();  // nvcc should not include this file
+#endif
+
+#include <algorithm>
+#include <tuple>
+#include <vector>
+
+#include <ATen/ATen.h>
+#include <ATen/Parallel.h>
+
+#include <tmol/score/common/accumulation_targets.hh>
+
+namespace tmol {
+namespace score {
+namespace common {
+
+// Run f(i, views...) for i in [0, n), where views are those of the
+// accumulation targets (see accumulation_targets.hh). With more than one
+// thread available in ATen's intra-op thread pool (sized by
+// torch.set_num_threads), the range is cut into tiles that are dealt
+// round-robin to one "part" per thread; part 0 accumulates directly into
+// the targets and each other part into zeroed private copies of them. The
+// private copies are then added to the targets in part order, so the result
+// depends only on n and the thread count, never on scheduling. With a
+// single thread, the loop is exactly the serial one.
+template <typename Func, typename... TPacks>
+void threaded_forall(
+    int64_t n,
+    Func f,
+    ParallelAccumulationTargets<TPacks...> const& accumulation) {
+  // How many tiles each part should get; more tiles smooths out the
+  // uneven cost of work items (e.g. the culled half of the block pairs)
+  constexpr int64_t TILES_PER_PART = 16;
+
+  // The views are resolved once per part, not once per work item
+  auto run_tiles = [&](std::tuple<TPacks...> const& targets,
+                       int64_t first_tile,
+                       int64_t tile_stride,
+                       int64_t tile_size) {
+    std::apply(
+        [&](auto const&... target) {
+          for (int64_t tile_begin = first_tile * tile_size; tile_begin < n;
+               tile_begin += tile_stride * tile_size) {
+            int64_t const tile_end = std::min(tile_begin + tile_size, n);
+            for (int64_t i = tile_begin; i < tile_end; ++i) {
+              f(i, target.view...);
+            }
+          }
+        },
+        targets);
+  };
+
+  int64_t const n_threads = at::get_num_threads();
+  if (n_threads <= 1 || n <= 1 || at::in_parallel_region()) {
+    run_tiles(accumulation.targets, 0, 1, std::max(n, int64_t(1)));
+    return;
+  }
+
+  int64_t const n_parts = std::min(n_threads, n);
+  int64_t const tile_size =
+      std::max(int64_t(1), n / (n_parts * TILES_PER_PART));
+
+  std::vector<std::tuple<TPacks...>> part_targets(
+      n_parts, accumulation.targets);
+  for (int64_t part = 1; part < n_parts; ++part) {
+    part_targets[part] = std::apply(
+        [](auto... target) {
+          return std::make_tuple(
+              std::decay_t<decltype(target)>::zeros_like(target)...);
+        },
+        accumulation.targets);
+  }
+
+  at::parallel_for(0, n_parts, 1, [&](int64_t part_begin, int64_t part_end) {
+    for (int64_t part = part_begin; part < part_end; ++part) {
+      run_tiles(part_targets[part], part, n_parts, tile_size);
+    }
+  });
+
+  for (int64_t part = 1; part < n_parts; ++part) {
+    std::apply(
+        [&](auto const&... target) {
+          std::apply(
+              [&](auto const&... private_target) {
+                (target.tensor.add_(private_target.tensor), ...);
+              },
+              part_targets[part]);
+        },
+        accumulation.targets);
+  }
+}
+
+}  // namespace common
+}  // namespace score
+}  // namespace tmol
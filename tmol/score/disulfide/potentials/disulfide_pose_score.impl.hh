@@ -71,15 +71,18 @@ auto DisulfidePoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
     V_t = TPack<Real, 4, D>::zeros({1, n_poses, 1, 1});
   }
 
-  auto dV_dx_t = TPack<Vec<Real, 3>, 3, D>::zeros({1, n_poses, max_n_atoms});
-
-  auto V = V_t.view;
-  auto dV_dx = dV_dx_t.view;
+  // score-only calls neither accumulate into nor allocate the derivatives
+  auto dV_dx_t = TPack<Vec<Real, 3>, 3, D>::zeros(
+      {1, n_poses, compute_derivs ? max_n_atoms : 0});
 
   // Optimal launch box on v100 and a100 is nt=32, vt=1
   LAUNCH_BOX_32;
 
-  auto func = ([=] TMOL_DEVICE_FUNC(int pose_index, int block_index) {
+  auto func = ([=] TMOL_DEVICE_FUNC(
+                   int pose_index,
+                   int block_index,
+                   TView<Real, 4, D> const& V,
+                   TView<Vec<Real, 3>, 3, D> const& dV_dx) {
     const auto& params = global_params[0];
     const auto& inter_block_connections =
         pose_stack_inter_block_connections[pose_index];
@@ -160,6 +163,7 @@ auto DisulfidePoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
             params,
 
             output_block_pair_energies,
+            compute_derivs,
             pose_V,
             pose_dV_dx);
       }
@@ -167,7 +171,10 @@ auto DisulfidePoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
   });
 
   int total_blocks = pose_stack_block_coord_offset.size(1);
-  DeviceDispatch<D>::forall_stacks(n_poses, total_blocks, func);
+  auto accumulation_targets =
+      DeviceDispatch<D>::parallel_accumulation_targets(V_t, dV_dx_t);
+  DeviceDispatch<D>::forall_stacks(
+      n_poses, total_blocks, func, accumulation_targets);
 
   return {V_t, dV_dx_t};
 }
@@ -198,12 +205,13 @@ auto DisulfidePoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
   auto dV_dcoords_t =
       TPack<Vec<Real, 3>, 3, D>::zeros({1, n_poses, max_n_atoms});
 
-  auto dV_dx = dV_dcoords_t.view;
-
   // Optimal launch box on v100 and a100 is nt=32, vt=1
   LAUNCH_BOX_32;
 
-  auto func = ([=] TMOL_DEVICE_FUNC(int pose_index, int block_index) {
+  auto func = ([=] TMOL_DEVICE_FUNC(
+                   int pose_index,
+                   int block_index,
+                   TView<Vec<Real, 3>, 3, D> const& dV_dx) {
     const auto& params = global_params[0];
     const auto& inter_block_connections =
         pose_stack_inter_block_connections[pose_index];
@@ -289,7 +297,10 @@ auto DisulfidePoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
   });
 
   int total_blocks = pose_stack_block_coord_offset.size(1);
-  DeviceDispatch<D>::forall_stacks(n_poses, total_blocks, func);
+  auto accumulation_targets =
+      DeviceDispatch<D>::parallel_accumulation_targets(dV_dcoords_t);
+  DeviceDispatch<D>::forall_stacks(
+      n_poses, total_blocks, func, accumulation_targets);
 
   return dV_dcoords_t;
 }
@@ -35,6 +35,7 @@ TMOL_DEVICE_FUNC void accumulate_disulfide_potential(
     const DisulfideGlobalParams<Real> &params,
 
     bool output_block_pair_energies,
+    bool compute_derivs,
     TensorAccessor<Real, 2, D> pose_V,
     TensorAccessor<Vec<Real, 3>, 1, D> pose_dV_dx) {
   auto block1_CA = coords[block1_CA_ind];
@@ -74,10 +75,12 @@ TMOL_DEVICE_FUNC void accumulate_disulfide_potential(
               / (params.d_scale * std::erfc(-params.d_shape * z / sqrt(2.0))
                  + 1.e-12);
     dscore_d *= params.wt_len;
-    accumulate<D, Vec<Real, 3>>::add(
-        pose_dV_dx[block1_S_ind], dscore_d * ssdist.dV_dA);
-    accumulate<D, Vec<Real, 3>>::add(
-        pose_dV_dx[block2_S_ind], dscore_d * ssdist.dV_dB);
+    if (compute_derivs) {
+      accumulate<D, Vec<Real, 3>>::add(
+          pose_dV_dx[block1_S_ind], dscore_d * ssdist.dV_dA);
+      accumulate<D, Vec<Real, 3>>::add(
+          pose_dV_dx[block2_S_ind], dscore_d * ssdist.dV_dB);
+    }
   }
 
   {  // Calculate Angles
@@ -95,18 +98,20 @@ TMOL_DEVICE_FUNC void accumulate_disulfide_potential(
     // Derivatives
     Real dscore_a = params.a_kappa * sin(angle1 - params.a_mu) * params.wt_ang;
     Real dscore_b = params.a_kappa * sin(angle2 - params.a_mu) * params.wt_ang;
-    accumulate<D, Vec<Real, 3>>::add(
-        pose_dV_dx[block1_CB_ind], dscore_a * csang_1.dV_dA);
-    accumulate<D, Vec<Real, 3>>::add(
-        pose_dV_dx[block1_S_ind], dscore_a * csang_1.dV_dB);
-    accumulate<D, Vec<Real, 3>>::add(
-        pose_dV_dx[block2_S_ind], dscore_a * csang_1.dV_dC);
-    accumulate<D, Vec<Real, 3>>::add(
-        pose_dV_dx[block2_CB_ind], dscore_b * csang_2.dV_dA);
-    accumulate<D, Vec<Real, 3>>::add(
-        pose_dV_dx[block2_S_ind], dscore_b * csang_2.dV_dB);
-    accumulate<D, Vec<Real, 3>>::add(
-        pose_dV_dx[block1_S_ind], dscore_b * csang_2.dV_dC);
+    if (compute_derivs) {
+      accumulate<D, Vec<Real, 3>>::add(
+          pose_dV_dx[block1_CB_ind], dscore_a * csang_1.dV_dA);
+      accumulate<D, Vec<Real, 3>>::add(
+          pose_dV_dx[block1_S_ind], dscore_a * csang_1.dV_dB);
+      accumulate<D, Vec<Real, 3>>::add(
+          pose_dV_dx[block2_S_ind], dscore_a * csang_1.dV_dC);
+      accumulate<D, Vec<Real, 3>>::add(
+          pose_dV_dx[block2_CB_ind], dscore_b * csang_2.dV_dA);
+      accumulate<D, Vec<Real, 3>>::add(
+          pose_dV_dx[block2_S_ind], dscore_b * csang_2.dV_dB);
+      accumulate<D, Vec<Real, 3>>::add(
+          pose_dV_dx[block1_S_ind], dscore_b * csang_2.dV_dC);
+    }
   }
 
   {  // SS dihed
@@ -126,14 +131,16 @@ TMOL_DEVICE_FUNC void accumulate_disulfide_potential(
     dscore_ss /= (exp_score1 + exp_score2 + MEST);
     dscore_ss *= params.wt_dih_ss;
 
-    accumulate<D, Vec<Real, 3>>::add(
-        pose_dV_dx[block1_CB_ind], dscore_ss * dihed.dV_dI);
-    accumulate<D, Vec<Real, 3>>::add(
-        pose_dV_dx[block1_S_ind], dscore_ss * dihed.dV_dJ);
-    accumulate<D, Vec<Real, 3>>::add(
-        pose_dV_dx[block2_S_ind], dscore_ss * dihed.dV_dK);
-    accumulate<D, Vec<Real, 3>>::add(
-        pose_dV_dx[block2_CB_ind], dscore_ss * dihed.dV_dL);
+    if (compute_derivs) {
+      accumulate<D, Vec<Real, 3>>::add(
+          pose_dV_dx[block1_CB_ind], dscore_ss * dihed.dV_dI);
+      accumulate<D, Vec<Real, 3>>::add(
+          pose_dV_dx[block1_S_ind], dscore_ss * dihed.dV_dJ);
+      accumulate<D, Vec<Real, 3>>::add(
+          pose_dV_dx[block2_S_ind], dscore_ss * dihed.dV_dK);
+      accumulate<D, Vec<Real, 3>>::add(
+          pose_dV_dx[block2_CB_ind], dscore_ss * dihed.dV_dL);
+    }
   }
 
   {  // CB-S dihed
@@ -156,16 +163,20 @@ TMOL_DEVICE_FUNC void accumulate_disulfide_potential(
     dscore_cs /= (exp_score1 + exp_score2 + exp_score3 + MEST);
     dscore_cs *= params.wt_dih_cs;
 
-    accumulate<D, Vec<Real, 3>>::add(
-        pose_dV_dx[block1_CA_ind],
-        dscore_cs * disulf_ca_dihedral_angle_1.dV_dI);
-    accumulate<D, Vec<Real, 3>>::add(
-        pose_dV_dx[block1_CB_ind],
-        dscore_cs * disulf_ca_dihedral_angle_1.dV_dJ);
-    accumulate<D, Vec<Real, 3>>::add(
-        pose_dV_dx[block1_S_ind], dscore_cs * disulf_ca_dihedral_angle_1.dV_dK);
-    accumulate<D, Vec<Real, 3>>::add(
-        pose_dV_dx[block2_S_ind], dscore_cs * disulf_ca_dihedral_angle_1.dV_dL);
+    if (compute_derivs) {
+      accumulate<D, Vec<Real, 3>>::add(
+          pose_dV_dx[block1_CA_ind],
+          dscore_cs * disulf_ca_dihedral_angle_1.dV_dI);
+      accumulate<D, Vec<Real, 3>>::add(
+          pose_dV_dx[block1_CB_ind],
+          dscore_cs * disulf_ca_dihedral_angle_1.dV_dJ);
+      accumulate<D, Vec<Real, 3>>::add(
+          pose_dV_dx[block1_S_ind],
+          dscore_cs * disulf_ca_dihedral_angle_1.dV_dK);
+      accumulate<D, Vec<Real, 3>>::add(
+          pose_dV_dx[block2_S_ind],
+          dscore_cs * disulf_ca_dihedral_angle_1.dV_dL);
+    }
 
     // Score (angle 2)
     Real angle2(disulf_ca_dihedral_angle_2.V);
@@ -186,16 +197,20 @@ TMOL_DEVICE_FUNC void accumulate_disulfide_potential(
     dscore_cs /= (exp_score1 + exp_score2 + exp_score3 + MEST);
     dscore_cs *= params.wt_dih_cs;
 
-    accumulate<D, Vec<Real, 3>>::add(
-        pose_dV_dx[block2_CA_ind],
-        dscore_cs * disulf_ca_dihedral_angle_2.dV_dI);
-    accumulate<D, Vec<Real, 3>>::add(
-        pose_dV_dx[block2_CB_ind],
-        dscore_cs * disulf_ca_dihedral_angle_2.dV_dJ);
-    accumulate<D, Vec<Real, 3>>::add(
-        pose_dV_dx[block2_S_ind], dscore_cs * disulf_ca_dihedral_angle_2.dV_dK);
-    accumulate<D, Vec<Real, 3>>::add(
-        pose_dV_dx[block1_S_ind], dscore_cs * disulf_ca_dihedral_angle_2.dV_dL);
+    if (compute_derivs) {
+      accumulate<D, Vec<Real, 3>>::add(
+          pose_dV_dx[block2_CA_ind],
+          dscore_cs * disulf_ca_dihedral_angle_2.dV_dI);
+      accumulate<D, Vec<Real, 3>>::add(
+          pose_dV_dx[block2_CB_ind],
+          dscore_cs * disulf_ca_dihedral_angle_2.dV_dJ);
+      accumulate<D, Vec<Real, 3>>::add(
+          pose_dV_dx[block2_S_ind],
+          dscore_cs * disulf_ca_dihedral_angle_2.dV_dK);
+      accumulate<D, Vec<Real, 3>>::add(
+          pose_dV_dx[block1_S_ind],
+          dscore_cs * disulf_ca_dihedral_angle_2.dV_dL);
+    }
   }
 
   if (output_block_pair_energies) {
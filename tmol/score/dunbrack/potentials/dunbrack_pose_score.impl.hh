@@ -138,7 +138,8 @@ auto DunbrackPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
   } else {
     V_t = TPack<Real, 4, D>::zeros({3, n_poses, 1, 1});
   }
-  auto dV_dx_t = TPack<Vec<Real, 3>, 3, D>::zeros({3, n_poses, max_n_atoms});
+  auto dV_dx_t = TPack<Vec<Real, 3>, 3, D>::zeros(
+      {3, n_poses, compute_derivs ? max_n_atoms : 0});
 
   auto dihedral_atom_inds_t = TPack<Vec<Int, DIH_N_ATOMS>, 3, D>::zeros(
       {n_poses, max_n_blocks, max_n_dih});
@@ -172,13 +173,14 @@ auto DunbrackPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
       TPack<CoordQuad, 3, D>::zeros({n_poses, max_n_blocks, 3});
   auto dneglnprob_nonrot_dtor_xyz = dneglnprob_nonrot_dtor_xyz_t.view;
 
-  auto V = V_t.view;
-  auto dV_dx = dV_dx_t.view;
-
   // Optimal launch box on v100 and a100 is nt=32, vt=1
   LAUNCH_BOX_32;
 
-  auto func = ([=] TMOL_DEVICE_FUNC(int pose_index, int block_index) {
+  auto func = ([=] TMOL_DEVICE_FUNC(
+                   int pose_index,
+                   int block_index,
+                   TView<Real, 4, D> const& V,
+                   TView<Vec<Real, 3>, 3, D> const& dV_dx) {
     int const block_index_v = (output_block_pair_energies) ? block_index : 0;
     int block_type_index = pose_stack_block_type[pose_index][block_index];
 
@@ -265,15 +267,17 @@ auto DunbrackPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
           dihedral_atom_inds[pose_index][block_index][0];
       Vec<Int, DIH_N_ATOMS> psi_ats =
           dihedral_atom_inds[pose_index][block_index][1];
-      for (int j = 0; j < DIH_N_ATOMS; ++j) {
-        if (phi_ats[j] != -1)
-          accumulate<D, Vec<Real, 3>>::add(
-              dV_dx[0][pose_index][phi_ats[j]],
-              dneglnprob_rot_dbb_xyz[pose_index][block_index][0].row(j));
-        if (psi_ats[j] != -1)
-          accumulate<D, Vec<Real, 3>>::add(
-              dV_dx[0][pose_index][psi_ats[j]],
-              dneglnprob_rot_dbb_xyz[pose_index][block_index][1].row(j));
+      if (compute_derivs) {
+        for (int j = 0; j < DIH_N_ATOMS; ++j) {
+          if (phi_ats[j] != -1)
+            accumulate<D, Vec<Real, 3>>::add(
+                dV_dx[0][pose_index][phi_ats[j]],
+                dneglnprob_rot_dbb_xyz[pose_index][block_index][0].row(j));
+          if (psi_ats[j] != -1)
+            accumulate<D, Vec<Real, 3>>::add(
+                dV_dx[0][pose_index][psi_ats[j]],
+                dneglnprob_rot_dbb_xyz[pose_index][block_index][1].row(j));
+        }
       }
     }
 
@@ -309,19 +313,21 @@ auto DunbrackPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
           dihedral_atom_inds[pose_index][block_index][1];
       Vec<Int, DIH_N_ATOMS> tor2_ats =
           dihedral_atom_inds[pose_index][block_index][2 + ii];
-      for (int j = 0; j < DIH_N_ATOMS; ++j) {
-        if (tor0_ats[j] != -1)
-          accumulate<D, Vec<Real, 3>>::add(
-              dV_dx[1][pose_index][tor0_ats[j]],
-              drotchi_devpen_dtor_xyz[pose_index][block_index][0].row(j));
-        if (tor1_ats[j] != -1)
-          accumulate<D, Vec<Real, 3>>::add(
-              dV_dx[1][pose_index][tor1_ats[j]],
-              drotchi_devpen_dtor_xyz[pose_index][block_index][1].row(j));
-        if (tor2_ats[j] != -1)
-          accumulate<D, Vec<Real, 3>>::add(
-              dV_dx[1][pose_index][tor2_ats[j]],
-              drotchi_devpen_dtor_xyz[pose_index][block_index][2].row(j));
+      if (compute_derivs) {
+        for (int j = 0; j < DIH_N_ATOMS; ++j) {
+          if (tor0_ats[j] != -1)
+            accumulate<D, Vec<Real, 3>>::add(
+                dV_dx[1][pose_index][tor0_ats[j]],
+                drotchi_devpen_dtor_xyz[pose_index][block_index][0].row(j));
+          if (tor1_ats[j] != -1)
+            accumulate<D, Vec<Real, 3>>::add(
+                dV_dx[1][pose_index][tor1_ats[j]],
+                drotchi_devpen_dtor_xyz[pose_index][block_index][1].row(j));
+          if (tor2_ats[j] != -1)
+            accumulate<D, Vec<Real, 3>>::add(
+                dV_dx[1][pose_index][tor2_ats[j]],
+                drotchi_devpen_dtor_xyz[pose_index][block_index][2].row(j));
+        }
       }
     }
 
@@ -354,24 +360,30 @@ auto DunbrackPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
           dihedral_atom_inds[pose_index][block_index][1];
       Vec<Int, DIH_N_ATOMS> tor2_ats =
           dihedral_atom_inds[pose_index][block_index][last];
-      for (int j = 0; j < DIH_N_ATOMS; ++j) {
-        if (tor0_ats[j] != -1)
-          accumulate<D, Vec<Real, 3>>::add(
-              dV_dx[2][pose_index][tor0_ats[j]],
-              dneglnprob_nonrot_dtor_xyz[pose_index][block_index][0].row(j));
-        if (tor1_ats[j] != -1)
-          accumulate<D, Vec<Real, 3>>::add(
-              dV_dx[2][pose_index][tor1_ats[j]],
-              dneglnprob_nonrot_dtor_xyz[pose_index][block_index][1].row(j));
-        if (tor2_ats[j] != -1)
-          accumulate<D, Vec<Real, 3>>::add(
-              dV_dx[2][pose_index][tor2_ats[j]],
-              dneglnprob_nonrot_dtor_xyz[pose_index][block_index][2].row(j));
+      if (compute_derivs) {
+        for (int j = 0; j < DIH_N_ATOMS; ++j) {
+          if (tor0_ats[j] != -1)
+            accumulate<D, Vec<Real, 3>>::add(
+                dV_dx[2][pose_index][tor0_ats[j]],
+                dneglnprob_nonrot_dtor_xyz[pose_index][block_index][0].row(j));
+          if (tor1_ats[j] != -1)
+            accumulate<D, Vec<Real, 3>>::add(
+                dV_dx[2][pose_index][tor1_ats[j]],
+                dneglnprob_nonrot_dtor_xyz[pose_index][block_index][1].row(j));
+          if (tor2_ats[j] != -1)
+            accumulate<D, Vec<Real, 3>>::add(
+                dV_dx[2][pose_index][tor2_ats[j]],
+                dneglnprob_nonrot_dtor_xyz[pose_index][block_index][2].row(j));
+        }
       }
     }
   });
 
-  DeviceDispatch<D>::forall_stacks(n_poses, max_n_blocks, func);
+  // Aside from V and dV_dx, each block writes only its own scratch entries
+  auto accumulation_targets =
+      DeviceDispatch<D>::parallel_accumulation_targets(V_t, dV_dx_t);
+  DeviceDispatch<D>::forall_stacks(
+      n_poses, max_n_blocks, func, accumulation_targets);
 
   return {V_t, dV_dx_t};
 }
@@ -502,12 +514,13 @@ auto DunbrackPoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
       TPack<CoordQuad, 3, D>::zeros({n_poses, max_n_blocks, 3});
   auto dneglnprob_nonrot_dtor_xyz = dneglnprob_nonrot_dtor_xyz_t.view;
 
-  auto dV_dx = dV_dx_t.view;
-
   // Optimal launch box on v100 and a100 is nt=32, vt=1
   LAUNCH_BOX_32;
 
-  auto func = ([=] TMOL_DEVICE_FUNC(int pose_index, int block_index) {
+  auto func = ([=] TMOL_DEVICE_FUNC(
+                   int pose_index,
+                   int block_index,
+                   TView<Vec<Real, 3>, 3, D> const& dV_dx) {
     int block_type_index = pose_stack_block_type[pose_index][block_index];
 
     if (block_type_index == -1) return;
@@ -701,7 +714,10 @@ auto DunbrackPoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
     }
   });
 
-  DeviceDispatch<D>::forall_stacks(n_poses, max_n_blocks, func);
+  auto accumulation_targets =
+      DeviceDispatch<D>::parallel_accumulation_targets(dV_dx_t);
+  DeviceDispatch<D>::forall_stacks(
+      n_poses, max_n_blocks, func, accumulation_targets);
 
   return dV_dx_t;
 }  // namespace potentials
@@ -127,7 +127,8 @@ class ElecEnergyTerm(AtomTypeDependentTerm, BondDependentTerm):
             pose_stack_block_coord_offset=pose_stack.block_coord_offset,
             pose_stack_block_types=pose_stack.block_type_ind,
             pose_stack_min_block_bondsep=pose_stack.min_block_bondsep,
-            pose_stack_inter_block_bondsep=pose_stack.inter_block_bondsep,
+            pose_stack_inter_block_bondsep_neighbors=pose_stack.inter_block_bondsep_neighbors,
+            pose_stack_inter_block_bondsep=pose_stack.inter_block_bondsep_sparse,
             bt_n_atoms=pbt.n_atoms,
             bt_partial_charge=pbt.elec_partial_charge,
             bt_n_interblock_bonds=pbt.n_conn,
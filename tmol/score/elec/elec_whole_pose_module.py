@@ -1,15 +1,21 @@
 import torch
 
 from tmol.score.elec.potentials.compiled import elec_pose_scores
+from tmol.score.common.block_neighbors import find_block_neighbor_pairs
 from tmol.score.common.convert_float64 import convert_float64
 
 
 class ElecWholePoseScoringModule(torch.nn.Module):
+    # blocks whose bounding spheres are farther apart than this (in A)
+    # cannot interact
+    block_neighbor_reach = 5.5
+
     def __init__(
         self,
         pose_stack_block_coord_offset,
         pose_stack_block_types,
         pose_stack_min_block_bondsep,
+        pose_stack_inter_block_bondsep_neighbors,
         pose_stack_inter_block_bondsep,
         bt_n_atoms,
         bt_partial_charge,
@@ -30,6 +36,9 @@ class ElecWholePoseScoringModule(torch.nn.Module):
         self.pose_stack_block_coord_offset = _p(pose_stack_block_coord_offset)
         self.pose_stack_block_types = _p(pose_stack_block_types)
         self.pose_stack_min_block_bondsep = _p(pose_stack_min_block_bondsep)
+        self.pose_stack_inter_block_bondsep_neighbors = _p(
+            pose_stack_inter_block_bondsep_neighbors
+        )
         self.pose_stack_inter_block_bondsep = _p(pose_stack_inter_block_bondsep)
         self.bt_n_atoms = _p(bt_n_atoms)
         self.bt_partial_charge = _p(bt_partial_charge)
@@ -52,12 +61,24 @@ class ElecWholePoseScoringModule(torch.nn.Module):
             )[None, :]
         )
 
-    def forward(self, coords, output_block_pair_energies=False):
+    def forward(
+        self, coords, output_block_pair_energies=False, block_neighbor_pairs=None
+    ):
+        if block_neighbor_pairs is None:
+            block_neighbor_pairs = find_block_neighbor_pairs(
+                coords.detach(),
+                self.pose_stack_block_coord_offset,
+                self.pose_stack_block_types,
+                self.bt_n_atoms,
+                self.block_neighbor_reach,
+            )
+
         args = [
             coords,
             self.pose_stack_block_coord_offset,
             self.pose_stack_block_types,
             self.pose_stack_min_block_bondsep,
+            self.pose_stack_inter_block_bondsep_neighbors,
             self.pose_stack_inter_block_bondsep,
             self.bt_n_atoms,
             self.bt_partial_charge,
@@ -66,6 +87,7 @@ class ElecWholePoseScoringModule(torch.nn.Module):
             self.bt_inter_repr_path_distance,
             self.bt_intra_repr_path_distance,
             self.global_params,
+            block_neighbor_pairs,
             output_block_pair_energies,
         ]
 
@@ -31,6 +31,7 @@ class ElecPoseScoreOp
       Tensor pose_stack_block_coord_offset,
       Tensor pose_stack_block_type,
       Tensor pose_stack_min_bond_separation,
+      Tensor pose_stack_inter_block_bondsep_neighbors,
       Tensor pose_stack_inter_block_bondsep,
 
       Tensor block_type_n_atoms,
@@ -41,10 +42,10 @@ class ElecPoseScoreOp
 
       Tensor block_type_intra_repr_path_distance,
       Tensor global_params,
+      Tensor block_neighbor_pairs,
       bool output_block_pair_energies) {
     at::Tensor score;
     at::Tensor dscore_dcoords;
-    at::Tensor block_neighbors;
 
     using Int = int32_t;
 
@@ -59,6 +60,7 @@ class ElecPoseScoreOp
                   TCAST(pose_stack_block_coord_offset),
                   TCAST(pose_stack_block_type),
                   TCAST(pose_stack_min_bond_separation),
+                  TCAST(pose_stack_inter_block_bondsep_neighbors),
                   TCAST(pose_stack_inter_block_bondsep),
 
                   TCAST(block_type_n_atoms),
@@ -69,12 +71,12 @@ class ElecPoseScoreOp
 
                   TCAST(block_type_intra_repr_path_distance),
                   TCAST(global_params),
+                  TCAST(block_neighbor_pairs),
                   output_block_pair_energies,
                   coords.requires_grad());
 
           score = std::get<0>(result).tensor;
           dscore_dcoords = std::get<1>(result).tensor;
-          block_neighbors = std::get<2>(result).tensor;
         }));
 
     if (output_block_pair_energies) {
@@ -85,6 +87,7 @@ class ElecPoseScoreOp
 
            pose_stack_block_type,
            pose_stack_min_bond_separation,
+           pose_stack_inter_block_bondsep_neighbors,
            pose_stack_inter_block_bondsep,
 
            block_type_n_atoms,
@@ -95,7 +98,7 @@ class ElecPoseScoreOp
 
            block_type_intra_repr_path_distance,
            global_params,
-           block_neighbors});
+           block_neighbor_pairs});
     } else {
       score = score.squeeze(-1).squeeze(-1);  // remove final 2 "dummy" dims
       ctx->save_for_backward({dscore_dcoords});
@@ -138,6 +141,7 @@ class ElecPoseScoreOp
 
       auto pose_stack_block_type = saved[i++];
       auto pose_stack_min_bond_separation = saved[i++];
+      auto pose_stack_inter_block_bondsep_neighbors = saved[i++];
       auto pose_stack_inter_block_bondsep = saved[i++];
 
       auto block_type_n_atoms = saved[i++];
@@ -148,7 +152,7 @@ class ElecPoseScoreOp
 
       auto block_type_intra_repr_path_distance = saved[i++];
       auto global_params = saved[i++];
-      auto block_neighbors = saved[i++];
+      auto block_neighbor_pairs = saved[i++];
 
       using Int = int32_t;
 
@@ -169,6 +173,7 @@ class ElecPoseScoreOp
                     TCAST(pose_stack_block_coord_offset),
                     TCAST(pose_stack_block_type),
                     TCAST(pose_stack_min_bond_separation),
+                    TCAST(pose_stack_inter_block_bondsep_neighbors),
                     TCAST(pose_stack_inter_block_bondsep),
 
                     TCAST(block_type_n_atoms),
@@ -179,7 +184,7 @@ class ElecPoseScoreOp
 
                     TCAST(block_type_intra_repr_path_distance),
                     TCAST(global_params),
-                    TCAST(block_neighbors),
+                    TCAST(block_neighbor_pairs),
                     TCAST(dTdV));
 
             dV_d_pose_coords = result.tensor;
@@ -202,6 +207,8 @@ class ElecPoseScoreOp
         torch::Tensor(),
         torch::Tensor(),
         torch::Tensor(),
+        torch::Tensor(),
+        torch::Tensor(),
     };
   }
 };
@@ -212,6 +219,7 @@ Tensor elec_pose_scores_op(
     Tensor pose_stack_block_coord_offset,
     Tensor pose_stack_block_type,
     Tensor pose_stack_min_bond_separation,
+    Tensor pose_stack_inter_block_bondsep_neighbors,
     Tensor pose_stack_inter_block_bondsep,
 
     Tensor block_type_n_atoms,
@@ -222,12 +230,14 @@ Tensor elec_pose_scores_op(
 
     Tensor block_type_intra_repr_path_distance,
     Tensor global_params,
+    Tensor block_neighbor_pairs,
     bool output_block_pair_energies) {
   return ElecPoseScoreOp<DispatchMethod>::apply(
       coords,
       pose_stack_block_coord_offset,
       pose_stack_block_type,
       pose_stack_min_bond_separation,
+      pose_stack_inter_block_bondsep_neighbors,
       pose_stack_inter_block_bondsep,
 
       block_type_n_atoms,
@@ -238,6 +248,7 @@ Tensor elec_pose_scores_op(
 
       block_type_intra_repr_path_distance,
       global_params,
+      block_neighbor_pairs,
       output_block_pair_energies);
 }
 
@@ -2,6 +2,7 @@
 
 #include <tmol/utility/tensor/TensorAccessor.h>
 
+#include <tmol/score/common/count_pair.hh>
 #include <tmol/score/common/data_loading.hh>
 #include <tmol/score/elec/potentials/params.hh>
 #include <tmol/score/elec/potentials/potentials.hh>
@@ -135,6 +136,7 @@ void TMOL_DEVICE_FUNC elec_load_tile_invariant_interres_data(
     TView<Int, 3, D> pose_stack_min_bond_separation,
     TView<Int, 1, D> block_type_n_interblock_bonds,
     TView<Int, 2, D> block_type_atoms_forming_chemical_bonds,
+    TView<Int, 3, D> pose_stack_inter_block_bondsep_neighbors,
     TView<Int, 5, D> pose_stack_inter_block_bondsep,
     TView<ElecGlobalParams<Real>, 1, D> global_params,
     int const max_important_bond_separation,
@@ -197,8 +199,14 @@ void TMOL_DEVICE_FUNC elec_load_tile_invariant_interres_data(
           int conn1 = conn_ind / inter_dat.r2.n_conn;
           int conn2 = conn_ind % inter_dat.r2.n_conn;
           shared_m.conn_seps[conn_ind] =
-              pose_stack_inter_block_bondsep[pose_ind][block_ind1][block_ind2]
-                                            [conn1][conn2];
+              common::count_pair::sparse_inter_block_bondsep<D, Int>(
+                  pose_stack_inter_block_bondsep_neighbors,
+                  pose_stack_inter_block_bondsep,
+                  pose_ind,
+                  block_ind1,
+                  block_ind2,
+                  conn1,
+                  conn2);
         }
       }
     });
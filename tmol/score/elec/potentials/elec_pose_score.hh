@@ -44,7 +44,13 @@ struct ElecPoseScoreDispatch {
       // (possibly) fit in constant cache
       TView<Int, 3, D> pose_stack_min_bond_separation,
 
-      // dims: n-poses x max-n-blocks x max-n-blocks x
+      // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors
+      // for each block, the (sorted) indices of the blocks whose
+      // connections are within MAX_SIG_BOND_SEPARATION chemical bonds
+      // of its own; -1 sentinel
+      TView<Int, 3, D> pose_stack_inter_block_bondsep_neighbors,
+
+      // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors x
       // max-n-interblock-connections x max-n-interblock-connections
       TView<Int, 5, D> pose_stack_inter_block_bondsep,
 
@@ -81,9 +87,15 @@ struct ElecPoseScoreDispatch {
 
       // LJ parameters
       TView<ElecGlobalParams<Real>, 1, D> global_params,
+
+      // dims: n-block-pairs x 3
+      // the (pose, block1, block2) of each pair of blocks close enough to
+      // interact, with block1 <= block2; one work item is launched per pair
+      TView<Int, 2, D> block_neighbor_pairs,
+
       bool output_block_pair_energies,
-      bool compute_derivs) -> std::
-      tuple<TPack<Real, 4, D>, TPack<Vec<Real, 3>, 3, D>, TPack<Int, 3, D> >;
+      bool compute_derivs)
+      -> std::tuple<TPack<Real, 4, D>, TPack<Vec<Real, 3>, 3, D> >;
 
   static auto backward(
       TView<Vec<Real, 3>, 2, D> coords,
@@ -99,7 +111,13 @@ struct ElecPoseScoreDispatch {
       // (possibly) fit in constant cache
       TView<Int, 3, D> pose_stack_min_bond_separation,
 
-      // dims: n-poses x max-n-blocks x max-n-blocks x
+      // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors
+      // for each block, the (sorted) indices of the blocks whose
+      // connections are within MAX_SIG_BOND_SEPARATION chemical bonds
+      // of its own; -1 sentinel
+      TView<Int, 3, D> pose_stack_inter_block_bondsep_neighbors,
+
+      // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors x
       // max-n-interblock-connections x max-n-interblock-connections
       TView<Int, 5, D> pose_stack_inter_block_bondsep,
 
@@ -137,8 +155,8 @@ struct ElecPoseScoreDispatch {
       // LJ parameters
       TView<ElecGlobalParams<Real>, 1, D> global_params,
 
-      TView<Int, 3, D> scratch_block_neighbors,  // from forward pass
-      TView<Real, 4, D> dTdV                     // nterms x nposes x len x len
+      TView<Int, 2, D> block_neighbor_pairs,  // from forward pass
+      TView<Real, 4, D> dTdV             // nterms x nposes x len x len
       ) -> TPack<Vec<Real, 3>, 3, D>;
 };
 
@@ -15,7 +15,6 @@
 #include <tmol/score/common/diamond_macros.hh>
 #include <tmol/score/common/geom.hh>
 #include <tmol/score/common/launch_box_macros.hh>
-#include <tmol/score/common/sphere_overlap.impl.hh>
 #include <tmol/score/common/tile_atom_pair_evaluation.hh>
 #include <tmol/score/common/tuple.hh>
 #include <tmol/score/common/warp_segreduce.hh>
@@ -158,6 +157,7 @@ EIGEN_DEVICE_FUNC int interres_count_pair_separation(
         pose_stack_min_bond_separation,                            \
         block_type_n_interblock_bonds,                             \
         block_type_atoms_forming_chemical_bonds,                   \
+        pose_stack_inter_block_bondsep_neighbors,                  \
         pose_stack_inter_block_bondsep,                            \
         global_params,                                             \
         max_important_bond_separation,                             \
@@ -372,7 +372,13 @@ auto ElecPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
     // (possibly) fit in constant cache
     TView<Int, 3, D> pose_stack_min_bond_separation,
 
-    // dims: n-poses x max-n-blocks x max-n-blocks x
+    // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors
+    // for each block, the (sorted) indices of the blocks whose
+    // connections are within MAX_SIG_BOND_SEPARATION chemical bonds
+    // of its own; -1 sentinel
+    TView<Int, 3, D> pose_stack_inter_block_bondsep_neighbors,
+
+    // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors x
     // max-n-interblock-connections x max-n-interblock-connections
     TView<Int, 5, D> pose_stack_inter_block_bondsep,
 
@@ -409,9 +415,15 @@ auto ElecPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
 
     // LJ parameters
     TView<ElecGlobalParams<Real>, 1, D> global_params,
+
+    // dims: n-block-pairs x 3
+    // the (pose, block1, block2) of each pair of blocks close enough to
+    // interact, with block1 <= block2; one work item is launched per pair
+    TView<Int, 2, D> block_neighbor_pairs,
+
     bool output_block_pair_energies,
-    bool compute_derivs) -> std::
-    tuple<TPack<Real, 4, D>, TPack<Vec<Real, 3>, 3, D>, TPack<Int, 3, D> > {
+    bool compute_derivs)
+    -> std::tuple<TPack<Real, 4, D>, TPack<Vec<Real, 3>, 3, D> > {
   using tmol::score::common::accumulate;
   using Real3 = Vec<Real, 3>;
 
@@ -431,9 +443,13 @@ auto ElecPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
   assert(pose_stack_min_bond_separation.size(1) == max_n_blocks);
   assert(pose_stack_min_bond_separation.size(2) == max_n_blocks);
 
+  assert(pose_stack_inter_block_bondsep_neighbors.size(0) == n_poses);
+  assert(pose_stack_inter_block_bondsep_neighbors.size(1) == max_n_blocks);
   assert(pose_stack_inter_block_bondsep.size(0) == n_poses);
   assert(pose_stack_inter_block_bondsep.size(1) == max_n_blocks);
-  assert(pose_stack_inter_block_bondsep.size(2) == max_n_blocks);
+  assert(
+      pose_stack_inter_block_bondsep.size(2)
+      == pose_stack_inter_block_bondsep_neighbors.size(2));
   assert(pose_stack_inter_block_bondsep.size(3) == max_n_interblock_bonds);
   assert(pose_stack_inter_block_bondsep.size(4) == max_n_interblock_bonds);
 
@@ -458,26 +474,21 @@ auto ElecPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
   } else {
     output_t = TPack<Real, 4, D>::zeros({1, n_poses, 1, 1});
   }
-  auto output = output_t.view;
-
-  auto dV_dcoords_t =
-      TPack<Vec<Real, 3>, 3, D>::zeros({1, n_poses, max_n_pose_atoms});
-  auto dV_dcoords = dV_dcoords_t.view;
 
-  auto scratch_block_spheres_t =
-      TPack<Real, 3, D>::zeros({n_poses, max_n_blocks, 4});
-  auto scratch_block_spheres = scratch_block_spheres_t.view;
-
-  auto scratch_block_neighbors_t =
-      TPack<Int, 3, D>::zeros({n_poses, max_n_blocks, max_n_blocks});
-  auto scratch_block_neighbors = scratch_block_neighbors_t.view;
+  // the energy-only path below never touches dV_dcoords
+  auto dV_dcoords_t = TPack<Vec<Real, 3>, 3, D>::zeros(
+      {1, n_poses, compute_derivs ? max_n_pose_atoms : 0});
 
   // Optimal launch box on v100 and a100 is nt=32, vt=1
   LAUNCH_BOX_32;
   // Define nt and reduce_t
   CTA_REAL_REDUCE_T_TYPEDEF;
 
-  auto eval_energies_by_block = ([=] TMOL_DEVICE_FUNC(int cta) {
+  auto eval_energies_by_block = ([=] TMOL_DEVICE_FUNC(
+                                     int cta,
+                                     TView<Real, 4, D> const& output,
+                                     TView<Vec<Real, 3>, 3, D> const&
+                                         dV_dcoords) {
     auto elec_atom_energy_and_derivs =
         ([=] TMOL_DEVICE_FUNC(
              int atom_tile_ind1,
@@ -506,17 +517,9 @@ auto ElecPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
 
     } shared;
 
-    int const pose_ind = cta / (max_n_blocks * max_n_blocks);
-    int const block_ind_pair = cta % (max_n_blocks * max_n_blocks);
-    int const block_ind1 = block_ind_pair / max_n_blocks;
-    int const block_ind2 = block_ind_pair % max_n_blocks;
-    if (block_ind1 > block_ind2) {
-      return;
-    }
-
-    if (scratch_block_neighbors[pose_ind][block_ind1][block_ind2] == 0) {
-      return;
-    }
+    int const pose_ind = block_neighbor_pairs[cta][0];
+    int const block_ind1 = block_neighbor_pairs[cta][1];
+    int const block_ind2 = block_neighbor_pairs[cta][2];
 
     int const max_important_bond_separation = 4;
 
@@ -587,7 +590,10 @@ auto ElecPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
         store_calculated_energies);
   });
 
-  auto eval_energies = ([=] TMOL_DEVICE_FUNC(int cta) {
+  auto eval_energies = ([=] TMOL_DEVICE_FUNC(
+                            int cta,
+                            TView<Real, 4, D> const& output,
+                            TView<Vec<Real, 3>, 3, D> const& dV_dcoords) {
     auto elec_atom_energy_and_derivs =
         ([=] TMOL_DEVICE_FUNC(
              int atom_tile_ind1,
@@ -628,17 +634,9 @@ auto ElecPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
 
     } shared;
 
-    int const pose_ind = cta / (max_n_blocks * max_n_blocks);
-    int const block_ind_pair = cta % (max_n_blocks * max_n_blocks);
-    int const block_ind1 = block_ind_pair / max_n_blocks;
-    int const block_ind2 = block_ind_pair % max_n_blocks;
-    if (block_ind1 > block_ind2) {
-      return;
-    }
-
-    if (scratch_block_neighbors[pose_ind][block_ind1][block_ind2] == 0) {
-      return;
-    }
+    int const pose_ind = block_neighbor_pairs[cta][0];
+    int const block_ind1 = block_neighbor_pairs[cta][1];
+    int const block_ind2 = block_neighbor_pairs[cta][2];
 
     int const max_important_bond_separation = 4;
 
@@ -711,48 +709,22 @@ auto ElecPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
 
   ///////////////////////////////////////////////////////////////////////
 
-  // Three steps
-  // 0: setup
-  // 1: launch a kernel to find a small bounding sphere surrounding the blocks
-  // 2: launch a kernel to look for spheres that are within striking distance of
-  // each other
-  // 3: launch a kernel to evaluate lj/lk between pairs of blocks
-  // within striking distance
-
-  // 0
-  // TO DO: let DeviceDispatch hold a cuda stream (??)
-  // at::cuda::CUDAStream wrapped_stream = at::cuda::getDefaultCUDAStream();
-  // mgpu::standard_context_t context(wrapped_stream.stream());
-  int const n_block_pairs = n_poses * max_n_blocks * max_n_blocks;
-
-  score::common::sphere_overlap::
-      compute_block_spheres<DeviceDispatch, D, Real, Int>::f(
-          coords,
-          pose_stack_block_coord_offset,
-          pose_stack_block_type,
-          block_type_n_atoms,
-          scratch_block_spheres);
-
-  score::common::sphere_overlap::
-      detect_block_neighbors<DeviceDispatch, D, Real, Int>::f(
-          coords,
-          pose_stack_block_coord_offset,
-          pose_stack_block_type,
-          block_type_n_atoms,
-          scratch_block_spheres,
-          scratch_block_neighbors,
-          Real(5.5));  // 5.5A hard coded here. Please fix! TEMP!
-
-  // 3
+  // The block pairs that are within striking distance of each other
+  // have already been found (see tmol/score/common/block_neighbors.py);
+  // launch a kernel to evaluate elec between them
+  int const n_block_pairs = block_neighbor_pairs.size(0);
+
+  auto accumulation_targets =
+      DeviceDispatch<D>::parallel_accumulation_targets(output_t, dV_dcoords_t);
   if (output_block_pair_energies) {
     DeviceDispatch<D>::template foreach_workgroup<launch_t>(
-        n_block_pairs, eval_energies_by_block);
+        n_block_pairs, eval_energies_by_block, accumulation_targets);
   } else {
     DeviceDispatch<D>::template foreach_workgroup<launch_t>(
-        n_block_pairs, eval_energies);
+        n_block_pairs, eval_energies, accumulation_targets);
   }
 
-  return {output_t, dV_dcoords_t, scratch_block_neighbors_t};
+  return {output_t, dV_dcoords_t};
 }  // namespace potentials
 
 template <
@@ -775,7 +747,13 @@ auto ElecPoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
     // (possibly) fit in constant cache
     TView<Int, 3, D> pose_stack_min_bond_separation,
 
-    // dims: n-poses x max-n-blocks x max-n-blocks x
+    // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors
+    // for each block, the (sorted) indices of the blocks whose
+    // connections are within MAX_SIG_BOND_SEPARATION chemical bonds
+    // of its own; -1 sentinel
+    TView<Int, 3, D> pose_stack_inter_block_bondsep_neighbors,
+
+    // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors x
     // max-n-interblock-connections x max-n-interblock-connections
     TView<Int, 5, D> pose_stack_inter_block_bondsep,
 
@@ -813,8 +791,8 @@ auto ElecPoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
     // LJ parameters
     TView<ElecGlobalParams<Real>, 1, D> global_params,
 
-    TView<Int, 3, D> scratch_block_neighbors,  // from forward pass
-    TView<Real, 4, D> dTdV                     // nterms x nposes x len x len
+    TView<Int, 2, D> block_neighbor_pairs,  // from forward pass
+    TView<Real, 4, D> dTdV             // nterms x nposes x len x len
     ) -> TPack<Vec<Real, 3>, 3, D> {
   using tmol::score::common::accumulate;
   using Real3 = Vec<Real, 3>;
@@ -835,9 +813,13 @@ auto ElecPoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
   assert(pose_stack_min_bond_separation.size(1) == max_n_blocks);
   assert(pose_stack_min_bond_separation.size(2) == max_n_blocks);
 
+  assert(pose_stack_inter_block_bondsep_neighbors.size(0) == n_poses);
+  assert(pose_stack_inter_block_bondsep_neighbors.size(1) == max_n_blocks);
   assert(pose_stack_inter_block_bondsep.size(0) == n_poses);
   assert(pose_stack_inter_block_bondsep.size(1) == max_n_blocks);
-  assert(pose_stack_inter_block_bondsep.size(2) == max_n_blocks);
+  assert(
+      pose_stack_inter_block_bondsep.size(2)
+      == pose_stack_inter_block_bondsep_neighbors.size(2));
   assert(pose_stack_inter_block_bondsep.size(3) == max_n_interblock_bonds);
   assert(pose_stack_inter_block_bondsep.size(4) == max_n_interblock_bonds);
 
@@ -854,14 +836,15 @@ auto ElecPoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
 
   auto dV_dcoords_t =
       TPack<Vec<Real, 3>, 3, D>::zeros({1, n_poses, max_n_pose_atoms});
-  auto dV_dcoords = dV_dcoords_t.view;
 
   // Optimal launch box on v100 and a100 is nt=32, vt=1
   LAUNCH_BOX_32;
   // Define nt and reduce_t
   CTA_REAL_REDUCE_T_TYPEDEF;
 
-  auto eval_derivs = ([=] TMOL_DEVICE_FUNC(int cta) {
+  auto eval_derivs = ([=] TMOL_DEVICE_FUNC(
+                          int cta,
+                          TView<Vec<Real, 3>, 3, D> const& dV_dcoords) {
     auto elec_atom_energy_and_derivs =
         ([=] TMOL_DEVICE_FUNC(
              int atom_tile_ind1,
@@ -898,17 +881,9 @@ auto ElecPoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
 
     } shared;
 
-    int const pose_ind = cta / (max_n_blocks * max_n_blocks);
-    int const block_ind_pair = cta % (max_n_blocks * max_n_blocks);
-    int const block_ind1 = block_ind_pair / max_n_blocks;
-    int const block_ind2 = block_ind_pair % max_n_blocks;
-    if (block_ind1 > block_ind2) {
-      return;
-    }
-
-    if (scratch_block_neighbors[pose_ind][block_ind1][block_ind2] == 0) {
-      return;
-    }
+    int const pose_ind = block_neighbor_pairs[cta][0];
+    int const block_ind1 = block_neighbor_pairs[cta][1];
+    int const block_ind2 = block_neighbor_pairs[cta][2];
 
     int const max_important_bond_separation = 4;
 
@@ -984,9 +959,11 @@ auto ElecPoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
 
   // Since we have the sphere overlap results from the forward pass,
   // there's only a single kernel launch here
-  int const n_block_pairs = n_poses * max_n_blocks * max_n_blocks;
+  int const n_block_pairs = block_neighbor_pairs.size(0);
+  auto accumulation_targets =
+      DeviceDispatch<D>::parallel_accumulation_targets(dV_dcoords_t);
   DeviceDispatch<D>::template foreach_workgroup<launch_t>(
-      n_block_pairs, eval_derivs);
+      n_block_pairs, eval_derivs, accumulation_targets);
 
   return dV_dcoords_t;
 }
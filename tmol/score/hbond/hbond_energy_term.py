@@ -49,7 +49,8 @@ class HBondEnergyTerm(AtomTypeDependentTerm, HBondDependentTerm):
             pose_stack_block_type=pose_stack.block_type_ind,
             pose_stack_inter_residue_connections=pose_stack.inter_residue_connections,
             pose_stack_min_bond_separation=pose_stack.min_block_bondsep,
-            pose_stack_inter_block_bondsep=pose_stack.inter_block_bondsep,
+            pose_stack_inter_block_bondsep_neighbors=pose_stack.inter_block_bondsep_neighbors,
+            pose_stack_inter_block_bondsep=pose_stack.inter_block_bondsep_sparse,
             bt_n_atoms=pbt.n_atoms,
             bt_n_interblock_bonds=pbt.n_conn,
             bt_atoms_forming_chemical_bonds=pbt.conn_atom,
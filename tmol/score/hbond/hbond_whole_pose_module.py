@@ -1,16 +1,22 @@
 import torch
 
 from tmol.score.hbond.potentials.compiled import hbond_pose_scores
+from tmol.score.common.block_neighbors import find_block_neighbor_pairs
 from tmol.score.common.convert_float64 import convert_float64
 
 
 class HBondWholePoseScoringModule(torch.nn.Module):
+    # blocks whose bounding spheres are farther apart than this (in A)
+    # cannot interact
+    block_neighbor_reach = 5.5
+
     def __init__(
         self,
         pose_stack_block_coord_offset,
         pose_stack_block_type,
         pose_stack_inter_residue_connections,
         pose_stack_min_bond_separation,
+        pose_stack_inter_block_bondsep_neighbors,
         pose_stack_inter_block_bondsep,
         bt_n_atoms,
         bt_n_interblock_bonds,
@@ -46,6 +52,9 @@ class HBondWholePoseScoringModule(torch.nn.Module):
         )
         self.pose_stack_min_bond_separation = _p(pose_stack_min_bond_separation)
 
+        self.pose_stack_inter_block_bondsep_neighbors = _p(
+            pose_stack_inter_block_bondsep_neighbors
+        )
         self.pose_stack_inter_block_bondsep = _p(pose_stack_inter_block_bondsep)
         self.bt_n_atoms = _p(bt_n_atoms)
         self.bt_n_interblock_bonds = _p(bt_n_interblock_bonds)
@@ -69,13 +78,25 @@ class HBondWholePoseScoringModule(torch.nn.Module):
         self.pair_polynomials = _p(pair_polynomials)
         self.global_params = _p(global_params)
 
-    def forward(self, coords, output_block_pair_energies=False):
+    def forward(
+        self, coords, output_block_pair_energies=False, block_neighbor_pairs=None
+    ):
+        if block_neighbor_pairs is None:
+            block_neighbor_pairs = find_block_neighbor_pairs(
+                coords.detach(),
+                self.pose_stack_block_coord_offset,
+                self.pose_stack_block_type,
+                self.bt_n_atoms,
+                self.block_neighbor_reach,
+            )
+
         args = [
             coords,
             self.pose_stack_block_coord_offset,
             self.pose_stack_block_type,
             self.pose_stack_inter_residue_connections,
             self.pose_stack_min_bond_separation,
+            self.pose_stack_inter_block_bondsep_neighbors,
             self.pose_stack_inter_block_bondsep,
             self.bt_n_atoms,
             self.bt_n_interblock_bonds,
@@ -95,6 +116,7 @@ class HBondWholePoseScoringModule(torch.nn.Module):
             self.pair_params,
             self.pair_polynomials,
             self.global_params,
+            block_neighbor_pairs,
             output_block_pair_energies,
         ]
 
@@ -34,6 +34,7 @@ class HBondPoseScoresOp
       Tensor pose_stack_inter_residue_connections,
       Tensor pose_stack_min_bond_separation,
 
+      Tensor pose_stack_inter_block_bondsep_neighbors,
       Tensor pose_stack_inter_block_bondsep,
       Tensor block_type_n_atoms,
       Tensor block_type_n_interblock_bonds,
@@ -56,12 +57,12 @@ class HBondPoseScoresOp
       Tensor pair_params,
       Tensor pair_polynomials,
       Tensor global_params,
+      Tensor block_neighbor_pairs,
       bool output_block_pair_energies
 
   ) {
     at::Tensor score;
     at::Tensor dscore_dcoords;
-    at::Tensor block_neighbors;
 
     using Int = int32_t;
 
@@ -78,6 +79,7 @@ class HBondPoseScoresOp
                   TCAST(pose_stack_inter_residue_connections),
                   TCAST(pose_stack_min_bond_separation),
 
+                  TCAST(pose_stack_inter_block_bondsep_neighbors),
                   TCAST(pose_stack_inter_block_bondsep),
                   TCAST(block_type_n_atoms),
                   TCAST(block_type_n_interblock_bonds),
@@ -100,12 +102,12 @@ class HBondPoseScoresOp
                   TCAST(pair_params),
                   TCAST(pair_polynomials),
                   TCAST(global_params),
+                  TCAST(block_neighbor_pairs),
                   output_block_pair_energies,
                   coords.requires_grad());
 
           score = std::get<0>(result).tensor;
           dscore_dcoords = std::get<1>(result).tensor;
-          block_neighbors = std::get<2>(result).tensor;
         }));
 
     if (output_block_pair_energies) {
@@ -117,6 +119,7 @@ class HBondPoseScoresOp
            pose_stack_inter_residue_connections,
            pose_stack_min_bond_separation,
 
+           pose_stack_inter_block_bondsep_neighbors,
            pose_stack_inter_block_bondsep,
            block_type_n_atoms,
            block_type_n_interblock_bonds,
@@ -139,7 +142,7 @@ class HBondPoseScoresOp
            pair_params,
            pair_polynomials,
            global_params,
-           block_neighbors});
+           block_neighbor_pairs});
     } else {
       score = score.squeeze(-1).squeeze(-1);  // remove final 2 "dummy" dims
       ctx->save_for_backward({dscore_dcoords});
@@ -181,6 +184,7 @@ class HBondPoseScoresOp
       auto pose_stack_inter_residue_connections = saved[i++];
       auto pose_stack_min_bond_separation = saved[i++];
 
+      auto pose_stack_inter_block_bondsep_neighbors = saved[i++];
       auto pose_stack_inter_block_bondsep = saved[i++];
       auto block_type_n_atoms = saved[i++];
       auto block_type_n_interblock_bonds = saved[i++];
@@ -203,7 +207,7 @@ class HBondPoseScoresOp
       auto pair_params = saved[i++];
       auto pair_polynomials = saved[i++];
       auto global_params = saved[i++];
-      auto block_neighbors = saved[i++];
+      auto block_neighbor_pairs = saved[i++];
 
       using Int = int32_t;
 
@@ -226,6 +230,7 @@ class HBondPoseScoresOp
                     TCAST(pose_stack_inter_residue_connections),
                     TCAST(pose_stack_min_bond_separation),
 
+                    TCAST(pose_stack_inter_block_bondsep_neighbors),
                     TCAST(pose_stack_inter_block_bondsep),
                     TCAST(block_type_n_atoms),
                     TCAST(block_type_n_interblock_bonds),
@@ -248,7 +253,7 @@ class HBondPoseScoresOp
                     TCAST(pair_params),
                     TCAST(pair_polynomials),
                     TCAST(global_params),
-                    TCAST(block_neighbors),
+                    TCAST(block_neighbor_pairs),
                     TCAST(dTdV));
 
             dV_d_pose_coords = result.tensor;
@@ -268,6 +273,8 @@ class HBondPoseScoresOp
             torch::Tensor(),  torch::Tensor(),
 
             torch::Tensor(),  torch::Tensor(), torch::Tensor(),
+            torch::Tensor(),  torch::Tensor(),
+
             torch::Tensor(),  torch::Tensor()};
   }
 };
@@ -280,6 +287,7 @@ Tensor hbond_pose_scores_op(
     Tensor pose_stack_inter_residue_connections,
     Tensor pose_stack_min_bond_separation,
 
+    Tensor pose_stack_inter_block_bondsep_neighbors,
     Tensor pose_stack_inter_block_bondsep,
     Tensor block_type_n_atoms,
     Tensor block_type_n_interblock_bonds,
@@ -302,6 +310,7 @@ Tensor hbond_pose_scores_op(
     Tensor pair_params,
     Tensor pair_polynomials,
     Tensor global_params,
+    Tensor block_neighbor_pairs,
     bool output_block_pair_energies) {
   return HBondPoseScoresOp<DispatchMethod>::apply(
       coords,
@@ -310,6 +319,7 @@ Tensor hbond_pose_scores_op(
       pose_stack_inter_residue_connections,
       pose_stack_min_bond_separation,
 
+      pose_stack_inter_block_bondsep_neighbors,
       pose_stack_inter_block_bondsep,
       block_type_n_atoms,
       block_type_n_interblock_bonds,
@@ -332,6 +342,7 @@ Tensor hbond_pose_scores_op(
       pair_params,
       pair_polynomials,
       global_params,
+      block_neighbor_pairs,
       output_block_pair_energies);
 }
 
@@ -2,6 +2,7 @@
 
 #include <tmol/utility/tensor/TensorAccessor.h>
 
+#include <tmol/score/common/count_pair.hh>
 #include <tmol/score/common/data_loading.hh>
 #include <tmol/score/bonded_atom.hh>
 #include <tmol/score/hbond/identification.hh>
@@ -225,6 +226,7 @@ void TMOL_DEVICE_FUNC hbond_load_tile_invariant_interres_data(
     TView<Int, 2, Dev> pose_stack_block_type,
     TView<Vec<Int, 2>, 3, Dev> pose_stack_inter_residue_connections,
     TView<Int, 3, Dev> pose_stack_min_bond_separation,
+    TView<Int, 3, Dev> pose_stack_inter_block_bondsep_neighbors,
     TView<Int, 5, Dev> pose_stack_inter_block_bondsep,
 
     TView<Int, 1, Dev> block_type_n_all_bonds,
@@ -309,8 +311,14 @@ void TMOL_DEVICE_FUNC hbond_load_tile_invariant_interres_data(
           int conn1 = conn_ind / inter_dat.r2.n_conn;
           int conn2 = conn_ind % inter_dat.r2.n_conn;
           shared_m.conn_seps[conn_ind] =
-              pose_stack_inter_block_bondsep[pose_ind][block_ind1][block_ind2]
-                                            [conn1][conn2];
+              common::count_pair::sparse_inter_block_bondsep<Dev, Int>(
+                  pose_stack_inter_block_bondsep_neighbors,
+                  pose_stack_inter_block_bondsep,
+                  pose_ind,
+                  block_ind1,
+                  block_ind2,
+                  conn1,
+                  conn2);
         }
       }
     });
@@ -50,10 +50,15 @@ struct HBondPoseScoreDispatch {
       TView<Int, 3, Dev>
           pose_stack_min_bond_separation,  // ?? needed ?? I think so
 
-      // dims: n-poses x max-n-blocks x max-n-blocks x
+      // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors
+      // for each block, the (sorted) indices of the blocks whose
+      // connections are within MAX_SIG_BOND_SEPARATION chemical bonds
+      // of its own; -1 sentinel
+      TView<Int, 3, Dev> pose_stack_inter_block_bondsep_neighbors,
+
+      // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors x
       // max-n-interblock-connections x max-n-interblock-connections
-      TView<Int, 5, Dev>
-          pose_stack_inter_block_bondsep,  // ?? needed ?? I think so
+      TView<Int, 5, Dev> pose_stack_inter_block_bondsep,
 
       //////////////////////
       // Chemical properties
@@ -94,12 +99,14 @@ struct HBondPoseScoreDispatch {
       TView<HBondPolynomials<double>, 2, Dev> pair_polynomials,
       TView<HBondGlobalParams<Real>, 1, Dev> global_params,
 
+      // dims: n-block-pairs x 3
+      // the (pose, block1, block2) of each pair of blocks close enough to
+      // interact, with block1 <= block2; one work item is launched per pair
+      TView<Int, 2, Dev> block_neighbor_pairs,
+
       bool output_block_pair_energies,
       bool compute_derivs)
-      -> std::tuple<
-          TPack<Real, 4, Dev>,
-          TPack<Vec<Real, 3>, 3, Dev>,
-          TPack<Int, 3, Dev> >;
+      -> std::tuple<TPack<Real, 4, Dev>, TPack<Vec<Real, 3>, 3, Dev> >;
 
   static auto backward(
       TView<Vec<Real, 3>, 2, Dev> coords,
@@ -121,10 +128,15 @@ struct HBondPoseScoreDispatch {
       TView<Int, 3, Dev>
           pose_stack_min_bond_separation,  // ?? needed ?? I think so
 
-      // dims: n-poses x max-n-blocks x max-n-blocks x
+      // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors
+      // for each block, the (sorted) indices of the blocks whose
+      // connections are within MAX_SIG_BOND_SEPARATION chemical bonds
+      // of its own; -1 sentinel
+      TView<Int, 3, Dev> pose_stack_inter_block_bondsep_neighbors,
+
+      // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors x
       // max-n-interblock-connections x max-n-interblock-connections
-      TView<Int, 5, Dev>
-          pose_stack_inter_block_bondsep,  // ?? needed ?? I think so
+      TView<Int, 5, Dev> pose_stack_inter_block_bondsep,
 
       //////////////////////
       // Chemical properties
@@ -165,7 +177,7 @@ struct HBondPoseScoreDispatch {
       TView<HBondPolynomials<double>, 2, Dev> pair_polynomials,
       TView<HBondGlobalParams<Real>, 1, Dev> global_params,
 
-      TView<Int, 3, Dev> scratch_block_neighbors,  // from forward pass
+      TView<Int, 2, Dev> block_neighbor_pairs,  // from forward pass
       TView<Real, 4, Dev> dTdV  // nterms x nposes x len x len
       ) -> TPack<Vec<Real, 3>, 3, Dev>;
 };
@@ -15,7 +15,6 @@
 #include <tmol/score/common/diamond_macros.hh>
 #include <tmol/score/common/geom.hh>
 #include <tmol/score/common/launch_box_macros.hh>
-#include <tmol/score/common/sphere_overlap.impl.hh>
 #include <tmol/score/common/tile_atom_pair_evaluation.hh>
 #include <tmol/score/common/tuple.hh>
 #include <tmol/score/common/warp_segreduce.hh>
@@ -185,6 +184,7 @@ EIGEN_DEVICE_FUNC int interres_count_pair_separation(
         pose_stack_block_type,                                        \
         pose_stack_inter_residue_connections,                         \
         pose_stack_min_bond_separation,                               \
+        pose_stack_inter_block_bondsep_neighbors,                     \
         pose_stack_inter_block_bondsep,                               \
         block_type_n_all_bonds,                                       \
         block_type_all_bonds,                                         \
@@ -415,7 +415,13 @@ auto HBondPoseScoreDispatch<DeviceDispatch, Dev, Real, Int>::forward(
     // (possibly) fit in constant cache
     TView<Int, 3, Dev> pose_stack_min_bond_separation,
 
-    // dims: n-poses x max-n-blocks x max-n-blocks x
+    // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors
+    // for each block, the (sorted) indices of the blocks whose
+    // connections are within MAX_SIG_BOND_SEPARATION chemical bonds
+    // of its own; -1 sentinel
+    TView<Int, 3, Dev> pose_stack_inter_block_bondsep_neighbors,
+
+    // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors x
     // max-n-interblock-connections x max-n-interblock-connections
     TView<Int, 5, Dev> pose_stack_inter_block_bondsep,
 
@@ -458,14 +464,15 @@ auto HBondPoseScoreDispatch<DeviceDispatch, Dev, Real, Int>::forward(
     TView<HBondPolynomials<double>, 2, Dev> pair_polynomials,
     TView<HBondGlobalParams<Real>, 1, Dev> global_params,
 
+    // dims: n-block-pairs x 3
+    // the (pose, block1, block2) of each pair of blocks close enough to
+    // interact, with block1 <= block2; one work item is launched per pair
+    TView<Int, 2, Dev> block_neighbor_pairs,
+
     bool output_block_pair_energies,
     bool compute_derivs
 
-    )
-    -> std::tuple<
-        TPack<Real, 4, Dev>,
-        TPack<Vec<Real, 3>, 3, Dev>,
-        TPack<Int, 3, Dev> > {
+    ) -> std::tuple<TPack<Real, 4, Dev>, TPack<Vec<Real, 3>, 3, Dev> > {
   using tmol::score::common::accumulate;
   using Real3 = Vec<Real, 3>;
 
@@ -496,9 +503,13 @@ auto HBondPoseScoreDispatch<DeviceDispatch, Dev, Real, Int>::forward(
   assert(pose_stack_min_bond_separation.size(1) == max_n_blocks);
   assert(pose_stack_min_bond_separation.size(2) == max_n_blocks);
 
+  assert(pose_stack_inter_block_bondsep_neighbors.size(0) == n_poses);
+  assert(pose_stack_inter_block_bondsep_neighbors.size(1) == max_n_blocks);
   assert(pose_stack_inter_block_bondsep.size(0) == n_poses);
   assert(pose_stack_inter_block_bondsep.size(1) == max_n_blocks);
-  assert(pose_stack_inter_block_bondsep.size(2) == max_n_blocks);
+  assert(
+      pose_stack_inter_block_bondsep.size(2)
+      == pose_stack_inter_block_bondsep_neighbors.size(2));
   assert(pose_stack_inter_block_bondsep.size(3) == max_n_interblock_bonds);
   assert(pose_stack_inter_block_bondsep.size(4) == max_n_interblock_bonds);
 
@@ -542,29 +553,22 @@ auto HBondPoseScoreDispatch<DeviceDispatch, Dev, Real, Int>::forward(
   } else {
     output_t = TPack<Real, 4, Dev>::zeros({1, n_poses, 1, 1});
   }
-  auto output = output_t.view;
 
   // auto accum_output_t = TPack<double, 2, Dev>::zeros({1, n_poses});
   // auto accum_output = accum_output_t.view;
 
-  auto dV_dcoords_t =
-      TPack<Vec<Real, 3>, 3, Dev>::zeros({1, n_poses, max_n_pose_atoms});
-  auto dV_dcoords = dV_dcoords_t.view;
-
-  auto scratch_block_spheres_t =
-      TPack<Real, 3, Dev>::zeros({n_poses, max_n_blocks, 4});
-  auto scratch_block_spheres = scratch_block_spheres_t.view;
-
-  auto scratch_block_neighbors_t =
-      TPack<Int, 3, Dev>::zeros({n_poses, max_n_blocks, max_n_blocks});
-  auto scratch_block_neighbors = scratch_block_neighbors_t.view;
+  auto dV_dcoords_t = TPack<Vec<Real, 3>, 3, Dev>::zeros(
+      {1, n_poses, compute_derivs ? max_n_pose_atoms : 0});
 
   // Optimal launch box on v100 and a100 is nt=32, vt=1
   LAUNCH_BOX_32;
   // Define nt and reduce_t
   CTA_REAL_REDUCE_T_TYPEDEF;
 
-  auto eval_energies = ([=] TMOL_DEVICE_FUNC(int cta) {
+  auto eval_energies = ([=] TMOL_DEVICE_FUNC(
+                            int cta,
+                            TView<Real, 4, Dev> const& output,
+                            TView<Vec<Real, 3>, 3, Dev> const& dV_dcoords) {
     auto hbond_atom_energy = ([=] HBOND_ATOM_ENERGY);
 
     auto score_inter_hbond_atom_pair = ([=] SCORE_INTER_HBOND_ATOM_PAIR);
@@ -578,17 +582,9 @@ auto HBondPoseScoreDispatch<DeviceDispatch, Dev, Real, Int>::forward(
 
     } shared;
 
-    int const pose_ind = cta / (max_n_blocks * max_n_blocks);
-    int const block_ind_pair = cta % (max_n_blocks * max_n_blocks);
-    int const block_ind1 = block_ind_pair / max_n_blocks;
-    int const block_ind2 = block_ind_pair % max_n_blocks;
-    if (block_ind1 > block_ind2) {
-      return;
-    }
-
-    if (scratch_block_neighbors[pose_ind][block_ind1][block_ind2] == 0) {
-      return;
-    }
+    int const pose_ind = block_neighbor_pairs[cta][0];
+    int const block_ind1 = block_neighbor_pairs[cta][1];
+    int const block_ind2 = block_neighbor_pairs[cta][2];
 
     int const max_important_bond_separation = 4;
 
@@ -661,43 +657,18 @@ auto HBondPoseScoreDispatch<DeviceDispatch, Dev, Real, Int>::forward(
 
   ///////////////////////////////////////////////////////////////////////
 
-  // Three steps
-  // 0: setup
-  // 1: launch a kernel to find a small bounding sphere surrounding the
-  // blocks 2: launch a kernel to look for spheres that are within
-  // striking distance of each other 3: launch a kernel to evaluate
-  // lj/lk between pairs of blocks within striking distance
-
-  // 0
-  // TO DO: let DeviceDispatch hold a cuda stream (??)
-  // at::cuda::CUDAStream wrapped_stream =
-  // at::cuda::getDefaultCUDAStream(); mgpu::standard_context_t
-  // context(wrapped_stream.stream());
-  int const n_block_pairs = n_poses * max_n_blocks * max_n_blocks;
-
-  score::common::sphere_overlap::
-      compute_block_spheres<DeviceDispatch, Dev, Real, Int>::f(
-          coords,
-          pose_stack_block_coord_offset,
-          pose_stack_block_type,
-          block_type_n_atoms,
-          scratch_block_spheres);
-
-  score::common::sphere_overlap::
-      detect_block_neighbors<DeviceDispatch, Dev, Real, Int>::f(
-          coords,
-          pose_stack_block_coord_offset,
-          pose_stack_block_type,
-          block_type_n_atoms,
-          scratch_block_spheres,
-          scratch_block_neighbors,
-          Real(5.5));  // 5.5A hard coded here. Please fix! TEMP!
-
-  // 3
+  // The block pairs that are within striking distance of each other
+  // have already been found (see tmol/score/common/block_neighbors.py);
+  // launch a kernel to evaluate hbonds between them
+  int const n_block_pairs = block_neighbor_pairs.size(0);
+
+  auto accumulation_targets =
+      DeviceDispatch<Dev>::parallel_accumulation_targets(
+          output_t, dV_dcoords_t);
   DeviceDispatch<Dev>::template foreach_workgroup<launch_t>(
-      n_block_pairs, eval_energies);
+      n_block_pairs, eval_energies, accumulation_targets);
 
-  return {output_t, dV_dcoords_t, scratch_block_neighbors_t};
+  return {output_t, dV_dcoords_t};
 }
 
 template <
@@ -725,7 +696,13 @@ auto HBondPoseScoreDispatch<DeviceDispatch, Dev, Real, Int>::backward(
     // (possibly) fit in constant cache
     TView<Int, 3, Dev> pose_stack_min_bond_separation,
 
-    // dims: n-poses x max-n-blocks x max-n-blocks x
+    // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors
+    // for each block, the (sorted) indices of the blocks whose
+    // connections are within MAX_SIG_BOND_SEPARATION chemical bonds
+    // of its own; -1 sentinel
+    TView<Int, 3, Dev> pose_stack_inter_block_bondsep_neighbors,
+
+    // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors x
     // max-n-interblock-connections x max-n-interblock-connections
     TView<Int, 5, Dev> pose_stack_inter_block_bondsep,
 
@@ -768,8 +745,8 @@ auto HBondPoseScoreDispatch<DeviceDispatch, Dev, Real, Int>::backward(
     TView<HBondPolynomials<double>, 2, Dev> pair_polynomials,
     TView<HBondGlobalParams<Real>, 1, Dev> global_params,
 
-    TView<Int, 3, Dev> scratch_block_neighbors,  // from forward pass
-    TView<Real, 4, Dev> dTdV                     // nterms x nposes x len x len
+    TView<Int, 2, Dev> block_neighbor_pairs,  // from forward pass
+    TView<Real, 4, Dev> dTdV             // nterms x nposes x len x len
     ) -> TPack<Vec<Real, 3>, 3, Dev>
 
 {
@@ -791,14 +768,15 @@ auto HBondPoseScoreDispatch<DeviceDispatch, Dev, Real, Int>::backward(
 
   auto dV_dcoords_t =
       TPack<Vec<Real, 3>, 3, Dev>::zeros({1, n_poses, max_n_pose_atoms});
-  auto dV_dcoords = dV_dcoords_t.view;
 
   // Optimal launch box on v100 and a100 is nt=32, vt=1
   LAUNCH_BOX_32;
   // Define nt and reduce_t
   CTA_REAL_REDUCE_T_TYPEDEF;
 
-  auto eval_derivs = ([=] TMOL_DEVICE_FUNC(int cta) {
+  auto eval_derivs = ([=] TMOL_DEVICE_FUNC(
+                          int cta,
+                          TView<Vec<Real, 3>, 3, Dev> const& dV_dcoords) {
     auto hbond_atom_energy =
         ([=] TMOL_DEVICE_FUNC(
              int don_ind,
@@ -841,17 +819,9 @@ auto HBondPoseScoreDispatch<DeviceDispatch, Dev, Real, Int>::backward(
 
     } shared;
 
-    int const pose_ind = cta / (max_n_blocks * max_n_blocks);
-    int const block_ind_pair = cta % (max_n_blocks * max_n_blocks);
-    int const block_ind1 = block_ind_pair / max_n_blocks;
-    int const block_ind2 = block_ind_pair % max_n_blocks;
-    if (block_ind1 > block_ind2) {
-      return;
-    }
-
-    if (scratch_block_neighbors[pose_ind][block_ind1][block_ind2] == 0) {
-      return;
-    }
+    int const pose_ind = block_neighbor_pairs[cta][0];
+    int const block_ind1 = block_neighbor_pairs[cta][1];
+    int const block_ind2 = block_neighbor_pairs[cta][2];
 
     int const max_important_bond_separation = 4;
 
@@ -927,9 +897,11 @@ auto HBondPoseScoreDispatch<DeviceDispatch, Dev, Real, Int>::backward(
 
   // Since we have the sphere overlap results from the forward pass,
   // there's only a single kernel launch here
-  int const n_block_pairs = n_poses * max_n_blocks * max_n_blocks;
+  int const n_block_pairs = block_neighbor_pairs.size(0);
+  auto accumulation_targets =
+      DeviceDispatch<Dev>::parallel_accumulation_targets(dV_dcoords_t);
   DeviceDispatch<Dev>::template foreach_workgroup<launch_t>(
-      n_block_pairs, eval_derivs);
+      n_block_pairs, eval_derivs, accumulation_targets);
 
   return dV_dcoords_t;
 }
@@ -15,6 +15,7 @@ from tmol.pose.pose_stack import PoseStack
 from tmol.types.torch import Tensor
 
 from tmol.score.ljlk.potentials.compiled import (
+    ljlk_atom_pair_energies,
     score_ljlk_inter_system_scores,
     register_lj_lk_rotamer_pair_energy_eval,
 )
@@ -94,7 +95,8 @@ class LJLKEnergyTerm(AtomTypeDependentTerm, BondDependentTerm):
             pose_stack_block_coord_offset=pose_stack.block_coord_offset,
             pose_stack_block_types=pose_stack.block_type_ind,
             pose_stack_min_block_bondsep=pose_stack.min_block_bondsep,
-            pose_stack_inter_block_bondsep=pose_stack.inter_block_bondsep,
+            pose_stack_inter_block_bondsep_neighbors=pose_stack.inter_block_bondsep_neighbors,
+            pose_stack_inter_block_bondsep=pose_stack.inter_block_bondsep_sparse,
             bt_n_atoms=pbt.n_atoms,
             bt_n_heavy_atoms=pbt.n_heavy_atoms,
             bt_n_heavy_atoms_in_tile=pbt.ljlk_n_heavy_atoms_in_tile,
@@ -108,6 +110,55 @@ class LJLKEnergyTerm(AtomTypeDependentTerm, BondDependentTerm):
             global_params=self.global_params,
         )
 
+    def nonbonded_atom_pair_energies(
+        self,
+        packed_block_types: PackedBlockTypes,
+        block_type1: Tensor[torch.int64][:],
+        atom1: Tensor[torch.int64][:],
+        coords1: Tensor[torch.float32][:, 3],
+        block_type2: Tensor[torch.int64][:],
+        atom2: Tensor[torch.int64][:],
+        coords2: Tensor[torch.float32][:, 3],
+    ) -> Tensor[torch.float32][:, :]:
+        """The unweighted energies, one row per score type, of pairs of
+        atoms from blocks that are not within MAX_SIG_BOND_SEPARATION
+        chemical bonds of each other. The energies depend on the atoms only
+        through their atom types and coordinates.
+        """
+        pbt = packed_block_types
+        params = self.type_params
+        global_params = self.global_params
+
+        def _stack(ts):
+            return torch.stack([t.to(torch.float32) for t in ts], dim=1)
+
+        return ljlk_atom_pair_energies(
+            coords1,
+            coords2,
+            pbt.atom_types[block_type1, atom1],
+            pbt.atom_types[block_type2, atom2],
+            _stack(
+                [
+                    params.lj_radius,
+                    params.lj_wdepth,
+                    params.lk_dgfree,
+                    params.lk_lambda,
+                    params.lk_volume,
+                    params.is_donor,
+                    params.is_hydroxyl,
+                    params.is_polarh,
+                    params.is_acceptor,
+                ]
+            ),
+            _stack(
+                [
+                    global_params.lj_hbond_dis,
+                    global_params.lj_hbond_OH_donor_dis,
+                    global_params.lj_hbond_hdis,
+                ]
+            ),
+        )
+
     def render_inter_module(
         self,
         packed_block_types: PackedBlockTypes,
@@ -8,6 +8,7 @@
 #include <tmol/score/common/forall_dispatch.hh>
 #include <tmol/score/common/device_operations.hh>
 
+#include "ljlk_atom_pair_energies.hh"
 #include "ljlk_pose_score.hh"
 #include "rotamer_pair_energy_lj.hh"
 // #include "rotamer_pair_energy_lk.hh"
@@ -33,6 +34,7 @@ class LJLKPoseScoreOp
 
       Tensor pose_stack_block_type,
       Tensor pose_stack_min_bond_separation,
+      Tensor pose_stack_inter_block_bondsep_neighbors,
       Tensor pose_stack_inter_block_bondsep,
       Tensor block_type_n_atoms,
       Tensor block_type_n_heavy_atoms_in_tile,
@@ -45,8 +47,9 @@ class LJLKPoseScoreOp
 
       Tensor type_params,
       Tensor global_params,
+      Tensor block_neighbor_pairs,
       bool output_block_pair_energies) {
-    at::Tensor score, dscore_dcoords, block_neighbors;
+    at::Tensor score, dscore_dcoords;
 
     using Int = int32_t;
 
@@ -62,6 +65,7 @@ class LJLKPoseScoreOp
 
                   TCAST(pose_stack_block_type),
                   TCAST(pose_stack_min_bond_separation),
+                  TCAST(pose_stack_inter_block_bondsep_neighbors),
                   TCAST(pose_stack_inter_block_bondsep),
                   TCAST(block_type_n_atoms),
                   TCAST(block_type_n_heavy_atoms_in_tile),
@@ -74,12 +78,12 @@ class LJLKPoseScoreOp
 
                   TCAST(type_params),
                   TCAST(global_params),
+                  TCAST(block_neighbor_pairs),
                   output_block_pair_energies,
                   coords.requires_grad());
 
           score = std::get<0>(result).tensor;
           dscore_dcoords = std::get<1>(result).tensor;
-          block_neighbors = std::get<2>(result).tensor;
         }));
 
     if (output_block_pair_energies) {
@@ -90,6 +94,7 @@ class LJLKPoseScoreOp
 
            pose_stack_block_type,
            pose_stack_min_bond_separation,
+           pose_stack_inter_block_bondsep_neighbors,
            pose_stack_inter_block_bondsep,
            block_type_n_atoms,
            block_type_n_heavy_atoms_in_tile,
@@ -102,7 +107,7 @@ class LJLKPoseScoreOp
 
            type_params,
            global_params,
-           block_neighbors});
+           block_neighbor_pairs});
     } else {
       score = score.squeeze(-1).squeeze(-1);  // remove final 2 "dummy" dims
       ctx->save_for_backward({dscore_dcoords});
@@ -145,6 +150,7 @@ class LJLKPoseScoreOp
 
       auto pose_stack_block_type = saved[i++];
       auto pose_stack_min_bond_separation = saved[i++];
+      auto pose_stack_inter_block_bondsep_neighbors = saved[i++];
       auto pose_stack_inter_block_bondsep = saved[i++];
       auto block_type_n_atoms = saved[i++];
       auto block_type_n_heavy_atoms_in_tile = saved[i++];
@@ -157,7 +163,7 @@ class LJLKPoseScoreOp
 
       auto type_params = saved[i++];
       auto global_params = saved[i++];
-      auto block_neighbors = saved[i++];
+      auto block_neighbor_pairs = saved[i++];
 
       using Int = int32_t;
 
@@ -179,6 +185,7 @@ class LJLKPoseScoreOp
 
                     TCAST(pose_stack_block_type),
                     TCAST(pose_stack_min_bond_separation),
+                    TCAST(pose_stack_inter_block_bondsep_neighbors),
                     TCAST(pose_stack_inter_block_bondsep),
                     TCAST(block_type_n_atoms),
                     TCAST(block_type_n_heavy_atoms_in_tile),
@@ -191,7 +198,7 @@ class LJLKPoseScoreOp
 
                     TCAST(type_params),
                     TCAST(global_params),
-                    TCAST(block_neighbors),
+                    TCAST(block_neighbor_pairs),
                     TCAST(dTdV));
 
             dV_d_pose_coords = result.tensor;
@@ -214,6 +221,8 @@ class LJLKPoseScoreOp
         torch::Tensor(),
         torch::Tensor(),
 
+        torch::Tensor(),
+        torch::Tensor(),
         torch::Tensor(),
         torch::Tensor(),
         torch::Tensor()};
@@ -227,6 +236,7 @@ Tensor ljlk_pose_scores_op(
 
     Tensor pose_stack_block_type,
     Tensor pose_stack_min_bond_separation,
+    Tensor pose_stack_inter_block_bondsep_neighbors,
     Tensor pose_stack_inter_block_bondsep,
     Tensor block_type_n_atoms,
     Tensor block_type_n_heavy_atoms_in_tile,
@@ -239,6 +249,7 @@ Tensor ljlk_pose_scores_op(
 
     Tensor ljlk_type_params,
     Tensor global_params,
+    Tensor block_neighbor_pairs,
     bool output_block_pair_energies) {
   return LJLKPoseScoreOp<DispatchMethod>::apply(
       coords,
@@ -246,6 +257,7 @@ Tensor ljlk_pose_scores_op(
 
       pose_stack_block_type,
       pose_stack_min_bond_separation,
+      pose_stack_inter_block_bondsep_neighbors,
       pose_stack_inter_block_bondsep,
       block_type_n_atoms,
       block_type_n_heavy_atoms_in_tile,
@@ -258,6 +270,7 @@ Tensor ljlk_pose_scores_op(
 
       ljlk_type_params,
       global_params,
+      block_neighbor_pairs,
       output_block_pair_energies);
 }
 
@@ -332,6 +345,36 @@ Tensor rotamer_pair_energies_op(
   return output_tensor;
 }
 
+Tensor ljlk_atom_pair_energies_op(
+    Tensor coords1,
+    Tensor coords2,
+    Tensor atom_types1,
+    Tensor atom_types2,
+    Tensor ljlk_type_params,
+    Tensor global_params) {
+  using Int = int32_t;
+  Tensor energies;
+
+  TMOL_DISPATCH_FLOATING_DEVICE(
+      coords1.type(), "ljlk_atom_pair_energies_op", ([&] {
+        using Real = scalar_t;
+        constexpr tmol::Device Dev = device_t;
+
+        auto result =
+            LJLKAtomPairEnergyDispatch<DeviceOperations, Dev, Real, Int>::f(
+                TCAST(coords1),
+                TCAST(coords2),
+                TCAST(atom_types1),
+                TCAST(atom_types2),
+                TCAST(ljlk_type_params),
+                TCAST(global_params));
+
+        energies = result.tensor;
+      }));
+
+  return energies;
+}
+
 Tensor register_lj_lk_rotamer_pair_energy_eval(
     Tensor context_coords,
     Tensor context_coord_offsets,
@@ -402,6 +445,7 @@ Tensor register_lj_lk_rotamer_pair_energy_eval(
 TORCH_LIBRARY_(TORCH_EXTENSION_NAME, m) {
   m.def("ljlk_pose_scores", &ljlk_pose_scores_op<DeviceOperations>);
   m.def("score_ljlk_inter_system_scores", &rotamer_pair_energies_op);
+  m.def("ljlk_atom_pair_energies", &ljlk_atom_pair_energies_op);
   m.def(
       "register_lj_lk_rotamer_pair_energy_eval",
       &register_lj_lk_rotamer_pair_energy_eval);
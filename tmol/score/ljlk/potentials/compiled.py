@@ -11,6 +11,8 @@ load(
                 "compiled.ops.cpp",
                 "ljlk_pose_score.cpu.cpp",
                 "ljlk_pose_score.cuda.cu",
+                "ljlk_atom_pair_energies.cpu.cpp",
+                "ljlk_atom_pair_energies.cuda.cu",
                 "rotamer_pair_energy_lj.cpu.cpp",
                 "rotamer_pair_energy_lj.cuda.cu",
                 # "rotamer_pair_energy_lk.cpu.cpp",
@@ -25,4 +27,5 @@ _ops = getattr(torch.ops, modulename(__name__))
 
 ljlk_pose_scores = _ops.ljlk_pose_scores
 score_ljlk_inter_system_scores = _ops.score_ljlk_inter_system_scores
+ljlk_atom_pair_energies = _ops.ljlk_atom_pair_energies
 register_lj_lk_rotamer_pair_energy_eval = _ops.register_lj_lk_rotamer_pair_energy_eval
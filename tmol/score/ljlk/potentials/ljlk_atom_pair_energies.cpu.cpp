@@ -0,0 +1,23 @@
+#include <tmol/score/common/device_operations.cpu.impl.hh>
+#include <tmol/score/ljlk/potentials/ljlk_atom_pair_energies.impl.hh>
+
+namespace tmol {
+namespace score {
+namespace ljlk {
+namespace potentials {
+
+template struct LJLKAtomPairEnergyDispatch<
+    DeviceOperations,
+    tmol::Device::CPU,
+    float,
+    int>;
+template struct LJLKAtomPairEnergyDispatch<
+    DeviceOperations,
+    tmol::Device::CPU,
+    double,
+    int>;
+
+}  // namespace potentials
+}  // namespace ljlk
+}  // namespace score
+}  // namespace tmol
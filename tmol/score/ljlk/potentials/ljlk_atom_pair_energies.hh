@@ -0,0 +1,41 @@
+#pragma once
+
+#include <Eigen/Core>
+
+#include <tmol/utility/tensor/TensorAccessor.h>
+#include <tmol/utility/tensor/TensorPack.h>
+
+#include "params.hh"
+
+namespace tmol {
+namespace score {
+namespace ljlk {
+namespace potentials {
+
+// The LJ and LK energies of independent pairs of atoms from blocks too far
+// apart in the chemical graph for count-pair to apply; used by the packer's
+// rotamer tries, which evaluate the atom pairs that rotamers share once
+template <
+    template <tmol::Device>
+    class DeviceOps,
+    tmol::Device D,
+    typename Real,
+    typename Int>
+struct LJLKAtomPairEnergyDispatch {
+  static auto f(
+      TView<Eigen::Matrix<Real, 3, 1>, 1, D> coords1,
+      TView<Eigen::Matrix<Real, 3, 1>, 1, D> coords2,
+
+      // the LJLK atom types of the atoms of each pair
+      TView<Int, 1, D> atom_types1,
+      TView<Int, 1, D> atom_types2,
+
+      TView<LJLKTypeParams<Real>, 1, D> type_params,
+      TView<LJGlobalParams<Real>, 1, D> global_params)
+      -> TPack<Real, 2, D>;  // 3 (ljatr, ljrep, lk) x n-pairs
+};
+
+}  // namespace potentials
+}  // namespace ljlk
+}  // namespace score
+}  // namespace tmol
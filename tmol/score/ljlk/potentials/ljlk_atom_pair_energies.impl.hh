@@ -0,0 +1,82 @@
+#pragma once
+
+#include <Eigen/Core>
+
+#include <tmol/utility/tensor/TensorAccessor.h>
+#include <tmol/utility/tensor/TensorPack.h>
+#include <tmol/utility/nvtx.hh>
+
+#include <tmol/score/common/count_pair.hh>
+#include <tmol/score/common/diamond_macros.hh>
+#include <tmol/score/common/geom.hh>
+#include <tmol/score/common/launch_box_macros.hh>
+
+#include <tmol/score/ljlk/potentials/lj.hh>
+#include <tmol/score/ljlk/potentials/lk_isotropic.hh>
+#include <tmol/score/ljlk/potentials/ljlk_atom_pair_energies.hh>
+
+namespace tmol {
+namespace score {
+namespace ljlk {
+namespace potentials {
+
+template <
+    template <tmol::Device>
+    class DeviceOps,
+    tmol::Device D,
+    typename Real,
+    typename Int>
+auto LJLKAtomPairEnergyDispatch<DeviceOps, D, Real, Int>::f(
+    TView<Eigen::Matrix<Real, 3, 1>, 1, D> coords1,
+    TView<Eigen::Matrix<Real, 3, 1>, 1, D> coords2,
+    TView<Int, 1, D> atom_types1,
+    TView<Int, 1, D> atom_types2,
+    TView<LJLKTypeParams<Real>, 1, D> type_params,
+    TView<LJGlobalParams<Real>, 1, D> global_params) -> TPack<Real, 2, D> {
+  int const n_pairs = coords1.size(0);
+  assert(coords2.size(0) == n_pairs);
+  assert(atom_types1.size(0) == n_pairs);
+  assert(atom_types2.size(0) == n_pairs);
+
+  auto V_t = TPack<Real, 2, D>::zeros({3, n_pairs});
+  auto V = V_t.view;
+
+  LAUNCH_BOX_32;
+
+  auto eval_pair = ([=] TMOL_DEVICE_FUNC(int i) {
+    // the blocks are not within MAX_SIG_BOND_SEPARATION bonds of each
+    // other, so every pair of their atoms counts in full
+    int const separation = common::count_pair::MAX_SIG_BOND_SEPARATION;
+    LJLKTypeParams<Real> params1 = type_params[atom_types1[i]];
+    LJLKTypeParams<Real> params2 = type_params[atom_types2[i]];
+    Real const dist = distance<Real>::V(coords1[i], coords2[i]);
+
+    auto lj = lj_score<Real>::V(
+        dist,
+        separation,
+        params1.lj_params(),
+        params2.lj_params(),
+        global_params[0]);
+    V[0][i] = lj[0];
+    V[1][i] = lj[1];
+
+    // only the heavy atoms desolvate each other
+    if (params1.lk_volume > 0 && params2.lk_volume > 0) {
+      V[2][i] = lk_isotropic_score<Real>::V(
+          dist,
+          separation,
+          params1.lk_params(),
+          params2.lk_params(),
+          global_params[0]);
+    }
+  });
+
+  DeviceOps<D>::template forall<launch_t>(n_pairs, eval_pair);
+
+  return V_t;
+}
+
+}  // namespace potentials
+}  // namespace ljlk
+}  // namespace score
+}  // namespace tmol
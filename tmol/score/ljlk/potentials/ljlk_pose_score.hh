@@ -46,7 +46,13 @@ struct LJLKPoseScoreDispatch {
       // (possibly) fit in constant cache
       TView<Int, 3, D> pose_stack_min_bond_separation,
 
-      // dims: n-systems x max-n-blocks x max-n-blocks x
+      // dims: n-systems x max-n-blocks x max-n-bondsep-neighbors
+      // for each block, the (sorted) indices of the blocks whose
+      // connections are within MAX_SIG_BOND_SEPARATION chemical bonds
+      // of its own; -1 sentinel
+      TView<Int, 3, D> pose_stack_inter_block_bondsep_neighbors,
+
+      // dims: n-systems x max-n-blocks x max-n-bondsep-neighbors x
       // max-n-interblock-connections x max-n-interblock-connections
       TView<Int, 5, D> pose_stack_inter_block_bondsep,
 
@@ -80,13 +86,18 @@ struct LJLKPoseScoreDispatch {
       TView<LJLKTypeParams<Real>, 1, D> type_params,
       TView<LJGlobalParams<Real>, 1, D> global_params,
 
+      // dims: n-block-pairs x 3
+      // the (pose, block1, block2) of each pair of blocks close enough to
+      // interact, with block1 <= block2; one work item is launched per pair
+      TView<Int, 2, D> block_neighbor_pairs,
+
       // should the output be per-pose (npose x nterms x 1 x 1)
       //   or per block-pair (npose x nterms x len x len)
       bool output_block_pair_energies,
 
       // do we need to compute gradients?
-      bool require_gradient) -> std::
-      tuple<TPack<Real, 4, D>, TPack<Vec<Real, 3>, 3, D>, TPack<Int, 3, D> >;
+      bool require_gradient)
+      -> std::tuple<TPack<Real, 4, D>, TPack<Vec<Real, 3>, 3, D> >;
 
   static auto backward(
       TView<Vec<Real, 3>, 2, D> coords,
@@ -102,7 +113,13 @@ struct LJLKPoseScoreDispatch {
       // (possibly) fit in constant cache
       TView<Int, 3, D> pose_stack_min_bond_separation,
 
-      // dims: n-systems x max-n-blocks x max-n-blocks x
+      // dims: n-systems x max-n-blocks x max-n-bondsep-neighbors
+      // for each block, the (sorted) indices of the blocks whose
+      // connections are within MAX_SIG_BOND_SEPARATION chemical bonds
+      // of its own; -1 sentinel
+      TView<Int, 3, D> pose_stack_inter_block_bondsep_neighbors,
+
+      // dims: n-systems x max-n-blocks x max-n-bondsep-neighbors x
       // max-n-interblock-connections x max-n-interblock-connections
       TView<Int, 5, D> pose_stack_inter_block_bondsep,
 
@@ -136,7 +153,7 @@ struct LJLKPoseScoreDispatch {
       TView<LJLKTypeParams<Real>, 1, D> type_params,
       TView<LJGlobalParams<Real>, 1, D> global_params,
 
-      TView<Int, 3, D> scratch_block_neighbors,  // from forward pass
+      TView<Int, 2, D> block_neighbor_pairs,  // from forward pass
       TView<Real, 4, D> dTdV  // nterms x nposes x (1|len) x (1|len)
       ) -> TPack<Vec<Real, 3>, 3, D>;
 };
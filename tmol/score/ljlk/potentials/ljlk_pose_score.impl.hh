@@ -14,7 +14,6 @@
 #include <tmol/score/common/diamond_macros.hh>
 #include <tmol/score/common/geom.hh>
 #include <tmol/score/common/launch_box_macros.hh>
-#include <tmol/score/common/sphere_overlap.impl.hh>
 #include <tmol/score/common/tile_atom_pair_evaluation.hh>
 #include <tmol/score/common/tuple.hh>
 #include <tmol/score/common/warp_segreduce.hh>
@@ -251,6 +250,7 @@ EIGEN_DEVICE_FUNC int interres_count_pair_separation(
 //    pose_stack_min_bond_separation (TView<Int, 3, D>)
 //    block_type_n_interblock_bonds (TView<Int, 1, D>)
 //    block_type_atoms_forming_chemical_bonds (TView<Int, 2, D>)
+//    pose_stack_inter_block_bondsep_neighbors (TView<Int, 3, D>)
 //    pose_stack_inter_block_bondsep (TView<Int, 5, D>)
 //    global_params (TView<LJGlobalParams<Real>, 1, D>)
 //    max_important_bond_separation (int)
@@ -270,6 +270,7 @@ EIGEN_DEVICE_FUNC int interres_count_pair_separation(
         pose_stack_min_bond_separation,                            \
         block_type_n_interblock_bonds,                             \
         block_type_atoms_forming_chemical_bonds,                   \
+        pose_stack_inter_block_bondsep_neighbors,                  \
         pose_stack_inter_block_bondsep,                            \
         global_params,                                             \
         max_important_bond_separation,                             \
@@ -638,7 +639,13 @@ auto LJLKPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
     // (possibly) fit in constant cache
     TView<Int, 3, D> pose_stack_min_bond_separation,
 
-    // dims: n-systems x max-n-blocks x max-n-blocks x
+    // dims: n-systems x max-n-blocks x max-n-bondsep-neighbors
+    // for each block, the (sorted) indices of the blocks whose
+    // connections are within MAX_SIG_BOND_SEPARATION chemical bonds
+    // of its own; -1 sentinel
+    TView<Int, 3, D> pose_stack_inter_block_bondsep_neighbors,
+
+    // dims: n-systems x max-n-blocks x max-n-bondsep-neighbors x
     // max-n-interblock-connections x max-n-interblock-connections
     TView<Int, 5, D> pose_stack_inter_block_bondsep,
 
@@ -672,11 +679,16 @@ auto LJLKPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
     TView<LJLKTypeParams<Real>, 1, D> type_params,
     TView<LJGlobalParams<Real>, 1, D> global_params,
 
+    // dims: n-block-pairs x 3
+    // the (pose, block1, block2) of each pair of blocks close enough to
+    // interact, with block1 <= block2; one work item is launched per pair
+    TView<Int, 2, D> block_neighbor_pairs,
+
     // should the output be per-pose (npose x nterms x 1 x 1)
     //   or per block-pair (npose x nterms x len x len)
     bool output_block_pair_energies,
-    bool require_gradient) -> std::
-    tuple<TPack<Real, 4, D>, TPack<Vec<Real, 3>, 3, D>, TPack<Int, 3, D> > {
+    bool require_gradient)
+    -> std::tuple<TPack<Real, 4, D>, TPack<Vec<Real, 3>, 3, D> > {
   using Real3 = Vec<Real, 3>;
 
   int const n_poses = coords.size(0);
@@ -697,9 +709,13 @@ auto LJLKPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
   assert(pose_stack_min_bond_separation.size(1) == max_n_blocks);
   assert(pose_stack_min_bond_separation.size(2) == max_n_blocks);
 
+  assert(pose_stack_inter_block_bondsep_neighbors.size(0) == n_poses);
+  assert(pose_stack_inter_block_bondsep_neighbors.size(1) == max_n_blocks);
   assert(pose_stack_inter_block_bondsep.size(0) == n_poses);
   assert(pose_stack_inter_block_bondsep.size(1) == max_n_blocks);
-  assert(pose_stack_inter_block_bondsep.size(2) == max_n_blocks);
+  assert(
+      pose_stack_inter_block_bondsep.size(2)
+      == pose_stack_inter_block_bondsep_neighbors.size(2));
   assert(pose_stack_inter_block_bondsep.size(3) == max_n_interblock_bonds);
   assert(pose_stack_inter_block_bondsep.size(4) == max_n_interblock_bonds);
 
@@ -729,26 +745,19 @@ auto LJLKPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
     output_t = TPack<Real, 4, D>::zeros({3, n_poses, 1, 1});
   }
 
-  auto output = output_t.view;
-
-  auto dV_dcoords_t =
-      TPack<Vec<Real, 3>, 3, D>::zeros({3, n_poses, max_n_pose_atoms});
-  auto dV_dcoords = dV_dcoords_t.view;
-
-  auto scratch_block_spheres_t =
-      TPack<Real, 3, D>::zeros({n_poses, max_n_blocks, 4});
-  auto scratch_block_spheres = scratch_block_spheres_t.view;
-
-  auto scratch_block_neighbors_t =
-      TPack<Int, 3, D>::zeros({n_poses, max_n_blocks, max_n_blocks});
-  auto scratch_block_neighbors = scratch_block_neighbors_t.view;
+  auto dV_dcoords_t = TPack<Vec<Real, 3>, 3, D>::zeros(
+      {3, n_poses, require_gradient ? max_n_pose_atoms : 0});
 
   // Optimal launch box on v100 and a100 is nt=32, vt=1
   LAUNCH_BOX_32;
   // Define nt and reduce_t
   CTA_REAL_REDUCE_T_TYPEDEF;
 
-  auto eval_energies_by_block = ([=] TMOL_DEVICE_FUNC(int cta) {
+  auto eval_energies_by_block = ([=] TMOL_DEVICE_FUNC(
+                                     int cta,
+                                     TView<Real, 4, D> const& output,
+                                     TView<Vec<Real, 3>, 3, D> const&
+                                         dV_dcoords) {
     auto atom_pair_lj_fn = ([=] TMOL_DEVICE_FUNC(
                                 int atom_tile_ind1,
                                 int atom_tile_ind2,
@@ -798,17 +807,9 @@ auto LJLKPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
     Real total_ljrep = 0;
     Real total_lk = 0;
 
-    int const pose_ind = cta / (max_n_blocks * max_n_blocks);
-    int const block_ind_pair = cta % (max_n_blocks * max_n_blocks);
-    int const block_ind1 = block_ind_pair / max_n_blocks;
-    int const block_ind2 = block_ind_pair % max_n_blocks;
-    if (block_ind1 > block_ind2) {
-      return;
-    }
-
-    if (scratch_block_neighbors[pose_ind][block_ind1][block_ind2] == 0) {
-      return;
-    }
+    int const pose_ind = block_neighbor_pairs[cta][0];
+    int const block_ind1 = block_neighbor_pairs[cta][1];
+    int const block_ind2 = block_neighbor_pairs[cta][2];
 
     int const max_important_bond_separation = 4;
 
@@ -885,7 +886,10 @@ auto LJLKPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
         store_calculated_energies);
   });
 
-  auto eval_energies = ([=] TMOL_DEVICE_FUNC(int cta) {
+  auto eval_energies = ([=] TMOL_DEVICE_FUNC(
+                            int cta,
+                            TView<Real, 4, D> const& output,
+                            TView<Vec<Real, 3>, 3, D> const& dV_dcoords) {
     auto atom_pair_lj_fn = ([=] TMOL_DEVICE_FUNC(
                                 int atom_tile_ind1,
                                 int atom_tile_ind2,
@@ -959,17 +963,9 @@ auto LJLKPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
     Real total_lj = 0;
     Real total_lk = 0;
 
-    int const pose_ind = cta / (max_n_blocks * max_n_blocks);
-    int const block_ind_pair = cta % (max_n_blocks * max_n_blocks);
-    int const block_ind1 = block_ind_pair / max_n_blocks;
-    int const block_ind2 = block_ind_pair % max_n_blocks;
-    if (block_ind1 > block_ind2) {
-      return;
-    }
-
-    if (scratch_block_neighbors[pose_ind][block_ind1][block_ind2] == 0) {
-      return;
-    }
+    int const pose_ind = block_neighbor_pairs[cta][0];
+    int const block_ind1 = block_neighbor_pairs[cta][1];
+    int const block_ind2 = block_neighbor_pairs[cta][2];
 
     int const max_important_bond_separation = 4;
 
@@ -1042,47 +1038,25 @@ auto LJLKPoseScoreDispatch<DeviceDispatch, D, Real, Int>::forward(
 
   ///////////////////////////////////////////////////////////////////////
 
-  // Three steps
-  // 0: setup
-  // 1: launch a kernel to find a small bounding sphere surrounding the blocks
-  // 2: launch a kernel to look for spheres that are within striking distance of
-  // each other
-  // 3: launch a kernel to evaluate lj/lk between pairs of blocks
-  // within striking distance
-
-  // 0
-  // TO DO: let DeviceDispatch hold a cuda stream (??)
-  // at::cuda::CUDAStream wrapped_stream = at::cuda::getDefaultCUDAStream();
-  // mgpu::standard_context_t context(wrapped_stream.stream());
-  int const n_block_pairs = n_poses * max_n_blocks * max_n_blocks;
-
-  score::common::sphere_overlap::
-      compute_block_spheres<DeviceDispatch, D, Real, Int>::f(
-          coords,
-          pose_stack_block_coord_offset,
-          pose_stack_block_type,
-          block_type_n_atoms,
-          scratch_block_spheres);
-
-  score::common::sphere_overlap::
-      detect_block_neighbors<DeviceDispatch, D, Real, Int>::f(
-          coords,
-          pose_stack_block_coord_offset,
-          pose_stack_block_type,
-          block_type_n_atoms,
-          scratch_block_spheres,
-          scratch_block_neighbors,
-          Real(6.0));  // 6A hard coded here. Please fix! TEMP!
+  // The block pairs that are within striking distance of each other
+  // have already been found (see tmol/score/common/block_neighbors.py);
+  // launch a kernel to evaluate lj/lk between them
+  int const n_block_pairs = block_neighbor_pairs.size(0);
+
+  // On the CPU, spread the block pairs across threads; everything they
+  // accumulate into lands in output_t or dV_dcoords_t
+  auto accumulation_targets =
+      DeviceDispatch<D>::parallel_accumulation_targets(output_t, dV_dcoords_t);
 
   if (output_block_pair_energies) {
     DeviceDispatch<D>::template foreach_workgroup<launch_t>(
-        n_block_pairs, eval_energies_by_block);
+        n_block_pairs, eval_energies_by_block, accumulation_targets);
   } else {
     DeviceDispatch<D>::template foreach_workgroup<launch_t>(
-        n_block_pairs, eval_energies);
+        n_block_pairs, eval_energies, accumulation_targets);
   }
 
-  return {output_t, dV_dcoords_t, scratch_block_neighbors_t};
+  return {output_t, dV_dcoords_t};
 }  // LJLKPoseScoreDispatch::forward
 
 template <
@@ -1105,7 +1079,13 @@ auto LJLKPoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
     // (possibly) fit in constant cache
     TView<Int, 3, D> pose_stack_min_bond_separation,
 
-    // dims: n-systems x max-n-blocks x max-n-blocks x
+    // dims: n-systems x max-n-blocks x max-n-bondsep-neighbors
+    // for each block, the (sorted) indices of the blocks whose
+    // connections are within MAX_SIG_BOND_SEPARATION chemical bonds
+    // of its own; -1 sentinel
+    TView<Int, 3, D> pose_stack_inter_block_bondsep_neighbors,
+
+    // dims: n-systems x max-n-blocks x max-n-bondsep-neighbors x
     // max-n-interblock-connections x max-n-interblock-connections
     TView<Int, 5, D> pose_stack_inter_block_bondsep,
 
@@ -1139,8 +1119,8 @@ auto LJLKPoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
     TView<LJLKTypeParams<Real>, 1, D> type_params,
     TView<LJGlobalParams<Real>, 1, D> global_params,
 
-    TView<Int, 3, D> scratch_block_neighbors,  // from forward pass
-    TView<Real, 4, D> dTdV                     // nterms x nposes x len x len
+    TView<Int, 2, D> block_neighbor_pairs,  // from forward pass
+    TView<Real, 4, D> dTdV             // nterms x nposes x len x len
     ) -> TPack<Vec<Real, 3>, 3, D> {
   using tmol::score::common::accumulate;
   using Real3 = Vec<Real, 3>;
@@ -1163,9 +1143,13 @@ auto LJLKPoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
   assert(pose_stack_min_bond_separation.size(1) == max_n_blocks);
   assert(pose_stack_min_bond_separation.size(2) == max_n_blocks);
 
+  assert(pose_stack_inter_block_bondsep_neighbors.size(0) == n_poses);
+  assert(pose_stack_inter_block_bondsep_neighbors.size(1) == max_n_blocks);
   assert(pose_stack_inter_block_bondsep.size(0) == n_poses);
   assert(pose_stack_inter_block_bondsep.size(1) == max_n_blocks);
-  assert(pose_stack_inter_block_bondsep.size(2) == max_n_blocks);
+  assert(
+      pose_stack_inter_block_bondsep.size(2)
+      == pose_stack_inter_block_bondsep_neighbors.size(2));
   assert(pose_stack_inter_block_bondsep.size(3) == max_n_interblock_bonds);
   assert(pose_stack_inter_block_bondsep.size(4) == max_n_interblock_bonds);
 
@@ -1185,9 +1169,7 @@ auto LJLKPoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
   assert(block_type_path_distance.size(1) == max_n_block_atoms);
   assert(block_type_path_distance.size(2) == max_n_block_atoms);
 
-  assert(scratch_block_neighbors.size(0) == n_poses);
-  assert(scratch_block_neighbors.size(1) == max_n_blocks);
-  assert(scratch_block_neighbors.size(2) == max_n_blocks);
+  assert(block_neighbor_pairs.size(1) == 3);
 
   assert(dTdV.size(0) == 3);
   assert(dTdV.size(1) == n_poses);
@@ -1196,14 +1178,15 @@ auto LJLKPoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
 
   auto dV_dcoords_t =
       TPack<Vec<Real, 3>, 3, D>::zeros({3, n_poses, max_n_pose_atoms});
-  auto dV_dcoords = dV_dcoords_t.view;
 
   // Optimal launch box on v100 and a100 is nt=32, vt=1
   LAUNCH_BOX_32;
   // Define nt and reduce_t
   CTA_REAL_REDUCE_T_TYPEDEF;
 
-  auto eval_derivs = ([=] TMOL_DEVICE_FUNC(int cta) {
+  auto eval_derivs = ([=] TMOL_DEVICE_FUNC(
+                          int cta,
+                          TView<Vec<Real, 3>, 3, D> const& dV_dcoords) {
     auto atom_pair_lj_fn =
         ([=] TMOL_DEVICE_FUNC(
              int atom_tile_ind1,
@@ -1273,17 +1256,9 @@ auto LJLKPoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
     Real total_lj = 0;
     Real total_lk = 0;
 
-    int const pose_ind = cta / (max_n_blocks * max_n_blocks);
-    int const block_ind_pair = cta % (max_n_blocks * max_n_blocks);
-    int const block_ind1 = block_ind_pair / max_n_blocks;
-    int const block_ind2 = block_ind_pair % max_n_blocks;
-    if (block_ind1 > block_ind2) {
-      return;
-    }
-
-    if (scratch_block_neighbors[pose_ind][block_ind1][block_ind2] == 0) {
-      return;
-    }
+    int const pose_ind = block_neighbor_pairs[cta][0];
+    int const block_ind1 = block_neighbor_pairs[cta][1];
+    int const block_ind2 = block_neighbor_pairs[cta][2];
 
     int const max_important_bond_separation = 4;
 
@@ -1359,9 +1334,11 @@ auto LJLKPoseScoreDispatch<DeviceDispatch, D, Real, Int>::backward(
 
   // Since we have the sphere overlap results from the forward pass,
   // there's only a single kernel launch here
-  int const n_block_pairs = n_poses * max_n_blocks * max_n_blocks;
+  int const n_block_pairs = block_neighbor_pairs.size(0);
+  auto accumulation_targets =
+      DeviceDispatch<D>::parallel_accumulation_targets(dV_dcoords_t);
   DeviceDispatch<D>::template foreach_workgroup<launch_t>(
-      n_block_pairs, eval_derivs);
+      n_block_pairs, eval_derivs, accumulation_targets);
 
   return dV_dcoords_t;
 }
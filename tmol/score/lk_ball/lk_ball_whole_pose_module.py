@@ -1,16 +1,22 @@
 import torch
 
 from tmol.score.lk_ball.potentials.compiled import gen_pose_waters, pose_score_lk_ball
+from tmol.score.common.block_neighbors import find_block_neighbor_pairs
 from tmol.score.common.convert_float64 import convert_float64
 
 
 class LKBallWholePoseScoringModule(torch.nn.Module):
+    # blocks whose bounding spheres are farther apart than this (in A)
+    # cannot interact
+    block_neighbor_reach = 6.0
+
     def __init__(
         self,
         pose_stack_block_coord_offset,
         pose_stack_block_type,
         pose_stack_inter_residue_connections,
         pose_stack_min_bond_separation,
+        pose_stack_inter_block_bondsep_neighbors,
         pose_stack_inter_block_bondsep,
         bt_n_atoms,
         bt_n_interblock_bonds,
@@ -49,6 +55,9 @@ class LKBallWholePoseScoringModule(torch.nn.Module):
             pose_stack_inter_residue_connections
         )
         self.pose_stack_min_bond_separation = _p(pose_stack_min_bond_separation)
+        self.pose_stack_inter_block_bondsep_neighbors = _p(
+            pose_stack_inter_block_bondsep_neighbors
+        )
         self.pose_stack_inter_block_bondsep = _p(pose_stack_inter_block_bondsep)
 
         self.bt_n_atoms = _p(bt_n_atoms)
@@ -81,12 +90,23 @@ class LKBallWholePoseScoringModule(torch.nn.Module):
         self.sp3_water_tors = _p(sp3_water_tors)
         self.ring_water_tors = _p(ring_water_tors)
 
-    def forward(self, pose_coords, output_block_pair_energies=False):
+    def forward(
+        self, pose_coords, output_block_pair_energies=False, block_neighbor_pairs=None
+    ):
         """Two step scoring: first build the waters and then score;
         derivatives are calculated backwards through the water
         building step by torch's autograd machinery
         """
 
+        if block_neighbor_pairs is None:
+            block_neighbor_pairs = find_block_neighbor_pairs(
+                pose_coords.detach(),
+                self.pose_stack_block_coord_offset,
+                self.pose_stack_block_type,
+                self.bt_n_atoms,
+                self.block_neighbor_reach,
+            )
+
         args = [
             pose_coords,
             self.pose_stack_block_coord_offset,
@@ -125,6 +145,7 @@ class LKBallWholePoseScoringModule(torch.nn.Module):
             self.pose_stack_block_type,
             self.pose_stack_inter_residue_connections,
             self.pose_stack_min_bond_separation,
+            self.pose_stack_inter_block_bondsep_neighbors,
             self.pose_stack_inter_block_bondsep,
             self.bt_n_atoms,
             self.bt_n_interblock_bonds,
@@ -135,6 +156,7 @@ class LKBallWholePoseScoringModule(torch.nn.Module):
             self.bt_tile_lk_ball_params,
             self.bt_path_distance,
             self.lk_ball_global_params,
+            block_neighbor_pairs,
             output_block_pair_energies,
         ]
 
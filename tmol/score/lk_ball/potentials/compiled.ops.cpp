@@ -360,6 +360,7 @@ class LKBallPoseScoreOp : public torch::autograd::Function<LKBallPoseScoreOp> {
       Tensor pose_stack_inter_residue_connections,
 
       Tensor pose_stack_min_bond_separation,
+      Tensor pose_stack_inter_block_bondsep_neighbors,
       Tensor pose_stack_inter_block_bondsep,
       Tensor block_type_n_atoms,
       Tensor block_type_n_interblock_bonds,
@@ -372,9 +373,9 @@ class LKBallPoseScoreOp : public torch::autograd::Function<LKBallPoseScoreOp> {
       Tensor block_type_path_distance,
 
       Tensor global_params,
+      Tensor block_neighbor_pairs,
       bool output_block_pair_energies) {
     at::Tensor score;
-    at::Tensor block_neighbors;
 
     using Int = int32_t;
 
@@ -396,6 +397,7 @@ class LKBallPoseScoreOp : public torch::autograd::Function<LKBallPoseScoreOp> {
                   TCAST(pose_stack_inter_residue_connections),
 
                   TCAST(pose_stack_min_bond_separation),
+                  TCAST(pose_stack_inter_block_bondsep_neighbors),
                   TCAST(pose_stack_inter_block_bondsep),
                   TCAST(block_type_n_atoms),
                   TCAST(block_type_n_interblock_bonds),
@@ -408,10 +410,10 @@ class LKBallPoseScoreOp : public torch::autograd::Function<LKBallPoseScoreOp> {
                   TCAST(block_type_path_distance),
 
                   TCAST(global_params),
+                  TCAST(block_neighbor_pairs),
                   output_block_pair_energies);
 
-          score = std::get<0>(result).tensor;
-          block_neighbors = std::get<1>(result).tensor;
+          score = result.tensor;
         }));
 
     ctx->save_for_backward(
@@ -422,6 +424,7 @@ class LKBallPoseScoreOp : public torch::autograd::Function<LKBallPoseScoreOp> {
          pose_stack_inter_residue_connections,
 
          pose_stack_min_bond_separation,
+         pose_stack_inter_block_bondsep_neighbors,
          pose_stack_inter_block_bondsep,
          block_type_n_atoms,
          block_type_n_interblock_bonds,
@@ -434,7 +437,7 @@ class LKBallPoseScoreOp : public torch::autograd::Function<LKBallPoseScoreOp> {
          block_type_path_distance,
 
          global_params,
-         block_neighbors});
+         block_neighbor_pairs});
 
     ctx->saved_data["block_pair_scoring"] = output_block_pair_energies;
 
@@ -457,6 +460,7 @@ class LKBallPoseScoreOp : public torch::autograd::Function<LKBallPoseScoreOp> {
     auto pose_stack_inter_residue_connections = saved[i++];
 
     auto pose_stack_min_bond_separation = saved[i++];
+    auto pose_stack_inter_block_bondsep_neighbors = saved[i++];
     auto pose_stack_inter_block_bondsep = saved[i++];
     auto block_type_n_atoms = saved[i++];
     auto block_type_n_interblock_bonds = saved[i++];
@@ -469,7 +473,7 @@ class LKBallPoseScoreOp : public torch::autograd::Function<LKBallPoseScoreOp> {
     auto block_type_path_distance = saved[i++];
 
     auto global_params = saved[i++];
-    auto block_neighbors = saved[i++];
+    auto block_neighbor_pairs = saved[i++];
 
     at::Tensor dV_d_pose_coords, dV_d_water_coords;
     using Int = int32_t;
@@ -499,6 +503,7 @@ class LKBallPoseScoreOp : public torch::autograd::Function<LKBallPoseScoreOp> {
                   TCAST(pose_stack_inter_residue_connections),
 
                   TCAST(pose_stack_min_bond_separation),
+                  TCAST(pose_stack_inter_block_bondsep_neighbors),
                   TCAST(pose_stack_inter_block_bondsep),
                   TCAST(block_type_n_atoms),
                   TCAST(block_type_n_interblock_bonds),
@@ -511,7 +516,7 @@ class LKBallPoseScoreOp : public torch::autograd::Function<LKBallPoseScoreOp> {
                   TCAST(block_type_path_distance),
 
                   TCAST(global_params),
-                  TCAST(block_neighbors),
+                  TCAST(block_neighbor_pairs),
                   TCAST(dTdV),
                   block_pair_scoring);
 
@@ -538,6 +543,8 @@ class LKBallPoseScoreOp : public torch::autograd::Function<LKBallPoseScoreOp> {
         torch::Tensor(),
         torch::Tensor(),
 
+        torch::Tensor(),
+        torch::Tensor(),
         torch::Tensor(),
         torch::Tensor()};
   }
@@ -551,6 +558,7 @@ Tensor lkball_pose_score(
     Tensor pose_stack_inter_residue_connections,
 
     Tensor pose_stack_min_bond_separation,
+    Tensor pose_stack_inter_block_bondsep_neighbors,
     Tensor pose_stack_inter_block_bondsep,
     Tensor block_type_n_atoms,
     Tensor block_type_n_interblock_bonds,
@@ -563,6 +571,7 @@ Tensor lkball_pose_score(
     Tensor block_type_path_distance,
 
     Tensor global_params,
+    Tensor block_neighbor_pairs,
     bool output_block_pair_energies) {
   return LKBallPoseScoreOp::apply(
       pose_coords,
@@ -572,6 +581,7 @@ Tensor lkball_pose_score(
       pose_stack_inter_residue_connections,
 
       pose_stack_min_bond_separation,
+      pose_stack_inter_block_bondsep_neighbors,
       pose_stack_inter_block_bondsep,
       block_type_n_atoms,
       block_type_n_interblock_bonds,
@@ -584,6 +594,7 @@ Tensor lkball_pose_score(
       block_type_path_distance,
 
       global_params,
+      block_neighbor_pairs,
       output_block_pair_energies);
 }
 
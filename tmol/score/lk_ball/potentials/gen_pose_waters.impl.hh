@@ -242,7 +242,9 @@ struct GeneratePoseWaters {
     });
 
     int const n_blocks = n_poses * max_n_blocks;
-    DeviceOps<Dev>::template foreach_workgroup<launch_t>(n_blocks, f_watergen);
+    // Each block writes only its own waters; nothing is accumulated
+    DeviceOps<Dev>::template foreach_workgroup<launch_t>(
+        n_blocks, f_watergen, DeviceOps<Dev>::parallel_accumulation_targets());
 
     return water_coords_t;
   };
@@ -342,7 +344,6 @@ struct GeneratePoseWaters {
 
     auto dE_d_pose_coords_t =
         TPack<Vec<Real, 3>, 2, Dev>::zeros({n_poses, max_n_pose_atoms});
-    auto dE_d_pose_coords = dE_d_pose_coords_t.view;
 
     int nsp2wats = sp2_water_tors.size(0);
     int nsp3wats = sp3_water_tors.size(0);
@@ -352,7 +353,10 @@ struct GeneratePoseWaters {
     LAUNCH_BOX_32;
     CTA_LAUNCH_T_PARAMS;
 
-    auto f_watergen = ([=] TMOL_DEVICE_FUNC(int ind) {
+    auto f_watergen = ([=] TMOL_DEVICE_FUNC(
+                           int ind,
+                           TView<Vec<Real, 3>, 2, Dev> const&
+                               dE_d_pose_coords) {
       int const pose_ind = ind / max_n_blocks;
       int const block_ind = ind % max_n_blocks;
       int const block_type = pose_stack_block_type[pose_ind][block_ind];
@@ -468,7 +472,10 @@ struct GeneratePoseWaters {
 
     int const n_blocks = n_poses * max_n_blocks;
     nvtx_range_push("watergen::dgen");
-    DeviceOps<Dev>::template foreach_workgroup<launch_t>(n_blocks, f_watergen);
+    auto accumulation_targets =
+        DeviceOps<Dev>::parallel_accumulation_targets(dE_d_pose_coords_t);
+    DeviceOps<Dev>::template foreach_workgroup<launch_t>(
+        n_blocks, f_watergen, accumulation_targets);
     nvtx_range_pop();
 
     // std::cout << "d watergen end" << std::endl;
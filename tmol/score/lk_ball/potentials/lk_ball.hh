@@ -7,6 +7,7 @@
 #include <tmol/score/common/geom.hh>
 #include <tmol/score/common/accumulate.hh>
 #include <tmol/score/common/diamond_macros.hh>
+#include <tmol/score/common/count_pair.hh>
 #include <tmol/score/common/data_loading.hh>
 #include <tmol/score/ljlk/potentials/lk_isotropic.hh>
 
@@ -673,6 +674,7 @@ void TMOL_DEVICE_FUNC lk_ball_load_tile_invariant_interres_data(
     TView<Int, 2, Dev> pose_stack_block_type,
     TView<Vec<Int, 2>, 3, Dev> pose_stack_inter_residue_connections,
     TView<Int, 3, Dev> pose_stack_min_bond_separation,
+    TView<Int, 3, Dev> pose_stack_inter_block_bondsep_neighbors,
     TView<Int, 5, Dev> pose_stack_inter_block_bondsep,
     TView<Int, 1, Dev> block_type_n_interblock_bonds,
     TView<Int, 2, Dev> block_type_atoms_forming_chemical_bonds,
@@ -745,8 +747,14 @@ void TMOL_DEVICE_FUNC lk_ball_load_tile_invariant_interres_data(
           int conn1 = conn_ind / inter_dat.r2.n_conn;
           int conn2 = conn_ind % inter_dat.r2.n_conn;
           shared_m.conn_seps[conn_ind] =
-              pose_stack_inter_block_bondsep[pose_ind][block_ind1][block_ind2]
-                                            [conn1][conn2];
+              common::count_pair::sparse_inter_block_bondsep<Dev, Int>(
+                  pose_stack_inter_block_bondsep_neighbors,
+                  pose_stack_inter_block_bondsep,
+                  pose_ind,
+                  block_ind1,
+                  block_ind2,
+                  conn1,
+                  conn2);
         }
       }
     });
@@ -51,7 +51,13 @@ struct LKBallPoseScoreDispatch {
       // (possibly) fit in constant cache
       TView<Int, 3, Dev> pose_stack_min_bond_separation,
 
-      // dims: n-poses x max-n-blocks x max-n-blocks x
+      // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors
+      // for each block, the (sorted) indices of the blocks whose
+      // connections are within MAX_SIG_BOND_SEPARATION chemical bonds
+      // of its own; -1 sentinel
+      TView<Int, 3, Dev> pose_stack_inter_block_bondsep_neighbors,
+
+      // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors x
       // max-n-interblock-connections x max-n-interblock-connections
       TView<Int, 5, Dev> pose_stack_inter_block_bondsep,
 
@@ -84,8 +90,12 @@ struct LKBallPoseScoreDispatch {
 
       // LKBall potential parameters
       TView<LKBallGlobalParams<Real>, 1, Dev> global_params,
-      bool output_block_pair_energies)
-      -> std::tuple<TPack<Real, 4, Dev>, TPack<Int, 3, Dev>>;
+
+      // dims: n-block-pairs x 3
+      // the (pose, block1, block2) of each pair of blocks close enough to
+      // interact, with block1 <= block2; one work item is launched per pair
+      TView<Int, 2, Dev> block_neighbor_pairs,
+      bool output_block_pair_energies) -> TPack<Real, 4, Dev>;
 
   static auto backward(
       TView<Vec<Real, 3>, 2, Dev> pose_coords,
@@ -107,7 +117,13 @@ struct LKBallPoseScoreDispatch {
       // (possibly) fit in constant cache
       TView<Int, 3, Dev> pose_stack_min_bond_separation,
 
-      // dims: n-poses x max-n-blocks x max-n-blocks x
+      // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors
+      // for each block, the (sorted) indices of the blocks whose
+      // connections are within MAX_SIG_BOND_SEPARATION chemical bonds
+      // of its own; -1 sentinel
+      TView<Int, 3, Dev> pose_stack_inter_block_bondsep_neighbors,
+
+      // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors x
       // max-n-interblock-connections x max-n-interblock-connections
       TView<Int, 5, Dev> pose_stack_inter_block_bondsep,
 
@@ -139,7 +155,7 @@ struct LKBallPoseScoreDispatch {
 
       // LKBall potential parameters
       TView<LKBallGlobalParams<Real>, 1, Dev> global_params,
-      TView<Int, 3, Dev> block_neighbors,  // from forward pass
+      TView<Int, 2, Dev> block_neighbor_pairs,  // from forward pass
       TView<Real, 4, Dev> dTdV,
       bool block_pair_scoring)
       -> std::tuple<TPack<Vec<Real, 3>, 2, Dev>, TPack<Vec<Real, 3>, 3, Dev>>;
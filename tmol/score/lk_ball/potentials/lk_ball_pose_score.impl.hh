@@ -15,7 +15,6 @@
 #include <tmol/score/common/diamond_macros.hh>
 #include <tmol/score/common/geom.hh>
 #include <tmol/score/common/launch_box_macros.hh>
-#include <tmol/score/common/sphere_overlap.impl.hh>
 #include <tmol/score/common/tile_atom_pair_evaluation.hh>
 #include <tmol/score/common/tuple.hh>
 #include <tmol/score/common/warp_segreduce.hh>
@@ -88,7 +87,13 @@ class LKBallPoseScoreDispatch {
       // (possibly) fit in constant cache
       TView<Int, 3, Dev> pose_stack_min_bond_separation,
 
-      // dims: n-poses x max-n-blocks x max-n-blocks x
+      // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors
+      // for each block, the (sorted) indices of the blocks whose
+      // connections are within MAX_SIG_BOND_SEPARATION chemical bonds
+      // of its own; -1 sentinel
+      TView<Int, 3, Dev> pose_stack_inter_block_bondsep_neighbors,
+
+      // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors x
       // max-n-interblock-connections x max-n-interblock-connections
       TView<Int, 5, Dev> pose_stack_inter_block_bondsep,
 
@@ -121,8 +126,12 @@ class LKBallPoseScoreDispatch {
 
       // LKBall potential parameters
       TView<LKBallGlobalParams<Real>, 1, Dev> global_params,
-      bool output_block_pair_energies)
-      -> std::tuple<TPack<Real, 4, Dev>, TPack<Int, 3, Dev>> {
+
+      // dims: n-block-pairs x 3
+      // the (pose, block1, block2) of each pair of blocks close enough to
+      // interact, with block1 <= block2; one work item is launched per pair
+      TView<Int, 2, Dev> block_neighbor_pairs,
+      bool output_block_pair_energies) -> TPack<Real, 4, Dev> {
     using tmol::score::common::accumulate;
     using Real3 = Vec<Real, 3>;
 
@@ -154,9 +163,13 @@ class LKBallPoseScoreDispatch {
     assert(pose_stack_min_bond_separation.size(1) == max_n_blocks);
     assert(pose_stack_min_bond_separation.size(2) == max_n_blocks);
 
+    assert(pose_stack_inter_block_bondsep_neighbors.size(0) == n_poses);
+    assert(pose_stack_inter_block_bondsep_neighbors.size(1) == max_n_blocks);
     assert(pose_stack_inter_block_bondsep.size(0) == n_poses);
     assert(pose_stack_inter_block_bondsep.size(1) == max_n_blocks);
-    assert(pose_stack_inter_block_bondsep.size(2) == max_n_blocks);
+    assert(
+        pose_stack_inter_block_bondsep.size(2)
+        == pose_stack_inter_block_bondsep_neighbors.size(2));
     assert(pose_stack_inter_block_bondsep.size(3) == max_n_interblock_bonds);
     assert(pose_stack_inter_block_bondsep.size(4) == max_n_interblock_bonds);
 
@@ -187,22 +200,15 @@ class LKBallPoseScoreDispatch {
       output_t =
           TPack<Real, 4, Dev>::zeros({n_lk_ball_score_types, n_poses, 1, 1});
     }
-    auto output = output_t.view;
-
-    auto scratch_block_spheres_t =
-        TPack<Real, 3, Dev>::zeros({n_poses, max_n_blocks, 4});
-    auto scratch_block_spheres = scratch_block_spheres_t.view;
-
-    auto scratch_block_neighbors_t =
-        TPack<Int, 3, Dev>::zeros({n_poses, max_n_blocks, max_n_blocks});
-    auto scratch_block_neighbors = scratch_block_neighbors_t.view;
 
     // Optimal launch box on v100 and a100 is nt=32, vt=1
     LAUNCH_BOX_32;
     // Define nt and reduce_t
     CTA_REAL_REDUCE_T_TYPEDEF;
 
-    auto eval_energies_by_block = ([=] TMOL_DEVICE_FUNC(int cta) {
+    auto eval_energies_by_block = ([=] TMOL_DEVICE_FUNC(
+                                       int cta,
+                                       TView<Real, 4, Dev> const& output) {
       auto score_inter_lk_ball_atom_pair =
           ([=] TMOL_DEVICE_FUNC(
                int pol_start,
@@ -278,17 +284,9 @@ class LKBallPoseScoreDispatch {
 
       } shared;
 
-      int const pose_ind = cta / (max_n_blocks * max_n_blocks);
-      int const block_ind_pair = cta % (max_n_blocks * max_n_blocks);
-      int const block_ind1 = block_ind_pair / max_n_blocks;
-      int const block_ind2 = block_ind_pair % max_n_blocks;
-      if (block_ind1 > block_ind2) {
-        return;
-      }
-
-      if (scratch_block_neighbors[pose_ind][block_ind1][block_ind2] == 0) {
-        return;
-      }
+      int const pose_ind = block_neighbor_pairs[cta][0];
+      int const block_ind1 = block_neighbor_pairs[cta][1];
+      int const block_ind2 = block_neighbor_pairs[cta][2];
 
       int const max_important_bond_separation = 4;
 
@@ -317,6 +315,7 @@ class LKBallPoseScoreDispatch {
                 pose_stack_block_type,
                 pose_stack_inter_residue_connections,
                 pose_stack_min_bond_separation,
+                pose_stack_inter_block_bondsep_neighbors,
                 pose_stack_inter_block_bondsep,
 
                 block_type_n_interblock_bonds,
@@ -592,43 +591,18 @@ class LKBallPoseScoreDispatch {
 
     ///////////////////////////////////////////////////////////////////////
 
-    // Three steps
-    // 0: setup
-    // 1: launch a kernel to find a small bounding sphere surrounding the
-    // blocks 2: launch a kernel to look for spheres that are within
-    // striking distance of each other 3: launch a kernel to evaluate
-    // lk-ball desolvation between pairs of blocks within striking distance
-
-    // 0
-    // TO DO: let DeviceDispatch hold a cuda stream (??)
-    // at::cuda::CUDAStream wrapped_stream =
-    // at::cuda::getDefaultCUDAStream(); mgpu::standard_context_t
-    // context(wrapped_stream.stream());
-    int const n_block_pairs = n_poses * max_n_blocks * max_n_blocks;
-
-    score::common::sphere_overlap::
-        compute_block_spheres<DeviceDispatch, Dev, Real, Int>::f(
-            pose_coords,
-            pose_stack_block_coord_offset,
-            pose_stack_block_type,
-            block_type_n_atoms,
-            scratch_block_spheres);
-
-    score::common::sphere_overlap::
-        detect_block_neighbors<DeviceDispatch, Dev, Real, Int>::f(
-            pose_coords,
-            pose_stack_block_coord_offset,
-            pose_stack_block_type,
-            block_type_n_atoms,
-            scratch_block_spheres,
-            scratch_block_neighbors,
-            Real(6.0));  // 6.0 hard coded here. Please fix! TEMP!
-
-    // 3 Only the forward pass in this calculation
+    // The block pairs that are within striking distance of each other
+    // have already been found (see tmol/score/common/block_neighbors.py);
+    // launch a kernel to evaluate lk-ball desolvation between them
+    int const n_block_pairs = block_neighbor_pairs.size(0);
+
+    // Only the forward pass in this calculation
+    auto accumulation_targets =
+        DeviceDispatch<Dev>::parallel_accumulation_targets(output_t);
     DeviceDispatch<Dev>::template foreach_workgroup<launch_t>(
-        n_block_pairs, eval_energies_by_block);
+        n_block_pairs, eval_energies_by_block, accumulation_targets);
 
-    return {output_t, scratch_block_neighbors_t};
+    return output_t;
   }
 
   static auto backward(
@@ -651,7 +625,13 @@ class LKBallPoseScoreDispatch {
       // (possibly) fit in constant cache
       TView<Int, 3, Dev> pose_stack_min_bond_separation,
 
-      // dims: n-poses x max-n-blocks x max-n-blocks x
+      // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors
+      // for each block, the (sorted) indices of the blocks whose
+      // connections are within MAX_SIG_BOND_SEPARATION chemical bonds
+      // of its own; -1 sentinel
+      TView<Int, 3, Dev> pose_stack_inter_block_bondsep_neighbors,
+
+      // dims: n-poses x max-n-blocks x max-n-bondsep-neighbors x
       // max-n-interblock-connections x max-n-interblock-connections
       TView<Int, 5, Dev> pose_stack_inter_block_bondsep,
 
@@ -683,7 +663,7 @@ class LKBallPoseScoreDispatch {
 
       // LKBall potential parameters
       TView<LKBallGlobalParams<Real>, 1, Dev> global_params,
-      TView<Int, 3, Dev> scratch_block_neighbors,  // from forward pass
+      TView<Int, 2, Dev> block_neighbor_pairs,  // from forward pass
       TView<Real, 4, Dev> dTdV,
       bool block_pair_scoring)
       -> std::tuple<TPack<Vec<Real, 3>, 2, Dev>, TPack<Vec<Real, 3>, 3, Dev>> {
@@ -719,9 +699,13 @@ class LKBallPoseScoreDispatch {
     assert(pose_stack_min_bond_separation.size(1) == max_n_blocks);
     assert(pose_stack_min_bond_separation.size(2) == max_n_blocks);
 
+    assert(pose_stack_inter_block_bondsep_neighbors.size(0) == n_poses);
+    assert(pose_stack_inter_block_bondsep_neighbors.size(1) == max_n_blocks);
     assert(pose_stack_inter_block_bondsep.size(0) == n_poses);
     assert(pose_stack_inter_block_bondsep.size(1) == max_n_blocks);
-    assert(pose_stack_inter_block_bondsep.size(2) == max_n_blocks);
+    assert(
+        pose_stack_inter_block_bondsep.size(2)
+        == pose_stack_inter_block_bondsep_neighbors.size(2));
     assert(pose_stack_inter_block_bondsep.size(3) == max_n_interblock_bonds);
     assert(pose_stack_inter_block_bondsep.size(4) == max_n_interblock_bonds);
 
@@ -744,27 +728,27 @@ class LKBallPoseScoreDispatch {
     assert(block_type_path_distance.size(1) == max_n_block_atoms);
     assert(block_type_path_distance.size(2) == max_n_block_atoms);
 
-    assert(scratch_block_neighbors.size(0) == n_poses);
-    assert(scratch_block_neighbors.size(1) == max_n_blocks);
-    assert(scratch_block_neighbors.size(2) == max_n_blocks);
+    assert(block_neighbor_pairs.size(1) == 3);
 
     assert(dTdV.size(0) == 4);
     assert(dTdV.size(1) == n_poses);
 
     auto dV_d_pose_coords_t =
         TPack<Vec<Real, 3>, 2, Dev>::zeros({n_poses, max_n_pose_atoms});
-    auto dV_d_pose_coords = dV_d_pose_coords_t.view;
 
     auto dV_d_water_coords_t = TPack<Vec<Real, 3>, 3, Dev>::zeros(
         {n_poses, max_n_pose_atoms, MAX_N_WATER});
-    auto dV_d_water_coords = dV_d_water_coords_t.view;
 
     // Optimal launch box on v100 and a100 is nt=32, vt=1
     LAUNCH_BOX_32;
     // Define nt and reduce_t
     CTA_REAL_REDUCE_T_TYPEDEF;
 
-    auto eval_derivs = ([=] TMOL_DEVICE_FUNC(int cta) {
+    auto eval_derivs = ([=] TMOL_DEVICE_FUNC(
+                            int cta,
+                            TView<Vec<Real, 3>, 2, Dev> const& dV_d_pose_coords,
+                            TView<Vec<Real, 3>, 3, Dev> const&
+                                dV_d_water_coords) {
       auto lk_ball_atom_derivs =
           ([=] TMOL_DEVICE_FUNC(
                int pol_ind,
@@ -863,17 +847,9 @@ class LKBallPoseScoreDispatch {
 
       } shared;
 
-      int const pose_ind = cta / (max_n_blocks * max_n_blocks);
-      int const block_ind_pair = cta % (max_n_blocks * max_n_blocks);
-      int const block_ind1 = block_ind_pair / max_n_blocks;
-      int const block_ind2 = block_ind_pair % max_n_blocks;
-      if (block_ind1 > block_ind2) {
-        return;
-      }
-
-      if (scratch_block_neighbors[pose_ind][block_ind1][block_ind2] == 0) {
-        return;
-      }
+      int const pose_ind = block_neighbor_pairs[cta][0];
+      int const block_ind1 = block_neighbor_pairs[cta][1];
+      int const block_ind2 = block_neighbor_pairs[cta][2];
 
       int const max_important_bond_separation = 4;
 
@@ -902,6 +878,7 @@ class LKBallPoseScoreDispatch {
                 pose_stack_block_type,
                 pose_stack_inter_residue_connections,
                 pose_stack_min_bond_separation,
+                pose_stack_inter_block_bondsep_neighbors,
                 pose_stack_inter_block_bondsep,
 
                 block_type_n_interblock_bonds,
@@ -1094,9 +1071,12 @@ class LKBallPoseScoreDispatch {
 
     // Since we have the sphere overlap results from the forward pass,
     // there's only a single kernel launch here
-    int const n_block_pairs = n_poses * max_n_blocks * max_n_blocks;
+    int const n_block_pairs = block_neighbor_pairs.size(0);
+    auto accumulation_targets =
+        DeviceDispatch<Dev>::parallel_accumulation_targets(
+            dV_d_pose_coords_t, dV_d_water_coords_t);
     DeviceDispatch<Dev>::template foreach_workgroup<launch_t>(
-        n_block_pairs, eval_derivs);
+        n_block_pairs, eval_derivs, accumulation_targets);
     // std::cout << "d lkball end" << std::endl;
 
     return {dV_d_pose_coords_t, dV_d_water_coords_t};
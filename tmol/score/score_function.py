@@ -1,4 +1,6 @@
+import copy
 import torch
+import weakref
 
 from typing import Sequence
 from tmol.types.torch import Tensor
@@ -11,6 +13,21 @@ from tmol.score.terms import *  # noqa: F401, F403
 from tmol.score.terms.score_term_factory import ScoreTermFactory
 
 from tmol.pose.pose_stack import PoseStack
+from tmol.score.annotation_cache import annotate_packed_block_types
+
+# The term modules name each of their per-pose parameters "pose_stack_*" and
+# take it unaltered from one of these PoseStack tensors
+_pose_stack_parameter_sources = {
+    "pose_stack_block_coord_offset": "block_coord_offset",
+    "pose_stack_block_type": "block_type_ind",
+    "pose_stack_block_types": "block_type_ind",
+    "pose_stack_inter_residue_connections": "inter_residue_connections",
+    "pose_stack_inter_block_connections": "inter_residue_connections",
+    "pose_stack_min_block_bondsep": "min_block_bondsep",
+    "pose_stack_min_bond_separation": "min_block_bondsep",
+    "pose_stack_inter_block_bondsep_neighbors": "inter_block_bondsep_neighbors",
+    "pose_stack_inter_block_bondsep": "inter_block_bondsep_sparse",
+}
 
 
 class ScoreFunction:
@@ -38,6 +55,7 @@ class ScoreFunction:
         self._term_for_st = [None] * ScoreType.n_score_types.value
         self._param_db = param_db
         self._device = device
+        self._term_modules_for_pbt = {}
 
     def set_weight(self, st: ScoreType, weight: float):
         if not self.score_type_covered_by_contained_term(st):
@@ -47,6 +65,22 @@ class ScoreFunction:
         self._weights[st.value] = weight
         self._weights_tensor_out_of_date = True
 
+    def weight(self, st: ScoreType) -> float:
+        return float(self._weights[st.value])
+
+    def without_terms(self, terms) -> "ScoreFunction":
+        """A new ScoreFunction with this one's weights for the score types
+        of all of its terms but the given ones
+        """
+        subset = ScoreFunction(self._param_db, self._device)
+        for term in self.all_terms():
+            if term in terms:
+                continue
+            for st in term.score_types():
+                if self.weight(st) != 0:
+                    subset.set_weight(st, self.weight(st))
+        return subset
+
     def score_type_covered_by_contained_term(self, st: ScoreType):
         for term in self._all_terms:
             if st in term.score_types():
@@ -126,12 +160,14 @@ class ScoreFunction:
         object's __call__ will return a tensor of weighted energies of
         shape (n_poses,).
         """
-        self.pre_work_initialization(pose_stack)
-        term_modules = [
-            t.render_whole_pose_scoring_module(pose_stack) for t in self.all_terms()
-        ]
+        term_modules = self.render_term_modules(pose_stack)
         return WholePoseScoringModule(
-            self.weights_tensor(), term_modules, output_block_pair_energies=False
+            self.weights_tensor(),
+            term_modules,
+            output_block_pair_energies=False,
+            block_neighbors_module=self.render_block_neighbors_module(
+                pose_stack, term_modules
+            ),
         )
 
     def render_block_pair_scoring_module(self, pose_stack: PoseStack):
@@ -143,20 +179,109 @@ class ScoreFunction:
         object's __call__ will return a tensor of weighted energies of
         shape (n_poses, max_n_blocks, max_n_blocks).
         """
+        term_modules = self.render_term_modules(pose_stack)
+        return WholePoseScoringModule(
+            self.weights_tensor(),
+            term_modules,
+            output_block_pair_energies=True,
+            block_neighbors_module=self.render_block_neighbors_module(
+                pose_stack, term_modules
+            ),
+        )
+
+    def render_incremental_scoring_module(self, pose_stack: PoseStack, debug=False):
+        """Create an object designed to evaluate the score of a set of Poses
+        repeatedly as a few of their blocks move between evaluations, e.g.,
+        as in Monte Carlo. Its __call__ takes the coordinates and a mask of
+        the blocks that have moved and returns a tensor of weighted energies
+        of shape (n_poses,); see IncrementalScoringModule.
+        """
+        term_modules = self.render_term_modules(pose_stack)
+        return IncrementalScoringModule(
+            self.weights_tensor(),
+            term_modules,
+            block_neighbors_module=self.render_block_neighbors_module(
+                pose_stack, term_modules
+            ),
+            inter_residue_connections=pose_stack.inter_residue_connections,
+            debug=debug,
+        )
+
+    def render_term_modules(self, pose_stack: PoseStack):
+        """Create each term's whole-pose scoring module for the pose_stack.
+        The modules are built once per PackedBlockTypes object; the renders
+        for later PoseStacks that share that object copy them, rebinding only
+        their per-pose parameters, rather than re-stacking the parameters of
+        the block types. The per-pose parameters are read through
+        PoseStack.topology_view, so the modules for a stack whose poses
+        share one topology hold a single copy of it.
+        """
         self.pre_work_initialization(pose_stack)
-        term_modules = [
-            t.render_whole_pose_scoring_module(pose_stack) for t in self.all_terms()
+        pbt = pose_stack.packed_block_types
+        terms = tuple(self.all_terms())
+
+        key = id(pbt)
+        entry = self._term_modules_for_pbt.get(key)
+        if entry is not None and entry[0]() is pbt and entry[1] == terms:
+            template_modules = entry[2]
+        else:
+            # render for one pose per topology, so that the terms do not
+            # build the per-pose topology tensors only for them to be rebound
+            topology_stack = pose_stack.topology_stack
+            if topology_stack is not pose_stack:
+                self.pre_work_initialization(topology_stack)
+            # cache the modules without their per-pose parameters, so that
+            # the cache keeps none of this PoseStack's tensors alive
+            template_modules = [
+                _without_pose_stack_parameters(
+                    t.render_whole_pose_scoring_module(topology_stack)
+                )
+                for t in terms
+            ]
+            cache = self._term_modules_for_pbt
+            cache[key] = (
+                weakref.ref(pbt, lambda _: cache.pop(key, None)),
+                terms,
+                template_modules,
+            )
+        return [
+            _rebind_pose_stack_parameters(term_module, pose_stack)
+            for term_module in template_modules
         ]
-        return WholePoseScoringModule(
-            self.weights_tensor(), term_modules, output_block_pair_energies=True
+
+    @staticmethod
+    def render_block_neighbors_module(
+        pose_stack: PoseStack, term_modules: Sequence[torch.nn.Module]
+    ):
+        """Create the module that finds the pairs of blocks within
+        interaction distance of each other so that the block-neighbor
+        calculation is performed only once per score evaluation and
+        shared between the two-body terms. Term modules that take
+        advantage of this define a "block_neighbor_reach" attribute;
+        the largest reach among them is used. Returns None if no term
+        module needs block neighbors.
+        """
+        reaches = [
+            tm.block_neighbor_reach
+            for tm in term_modules
+            if hasattr(tm, "block_neighbor_reach")
+        ]
+        if len(reaches) == 0:
+            return None
+
+        from tmol.score.common.block_neighbors import BlockNeighborsModule
+
+        return BlockNeighborsModule(
+            pose_stack.topology_view("block_coord_offset"),
+            pose_stack.topology_view("block_type_ind"),
+            pose_stack.packed_block_types.n_atoms,
+            max(reaches),
         )
 
     def pre_work_initialization(self, pose_stack: PoseStack):
-        for block_type in pose_stack.packed_block_types.active_block_types:
-            for energy_term in self.all_terms():
-                energy_term.setup_block_type(block_type)
-        for energy_term in self.all_terms():
-            energy_term.setup_packed_block_types(pose_stack.packed_block_types)
+        annotate_packed_block_types(
+            self._param_db, pose_stack.packed_block_types, self.all_terms()
+        )
         for energy_term in self.all_terms():
             energy_term.setup_poses(pose_stack)
 
@@ -198,30 +323,359 @@ class ScoreFunction:
         return sorted_term_list
 
 
+def _pose_stack_parameter(pose_stack: PoseStack, source: str):
+    # the topology tensors are read without copying a shared topology; the
+    # others (e.g. min_block_bondsep) are annotations the terms made
+    if hasattr(pose_stack, "_" + source):
+        return pose_stack.topology_view(source)
+    return getattr(pose_stack, source)
+
+
+def _without_pose_stack_parameters(term_module):
+    """A shallow copy of the term module sharing its block-type parameters
+    but with its per-pose parameters unset"""
+    stripped = copy.copy(term_module)
+    stripped._parameters = {
+        name: None if name.startswith("pose_stack_") else param
+        for name, param in term_module._parameters.items()
+    }
+    return stripped
+
+
+def _rebind_pose_stack_parameters(term_module, pose_stack: PoseStack):
+    """A shallow copy of the term module sharing its block-type parameters
+    but with the per-pose parameters of the pose_stack"""
+    rebound = copy.copy(term_module)
+    rebound._parameters = rebound._parameters.copy()
+    for name in term_module._parameters:
+        if name.startswith("pose_stack_"):
+            setattr(
+                rebound,
+                name,
+                torch.nn.Parameter(
+                    _pose_stack_parameter(
+                        pose_stack, _pose_stack_parameter_sources[name]
+                    ),
+                    requires_grad=False,
+                ),
+            )
+    return rebound
+
+
+def _select_pose_stack_parameters(term_module, pose_ind):
+    """A shallow copy of the term module sharing its block-type parameters
+    but with only the pose_ind poses of its per-pose parameters"""
+    selected = copy.copy(term_module)
+    selected._parameters = selected._parameters.copy()
+    for name, param in term_module._parameters.items():
+        if name.startswith("pose_stack_") and param is not None:
+            setattr(
+                selected,
+                name,
+                torch.nn.Parameter(param[pose_ind], requires_grad=False),
+            )
+    return selected
+
+
 class WholePoseScoringModule:
     def __init__(
         self,
         weights: Tensor[torch.float32][:],
         term_modules: Sequence[torch.nn.Module],
         output_block_pair_energies=False,
+        block_neighbors_module=None,
     ):
         # super(WholePoseScoringModule, self).__init__()
-        self.weights = torch.nn.Parameter(weights.unsqueeze(1), requires_grad=False)
+        # one weight per score type, broadcast over the poses or, for block-pair
+        # energies, over the poses and pairs of blocks
+        weights = weights.view((-1, 1, 1, 1) if output_block_pair_energies else (-1, 1))
+        self.weights = torch.nn.Parameter(weights, requires_grad=False)
         self.term_modules = term_modules
         self.output_block_pair_energies = output_block_pair_energies
+        self.block_neighbors_module = block_neighbors_module
+        self._poses_module = None
 
-    def __call__(self, coords):
-        return torch.sum(self.weights * self.unweighted_scores(coords), dim=0)
+    def __call__(self, coords, active_poses=None):
+        return torch.sum(
+            self.weights * self.unweighted_scores(coords, active_poses), dim=0
+        )
 
-    def unweighted_scores(self, coords):
-        return torch.cat(
-            tuple(
-                term(coords, self.output_block_pair_energies)
-                for term in self.term_modules
-            ),
+    def unweighted_scores(self, coords, active_poses=None):
+        """The scores from each of the term modules, concatenated. If given,
+        the boolean active_poses mask of shape [n_poses] marks the poses
+        whose scores are needed: only the coordinates of those poses are
+        scored, and the scores of the others come back as 0.
+        """
+        if active_poses is None or bool(torch.all(active_poses)):
+            return torch.cat(self.unweighted_term_scores(coords), dim=0)
+
+        pose_ind = torch.nonzero(active_poses)[:, 0]
+        active_scores = torch.cat(
+            self._for_poses(pose_ind).unweighted_term_scores(coords[pose_ind]),
             dim=0,
         )
-        return torch.cat([term(coords) for term in self.term_modules], dim=0)
+        scores = active_scores.new_zeros(
+            (active_scores.shape[0], coords.shape[0], *active_scores.shape[2:])
+        )
+        scores[:, pose_ind] = active_scores
+        return scores
+
+    def _for_poses(self, pose_ind):
+        """A shallow copy of this module that scores only the poses of
+        pose_ind; it is kept until asked for a different set of poses"""
+        if self._poses_module is not None and torch.equal(
+            self._poses_module[0], pose_ind
+        ):
+            return self._poses_module[1]
+
+        poses_module = copy.copy(self)
+        poses_module.term_modules = [
+            _select_pose_stack_parameters(term_module, pose_ind)
+            for term_module in self.term_modules
+        ]
+        if self.block_neighbors_module is not None:
+            poses_module.block_neighbors_module = _select_pose_stack_parameters(
+                self.block_neighbors_module, pose_ind
+            )
+        poses_module._poses_module = None
+        self._poses_module = (pose_ind, poses_module)
+        return poses_module
+
+    def unweighted_term_scores(self, coords, block_pair_mask=None):
+        """The scores from each of the term modules, in order. If given, the
+        [n_poses x max_n_blocks x max_n_blocks] block_pair_mask restricts the
+        terms that take block neighbors to the block pairs it marks; their
+        energies for the unmarked pairs will come back as 0.
+        """
+        return self._term_scores(coords, self.term_modules, block_pair_mask)
+
+    def _term_scores(self, coords, term_modules, block_pair_mask=None):
+        # each term computes derivatives in its forward only when the coords
+        # require a gradient; under no_grad, none will be asked for, so let
+        # the terms take their score-only paths
+        if coords.requires_grad and not torch.is_grad_enabled():
+            coords = coords.detach()
+
+        # find the neighboring blocks once and hand them to each of the
+        # terms that would otherwise have to find them themselves
+        block_neighbor_pairs = None
+        if self.block_neighbors_module is not None:
+            block_neighbor_pairs = self.block_neighbors_module(coords)
+            if block_pair_mask is not None:
+                from tmol.score.common.block_neighbors import (
+                    mask_block_neighbor_pairs,
+                )
+
+                block_neighbor_pairs = mask_block_neighbor_pairs(
+                    block_neighbor_pairs, block_pair_mask
+                )
+
+        def score_term(term):
+            if block_neighbor_pairs is not None and hasattr(
+                term, "block_neighbor_reach"
+            ):
+                return term(
+                    coords,
+                    self.output_block_pair_energies,
+                    block_neighbor_pairs=block_neighbor_pairs,
+                )
+            return term(coords, self.output_block_pair_energies)
+
+        return [score_term(term) for term in term_modules]
+
+
+class IncrementalScoringModule(WholePoseScoringModule):
+    """Score a set of Poses repeatedly as only a few of their blocks move
+    between calls, e.g., in Monte Carlo. The per-term block-pair energies
+    from the last call are kept, and a call given the mask of the blocks
+    that have moved since then only re-evaluates the block pairs that touch
+    them (or the blocks chemically bonded to them); the terms that take
+    block neighbors skip the other pairs entirely. This object's __call__
+    returns a tensor of weighted energies of shape (n_poses,).
+
+    For coordinates that require grad, the derivatives of those terms'
+    energies from the last call are kept too: an incremental call takes
+    away the derivatives of the re-evaluated block pairs at the previous
+    coordinates and adds them back at the new ones. The terms that do not
+    take block neighbors are always evaluated in full. With debug set, each
+    incremental call is checked against a full rescore.
+    """
+
+    def __init__(
+        self,
+        weights: Tensor[torch.float32][:],
+        term_modules: Sequence[torch.nn.Module],
+        block_neighbors_module,
+        inter_residue_connections: Tensor[torch.int32][:, :, :, 2],
+        debug=False,
+    ):
+        super(IncrementalScoringModule, self).__init__(
+            weights,
+            term_modules,
+            output_block_pair_energies=True,
+            block_neighbors_module=block_neighbors_module,
+        )
+        n_poses, max_n_blocks = inter_residue_connections.shape[:2]
+        other_block = inter_residue_connections[:, :, :, 0].to(torch.int64)
+        is_conn = other_block >= 0
+        pose_ind, block_ind, _ = torch.nonzero(is_conn, as_tuple=True)
+        bonded = torch.zeros(
+            (n_poses, max_n_blocks, max_n_blocks),
+            dtype=torch.bool,
+            device=other_block.device,
+        )
+        bonded[pose_ind, block_ind, other_block[is_conn]] = True
+        self.bonded_blocks = bonded
+        self.is_pair_term = [
+            hasattr(term, "block_neighbor_reach") for term in term_modules
+        ]
+        self.pair_terms = [
+            term for term, is_pair in zip(term_modules, self.is_pair_term) if is_pair
+        ]
+        self.debug = debug
+        self.term_scores = None
+        # the coordinates of the last call and, if it computed derivatives,
+        # the per-pose derivatives of the pair terms' weighted energies
+        self.coords = None
+        self.pair_coords_grad = None
+
+    def __call__(self, coords, moved_blocks=None):
+        """Score the coords; moved_blocks, an [n_poses x max_n_blocks] bool
+        tensor, marks the blocks whose coordinates have changed since the
+        previous call. Without it, or on the first call, every block pair is
+        scored; so too when derivatives are needed but the previous call
+        computed none.
+        """
+        need_grad = coords.requires_grad and torch.is_grad_enabled()
+        touched = None
+        if moved_blocks is not None and self.term_scores is not None:
+            if not need_grad or self.pair_coords_grad is not None:
+                touched = self._touched_block_pairs(moved_blocks)
+
+        # the derivatives are taken here, rather than in backward, so that
+        # those of the pair terms can be kept for the next call
+        eval_coords = coords.detach().requires_grad_(True) if need_grad else coords
+        if touched is None:
+            term_scores = self.unweighted_term_scores(eval_coords)
+        else:
+            term_scores = self.unweighted_term_scores(
+                eval_coords, block_pair_mask=touched.to(torch.int32)
+            )
+            term_scores = [
+                torch.where(touched.unsqueeze(0), ts, cached) if is_pair else ts
+                for is_pair, ts, cached in zip(
+                    self.is_pair_term, term_scores, self.term_scores
+                )
+            ]
+            if self.debug:
+                self._check_against_full_rescore(coords, term_scores)
+
+        pair_scores = self._weighted_scores(term_scores, self.is_pair_term)
+        other_scores = self._weighted_scores(
+            term_scores, [not is_pair for is_pair in self.is_pair_term]
+        )
+        scores = pair_scores + other_scores
+
+        pair_coords_grad = None
+        if need_grad:
+            pair_coords_grad = _coords_grad(pair_scores, eval_coords)
+            if touched is not None:
+                previous_coords = self.coords.requires_grad_(True)
+                previous_touched_scores = self._weighted_pair_scores(
+                    self._term_scores(
+                        previous_coords,
+                        self.pair_terms,
+                        block_pair_mask=touched.to(torch.int32),
+                    )
+                )
+                pair_coords_grad = (
+                    self.pair_coords_grad
+                    - _coords_grad(previous_touched_scores, previous_coords)
+                    + pair_coords_grad
+                )
+                if self.debug:
+                    self._check_grad_against_full_rescore(coords, pair_coords_grad)
+            coords_grad = pair_coords_grad + _coords_grad(other_scores, eval_coords)
+            # the values of the scores with the derivatives of coords_grad
+            scores = scores.detach() + torch.sum(
+                coords_grad * (coords - coords.detach()), dim=(1, 2)
+            )
+
+        self.term_scores = [ts.detach() for ts in term_scores]
+        self.coords = coords.detach().clone()
+        self.pair_coords_grad = pair_coords_grad
+        return scores
+
+    def _touched_block_pairs(self, moved_blocks):
+        moved_blocks = moved_blocks.to(torch.bool)
+        # the energies of a block can depend on the atoms of the blocks it
+        # is bonded to, e.g., through its torsions or its waters
+        affected = torch.logical_or(
+            moved_blocks,
+            torch.any(
+                torch.logical_and(self.bonded_blocks, moved_blocks.unsqueeze(1)),
+                dim=2,
+            ),
+        )
+        return torch.logical_or(affected.unsqueeze(2), affected.unsqueeze(1))
+
+    def _weighted_scores(self, term_scores, include):
+        """The weighted sum, per pose, of the energies of the included terms"""
+        scores = 0
+        offset = 0
+        for ts, included in zip(term_scores, include):
+            if included:
+                weights = self.weights[offset : offset + ts.shape[0]]
+                scores = scores + torch.sum(weights * ts, dim=(0, 2, 3))
+            offset += ts.shape[0]
+        if not torch.is_tensor(scores):
+            scores = torch.zeros(
+                term_scores[0].shape[1],
+                dtype=self.weights.dtype,
+                device=self.weights.device,
+            )
+        return scores
+
+    def _weighted_pair_scores(self, pair_term_scores):
+        pair_term_scores = iter(pair_term_scores)
+        return self._weighted_scores(
+            [
+                next(pair_term_scores) if is_pair else ts
+                for is_pair, ts in zip(self.is_pair_term, self.term_scores)
+            ],
+            self.is_pair_term,
+        )
+
+    def _check_against_full_rescore(self, coords, term_scores):
+        with torch.no_grad():
+            full_scores = torch.cat(self.unweighted_term_scores(coords), dim=0)
+        torch.testing.assert_close(
+            torch.cat(term_scores, dim=0).detach(),
+            full_scores,
+            rtol=1e-5,
+            atol=1e-4,
+        )
+
+    def _check_grad_against_full_rescore(self, coords, pair_coords_grad):
+        full_coords = coords.detach().requires_grad_(True)
+        full_scores = self._weighted_pair_scores(
+            self._term_scores(full_coords, self.pair_terms)
+        )
+        torch.testing.assert_close(
+            pair_coords_grad,
+            _coords_grad(full_scores, full_coords),
+            rtol=1e-5,
+            atol=1e-3,
+        )
+
+
+def _coords_grad(scores, coords):
+    """The derivatives of each pose's score with respect to its coordinates;
+    the poses do not interact, so those of their sum"""
+    if not scores.requires_grad:
+        return torch.zeros_like(coords)
+    (coords_grad,) = torch.autograd.grad(torch.sum(scores), coords, allow_unused=True)
+    return torch.zeros_like(coords) if coords_grad is None else coords_grad
 
 
 # class BlockPairScoringModule:
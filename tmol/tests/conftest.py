@@ -1,3 +1,4 @@
+import os
 import subprocess
 
 from .database import (  # noqa: F401
@@ -50,6 +51,12 @@ from .pose import (  # noqa: F401
 )
 
 
+def pytest_configure(config):
+    # Keep tests independent of annotations cached on disk by earlier runs;
+    # tests of the cache point it at a temporary directory.
+    os.environ["TMOL_ANNOTATION_CACHE"] = ""
+
+
 def pytest_collection_modifyitems(session, config, items):
     # Run all linting-tests *after* the functional tests
     items[:] = sorted(items, key=lambda i: i.nodeid.startswith("tmol/tests/linting"))
@@ -77,7 +77,8 @@ def test_build_missing_leaf_atoms(torch_device, ubq_pdb):
     (
         block_types64,
         inter_residue_connections64,
-        inter_block_bondsep64,
+        inter_block_bondsep_neighbors,
+        inter_block_bondsep_sparse,
     ) = assign_block_types(
         co,
         pbt,
@@ -188,7 +189,8 @@ def test_build_missing_leaf_atoms_error_handling(torch_device, ubq_pdb):
     (
         block_types64,
         inter_residue_connections64,
-        inter_block_bondsep64,
+        inter_block_bondsep_neighbors,
+        inter_block_bondsep_sparse,
     ) = assign_block_types(
         co,
         pbt,
@@ -301,7 +303,8 @@ def test_build_missing_leaf_atoms_backwards(torch_device, ubq_pdb):
             (
                 block_types64,
                 inter_residue_connections64,
-                inter_block_bondsep64,
+                inter_block_bondsep_neighbors,
+                inter_block_bondsep_sparse,
             ) = assign_block_types(
                 co,
                 pbt,
@@ -411,7 +414,8 @@ def test_coord_sum_gradcheck(torch_device, ubq_pdb):
     (
         block_types64,
         inter_residue_connections64,
-        inter_block_bondsep64,
+        inter_block_bondsep_neighbors,
+        inter_block_bondsep_sparse,
     ) = assign_block_types(
         co,
         pbt,
@@ -506,7 +510,8 @@ def test_build_missing_hydrogens_and_oxygens_gradcheck(ubq_pdb, torch_device):
     (
         block_types64,
         inter_residue_connections64,
-        inter_block_bondsep64,
+        inter_block_bondsep_neighbors,
+        inter_block_bondsep_sparse,
     ) = assign_block_types(
         co,
         pbt,
@@ -269,3 +269,42 @@ def test_find_disulf_w_no_cys_in_canonical_ordering(
 
     restype_variants_gold = torch.full_like(res_types, 0)
     torch.testing.assert_close(restype_variants_gold, restype_variants)
+
+
+def test_find_disulfides_greedy_in_batch(torch_device):
+    co = default_canonical_ordering()
+    sg_ind = co.cys_inds.sg_atom_for_co_cys
+    res_types = torch.full(
+        (3, 4), co.cys_inds.cys_co_aa_ind, dtype=torch.int32, device=torch_device
+    )
+    res_types[2, 3] = -1
+    coords = torch.full(
+        (3, 4, co.max_n_canonical_atoms, 3),
+        numpy.nan,
+        dtype=torch.float32,
+        device=torch_device,
+    )
+    sg_x = torch.tensor(
+        [
+            # cys 0 takes the closer cys 1 and leaves cys 2 unpaired,
+            # though cys 2 is closer to cys 1 than cys 0 is
+            [0.0, 2.0, 3.5, 20.0],
+            # the closest SG w/i the cutoff need not be the next cys
+            [0.0, 2.4, 0.5, 2.6],
+            # nothing w/i the cutoff
+            [0.0, 3.0, 6.0, 0.0],
+        ],
+        dtype=torch.float32,
+        device=torch_device,
+    )
+    coords[:, :, sg_ind] = 0
+    coords[:, :, sg_ind, 0] = sg_x
+
+    found_dslf, restype_variants = find_disulfides(co, res_types, coords)
+
+    found_dslf_gold = numpy.array([[0, 0, 1], [1, 0, 2], [1, 1, 3]], dtype=numpy.int64)
+    numpy.testing.assert_equal(found_dslf.cpu().numpy(), found_dslf_gold)
+    restype_variants_gold = numpy.array(
+        [[1, 1, 0, 0], [1, 1, 1, 1], [0, 0, 0, 0]], dtype=numpy.int32
+    )
+    numpy.testing.assert_equal(restype_variants.cpu().numpy(), restype_variants_gold)
@@ -84,7 +84,8 @@ def test_assign_block_types(torch_device, ubq_pdb):
     (
         block_types,
         inter_residue_connections64,
-        inter_block_bondsep64,
+        inter_block_bondsep_neighbors,
+        inter_block_bondsep_sparse,
     ) = assign_block_types(
         co, pbt, at_is_pres, ch_id, can_rts, res_type_variants, found_disulfides
     )
@@ -198,7 +199,8 @@ def test_assign_block_types_w_exotic_termini_options(
     (
         block_types,
         inter_residue_connections64,
-        inter_block_bondsep64,
+        inter_block_bondsep_neighbors,
+        inter_block_bondsep_sparse,
     ) = assign_block_types(
         co, pbt, at_is_pres, ch_id, can_rts, res_type_variants, found_disulfides
     )
@@ -270,7 +272,8 @@ def test_assign_block_types_jagged_poses(torch_device, ubq_pdb):
     (
         block_types,
         inter_residue_connections64,
-        inter_block_bondsep64,
+        inter_block_bondsep_neighbors,
+        inter_block_bondsep_sparse,
     ) = assign_block_types(
         co, pbt, at_is_pres, ch_id, can_rts, res_type_variants, found_disulfides
     )
@@ -356,7 +359,8 @@ def test_assign_block_types_with_gaps(ubq_pdb, torch_device):
     (
         block_types,
         inter_residue_connections64,
-        inter_block_bondsep64,
+        inter_block_bondsep_neighbors,
+        inter_block_bondsep_sparse,
     ) = assign_block_types(
         co, pbt, at_is_pres, ch_id, can_rts, res_type_variants, found_disulfides
     )
@@ -426,7 +430,8 @@ def test_assign_block_types_for_pert_and_antigen(
     (
         block_types,
         inter_residue_connections64,
-        inter_block_bondsep64,
+        inter_block_bondsep_neighbors,
+        inter_block_bondsep_sparse,
     ) = assign_block_types(
         co,
         pbt,
@@ -508,7 +513,8 @@ def test_take_block_type_atoms_from_canonical(torch_device, ubq_pdb):
     (
         block_types64,
         inter_residue_connections64,
-        inter_block_bondsep64,
+        inter_block_bondsep_neighbors,
+        inter_block_bondsep_sparse,
     ) = assign_block_types(
         co, pbt, at_is_pres, ch_id, can_rts, res_type_variants, found_disulfides
     )
@@ -661,7 +667,8 @@ def test_select_best_block_type_candidate_choosing_default_term(
     (
         block_types,
         inter_residue_connections64,
-        inter_block_bondsep64,
+        inter_block_bondsep_neighbors,
+        inter_block_bondsep_sparse,
     ) = assign_block_types(
         co, pbt, at_is_pres, ch_id, can_rts, res_type_variants, found_disulfides
     )
@@ -776,7 +783,8 @@ def test_select_best_block_type_candidate_w_mult_opts(
     (
         block_types,
         inter_residue_connections64,
-        inter_block_bondsep64,
+        inter_block_bondsep_neighbors,
+        inter_block_bondsep_sparse,
     ) = assign_block_types(
         co, pbt, at_is_pres, ch_id, can_rts, res_type_variants, found_disulfides
     )
@@ -869,7 +877,8 @@ def test_select_best_block_type_candidate_error_impossible_combo(
         (
             block_types,
             inter_residue_connections64,
-            inter_block_bondsep64,
+            inter_block_bondsep_neighbors,
+            inter_block_bondsep_sparse,
         ) = assign_block_types(
             co, pbt, at_is_pres, ch_id, can_rts, res_type_variants, found_disulfides
         )
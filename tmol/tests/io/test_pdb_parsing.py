@@ -0,0 +1,111 @@
+import numpy
+import pandas
+import pytest
+
+from tmol.io.pdb_parsing import parse_pdb, parse_pdb_models, parse_atom_lines
+
+
+def test_parse_pdb_sources_agree(ubq_pdb, tmp_path):
+    pdb_fname = tmp_path / "ubq.pdb"
+    pdb_fname.write_text(ubq_pdb)
+
+    from_string = parse_pdb(ubq_pdb)
+    from_lines = parse_pdb(ubq_pdb.split("\n"))
+    from_file = parse_pdb(str(pdb_fname))
+
+    pandas.testing.assert_frame_equal(from_string, from_lines)
+    pandas.testing.assert_frame_equal(from_string, from_file)
+
+    # ubiquitin's first atom, Met1 N:
+    # ATOM      1  N   MET A   1      27.340  24.430   2.614  1.00  9.67
+    first = from_string.iloc[0]
+    assert first["atomi"] == 1
+    assert first["atomn"] == "N"
+    assert first["resn"] == "MET"
+    assert first["chain"] == "A"
+    assert first["resi"] == 1
+    numpy.testing.assert_equal(
+        [first["x"], first["y"], first["z"], first["occupancy"], first["b"]],
+        [27.340, 24.430, 2.614, 1.00, 9.67],
+    )
+
+
+def test_parse_atom_lines_matches_text_conversion():
+    lines = [
+        "ATOM      1  N   MET A   1      27.340  24.430   2.614  1.00  9.67",
+        "ATOM     12 HD21 ASN B-101A     -0.005 -12.500 100.000  0.50-10.25",
+        "ATOM    123  CA  GLY C  42       1.5e1   -0.0    0.001  1.00 0.00",
+    ]
+    records = parse_atom_lines(lines)
+
+    numpy.testing.assert_equal(records["atomi"], [int(l[6:11]) for l in lines])
+    numpy.testing.assert_equal(records["resi"], [int(l[22:26]) for l in lines])
+    numpy.testing.assert_equal(records["atomn"], ["N", "HD21", "CA"])
+    numpy.testing.assert_equal(records["insert"], ["", "A", ""])
+    for field, (first, last) in (
+        ("x", (30, 38)),
+        ("y", (38, 46)),
+        ("z", (46, 54)),
+        ("occupancy", (54, 60)),
+        ("b", (60, 66)),
+    ):
+        # parsed values must be bitwise identical to float()
+        numpy.testing.assert_array_equal(
+            records[field], [float(l[first:last]) for l in lines]
+        )
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        # a '-' inside the x coordinate
+        "ATOM      1  N   MET A   1      27-340  24.430   2.614  1.00  9.67",
+        # a blank y coordinate
+        "ATOM      1  N   MET A   1      27.340           2.614  1.00  9.67",
+        # a blank inside the z coordinate
+        "ATOM      1  N   MET A   1      27.340  24.430   2. 14  1.00  9.67",
+        # two decimal points in the occupancy
+        "ATOM      1  N   MET A   1      27.340  24.430   2.614  1.0.  9.67",
+        # a '-' inside the serial number
+        "ATOM    1-1  N   MET A   1      27.340  24.430   2.614  1.00  9.67",
+        # a blank serial number
+        "ATOM         N   MET A   1      27.340  24.430   2.614  1.00  9.67",
+    ],
+    ids=[
+        "x_minus",
+        "y_blank",
+        "z_blank",
+        "occupancy_points",
+        "atomi_minus",
+        "atomi_blank",
+    ],
+)
+def test_parse_atom_lines_rejects_malformed_fields(line):
+    good = "ATOM      2  CA  MET A   1      26.266  25.413   2.842  1.00 10.38"
+    with pytest.raises(ValueError):
+        parse_atom_lines([good, line])
+
+
+def test_parse_pdb_models(ubq_pdb, tmp_path):
+    atom_lines = [l for l in ubq_pdb.split("\n") if l.startswith("ATOM  ")]
+    model = "\n".join(atom_lines[:20] + ["TER"] + atom_lines[20:40])
+    multimodel = "".join(
+        "MODEL     {}\n{}\nENDMDL\n".format(i + 1, model) for i in range(3)
+    )
+    pdb_fname = tmp_path / "multimodel.pdb"
+    pdb_fname.write_text(multimodel)
+
+    whole = parse_pdb(multimodel)
+    assert len(whole) == 120
+    numpy.testing.assert_equal(numpy.unique(whole["modeli"]), [0, 1, 2])
+    numpy.testing.assert_equal(numpy.unique(whole["chaini"]), numpy.arange(6))
+    numpy.testing.assert_equal(numpy.unique(whole["model"]), ["1", "2", "3"])
+
+    models = list(parse_pdb_models(str(pdb_fname)))
+    assert len(models) == 3
+    for i, model_records in enumerate(models):
+        assert len(model_records) == 40
+        assert (model_records["modeli"] == i).all()
+        assert (model_records["model"] == str(i + 1)).all()
+
+    pandas.testing.assert_frame_equal(whole, pandas.concat(models, ignore_index=True))
@@ -1,3 +1,4 @@
+import pytest
 import torch
 import numpy
 
@@ -5,8 +6,14 @@ from tmol.io.canonical_ordering import (
     default_canonical_ordering,
     default_packed_block_types,
     canonical_form_from_pdb,
+    canonical_form_from_pdbs,
 )
-from tmol.io.pose_stack_construction import pose_stack_from_canonical_form
+from tmol.io.pose_stack_construction import (
+    pose_stack_from_canonical_form,
+    pose_stack_with_canonical_coords,
+)
+from tmol.io import pose_stack_from_pdb, pose_stack_from_pdbs
+from tmol.pose.pose_stack_builder import PoseStackBuilder
 
 
 def test_build_pose_stack_from_canonical_form_ubq(torch_device, ubq_pdb):
@@ -196,3 +203,99 @@ def test_build_pose_stack_from_canonical_form_ubq_w_atom_mapping(torch_device, u
     ]
 
     numpy.testing.assert_equal(coords.cpu().numpy(), cf_atom_coords.cpu().numpy())
+
+
+def test_pose_stack_from_pdbs(torch_device, ubq_pdb, pertuzumab_pdb):
+    pdbs = [ubq_pdb, pertuzumab_pdb, ubq_pdb]
+    gold = PoseStackBuilder.from_poses(
+        [pose_stack_from_pdb(pdb, torch_device) for pdb in pdbs], torch_device
+    )
+
+    for n_workers in (1, 2):
+        pose_stack = pose_stack_from_pdbs(pdbs, torch_device, n_workers=n_workers)
+
+        assert pose_stack.n_poses == 3
+        assert pose_stack.coords.device == torch_device
+        numpy.testing.assert_equal(
+            gold.block_type_ind.cpu().numpy(), pose_stack.block_type_ind.cpu().numpy()
+        )
+        numpy.testing.assert_equal(
+            gold.inter_residue_connections.cpu().numpy(),
+            pose_stack.inter_residue_connections.cpu().numpy(),
+        )
+        numpy.testing.assert_allclose(
+            gold.coords.cpu().numpy(), pose_stack.coords.cpu().numpy(), atol=1e-5
+        )
+
+
+def test_canonical_form_from_pdbs_in_process(torch_device, ubq_pdb):
+    import tmol.io.canonical_ordering
+
+    co = default_canonical_ordering()
+    cf = canonical_form_from_pdbs(co, [ubq_pdb, ubq_pdb], torch_device)
+    gold = canonical_form_from_pdb(co, ubq_pdb, torch_device)
+
+    # the ordering is handed to the conversion rather than left in the
+    # module global that the pool's workers read
+    assert tmol.io.canonical_ordering._worker_canonical_ordering is None
+    for k in ("chain_id", "res_types"):
+        numpy.testing.assert_equal(cf[k][1:].cpu().numpy(), gold[k].cpu().numpy())
+    numpy.testing.assert_equal(
+        cf["coords"][1:].cpu().numpy(), gold["coords"].cpu().numpy()
+    )
+
+
+def test_pose_stack_from_pdbs_after_cuda_init(ubq_pdb):
+    """The worker pool must not inherit an initialized CUDA context"""
+    if not torch.cuda.is_available():
+        pytest.skip("CUDA is not available")
+    device = torch.device("cuda")
+    torch.zeros(1, device=device)
+
+    pose_stack = pose_stack_from_pdbs([ubq_pdb, ubq_pdb], device, n_workers=2)
+    gold = pose_stack_from_pdb(ubq_pdb, device)
+
+    assert pose_stack.n_poses == 2
+    numpy.testing.assert_allclose(
+        gold.coords.cpu().numpy()[0], pose_stack.coords.cpu().numpy()[1], atol=1e-5
+    )
+
+
+def test_pose_stack_with_canonical_coords(torch_device, ubq_pdb):
+    co = default_canonical_ordering()
+    pbt = default_packed_block_types(torch_device)
+    canonical_form = canonical_form_from_pdb(co, ubq_pdb, torch_device)
+    template = pose_stack_from_canonical_form(co, pbt, **canonical_form)
+
+    # three conformations: the input structure, and two rigid displacements
+    shift = torch.tensor(
+        [[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, -2.5, 3.0]],
+        dtype=torch.float32,
+        device=torch_device,
+    )
+    coords = canonical_form["coords"].expand(3, -1, -1, -1) + shift[:, None, None, :]
+    gold = pose_stack_from_canonical_form(
+        co,
+        pbt,
+        **{
+            k: v.expand((3,) + v.shape[1:]) if k != "coords" else coords
+            for k, v in canonical_form.items()
+        },
+    )
+
+    # from a single-pose template or from one with a pose per conformation;
+    # either way, the topology tensors are reused
+    for template_stack in (template, gold):
+        pose_stack = pose_stack_with_canonical_coords(template_stack, coords)
+        assert pose_stack.n_poses == 3
+        assert pose_stack.n_topologies == 1
+        assert (
+            pose_stack.topology_view("block_type_ind").data_ptr()
+            == template_stack.topology_view("block_type_ind").data_ptr()
+        )
+        numpy.testing.assert_equal(
+            gold.block_type_ind.cpu().numpy(), pose_stack.block_type_ind.cpu().numpy()
+        )
+        numpy.testing.assert_allclose(
+            gold.coords.cpu().numpy(), pose_stack.coords.cpu().numpy(), atol=1e-5
+        )
@@ -1,7 +1,7 @@
 import torch
 import pytest
 
-from tmol.optimization.lbfgs_armijo import LBFGS_Armijo
+from tmol.optimization.lbfgs_armijo import LBFGS_Armijo, LBFGS_Armijo_Stacked
 
 
 class SimpleLJScore:
@@ -92,3 +92,62 @@ def test_lbfgs_armijo_short_history():
     score_stop = closure()
 
     assert score_start > score_stop
+
+
+def test_lbfgs_armijo_stacked_matches_independent():
+    dtype = torch.double
+    device = torch.device("cpu")
+
+    n_atoms = [20, 12, 16]
+    torch.manual_seed(0)
+    start = [torch.randn(n, 3, device=device, dtype=dtype) for n in n_atoms]
+    scorefunc = SimpleLJScore(r_m=1.0, epsilon=1.0)
+
+    # minimize each system on its own
+    independent = []
+    for x0 in start:
+        x = x0.clone().requires_grad_(True)
+        optimizer = LBFGS_Armijo([x], lr=1.0, rtol=1e-4, gradtol=1e-2)
+
+        def closure():
+            optimizer.zero_grad()
+            E = scorefunc(10 * x)
+            E.total_score.backward()
+            return E.total_score
+
+        optimizer.step(closure)
+        independent.append(x.detach())
+
+    # ... and all together, with each system converging on its own
+    x = torch.cat(start).requires_grad_(True)
+    pose_ind = torch.repeat_interleave(
+        torch.arange(len(n_atoms)), torch.tensor(n_atoms)
+    )
+    optimizer = LBFGS_Armijo_Stacked(
+        [x], [pose_ind], len(n_atoms), lr=1.0, rtol=1e-4, gradtol=1e-2
+    )
+
+    # only the systems still being minimized need to be scored
+    n_evals = torch.zeros(len(n_atoms), dtype=torch.int64)
+
+    def stacked_closure(active):
+        optimizer.zero_grad()
+        n_evals[active] += 1
+        E = torch.stack(
+            [
+                scorefunc(10 * xi).total_score if active[i] else xi.new_zeros(())
+                for i, xi in enumerate(torch.split(x, n_atoms))
+            ]
+        )
+        E.sum().backward()
+        return E
+
+    all_systems = torch.ones(len(n_atoms), dtype=torch.bool)
+    score_start = stacked_closure(all_systems)
+    optimizer.step(stacked_closure)
+    score_stop = stacked_closure(all_systems)
+
+    assert torch.all(score_stop < score_start)
+    assert torch.min(n_evals) < torch.max(n_evals)
+    for xi, xi_ind in zip(torch.split(x.detach(), n_atoms), independent):
+        torch.testing.assert_close(xi, xi_ind)
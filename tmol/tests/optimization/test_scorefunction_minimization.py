@@ -4,13 +4,16 @@ import pytest
 # from tmol.pose.pose_stack import PoseStack
 from tmol.io import pose_stack_from_pdb
 from tmol.pose.pose_stack_builder import PoseStackBuilder
-from tmol.optimization.lbfgs_armijo import LBFGS_Armijo
+from tmol.optimization.lbfgs_armijo import LBFGS_Armijo, LBFGS_Armijo_Stacked
 from tmol.score.score_function import ScoreFunction
 from tmol.score.score_types import ScoreType
 from tmol.score import beta2016_score_function
 
 # from tmol.optimization.modules import DOFMaskingFunc
-from tmol.optimization.sfxn_modules import CartesianSfxnNetwork
+from tmol.optimization.sfxn_modules import (
+    CartesianSfxnNetwork,
+    KinematicSfxnNetwork,
+)
 
 
 def test_minimize_w_pose_and_sfxn_smoke(rts_ubq_res, default_database, torch_device):
@@ -46,6 +49,160 @@ def test_minimize_w_pose_and_sfxn_smoke(rts_ubq_res, default_database, torch_dev
     assert E1 < E0
 
 
+def test_minimize_stacked_w_pose_and_sfxn_smoke(
+    rts_ubq_res, default_database, torch_device
+):
+    pose_stack1 = PoseStackBuilder.one_structure_from_polymeric_residues(
+        default_database.chemical, rts_ubq_res[:4], torch_device
+    )
+    pose_stack2 = PoseStackBuilder.one_structure_from_polymeric_residues(
+        default_database.chemical, rts_ubq_res[4:10], torch_device
+    )
+    pose_stack = PoseStackBuilder.from_poses(
+        [pose_stack1, pose_stack2, pose_stack1], torch_device
+    )
+
+    sfxn = ScoreFunction(default_database, torch_device)
+    sfxn.set_weight(ScoreType.fa_ljatr, 1.0)
+    sfxn.set_weight(ScoreType.fa_ljrep, 0.55)
+    sfxn.set_weight(ScoreType.fa_lk, 0.8)
+
+    cart_sfxn_network = CartesianSfxnNetwork(sfxn, pose_stack)
+    optimizer = LBFGS_Armijo_Stacked(
+        cart_sfxn_network.parameters(),
+        [cart_sfxn_network.pose_ind],
+        pose_stack.n_poses,
+        lr=0.1,
+        max_iter=20,
+    )
+
+    E0 = cart_sfxn_network.whole_pose_scoring_module(cart_sfxn_network.full_coords)
+
+    # the scores of the poses being minimized do not depend on the others
+    active = torch.tensor([True, False, True], device=torch_device)
+    torch.testing.assert_close(
+        cart_sfxn_network.whole_pose_scoring_module(
+            cart_sfxn_network.full_coords, active
+        )[active],
+        E0[active],
+    )
+
+    def closure(active):
+        optimizer.zero_grad()
+        E = cart_sfxn_network(active)
+        E.sum().backward()
+        return E
+
+    optimizer.step(closure)
+
+    E1 = cart_sfxn_network.whole_pose_scoring_module(cart_sfxn_network.full_coords)
+    assert torch.all(E1 < E0)
+
+
+def test_stacked_network_scores_only_active_poses(
+    rts_ubq_res, default_database, torch_device
+):
+    pose_stack1 = PoseStackBuilder.one_structure_from_polymeric_residues(
+        default_database.chemical, rts_ubq_res[:4], torch_device
+    )
+    pose_stack2 = PoseStackBuilder.one_structure_from_polymeric_residues(
+        default_database.chemical, rts_ubq_res[4:10], torch_device
+    )
+    pose_stack = PoseStackBuilder.from_poses(
+        [pose_stack1, pose_stack2, pose_stack1], torch_device
+    )
+
+    # terms both with and without block neighbors
+    sfxn = ScoreFunction(default_database, torch_device)
+    for st in (
+        ScoreType.fa_ljatr,
+        ScoreType.cart_lengths,
+        ScoreType.rama,
+        ScoreType.omega,
+        ScoreType.ref,
+    ):
+        sfxn.set_weight(st, 1.0)
+
+    cart_sfxn_network = CartesianSfxnNetwork(sfxn, pose_stack)
+    E0 = cart_sfxn_network.whole_pose_scoring_module(cart_sfxn_network.full_coords)
+
+    n_poses_scored = []
+    for term_module in cart_sfxn_network.whole_pose_scoring_module.term_modules:
+        term_module.register_forward_pre_hook(
+            lambda module, args: n_poses_scored.append(args[0].shape[0])
+        )
+
+    active = torch.tensor([True, False, True], device=torch_device)
+    E = cart_sfxn_network(active)
+    E.sum().backward()
+
+    assert n_poses_scored == [2] * len(
+        cart_sfxn_network.whole_pose_scoring_module.term_modules
+    )
+    torch.testing.assert_close(E[active], E0[active])
+    assert E[1] == 0
+    grad = cart_sfxn_network.masked_coords.grad
+    assert torch.all(grad[cart_sfxn_network.pose_ind == 1] == 0)
+    assert torch.any(grad[cart_sfxn_network.pose_ind == 0] != 0)
+
+
+def test_kinematic_network_refolds_starting_coords(
+    rts_ubq_res, default_database, torch_device
+):
+    pose_stack1 = PoseStackBuilder.one_structure_from_polymeric_residues(
+        default_database.chemical, rts_ubq_res[:4], torch_device
+    )
+    pose_stack2 = PoseStackBuilder.one_structure_from_polymeric_residues(
+        default_database.chemical, rts_ubq_res[4:10], torch_device
+    )
+    pose_stack = PoseStackBuilder.from_poses([pose_stack1, pose_stack2], torch_device)
+
+    sfxn = ScoreFunction(default_database, torch_device)
+    sfxn.set_weight(ScoreType.fa_ljatr, 1.0)
+
+    kin_sfxn_network = KinematicSfxnNetwork(sfxn, pose_stack)
+    start_coords = pose_stack.coords.clone()
+    kin_sfxn_network()
+
+    real_atoms = pose_stack.real_atoms
+    torch.testing.assert_close(
+        kin_sfxn_network.full_coords.detach()[real_atoms],
+        start_coords[real_atoms],
+        atol=1e-4,
+        rtol=1e-4,
+    )
+
+
+def test_minimize_kinematic_w_pose_and_sfxn_smoke(
+    rts_ubq_res, default_database, torch_device
+):
+    pose_stack1 = PoseStackBuilder.one_structure_from_polymeric_residues(
+        default_database.chemical, rts_ubq_res[:4], torch_device
+    )
+    pose_stack = PoseStackBuilder.from_poses([pose_stack1] * 3, torch_device)
+
+    sfxn = ScoreFunction(default_database, torch_device)
+    sfxn.set_weight(ScoreType.fa_ljatr, 1.0)
+    sfxn.set_weight(ScoreType.fa_ljrep, 0.55)
+    sfxn.set_weight(ScoreType.fa_lk, 0.8)
+
+    kin_sfxn_network = KinematicSfxnNetwork(sfxn, pose_stack)
+    optimizer = LBFGS_Armijo(kin_sfxn_network.parameters(), lr=0.1, max_iter=20)
+
+    E0 = kin_sfxn_network().detach()
+
+    def closure():
+        optimizer.zero_grad()
+        E = kin_sfxn_network().sum()
+        E.backward()
+        return E
+
+    optimizer.step(closure)
+
+    E1 = kin_sfxn_network().detach()
+    assert torch.all(E1 < E0)
+
+
 @pytest.mark.parametrize("n_poses", [1, 3, 10, 30])
 @pytest.mark.benchmark(group=["minimize_pose_stack"])
 def test_minimize_w_pose_and_sfxn_benchmark(
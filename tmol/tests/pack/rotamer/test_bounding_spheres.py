@@ -49,11 +49,15 @@ def test_create_rotamer_bounding_spheres_smoke(
     # print("bounding spheres")
     # print(bounding_spheres)
 
-    rot_coords = rotamer_set.coords.cpu()
+    n_rots = rotamer_set.pose_for_rot.shape[0]
+    rot_coords = rotamer_set.coords_for_rots(
+        poses.packed_block_types,
+        torch.arange(n_rots, dtype=torch.int64, device=torch_device),
+    ).cpu()
     bounding_spheres = bounding_spheres.cpu()
     n_atoms = poses.packed_block_types.n_atoms.cpu()
     fudge = 1e-4
-    for i in range(rotamer_set.coords.shape[0]):
+    for i in range(n_rots):
         i_bti = rotamer_set.block_type_ind_for_rot[i]
         i_pose = rotamer_set.pose_for_rot[i]
         i_bi = rotamer_set.block_ind_for_rot[i]
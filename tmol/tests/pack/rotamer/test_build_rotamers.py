@@ -26,6 +26,8 @@ from tmol.kinematics.compiled.compiled_ops import forward_only_op
 
 from tmol.utility.tensor.common_operations import exclusive_cumsum1d, stretch
 
+from tmol.tests.pack.test_interaction_graph import ala_gly_rotamers
+
 
 def test_annotate_restypes(
     default_database, fresh_default_restype_set, torch_device, dun_sampler
@@ -1005,13 +1007,20 @@ def test_build_lots_of_rotamers(
         len(poses.packed_block_types.active_block_types),
     )
 
-    n_rots = rotamer_set.coords.shape[0]
+    n_rots = rotamer_set.pose_for_rot.shape[0]
 
     # all the rotamers should be the same on all n_poses copies of ubq
     n_rots_per_pose = n_rots // n_poses
     assert n_rots_per_pose * n_poses == n_rots
 
-    new_coords = rotamer_set.coords.cpu().numpy()
+    new_coords = (
+        rotamer_set.coords_for_rots(
+            poses.packed_block_types,
+            torch.arange(n_rots, dtype=torch.int64, device=torch_device),
+        )
+        .cpu()
+        .numpy()
+    )
     # print (rotamer_set)
 
     for i in range(1, n_poses):
@@ -1022,6 +1031,45 @@ def test_build_lots_of_rotamers(
         )
 
 
+def test_rotamer_coord_layout(
+    default_database, fresh_default_restype_set, rts_ubq_res, torch_device
+):
+    poses, rotamer_set = ala_gly_rotamers(
+        default_database, fresh_default_restype_set, rts_ubq_res, torch_device
+    )
+    pbt = poses.packed_block_types
+    n_rots = rotamer_set.pose_for_rot.shape[0]
+
+    # only the sidechain atoms of each rotamer are stored per rotamer
+    n_sc_atoms = pbt.n_rotamer_sidechain_atoms[rotamer_set.block_type_ind_for_rot]
+    assert rotamer_set.coords.shape == (int(torch.sum(n_sc_atoms)), 3)
+    numpy.testing.assert_equal(
+        rotamer_set.coord_offset_for_rot.cpu().numpy(),
+        exclusive_cumsum1d(n_sc_atoms).cpu().numpy(),
+    )
+    for i, bt in enumerate(pbt.active_block_types):
+        mc_ind = pbt.rotamer_mainchain_atom_ind[i].cpu().numpy()
+        mc_atoms = [bt.atom_to_idx[at] for at in bt.properties.polymer.mainchain_atoms]
+        numpy.testing.assert_equal(mc_ind[mc_atoms], numpy.arange(len(mc_atoms)))
+        assert numpy.sum(mc_ind != -1) == len(mc_atoms)
+        assert pbt.n_rotamer_sidechain_atoms[i] == bt.n_atoms - len(mc_atoms)
+
+    # the shared mainchain atoms and each rotamer's own sidechain atoms
+    # come back together into intact residues
+    coords = rotamer_set.coords_for_rots(
+        pbt, torch.arange(n_rots, dtype=torch.int64, device=torch_device)
+    ).cpu()
+    for i in range(n_rots):
+        bt = pbt.active_block_types[rotamer_set.block_type_ind_for_rot[i]]
+        bonds = torch.tensor(bt.bond_indices, dtype=torch.int64)
+        bond_lengths = torch.norm(
+            coords[i, bonds[:, 0]] - coords[i, bonds[:, 1]], dim=1
+        )
+        assert torch.all(bond_lengths > 0.9)
+        assert torch.all(bond_lengths < 1.6)
+        assert torch.all(coords[i, bt.n_atoms :] == 0)
+
+
 def test_create_dofs_for_many_rotamers(
     default_database, fresh_default_restype_set, rts_ubq_res, torch_device, dun_sampler
 ):
@@ -0,0 +1,101 @@
+import numpy
+import torch
+
+from tmol.pack.interaction_graph import build_interaction_graph
+from tmol.pack.rotamer.rotamer_trie import build_rotamer_trie
+from tmol.tests.pack.test_interaction_graph import (
+    ala_gly_rotamers,
+    pairwise_score_function,
+)
+from tmol.tests.pack.test_packer import nonbonded_score_function
+
+
+def test_rotamer_trie_paths(
+    default_database, fresh_default_restype_set, rts_ubq_res, torch_device
+):
+    poses, rotamer_set = ala_gly_rotamers(
+        default_database, fresh_default_restype_set, rts_ubq_res, torch_device
+    )
+    pbt = poses.packed_block_types
+    sfxn = nonbonded_score_function(default_database, torch_device)
+    sfxn.pre_work_initialization(poses)
+    trie = build_rotamer_trie(pbt, rotamer_set, pbt.atom_types)
+
+    # the rotamers at a block share their mainchain atoms
+    n_rots = rotamer_set.block_ind_for_rot.shape[0]
+    n_atoms = int(torch.sum(pbt.n_atoms[rotamer_set.block_type_ind_for_rot]))
+    assert trie.node_coords.shape[0] < n_atoms
+    packable = rotamer_set.n_rots_for_block > 0
+    assert torch.all(trie.block_n_roots[packable] >= 1)
+    assert torch.all(trie.block_n_roots[torch.logical_not(packable)] == 0)
+
+    # each block's rotamers take each place in the trie order once
+    local_rot = (
+        torch.arange(n_rots, dtype=torch.int64, device=torch_device)
+        - rotamer_set.rot_offset_for_block[
+            rotamer_set.pose_for_rot, rotamer_set.block_ind_for_rot.to(torch.int64)
+        ]
+    )
+    numpy.testing.assert_equal(
+        torch.sort(trie.trie_order_for_rot)[0].cpu().numpy(),
+        torch.sort(local_rot)[0].cpu().numpy(),
+    )
+
+    # walk each rotamer's path down from its block's roots: each node on it
+    # has the coordinates of the rotamer's next atom and a range of
+    # rotamers that includes the rotamer
+    coords = rotamer_set.coords_for_rots(
+        pbt, torch.arange(n_rots, dtype=torch.int64, device=torch_device)
+    ).cpu()
+    node_coords = trie.node_coords.cpu()
+    atom_order = pbt.rotamer_trie_atom_order.cpu()
+    first_rot = trie.node_first_rot.cpu()
+    end_rot = trie.node_end_rot.cpu()
+    first_child = trie.node_first_child.cpu()
+    n_children = trie.node_n_children.cpu()
+    for rot in range(n_rots):
+        pose = int(rotamer_set.pose_for_rot[rot])
+        block = int(rotamer_set.block_ind_for_rot[rot])
+        order = int(trie.trie_order_for_rot[rot])
+        start = int(trie.block_first_root[pose, block])
+        n_candidates = int(trie.block_n_roots[pose, block])
+        block_type = int(rotamer_set.block_type_ind_for_rot[rot])
+        n_rot_atoms = int(pbt.n_atoms[block_type])
+        for depth in range(n_rot_atoms):
+            candidates = torch.arange(start, start + n_candidates)
+            on_path = candidates[
+                torch.logical_and(
+                    first_rot[candidates] <= order, order < end_rot[candidates]
+                )
+            ]
+            assert on_path.shape[0] == 1
+            node = int(on_path[0])
+            numpy.testing.assert_equal(
+                node_coords[node].numpy(),
+                coords[rot, atom_order[block_type, depth]].numpy(),
+            )
+            start, n_candidates = int(first_child[node]), int(n_children[node])
+
+
+def test_trie_pair_energies_match_two_block_poses(
+    default_database, fresh_default_restype_set, rts_ubq_res, torch_device
+):
+    poses, rotamer_set = ala_gly_rotamers(
+        default_database, fresh_default_restype_set, rts_ubq_res, torch_device
+    )
+    for sfxn in (
+        nonbonded_score_function(default_database, torch_device),
+        pairwise_score_function(default_database, torch_device),
+    ):
+        ig = build_interaction_graph(sfxn, poses, rotamer_set)
+        ig_ref = build_interaction_graph(
+            sfxn, poses, rotamer_set, use_rotamer_tries=False
+        )
+
+        assert torch.equal(ig.pair_offsets, ig_ref.pair_offsets)
+        numpy.testing.assert_allclose(
+            ig.energy2b.cpu().numpy(),
+            ig_ref.energy2b.cpu().numpy(),
+            rtol=1e-4,
+            atol=1e-4,
+        )
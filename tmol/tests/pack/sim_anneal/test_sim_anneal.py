@@ -300,9 +300,9 @@ def dont_test_accept_final_smoke(
     ).to(torch.int64)
     rand_rot_global = rotamer_set.rot_offset_for_block + rand_rot
     packable_blocks = rotamer_set.n_rots_for_block != 0
-    context_coords[packable_blocks] = rotamer_set.coords[
-        rand_rot_global[packable_blocks]
-    ]
+    context_coords[packable_blocks] = rotamer_set.coords_for_rots(
+        poses.packed_block_types, rand_rot_global[packable_blocks]
+    )
     context_block_type = poses.block_type_ind.clone()
     context_block_type[packable_blocks] = rotamer_set.block_type_ind_for_rot[
         rand_rot_global[packable_blocks]
@@ -0,0 +1,239 @@
+import numpy
+import torch
+
+from tmol.pose.pose_stack_builder import PoseStackBuilder
+from tmol.pack.packer_task import PackerTask, PackerPalette
+from tmol.pack.rotamer.fixed_aa_chi_sampler import FixedAAChiSampler
+from tmol.pack.rotamer.build_rotamers import build_rotamers
+from tmol.pack.interaction_graph import (
+    build_interaction_graph,
+    assignment_energies,
+    _poses_with_rotamers,
+)
+from tmol.pack.sim_anneal.annealer import InteractionGraphRPEModule
+from tmol.pack.sim_anneal.compiled.compiled import (
+    create_sim_annealer,
+    delete_sim_annealer,
+    register_standard_random_rotamer_picker,
+    register_standard_metropolis_accept_or_rejector,
+    run_sim_annealing,
+)
+from tmol.score.score_function import ScoreFunction
+from tmol.score.score_types import ScoreType
+
+
+def ala_gly_rotamers(default_database, fresh_default_restype_set, rts_ubq_res, device):
+    p = PoseStackBuilder.one_structure_from_polymeric_residues(
+        default_database.chemical, rts_ubq_res[:12], device
+    )
+    poses = PoseStackBuilder.from_poses([p, p], device)
+    task = PackerTask(poses, PackerPalette(fresh_default_restype_set))
+    for i, one_pose_rlts in enumerate(task.rlts):
+        for j, rlt in enumerate(one_pose_rlts):
+            if i == 1 and j % 3 == 0:
+                # leave some blocks fixed in the second pose
+                rlt.disable_packing()
+            else:
+                rlt.restrict_absent_name3s(["ALA", "GLY"])
+    task.add_chi_sampler(FixedAAChiSampler())
+    return build_rotamers(poses, task, default_database.chemical)
+
+
+def pairwise_score_function(default_database, device):
+    sfxn = ScoreFunction(default_database, device)
+    for st in (
+        ScoreType.fa_ljatr,
+        ScoreType.fa_ljrep,
+        ScoreType.fa_lk,
+        ScoreType.lk_ball,
+        ScoreType.fa_elec,
+        ScoreType.hbond,
+    ):
+        sfxn.set_weight(st, 1.0)
+    return sfxn
+
+
+def random_assignment(rotamer_set):
+    n_rots_for_block = rotamer_set.n_rots_for_block
+    local_rot = torch.floor(
+        torch.rand(n_rots_for_block.shape, device=n_rots_for_block.device)
+        * n_rots_for_block
+    ).to(torch.int64)
+    return torch.where(
+        n_rots_for_block > 0, rotamer_set.rot_offset_for_block + local_rot, -1
+    )
+
+
+def test_interaction_graph_energies_match_rescore(
+    default_database, fresh_default_restype_set, rts_ubq_res, torch_device
+):
+    poses, rotamer_set = ala_gly_rotamers(
+        default_database, fresh_default_restype_set, rts_ubq_res, torch_device
+    )
+    sfxn = pairwise_score_function(default_database, torch_device)
+
+    # small batches to exercise the batching
+    ig = build_interaction_graph(sfxn, poses, rotamer_set, max_n_blocks_per_batch=64)
+
+    assert ig.energy1b.shape == rotamer_set.block_ind_for_rot.shape
+    assert ig.pair_neighbors.shape[:2] == rotamer_set.n_rots_for_block.shape
+    # only packable blocks have neighbors
+    packable = rotamer_set.n_rots_for_block > 0
+    assert torch.all(ig.pair_neighbors[torch.logical_not(packable)] == -1)
+    # ...and the neighbor relationship is symmetric
+    nz_pose, nz_block, nz_slot = torch.nonzero(ig.pair_neighbors != -1, as_tuple=True)
+    neighbors = ig.pair_neighbors[nz_pose, nz_block, nz_slot].to(torch.int64)
+    assert torch.all(
+        torch.any(ig.pair_neighbors[nz_pose, neighbors] == nz_block.unsqueeze(1), dim=1)
+    )
+
+    torch.manual_seed(1234)
+    expanded_coords, _ = poses.expand_coords()
+    pose_ind = torch.arange(poses.n_poses, dtype=torch.int64, device=torch_device)
+    for _ in range(3):
+        assignment = random_assignment(rotamer_set)
+        assigned_poses = _poses_with_rotamers(
+            poses, rotamer_set, expanded_coords, pose_ind, assignment
+        )
+        scorer = sfxn.render_whole_pose_scoring_module(assigned_poses)
+
+        numpy.testing.assert_allclose(
+            assignment_energies(ig, rotamer_set, assignment).cpu().numpy(),
+            scorer(assigned_poses.coords).detach().cpu().numpy(),
+            rtol=1e-4,
+            atol=1e-2,
+        )
+
+
+def test_anneal_with_interaction_graph(
+    default_database, fresh_default_restype_set, rts_ubq_res, torch_device
+):
+    poses, rotamer_set = ala_gly_rotamers(
+        default_database, fresh_default_restype_set, rts_ubq_res, torch_device
+    )
+    sfxn = pairwise_score_function(default_database, torch_device)
+    ig = build_interaction_graph(sfxn, poses, rotamer_set)
+
+    pbt = poses.packed_block_types
+    n_poses = poses.n_poses
+    max_n_blocks = poses.max_n_blocks
+    max_n_atoms = pbt.max_n_atoms
+
+    def _i32_arange(n):
+        return torch.arange(n, dtype=torch.int32, device=torch_device)
+
+    torch.manual_seed(4321)
+    initial_assignment = random_assignment(rotamer_set)
+    packable = initial_assignment != -1
+    expanded_coords, _ = poses.expand_coords()
+    context_coords = expanded_coords.clone()
+    context_coords[packable] = rotamer_set.coords_for_rots(
+        pbt, initial_assignment[packable]
+    )
+    # give every block room for the largest block type
+    context_coords = context_coords.view(n_poses, max_n_blocks * max_n_atoms, 3)
+    context_coord_offsets = (_i32_arange(max_n_blocks) * max_n_atoms).repeat(n_poses, 1)
+    context_block_type = poses.block_type_ind.clone()
+    context_block_type[packable] = rotamer_set.block_type_ind_for_rot[
+        initial_assignment[packable]
+    ].to(torch.int32)
+    context_rot_for_block = initial_assignment.to(torch.int32)
+
+    pose_id_for_context = _i32_arange(n_poses)
+    alternate_coords = torch.zeros(
+        (2 * n_poses * max_n_atoms, 3), dtype=torch.float32, device=torch_device
+    )
+    alternate_coord_offsets = _i32_arange(2 * n_poses) * max_n_atoms
+    alternate_id = torch.zeros((2 * n_poses, 3), dtype=torch.int32, device=torch_device)
+    random_rots = torch.zeros((n_poses,), dtype=torch.int32, device=torch_device)
+    accepted = torch.zeros((n_poses,), dtype=torch.int32, device=torch_device)
+    rotamer_component_energies = torch.zeros(
+        (1, 2 * n_poses), dtype=torch.float32, device=torch_device
+    )
+    temperature = torch.ones((1,), dtype=torch.float32)
+    annealer_event = torch.zeros((1,), dtype=torch.int64)
+    score_events = torch.zeros((1,), dtype=torch.int64)
+    block_type_n_atoms = pbt.n_atoms.to(torch.int32)
+
+    # the annealer holds views of its tensors, so keep them alive until it runs
+    n_rots_for_pose = rotamer_set.n_rots_for_pose.to(torch.int32)
+    rot_offset_for_pose = rotamer_set.rot_offset_for_pose.to(torch.int32)
+    block_type_ind_for_rot = rotamer_set.block_type_ind_for_rot.to(torch.int32)
+    block_ind_for_rot = rotamer_set.block_ind_for_rot.to(torch.int32)
+    rotamer_coord_offsets = rotamer_set.coord_offset_for_rot.to(torch.int32)
+
+    annealer = torch.zeros((1,), dtype=torch.int64)
+    create_sim_annealer(annealer)
+    register_standard_random_rotamer_picker(
+        context_coords,
+        context_coord_offsets,
+        context_block_type,
+        pose_id_for_context,
+        n_rots_for_pose,
+        rot_offset_for_pose,
+        block_type_ind_for_rot,
+        block_ind_for_rot,
+        rotamer_set.coords,
+        rotamer_coord_offsets,
+        rotamer_set.mainchain_coords,
+        pbt.rotamer_sidechain_atom_ind,
+        pbt.rotamer_mainchain_atom_ind,
+        alternate_coords,
+        alternate_coord_offsets,
+        alternate_id,
+        random_rots,
+        block_type_n_atoms,
+        max_n_atoms,
+        annealer_event,
+        annealer,
+    )
+    register_standard_metropolis_accept_or_rejector(
+        temperature,
+        context_coords,
+        context_coord_offsets,
+        context_block_type,
+        alternate_coords,
+        alternate_coord_offsets,
+        alternate_id,
+        rotamer_component_energies,
+        accepted,
+        block_type_n_atoms,
+        max_n_atoms,
+        score_events,
+        annealer,
+    )
+    ig_rpe = InteractionGraphRPEModule(ig, rotamer_set, pose_id_for_context)
+    ig_rpe.register_with_sim_annealer(
+        context_rot_for_block,
+        accepted,
+        random_rots,
+        rotamer_component_energies[0],
+        annealer,
+    )
+    run_sim_annealing(annealer)
+    delete_sim_annealer(annealer)
+
+    # the assignment tracked by the interaction graph agrees with the
+    # block types and coordinates the annealer accepted
+    final_assignment = context_rot_for_block.to(torch.int64)
+    assert torch.all((final_assignment != -1) == packable)
+    final_rots = final_assignment[packable]
+    numpy.testing.assert_equal(
+        context_block_type[packable].cpu().numpy(),
+        rotamer_set.block_type_ind_for_rot[final_rots].cpu().numpy(),
+    )
+    final_coords = context_coords.view(n_poses, max_n_blocks, max_n_atoms, 3)
+    final_n_atoms = pbt.n_atoms[rotamer_set.block_type_ind_for_rot[final_rots]]
+    real_atoms = torch.arange(max_n_atoms, device=torch_device) < (
+        final_n_atoms.unsqueeze(1)
+    )
+    numpy.testing.assert_equal(
+        final_coords[packable][real_atoms].cpu().numpy(),
+        rotamer_set.coords_for_rots(pbt, final_rots)[real_atoms].cpu().numpy(),
+    )
+
+    # and annealing has lowered the energy
+    assert torch.all(
+        assignment_energies(ig, rotamer_set, final_assignment)
+        < assignment_energies(ig, rotamer_set, initial_assignment)
+    )
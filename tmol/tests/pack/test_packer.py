@@ -0,0 +1,193 @@
+import numpy
+import pytest
+import torch
+
+import tmol.pack
+from tmol.pose.pose_stack_builder import PoseStackBuilder
+from tmol.pack.packer import Packer
+from tmol.pack.packer_task import PackerTask, PackerPalette
+from tmol.pack.sim_anneal.schedule import AnnealingSchedule, ReplicaExchange
+from tmol.pack.rotamer.fixed_aa_chi_sampler import FixedAAChiSampler
+from tmol.score.score_function import ScoreFunction
+from tmol.score.score_types import ScoreType
+
+
+def two_poses(default_database, rts_ubq_res, device):
+    p = PoseStackBuilder.one_structure_from_polymeric_residues(
+        default_database.chemical, rts_ubq_res[:12], device
+    )
+    return PoseStackBuilder.from_poses([p, p], device)
+
+
+def ala_gly_task(poses, restype_set):
+    task = PackerTask(poses, PackerPalette(restype_set))
+    for i, one_pose_rlts in enumerate(task.rlts):
+        for j, rlt in enumerate(one_pose_rlts):
+            if i == 1 and j % 3 == 0:
+                rlt.disable_packing()
+            else:
+                rlt.restrict_absent_name3s(["ALA", "GLY"])
+    task.add_chi_sampler(FixedAAChiSampler())
+    return task
+
+
+def nonbonded_score_function(default_database, device):
+    sfxn = ScoreFunction(default_database, device)
+    for st in (ScoreType.fa_ljatr, ScoreType.fa_ljrep, ScoreType.fa_lk):
+        sfxn.set_weight(st, 1.0)
+    return sfxn
+
+
+def test_pack_smoke(
+    default_database, fresh_default_restype_set, rts_ubq_res, torch_device
+):
+    poses = two_poses(default_database, rts_ubq_res, torch_device)
+    sfxn = nonbonded_score_function(default_database, torch_device)
+
+    n_traj_per_pose = 3
+    repacked, energies = tmol.pack.pack(
+        poses, sfxn, ala_gly_task(poses, fresh_default_restype_set), n_traj_per_pose
+    )
+
+    assert repacked.n_poses == 2
+    assert energies.shape == (2, n_traj_per_pose)
+
+    # the blocks that were not packed keep their block types
+    def block_type_names(pose_stack, pose_ind):
+        bts = pose_stack.packed_block_types.active_block_types
+        return [bts[bt].name for bt in pose_stack.block_type_ind[pose_ind].tolist()]
+
+    assert block_type_names(repacked, 1)[::3] == block_type_names(poses, 1)[::3]
+
+    # the best trajectory's energy is the energy of the pose returned
+    scorer = sfxn.render_whole_pose_scoring_module(repacked)
+    numpy.testing.assert_allclose(
+        scorer(repacked.coords).detach().cpu().numpy(),
+        torch.min(energies, dim=1)[0].cpu().numpy(),
+        rtol=1e-4,
+        atol=1e-2,
+    )
+
+    # a Packer reuses the annealer's buffers for a stack of the same shape
+    packer = Packer()
+    packer.pack(
+        poses, sfxn, ala_gly_task(poses, fresh_default_restype_set), n_traj_per_pose
+    )
+    buffers = packer._buffers
+    packer.pack(
+        poses, sfxn, ala_gly_task(poses, fresh_default_restype_set), n_traj_per_pose
+    )
+    assert packer._buffers is buffers
+
+    # ... and allocates new ones for a stack of another shape
+    tmol.pack.pack(
+        poses, sfxn, ala_gly_task(poses, fresh_default_restype_set), packer=packer
+    )
+    assert packer._buffers is not buffers
+    packer.release()
+    assert packer._buffers is None
+
+
+@pytest.mark.parametrize(
+    "schedule",
+    [
+        AnnealingSchedule.linear(n_outer_cycles=6, inner_cycles_per_rotamer=2),
+        AnnealingSchedule.geometric(n_outer_cycles=6, n_quench_cycles=2),
+        # plateaus almost at once: every trajectory skips ahead to the quench
+        AnnealingSchedule(patience=1, min_accept_rate=1.0, energy_tolerance=1e6),
+        AnnealingSchedule.quench(n_cycles=3, patience=1),
+    ],
+    ids=["linear", "geometric", "early_stop", "quench_only"],
+)
+def test_pack_with_schedule(
+    default_database, fresh_default_restype_set, rts_ubq_res, torch_device, schedule
+):
+    poses = two_poses(default_database, rts_ubq_res, torch_device)
+    sfxn = nonbonded_score_function(default_database, torch_device)
+
+    packer = Packer()
+    repacked, energies = packer.pack(
+        poses,
+        sfxn,
+        ala_gly_task(poses, fresh_default_restype_set),
+        n_traj_per_pose=2,
+        schedule=schedule,
+        n_quench_passes=1,
+    )
+
+    n_outer_cycles_run = int(packer._buffers.n_outer_cycles_run[0])
+    if not schedule.stops_early:
+        assert n_outer_cycles_run == schedule.n_outer_cycles
+    elif schedule.n_quench_cycles < schedule.n_outer_cycles:
+        # the plateaued trajectories skipped ahead to the quench
+        assert 1 < n_outer_cycles_run < schedule.n_outer_cycles
+    else:
+        assert 1 <= n_outer_cycles_run <= schedule.n_outer_cycles
+    # the anneal ended quenched
+    assert packer._buffers.temperature[0] == 0
+
+    assert torch.all(torch.isfinite(energies))
+    scorer = sfxn.render_whole_pose_scoring_module(repacked)
+    numpy.testing.assert_allclose(
+        scorer(repacked.coords).detach().cpu().numpy(),
+        torch.min(energies, dim=1)[0].cpu().numpy(),
+        rtol=1e-4,
+        atol=1e-2,
+    )
+
+
+def test_pack_with_replica_exchange(
+    default_database, fresh_default_restype_set, rts_ubq_res, torch_device
+):
+    poses = two_poses(default_database, rts_ubq_res, torch_device)
+    sfxn = nonbonded_score_function(default_database, torch_device)
+
+    torch.manual_seed(2718)
+    repacked, energies = tmol.pack.pack(
+        poses,
+        sfxn,
+        ala_gly_task(poses, fresh_default_restype_set),
+        n_traj_per_pose=4,
+        schedule=AnnealingSchedule(n_outer_cycles=8),
+        replica_exchange=ReplicaExchange(exchange_interval=5),
+    )
+
+    assert energies.shape == (2, 4)
+    assert torch.all(torch.isfinite(energies))
+    scorer = sfxn.render_whole_pose_scoring_module(repacked)
+    numpy.testing.assert_allclose(
+        scorer(repacked.coords).detach().cpu().numpy(),
+        torch.min(energies, dim=1)[0].cpu().numpy(),
+        rtol=1e-4,
+        atol=1e-2,
+    )
+
+
+def test_replica_exchange_temperature_ladder():
+    ladder = ReplicaExchange(max_temperature_ratio=8.0).temperature_ladder(
+        4, torch.device("cpu")
+    )
+    numpy.testing.assert_allclose(ladder.numpy(), [1.0, 2.0, 4.0, 8.0], rtol=1e-6)
+
+    single = ReplicaExchange().temperature_ladder(1, torch.device("cpu"))
+    numpy.testing.assert_allclose(single.numpy(), [1.0])
+
+    with pytest.raises(ValueError):
+        ReplicaExchange(max_temperature_ratio=0.5)
+    with pytest.raises(ValueError):
+        ReplicaExchange(exchange_interval=0)
+
+
+def test_annealing_schedule_validation():
+    with pytest.raises(ValueError):
+        AnnealingSchedule(n_outer_cycles=0)
+    with pytest.raises(ValueError):
+        AnnealingSchedule(n_outer_cycles=2, n_quench_cycles=3)
+    with pytest.raises(ValueError):
+        AnnealingSchedule(max_temperature=1, min_temperature=2)
+    with pytest.raises(ValueError):
+        AnnealingSchedule.geometric(min_temperature=0)
+
+    quench = AnnealingSchedule.quench(4)
+    assert quench.n_outer_cycles == quench.n_quench_cycles == 4
+    assert not quench.stops_early
@@ -0,0 +1,226 @@
+import attr
+import itertools
+import numpy
+import torch
+
+import tmol.pack
+from tmol.pack.rotamer.build_rotamers import RotamerSet
+from tmol.pack.interaction_graph import (
+    InteractionGraph,
+    build_interaction_graph,
+    assignment_energies,
+)
+from tmol.pack.prune import RotamerPruning, prune_rotamers
+from tmol.tests.pack.test_interaction_graph import (
+    ala_gly_rotamers,
+    pairwise_score_function,
+    random_assignment,
+)
+from tmol.tests.pack.test_packer import (
+    two_poses,
+    ala_gly_task,
+    nonbonded_score_function,
+)
+
+
+def fully_connected_problem(n_rots_for_block, device):
+    """A one-pose RotamerSet and InteractionGraph with random energies in
+    which every block neighbors every other
+    """
+    n_blocks = len(n_rots_for_block)
+    n_rots_for_block = torch.tensor([n_rots_for_block], dtype=torch.int64)
+    rot_offset_for_block = torch.cumsum(n_rots_for_block, dim=1) - n_rots_for_block
+    n_rots = int(torch.sum(n_rots_for_block))
+    block_ind_for_rot = torch.repeat_interleave(
+        torch.arange(n_blocks, dtype=torch.int32), n_rots_for_block[0]
+    )
+    rotamer_set = RotamerSet(
+        n_rots_for_pose=torch.tensor([n_rots]),
+        rot_offset_for_pose=torch.tensor([0]),
+        n_rots_for_block=n_rots_for_block,
+        rot_offset_for_block=rot_offset_for_block,
+        pose_for_rot=torch.zeros((n_rots,), dtype=torch.int64),
+        block_type_ind_for_rot=torch.zeros((n_rots,), dtype=torch.int64),
+        block_ind_for_rot=block_ind_for_rot,
+        coords=torch.zeros((0, 3), dtype=torch.float32),
+        coord_offset_for_rot=torch.zeros((n_rots,), dtype=torch.int64),
+        mainchain_coords=torch.zeros((1, n_blocks, 1, 3), dtype=torch.float32),
+    )
+
+    pair_neighbors = torch.full((1, n_blocks, n_blocks - 1), -1, dtype=torch.int32)
+    pair_offsets = torch.full((1, n_blocks, n_blocks - 1), -1, dtype=torch.int64)
+    offset = 0
+    for i, j in itertools.combinations(range(n_blocks), 2):
+        pair_neighbors[0, i, j - 1] = j
+        pair_neighbors[0, j, i] = i
+        pair_offsets[0, i, j - 1] = offset
+        pair_offsets[0, j, i] = offset
+        offset += int(n_rots_for_block[0, i] * n_rots_for_block[0, j])
+    ig = InteractionGraph(
+        background_energy=torch.zeros((1,), dtype=torch.float32),
+        energy1b=4 * torch.randn((n_rots,), dtype=torch.float32),
+        pair_neighbors=pair_neighbors,
+        pair_offsets=pair_offsets,
+        energy2b=torch.randn((offset,), dtype=torch.float32),
+    )
+
+    def _to_device(x):
+        return type(x)(
+            **{k: v.to(device) for k, v in attr.asdict(x, recurse=False).items()}
+        )
+
+    return _to_device(rotamer_set), _to_device(ig)
+
+
+def all_assignments(rotamer_set):
+    """Every assignment of rotamers to the blocks of the only pose"""
+    per_block = [
+        range(offset, offset + n)
+        for offset, n in zip(
+            rotamer_set.rot_offset_for_block[0].tolist(),
+            rotamer_set.n_rots_for_block[0].tolist(),
+        )
+    ]
+    return torch.tensor(
+        list(itertools.product(*per_block)),
+        dtype=torch.int64,
+        device=rotamer_set.n_rots_for_block.device,
+    )
+
+
+def test_dead_end_elimination_keeps_the_minimum(torch_device):
+    torch.manual_seed(31415)
+    rotamer_set, ig = fully_connected_problem([5, 4, 6, 3], torch_device)
+
+    assignments = all_assignments(rotamer_set)
+    energies = assignment_energies(
+        ig, rotamer_set, assignments, torch.zeros_like(assignments[:, 0])
+    )
+
+    pruned_rotamer_set, pruned_ig, kept_rots = prune_rotamers(ig, rotamer_set)
+    assert kept_rots.shape[0] < ig.energy1b.shape[0]
+    assert torch.all(pruned_rotamer_set.n_rots_for_block > 0)
+
+    # the lowest-energy assignment survives...
+    best = assignments[torch.argmin(energies)]
+    assert torch.all(torch.isin(best, kept_rots))
+
+    # ...and the compacted graph gives the same energy to every assignment
+    # of the survivors as the original one does
+    pruned_assignments = all_assignments(pruned_rotamer_set)
+    numpy.testing.assert_allclose(
+        assignment_energies(
+            pruned_ig,
+            pruned_rotamer_set,
+            pruned_assignments,
+            torch.zeros_like(pruned_assignments[:, 0]),
+        )
+        .cpu()
+        .numpy(),
+        assignment_energies(
+            ig,
+            rotamer_set,
+            kept_rots[pruned_assignments],
+            torch.zeros_like(pruned_assignments[:, 0]),
+        )
+        .cpu()
+        .numpy(),
+        rtol=1e-5,
+        atol=1e-5,
+    )
+    numpy.testing.assert_allclose(
+        torch.min(
+            assignment_energies(
+                pruned_ig,
+                pruned_rotamer_set,
+                pruned_assignments,
+                torch.zeros_like(pruned_assignments[:, 0]),
+            )
+        ).item(),
+        torch.min(energies).item(),
+        rtol=1e-6,
+    )
+
+
+def test_dead_end_elimination_in_small_batches(torch_device):
+    torch.manual_seed(27182)
+    rotamer_set, ig = fully_connected_problem([5, 4, 6, 3], torch_device)
+
+    # tiling the rotamer axes and batching the blocks and edges to fit any
+    # cap on the batch size eliminates the same rotamers
+    _, _, kept_rots = prune_rotamers(ig, rotamer_set)
+    assert kept_rots.shape[0] < ig.energy1b.shape[0]
+    for max_batch_size in (1, 8, 30):
+        _, _, batched_kept_rots = prune_rotamers(
+            ig, rotamer_set, max_batch_size=max_batch_size
+        )
+        assert torch.equal(batched_kept_rots, kept_rots)
+
+
+def test_prune_rotamers_by_energy(
+    default_database, fresh_default_restype_set, rts_ubq_res, torch_device
+):
+    poses, rotamer_set = ala_gly_rotamers(
+        default_database, fresh_default_restype_set, rts_ubq_res, torch_device
+    )
+    sfxn = pairwise_score_function(default_database, torch_device)
+    ig = build_interaction_graph(sfxn, poses, rotamer_set)
+
+    threshold = float(torch.median(ig.energy1b))
+    pruned_rotamer_set, pruned_ig, kept_rots = prune_rotamers(
+        ig, rotamer_set, energy_threshold=threshold, max_n_dee_passes=0
+    )
+
+    # the packable blocks stay packable and keep their low-energy rotamers
+    packable = rotamer_set.n_rots_for_block > 0
+    assert torch.equal(pruned_rotamer_set.n_rots_for_block > 0, packable)
+    assert torch.all(kept_rots[:-1] < kept_rots[1:])
+    low_energy = torch.nonzero(ig.energy1b <= threshold, as_tuple=True)[0]
+    assert torch.all(torch.isin(low_energy, kept_rots))
+    pbt = poses.packed_block_types
+    numpy.testing.assert_equal(
+        pruned_rotamer_set.coords_for_rots(
+            pbt, torch.arange(kept_rots.shape[0], device=torch_device)
+        )
+        .cpu()
+        .numpy(),
+        rotamer_set.coords_for_rots(pbt, kept_rots).cpu().numpy(),
+    )
+
+    torch.manual_seed(2024)
+    for _ in range(3):
+        assignment = random_assignment(pruned_rotamer_set)
+        original_assignment = torch.where(
+            assignment != -1, kept_rots[assignment.clamp(min=0)], -1
+        )
+        numpy.testing.assert_allclose(
+            assignment_energies(pruned_ig, pruned_rotamer_set, assignment)
+            .cpu()
+            .numpy(),
+            assignment_energies(ig, rotamer_set, original_assignment).cpu().numpy(),
+            rtol=1e-5,
+            atol=1e-3,
+        )
+
+
+def test_pack_with_pruning(
+    default_database, fresh_default_restype_set, rts_ubq_res, torch_device
+):
+    poses = two_poses(default_database, rts_ubq_res, torch_device)
+    sfxn = nonbonded_score_function(default_database, torch_device)
+
+    repacked, energies = tmol.pack.pack(
+        poses,
+        sfxn,
+        ala_gly_task(poses, fresh_default_restype_set),
+        n_traj_per_pose=2,
+        pruning=RotamerPruning(),
+    )
+
+    scorer = sfxn.render_whole_pose_scoring_module(repacked)
+    numpy.testing.assert_allclose(
+        scorer(repacked.coords).detach().cpu().numpy(),
+        torch.min(energies, dim=1)[0].cpu().numpy(),
+        rtol=1e-4,
+        atol=1e-2,
+    )
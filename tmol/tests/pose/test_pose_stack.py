@@ -1,6 +1,8 @@
 import numpy
 import torch
 
+from tmol.pose.pose_stack_builder import PoseStackBuilder
+
 
 def test_n_poses(ubq_40_60_pose_stack):
     assert ubq_40_60_pose_stack.n_poses == 2
@@ -88,3 +90,103 @@ def test_expand_coords(ubq_40_60_pose_stack, torch_device):
     numpy.testing.assert_equal(
         real_expanded_coords.cpu().numpy(), real_expanded_coords.cpu().numpy()
     )
+
+
+def test_share_pose_topologies(ubq_res, default_database, torch_device):
+    p1 = PoseStackBuilder.one_structure_from_polymeric_residues(
+        default_database.chemical, ubq_res[:40], torch_device
+    )
+    p2 = PoseStackBuilder.one_structure_from_polymeric_residues(
+        default_database.chemical, ubq_res[:60], torch_device
+    )
+
+    # a stack of decoys of one sequence holds a single copy of its topology
+    decoys = PoseStackBuilder.from_poses([p1] * 3, torch_device)
+    assert decoys.n_topologies == 1
+    for name in (
+        "block_type_ind",
+        "inter_residue_connections64",
+        "inter_block_bondsep_sparse",
+    ):
+        assert decoys.topology_view(name).stride(0) == 0
+        # the per-pose properties are ordinary tensors, built once
+        t = getattr(decoys, name)
+        assert t.is_contiguous() and t.shape[0] == 3
+        assert getattr(decoys, name) is t
+    assert decoys.inter_block_bondsep.is_contiguous()
+    numpy.testing.assert_equal(
+        decoys.inter_block_bondsep.cpu().numpy(),
+        p1.inter_block_bondsep.expand(3, -1, -1, -1, -1).cpu().numpy(),
+    )
+
+    # stacking stacks that already share their topologies keeps one copy
+    assert PoseStackBuilder.from_poses([decoys, p1], torch_device).n_topologies == 1
+
+    poses = PoseStackBuilder.from_poses([p1, p2, p1, p2, p2], torch_device)
+    assert poses.n_topologies == 2
+    assert poses.topology_stack.inter_block_bondsep_sparse.shape[0] == 2
+    topology_ind = poses.topology_ind_for_pose.cpu().numpy()
+    assert topology_ind[0] == topology_ind[2]
+    assert topology_ind[1] == topology_ind[3] == topology_ind[4]
+    assert topology_ind[0] != topology_ind[1]
+    numpy.testing.assert_equal(
+        poses.first_pose_for_topology[poses.topology_ind_for_pose].cpu().numpy(),
+        numpy.array([0, 1, 0, 1, 1]),
+    )
+
+    unshared = PoseStackBuilder.from_poses([p1, p2], torch_device)
+    for i, j in ((0, 0), (1, 1), (2, 0), (3, 1), (4, 1)):
+        for name in (
+            "block_coord_offset",
+            "block_type_ind64",
+            "inter_residue_connections",
+            "inter_block_bondsep_neighbors",
+            "inter_block_bondsep_sparse",
+            "inter_block_bondsep64",
+        ):
+            numpy.testing.assert_equal(
+                getattr(poses, name)[i].cpu().numpy(),
+                getattr(unshared, name)[j].cpu().numpy(),
+            )
+
+
+def test_derived_tensors_are_memoized(ubq_40_60_pose_stack):
+    poses = ubq_40_60_pose_stack
+    assert poses.n_ats_per_block is poses.n_ats_per_block
+    assert poses.real_atoms is poses.real_atoms
+
+    expanded_coords, real_expanded_coords = poses.expand_coords()
+    assert poses.expand_coords()[1] is real_expanded_coords
+
+    # the coordinates may change, and each expansion reads the current ones
+    poses.coords += 1.0
+    moved_expanded_coords, _ = poses.expand_coords()
+    numpy.testing.assert_allclose(
+        moved_expanded_coords[real_expanded_coords].cpu().numpy(),
+        expanded_coords[real_expanded_coords].cpu().numpy() + 1.0,
+    )
+    assert torch.all(moved_expanded_coords[~real_expanded_coords] == 0)
+
+    # ... into a buffer the caller holds, if given one
+    buffer = torch.full_like(expanded_coords, float("nan"))
+    buffered_coords, _ = poses.expand_coords(out=buffer)
+    assert buffered_coords.data_ptr() == buffer.data_ptr()
+    numpy.testing.assert_equal(
+        buffer.cpu().numpy(), moved_expanded_coords.cpu().numpy()
+    )
+
+
+def test_expand_coords_of_shared_topology(ubq_res, default_database, torch_device):
+    p1 = PoseStackBuilder.one_structure_from_polymeric_residues(
+        default_database.chemical, ubq_res[:40], torch_device
+    )
+    decoys = PoseStackBuilder.from_poses([p1] * 3, torch_device)
+
+    expanded_coords, real_expanded_coords = decoys.expand_coords()
+    expanded_coords1, _ = p1.expand_coords()
+    numpy.testing.assert_equal(
+        expanded_coords.cpu().numpy(),
+        expanded_coords1.expand(3, -1, -1, -1).cpu().numpy(),
+    )
+    # the gather index is held once for the shared topology
+    assert decoys._expand_coords_index_for_topology.shape[0] == 1
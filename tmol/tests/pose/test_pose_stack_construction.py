@@ -3,6 +3,11 @@ import torch
 
 from tmol.chemical.constants import MAX_SIG_BOND_SEPARATION
 from tmol.chemical.restypes import find_simple_polymeric_connections
+from tmol.io import pose_stack_from_pdb
+from tmol.pose.pose_stack import (
+    dense_inter_block_bondsep,
+    sparse_inter_block_bondsep,
+)
 from tmol.pose.pose_stack_builder import PoseStackBuilder
 
 
@@ -135,6 +140,32 @@ def test_concatenate_pose_stacks_ctor(ubq_res, default_database, torch_device):
     assert poses.inter_block_bondsep.shape == (2, 60, 60, 2, 2)
 
 
+def test_sparse_inter_block_bondsep_round_trip(ubq_res, torch_device):
+    connections = find_simple_polymeric_connections(ubq_res[:10])
+    bonds = PoseStackBuilder._determine_single_structure_inter_block_bondsep(
+        ubq_res[:10], connections, torch_device
+    )
+    neighbors, sparse = sparse_inter_block_bondsep(bonds)
+
+    # a residue in the middle of a chain sees itself and its two
+    # neighbors up and down the chain
+    assert neighbors.shape == (1, 10, 5)
+    assert sparse.shape == (1, 10, 5, 2, 2)
+    assert neighbors.dtype == torch.int32
+    assert neighbors.device == torch_device
+    numpy.testing.assert_equal(
+        neighbors[0, 4].cpu().numpy(), numpy.array([2, 3, 4, 5, 6])
+    )
+    numpy.testing.assert_equal(
+        neighbors[0, 0].cpu().numpy(), numpy.array([0, 1, 2, -1, -1])
+    )
+
+    dense = dense_inter_block_bondsep(neighbors, sparse)
+    torch.testing.assert_close(
+        dense, torch.clamp(bonds, max=MAX_SIG_BOND_SEPARATION).to(torch.int32)
+    )
+
+
 def test_create_pose_from_sequence(fresh_default_packed_block_types, torch_device):
     pbt = fresh_default_packed_block_types
     seqs = [["A", "P", "L", "F"], ["F", "P", "D"], ["A", "S", "F"]]
@@ -664,6 +695,87 @@ def test_calculate_interblock_bondsep_from_connectivity_graph_heavy(torch_device
     torch.testing.assert_close(inter_block_bondsep, inter_block_bondsep_gold)
 
 
+def test_calculate_sparse_interblock_bondsep_matches_apsp(
+    ubq_pdb, pertuzumab_pdb, torch_device
+):
+    pose_stack = PoseStackBuilder.from_poses(
+        [
+            pose_stack_from_pdb(ubq_pdb, torch_device),
+            pose_stack_from_pdb(pertuzumab_pdb, torch_device),
+        ],
+        torch_device,
+    )
+    pbt = pose_stack.packed_block_types
+    real_blocks = pose_stack.block_type_ind64 != -1
+
+    (
+        neighbors,
+        sparse,
+    ) = PoseStackBuilder._calculate_sparse_interblock_bondsep(
+        pbt, pose_stack.block_type_ind64, pose_stack.inter_residue_connections64
+    )
+
+    # the gold standard: all-pairs-shortest-paths on the dense graph
+    (
+        pconn_matrix,
+        pconn_offsets,
+        block_n_conn,
+        pose_n_pconn,
+    ) = PoseStackBuilder._take_real_conn_conn_intrablock_pairs(
+        pbt, pose_stack.block_type_ind64, real_blocks
+    )
+    PoseStackBuilder._incorporate_inter_residue_connections_into_connectivity_graph(
+        pose_stack.inter_residue_connections64, pconn_offsets, pconn_matrix
+    )
+    ibb_gold = PoseStackBuilder._calculate_interblock_bondsep_from_connectivity_graph(
+        pbt, block_n_conn, pose_n_pconn, pconn_matrix
+    )
+    neighbors_gold, sparse_gold = sparse_inter_block_bondsep(ibb_gold)
+
+    torch.testing.assert_close(neighbors, neighbors_gold)
+    torch.testing.assert_close(sparse, sparse_gold)
+
+
+def test_builders_match_apsp_interblock_bondsep(
+    ubq_res, default_database, fresh_default_packed_block_types, torch_device
+):
+    # both of these builders used to build the dense bond separations first
+    pose_stacks = [
+        PoseStackBuilder.one_structure_from_polymeric_residues(
+            default_database.chemical, ubq_res[:20], torch_device
+        ),
+        PoseStackBuilder.pose_stack_from_monomer_polymer_sequences(
+            fresh_default_packed_block_types,
+            [["A", "P", "L", "F"], ["F", "P", "D"], ["A", "S", "F"]],
+        ),
+    ]
+    for pose_stack in pose_stacks:
+        pbt = pose_stack.packed_block_types
+        real_blocks = pose_stack.block_type_ind64 != -1
+        (
+            pconn_matrix,
+            pconn_offsets,
+            block_n_conn,
+            pose_n_pconn,
+        ) = PoseStackBuilder._take_real_conn_conn_intrablock_pairs(
+            pbt, pose_stack.block_type_ind64, real_blocks
+        )
+        PoseStackBuilder._incorporate_inter_residue_connections_into_connectivity_graph(
+            pose_stack.inter_residue_connections64, pconn_offsets, pconn_matrix
+        )
+        ibb_gold = (
+            PoseStackBuilder._calculate_interblock_bondsep_from_connectivity_graph(
+                pbt, block_n_conn, pose_n_pconn, pconn_matrix
+            )
+        )
+        neighbors_gold, sparse_gold = sparse_inter_block_bondsep(ibb_gold)
+
+        torch.testing.assert_close(
+            pose_stack.inter_block_bondsep_neighbors, neighbors_gold
+        )
+        torch.testing.assert_close(pose_stack.inter_block_bondsep_sparse, sparse_gold)
+
+
 def test_incorporate_extra_connections_into_inter_res_conn_set(torch_device):
     n_poses, max_n_blocks, max_n_conn = 2, 5, 3
     resolved_expoly_connections = [[(2, 2, 4, 2)], [(1, 2, 3, 2)]]
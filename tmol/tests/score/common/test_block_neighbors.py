@@ -0,0 +1,89 @@
+import torch
+
+from tmol.io import pose_stack_from_pdb
+from tmol.pose.pose_stack_builder import PoseStackBuilder
+from tmol.score.common.block_neighbors import (
+    BlockNeighborsModule,
+    detect_block_neighbors,
+    mask_block_neighbor_pairs,
+)
+
+
+def test_block_neighbors_gold(ubq_pdb, torch_device):
+    pose_stack1 = pose_stack_from_pdb(ubq_pdb, torch_device, residue_end=20)
+    pose_stack2 = pose_stack_from_pdb(ubq_pdb, torch_device, residue_end=30)
+    pose_stack = PoseStackBuilder.from_poses([pose_stack1, pose_stack2], torch_device)
+    reach = 6.0
+
+    block_neighbors_module = BlockNeighborsModule(
+        pose_stack.block_coord_offset,
+        pose_stack.block_type_ind,
+        pose_stack.packed_block_types.n_atoms,
+        reach,
+    )
+    block_neighbor_pairs = block_neighbors_module(pose_stack.coords)
+
+    # the gold standard: enclose each block in a sphere centered at the
+    # average position of its atoms and compare all pairs of spheres
+    expanded_coords, real_atoms = pose_stack.expand_coords()
+    n_ats = pose_stack.n_ats_per_block.clamp(min=1)
+    centers = torch.sum(
+        expanded_coords * real_atoms.unsqueeze(3), dim=2
+    ) / n_ats.unsqueeze(2)
+    radii, _ = torch.max(
+        torch.norm(expanded_coords - centers.unsqueeze(2), dim=3) * real_atoms, dim=2
+    )
+    center_dist = torch.norm(centers.unsqueeze(2) - centers.unsqueeze(1), dim=3)
+    real_blocks = pose_stack.block_type_ind != -1
+    gold = torch.logical_and(
+        center_dist < radii.unsqueeze(2) + radii.unsqueeze(1) + reach,
+        torch.logical_and(real_blocks.unsqueeze(2), real_blocks.unsqueeze(1)),
+    )
+    gold = torch.triu(gold)
+
+    assert block_neighbor_pairs.dtype == torch.int32
+    assert block_neighbor_pairs.shape[1] == 3
+    assert block_neighbor_pairs.device == torch_device
+
+    # the pairs come in the order of the dense layout
+    pairs = block_neighbor_pairs.to(torch.int64).cpu()
+    pair_keys = (
+        pairs[:, 0] * pose_stack.max_n_blocks + pairs[:, 1]
+    ) * pose_stack.max_n_blocks + pairs[:, 2]
+    assert torch.all(pair_keys[1:] > pair_keys[:-1])
+
+    block_neighbors = torch.zeros_like(gold)
+    block_neighbors[pairs[:, 0], pairs[:, 1], pairs[:, 2]] = True
+    torch.testing.assert_close(block_neighbors, gold.cpu())
+
+    # and the cell list agrees with the compiled all-pairs reference
+    dense_block_neighbors = detect_block_neighbors(
+        pose_stack.coords,
+        pose_stack.block_coord_offset,
+        pose_stack.block_type_ind,
+        pose_stack.packed_block_types.n_atoms,
+        reach,
+    )
+    torch.testing.assert_close(dense_block_neighbors.cpu() != 0, block_neighbors)
+
+
+def test_mask_block_neighbor_pairs(torch_device):
+    block_neighbor_pairs = torch.tensor(
+        [[0, 0, 0], [0, 0, 1], [1, 0, 0], [1, 1, 2]],
+        dtype=torch.int32,
+        device=torch_device,
+    )
+
+    pose_mask = torch.tensor([0, 1], dtype=torch.int32, device=torch_device)
+    torch.testing.assert_close(
+        mask_block_neighbor_pairs(block_neighbor_pairs, pose_mask.view(-1, 1, 1)),
+        block_neighbor_pairs[2:],
+    )
+
+    block_pair_mask = torch.zeros((2, 3, 3), dtype=torch.int32, device=torch_device)
+    block_pair_mask[0, 0, 1] = 1
+    block_pair_mask[1, 1, 2] = 1
+    torch.testing.assert_close(
+        mask_block_neighbor_pairs(block_neighbor_pairs, block_pair_mask),
+        block_neighbor_pairs[[1, 3]],
+    )
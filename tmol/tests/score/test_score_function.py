@@ -1,6 +1,10 @@
+import pytest
+import torch
+
 from tmol.score.score_function import ScoreFunction
 from tmol.score.score_types import ScoreType
 from tmol.pose.pose_stack_builder import PoseStackBuilder
+from tmol.io import pose_stack_from_pdb
 
 
 def test_pose_score_smoke(rts_ubq_res, default_database, torch_device):
@@ -22,3 +26,458 @@ def test_pose_score_smoke(rts_ubq_res, default_database, torch_device):
     # print(scores.shape)
 
     assert scores is not None
+
+
+def test_pose_score_cpu_threads(ubq_pdb, default_database):
+    torch_device = torch.device("cpu")
+    pose_stack = pose_stack_from_pdb(ubq_pdb, torch_device)
+    pose_stack = PoseStackBuilder.from_poses([pose_stack] * 3, torch_device)
+
+    sfxn = ScoreFunction(default_database, torch_device)
+    for st in (
+        ScoreType.fa_ljatr,
+        ScoreType.fa_ljrep,
+        ScoreType.fa_lk,
+        ScoreType.lk_ball,
+        ScoreType.fa_elec,
+        ScoreType.hbond,
+        ScoreType.cart_lengths,
+        ScoreType.rama,
+    ):
+        sfxn.set_weight(st, 1.0)
+
+    def score_and_grad(n_threads):
+        torch.set_num_threads(n_threads)
+        coords = pose_stack.coords.clone().requires_grad_(True)
+        scorer = sfxn.render_whole_pose_scoring_module(pose_stack)
+        scores = scorer(coords)
+        torch.sum(scores).backward()
+        return scores.detach(), coords.grad
+
+    original_n_threads = torch.get_num_threads()
+    try:
+        serial_scores, serial_grad = score_and_grad(1)
+        threaded_scores, threaded_grad = score_and_grad(4)
+        threaded_scores2, threaded_grad2 = score_and_grad(4)
+    finally:
+        torch.set_num_threads(original_n_threads)
+
+    # summation order differs between thread counts
+    torch.testing.assert_close(threaded_scores, serial_scores, rtol=1e-5, atol=1e-3)
+    torch.testing.assert_close(threaded_grad, serial_grad, rtol=1e-5, atol=1e-3)
+
+    # for a given thread count, the reduction order is fixed
+    assert torch.equal(threaded_scores, threaded_scores2)
+    assert torch.equal(threaded_grad, threaded_grad2)
+
+
+def test_pose_score_annotation_cache(ubq_pdb, default_database, tmp_path, monkeypatch):
+    import attr
+    import cattr
+    import numpy
+    from tmol.chemical.restypes import RefinedResidueType
+    from tmol.pose.packed_block_types import PackedBlockTypes
+    from tmol.score.cartbonded.cartbonded_energy_term import CartBondedEnergyTerm
+
+    import tmol.io.canonical_ordering
+    import tmol.score.annotation_cache as annotation_cache
+    import tmol.score.score_function
+
+    monkeypatch.setenv("TMOL_ANNOTATION_CACHE", str(tmp_path))
+    torch_device = torch.device("cpu")
+    chem_db = default_database.chemical
+
+    def fresh_default_packed_block_types(device):
+        # block types that have never been annotated, as in a newly
+        # started process
+        restype_list = [
+            cattr.structure(cattr.unstructure(r), RefinedResidueType)
+            for r in chem_db.residues
+        ]
+        return PackedBlockTypes.from_restype_list(chem_db, restype_list, device)
+
+    def fresh_pose_stack():
+        # built as in real use, so the PackedBlockTypes also carries the
+        # annotations made during construction
+        with monkeypatch.context() as m:
+            m.setattr(
+                tmol.io.canonical_ordering,
+                "default_packed_block_types",
+                fresh_default_packed_block_types,
+            )
+            return pose_stack_from_pdb(ubq_pdb, torch_device)
+
+    def fresh_sfxn():
+        sfxn = ScoreFunction(default_database, torch_device)
+        for st in (
+            ScoreType.fa_ljatr,
+            ScoreType.lk_ball,
+            ScoreType.fa_elec,
+            ScoreType.hbond,
+            ScoreType.cart_lengths,
+            ScoreType.rama,
+        ):
+            sfxn.set_weight(st, 1.0)
+        return sfxn
+
+    pose_stack1 = fresh_pose_stack()
+    scores1 = fresh_sfxn().render_whole_pose_scoring_module(pose_stack1)(
+        pose_stack1.coords
+    )
+    assert len(list(tmp_path.glob("*.pt"))) == 1
+
+    def no_subgraphs(*args):
+        raise AssertionError("annotation should have been loaded from the cache")
+
+    pose_stack2 = fresh_pose_stack()
+    pbt2 = pose_stack2.packed_block_types
+    assert hasattr(pbt2, "canonical_ordering_annotation")
+
+    # note the attributes the cache restored and those present once the
+    # terms have been through their setup, which should add none
+    snapshots = []
+
+    def attribute_names(pbt):
+        return set(vars(pbt)), [set(vars(bt)) for bt in pbt.active_block_types]
+
+    load_annotations = annotation_cache._load_annotations
+    annotate = tmol.score.score_function.annotate_packed_block_types
+
+    def noting_load_annotations(cache_file, packed_block_types, term_types):
+        found = load_annotations(cache_file, packed_block_types, term_types)
+        snapshots.append((found, attribute_names(packed_block_types)))
+        return found
+
+    def noting_annotate(param_db, packed_block_types, terms):
+        annotate(param_db, packed_block_types, terms)
+        snapshots.append(attribute_names(packed_block_types))
+
+    monkeypatch.setattr(annotation_cache, "_load_annotations", noting_load_annotations)
+    monkeypatch.setattr(
+        tmol.score.score_function, "annotate_packed_block_types", noting_annotate
+    )
+    monkeypatch.setattr(CartBondedEnergyTerm, "find_subgraphs", no_subgraphs)
+    scores2 = fresh_sfxn().render_whole_pose_scoring_module(pose_stack2)(
+        pose_stack2.coords
+    )
+    assert torch.equal(scores1, scores2)
+
+    (found, (loaded_pbt_names, loaded_bt_names)), (pbt_names, bt_names) = snapshots
+    assert found
+    assert pbt_names - loaded_pbt_names == {"_annotated_term_types"}
+    assert bt_names == loaded_bt_names
+
+    pbt1 = pose_stack1.packed_block_types
+    for name in ("atom_types", "cartbonded_params_hash_keys", "hbpbt_params"):
+        assert hasattr(pbt2, name)
+    assert torch.equal(
+        pbt1.cartbonded_params_hash_values, pbt2.cartbonded_params_hash_values
+    )
+    for bt1, bt2 in zip(pbt1.active_block_types, pbt2.active_block_types):
+        numpy.testing.assert_array_equal(
+            bt1.backbone_torsion_params.backbone_torsion_atoms,
+            bt2.backbone_torsion_params.backbone_torsion_atoms,
+        )
+
+    # block types that already carry annotations, e.g. from the
+    # PackedBlockTypes for another device, keep them
+    hbbt_params = [bt.hbbt_params for bt in pbt2.active_block_types]
+    pbt3 = PackedBlockTypes.from_restype_list(
+        chem_db, pbt2.active_block_types, torch_device
+    )
+    pose_stack3 = attr.evolve(pose_stack2, packed_block_types=pbt3)
+    fresh_sfxn().pre_work_initialization(pose_stack3)
+    assert hasattr(pbt3, "hbpbt_params")
+    for bt, params in zip(pbt3.active_block_types, hbbt_params):
+        assert bt.hbbt_params is params
+
+    # entries are not unpickled unrestricted: a planted one is ignored
+    (cache_file,) = tmp_path.glob("*.pt")
+    torch.save({"block_type_names": _Planted()}, cache_file)
+    pose_stack4 = fresh_pose_stack()
+    monkeypatch.undo()
+    monkeypatch.setenv("TMOL_ANNOTATION_CACHE", str(tmp_path))
+    with pytest.warns(UserWarning, match="unreadable annotation cache"):
+        scores4 = fresh_sfxn().render_whole_pose_scoring_module(pose_stack4)(
+            pose_stack4.coords
+        )
+    assert torch.equal(scores1, scores4)
+
+
+class _Planted:
+    def __reduce__(self):
+        return (_planted_entry_loaded, ())
+
+
+def _planted_entry_loaded():
+    raise AssertionError("the cache entry was unpickled unrestricted")
+
+
+def test_annotation_cache_is_opt_in_and_keyed_on_contents(monkeypatch):
+    import numpy
+    from tmol.score.annotation_cache import annotation_cache_dir, _digest
+
+    monkeypatch.delenv("TMOL_ANNOTATION_CACHE", raising=False)
+    assert annotation_cache_dir() is None
+
+    # editing a large table without changing its shape changes the key
+    table = numpy.zeros((1024, 1024), dtype=numpy.float32)
+    edited = table.copy()
+    edited[512, 512] = 1.0
+    assert _digest(table) == _digest(table.copy())
+    assert _digest(table) != _digest(edited)
+
+
+def test_pose_score_without_derivatives(ubq_pdb, default_database, torch_device):
+    pose_stack = pose_stack_from_pdb(ubq_pdb, torch_device)
+
+    sfxn = ScoreFunction(default_database, torch_device)
+    for st in (
+        ScoreType.fa_ljatr,
+        ScoreType.fa_ljrep,
+        ScoreType.fa_lk,
+        ScoreType.lk_ball,
+        ScoreType.fa_elec,
+        ScoreType.hbond,
+        ScoreType.cart_lengths,
+        ScoreType.cart_angles,
+        ScoreType.cart_torsions,
+        ScoreType.disulfide,
+        ScoreType.rama,
+        ScoreType.omega,
+        ScoreType.dunbrack_rot,
+        ScoreType.dunbrack_rotdev,
+        ScoreType.dunbrack_semirot,
+    ):
+        sfxn.set_weight(st, 1.0)
+
+    for render in (
+        sfxn.render_whole_pose_scoring_module,
+        sfxn.render_block_pair_scoring_module,
+    ):
+        scorer = render(pose_stack)
+        coords = pose_stack.coords.clone().requires_grad_(True)
+        scores = scorer.unweighted_scores(coords)
+        torch.sum(scores).backward()
+        assert coords.grad is not None
+
+        # the score-only forward gives the same scores, whether the coords
+        # do not require a gradient or gradients are turned off
+        torch.testing.assert_close(
+            scorer.unweighted_scores(pose_stack.coords), scores.detach()
+        )
+        with torch.no_grad():
+            torch.testing.assert_close(scorer.unweighted_scores(coords), scores)
+
+
+def test_incremental_rescore(ubq_pdb, default_database, torch_device):
+    pose_stack = pose_stack_from_pdb(ubq_pdb, torch_device)
+    pose_stack = PoseStackBuilder.from_poses([pose_stack] * 2, torch_device)
+
+    sfxn = ScoreFunction(default_database, torch_device)
+    for st in (
+        ScoreType.fa_ljatr,
+        ScoreType.fa_ljrep,
+        ScoreType.fa_lk,
+        ScoreType.lk_ball,
+        ScoreType.fa_elec,
+        ScoreType.hbond,
+        ScoreType.cart_lengths,
+        ScoreType.rama,
+    ):
+        sfxn.set_weight(st, 1.0)
+
+    full_scorer = sfxn.render_whole_pose_scoring_module(pose_stack)
+    scorer = sfxn.render_incremental_scoring_module(pose_stack, debug=True)
+    # summing the block-pair energies changes the order of the additions
+    torch.testing.assert_close(
+        scorer(pose_stack.coords),
+        full_scorer(pose_stack.coords),
+        rtol=1e-5,
+        atol=1e-3,
+    )
+
+    # move one block in the first pose and two in the second
+    pbt = pose_stack.packed_block_types
+    n_atoms = pbt.n_atoms[pose_stack.block_type_ind.to(torch.int64)]
+    moved = torch.zeros_like(pose_stack.block_type_ind, dtype=torch.bool)
+    moved[0, 10] = True
+    moved[1, 20] = True
+    moved[1, 45] = True
+    coords = pose_stack.coords.clone()
+    for pose, block in torch.nonzero(moved).tolist():
+        start = int(pose_stack.block_coord_offset[pose, block])
+        coords[pose, start : start + int(n_atoms[pose, block])] += torch.tensor(
+            [0.3, -0.2, 0.25], device=torch_device
+        )
+
+    scores = scorer(coords, moved)
+    full_scores = full_scorer(coords)
+    torch.testing.assert_close(scores, full_scores, rtol=1e-5, atol=1e-3)
+
+    # derivatives: a full call to keep them, then incremental ones that
+    # update them; debug checks each against a full rescore
+    def move(coords, step):
+        coords = coords.detach().clone()
+        for pose, block in torch.nonzero(moved).tolist():
+            start = int(pose_stack.block_coord_offset[pose, block])
+            coords[pose, start : start + int(n_atoms[pose, block])] += step
+        return coords.requires_grad_(True)
+
+    coords.requires_grad_(True)
+    scorer(coords)
+    for step in ([-0.1, 0.15, 0.05], [0.2, 0.1, -0.3]):
+        coords = move(coords, torch.tensor(step, device=torch_device))
+        scores = scorer(coords, moved)
+        torch.sum(scores).backward()
+
+        full_coords = coords.detach().clone().requires_grad_(True)
+        full_scores = full_scorer(full_coords)
+        torch.sum(full_scores).backward()
+        torch.testing.assert_close(scores, full_scores, rtol=1e-5, atol=1e-3)
+        torch.testing.assert_close(coords.grad, full_coords.grad, rtol=1e-5, atol=1e-3)
+
+
+def test_render_reuses_block_type_parameters(ubq_pdb, default_database, torch_device):
+    pose_stack1 = pose_stack_from_pdb(ubq_pdb, torch_device, residue_end=40)
+    pose_stack2 = pose_stack_from_pdb(ubq_pdb, torch_device)
+    assert pose_stack1.packed_block_types is pose_stack2.packed_block_types
+
+    sfxn = ScoreFunction(default_database, torch_device)
+    for st in (
+        ScoreType.fa_ljatr,
+        ScoreType.fa_ljrep,
+        ScoreType.fa_lk,
+        ScoreType.lk_ball,
+        ScoreType.fa_elec,
+        ScoreType.hbond,
+        ScoreType.cart_lengths,
+        ScoreType.rama,
+        ScoreType.ref,
+    ):
+        sfxn.set_weight(st, 1.0)
+
+    term_modules1 = sfxn.render_term_modules(pose_stack1)
+    term_modules2 = sfxn.render_term_modules(pose_stack2)
+    fresh_term_modules2 = [
+        term.render_whole_pose_scoring_module(pose_stack2) for term in sfxn.all_terms()
+    ]
+
+    for tm1, tm2, fresh_tm2 in zip(term_modules1, term_modules2, fresh_term_modules2):
+        for name, param in tm2.named_parameters():
+            if name.startswith("pose_stack_"):
+                assert param.shape == getattr(fresh_tm2, name).shape
+            else:
+                # shared with the module rendered for the first PoseStack
+                assert param is getattr(tm1, name)
+        torch.testing.assert_close(
+            tm2(pose_stack2.coords), fresh_tm2(pose_stack2.coords)
+        )
+
+    # the first module still scores the first PoseStack
+    torch.testing.assert_close(
+        sfxn.render_whole_pose_scoring_module(pose_stack1)(pose_stack1.coords),
+        torch.sum(
+            sfxn.weights_tensor().unsqueeze(1)
+            * torch.cat([tm(pose_stack1.coords) for tm in term_modules1]),
+            dim=0,
+        ),
+    )
+
+    # adding a term renders the modules anew
+    sfxn.set_weight(ScoreType.disulfide, 1.0)
+    assert len(sfxn.render_term_modules(pose_stack2)) == len(term_modules2) + 1
+
+
+def test_render_cache_holds_no_pose_stack_tensors(
+    ubq_pdb, default_database, torch_device
+):
+    import weakref
+
+    pose_stack1 = pose_stack_from_pdb(ubq_pdb, torch_device, residue_end=40)
+    pose_stack2 = pose_stack_from_pdb(ubq_pdb, torch_device)
+    assert pose_stack1.packed_block_types is pose_stack2.packed_block_types
+
+    sfxn = ScoreFunction(default_database, torch_device)
+    sfxn.set_weight(ScoreType.fa_ljatr, 1.0)
+    sfxn.set_weight(ScoreType.cart_lengths, 1.0)
+
+    term_modules1 = sfxn.render_term_modules(pose_stack1)
+    block_coord_offset1 = weakref.ref(pose_stack1.block_coord_offset)
+    del term_modules1, pose_stack1
+    assert block_coord_offset1() is None
+
+    # the cached modules still render for, and score, other PoseStacks
+    term_modules2 = sfxn.render_term_modules(pose_stack2)
+    fresh_term_modules2 = [
+        term.render_whole_pose_scoring_module(pose_stack2) for term in sfxn.all_terms()
+    ]
+    for tm2, fresh_tm2 in zip(term_modules2, fresh_term_modules2):
+        torch.testing.assert_close(
+            tm2(pose_stack2.coords), fresh_tm2(pose_stack2.coords)
+        )
+
+
+def test_score_shared_topology_pose_stack(ubq_pdb, default_database, torch_device):
+    pose_stack1 = pose_stack_from_pdb(ubq_pdb, torch_device)
+    decoys = PoseStackBuilder.from_poses([pose_stack1] * 3, torch_device)
+    assert decoys.n_topologies == 1
+
+    sfxn = ScoreFunction(default_database, torch_device)
+    for st in (
+        ScoreType.fa_ljatr,
+        ScoreType.fa_ljrep,
+        ScoreType.fa_lk,
+        ScoreType.lk_ball,
+        ScoreType.fa_elec,
+        ScoreType.hbond,
+        ScoreType.cart_lengths,
+        ScoreType.cart_angles,
+        ScoreType.cart_torsions,
+        ScoreType.disulfide,
+        ScoreType.rama,
+        ScoreType.omega,
+        ScoreType.ref,
+    ):
+        sfxn.set_weight(st, 1.0)
+
+    # the decoys score the same as the single pose they were copied from
+    # although they read their topology through stride-0 views
+    scores1 = sfxn.render_whole_pose_scoring_module(pose_stack1).unweighted_scores(
+        pose_stack1.coords
+    )
+    scorer = sfxn.render_whole_pose_scoring_module(decoys)
+    for term_module in scorer.term_modules:
+        for name, param in term_module.named_parameters():
+            if name.startswith("pose_stack_"):
+                assert param.stride(0) == 0
+    scores = scorer.unweighted_scores(decoys.coords)
+    torch.testing.assert_close(scores, scores1.expand(-1, 3))
+
+    # the poses of a stack of two sequences are scored in place, with their
+    # topologies gathered per pose
+    pose_stack2 = pose_stack_from_pdb(ubq_pdb, torch_device, residue_end=40)
+    mixed = PoseStackBuilder.from_poses(
+        [pose_stack1, pose_stack2, pose_stack1], torch_device
+    )
+    assert mixed.n_topologies == 2
+
+    scores2 = sfxn.render_whole_pose_scoring_module(pose_stack2).unweighted_scores(
+        pose_stack2.coords
+    )
+    coords = mixed.coords.clone().requires_grad_(True)
+    scores = sfxn.render_whole_pose_scoring_module(mixed).unweighted_scores(coords)
+    torch.testing.assert_close(
+        scores, torch.stack((scores1[:, 0], scores2[:, 0], scores1[:, 0]), dim=1)
+    )
+
+    block_pair_scores1 = sfxn.render_block_pair_scoring_module(pose_stack1)(
+        pose_stack1.coords
+    )
+    block_pair_scores = sfxn.render_block_pair_scoring_module(mixed)(mixed.coords)
+    torch.testing.assert_close(block_pair_scores[0], block_pair_scores1[0])
+    torch.testing.assert_close(block_pair_scores[2], block_pair_scores1[0])
+
+    torch.sum(scores[:, 1]).backward()
+    assert torch.all(coords.grad[0] == 0) and torch.all(coords.grad[2] == 0)
+    assert torch.any(coords.grad[1] != 0)
@@ -2,6 +2,7 @@ import pytest
 
 import torch
 
+import tmol.utility.cpp_extension
 from tmol.utility.cpp_extension import load, relpaths, modulename, cuda_if_available
 
 from tmol.tests.torch import requires_cuda
@@ -68,3 +69,101 @@ def test_hybrid_nocuda():
     if torch.cuda.is_available():
         with pytest.raises(TypeError):
             extension_nocuda.sum(torch.ones(10, device="cuda"))
+
+
+def test_prebuilt_extension_cache(tmp_path, monkeypatch):
+    """Extensions stored in the extension cache load without compilation.
+
+    An extension built while populating a cache directory is copied into it,
+    and is then loaded from the cache, without invoking the jit compiler,
+    whenever the same sources and flags are requested.
+    """
+    name = modulename(f"{__name__}.pure")
+    sources = relpaths(__file__, "pure.cpp")
+
+    monkeypatch.setattr(tmol.utility.cpp_extension, "_populate_extension_dir", tmp_path)
+    load(name, sources)
+    assert len(list(tmp_path.glob(f"{name}-*/*.so"))) == 1
+    monkeypatch.setattr(tmol.utility.cpp_extension, "_populate_extension_dir", None)
+
+    def no_jit(*args, **kwargs):
+        raise AssertionError("extension should be loaded from the cache")
+
+    monkeypatch.setenv("TMOL_EXTENSION_CACHE", str(tmp_path))
+    monkeypatch.setattr(torch.utils.cpp_extension, "load", no_jit)
+
+    extension = load(name, sources)
+    assert extension.sum(torch.ones(10)) == 10
+
+    # different flags are a different build, which is not in the cache
+    with pytest.raises(AssertionError):
+        load(name, sources, extra_cflags=["-O1"])
+
+
+def test_extension_build_key_is_known_at_load_time(monkeypatch):
+    """A build is keyed only on what the machine loading it sees the same way
+    as the machine that built it: not on the compilers or the visible GPUs,
+    but on TORCH_CUDA_ARCH_LIST for builds with CUDA sources."""
+    build_key = tmol.utility.cpp_extension._extension_build_key
+    sources = relpaths(__file__, "pure.cpp")
+    cuda_sources = relpaths(__file__, ["hybrid.cpp", "hybrid.cu"])
+    cuda_kwargs = dict(
+        with_cuda=True, extra_cuda_cflags=["-O3", "--gpu-architecture=sm_70"]
+    )
+
+    monkeypatch.setenv("CXX", "c++")
+    key = build_key("extension", sources, {})
+    cuda_key = build_key("extension", cuda_sources, cuda_kwargs)
+    monkeypatch.setenv("CXX", "no-such-compiler")
+    assert build_key("extension", sources, {}) == key
+
+    # the architecture probed from the build machine's GPU is not keyed on
+    other_gpu_kwargs = dict(
+        with_cuda=True, extra_cuda_cflags=["-O3", "--gpu-architecture=sm_86"]
+    )
+    assert build_key("extension", cuda_sources, other_gpu_kwargs) == cuda_key
+
+    monkeypatch.setenv("TORCH_CUDA_ARCH_LIST", "7.0")
+    key = build_key("extension", sources, {})
+    cuda_key = build_key("extension", cuda_sources, cuda_kwargs)
+    monkeypatch.setenv("TORCH_CUDA_ARCH_LIST", "8.6")
+    assert build_key("extension", cuda_sources, cuda_kwargs) != cuda_key
+    # the architectures matter only to builds with CUDA sources
+    assert build_key("extension", sources, {}) == key
+
+
+def test_prebuilt_extension_checked_against_devices(tmp_path, monkeypatch):
+    """A prebuilt library is loaded only if the GPU architectures recorded
+    alongside it at build time run on every visible device."""
+    import json
+    import torch.cuda
+
+    cpp_extension = tmol.utility.cpp_extension
+    assert cpp_extension._gpu_architectures(
+        dict(
+            with_cuda=True,
+            extra_cuda_cflags=["-O3", "--gpu-architecture=sm_75"],
+        )
+    ) == [[7, 5]]
+    assert cpp_extension._gpu_architectures(dict(with_cuda=False)) == []
+
+    lib_path = tmp_path / "extension.so"
+    lib_path.touch()
+    # without the build record, the library is not trusted
+    assert not cpp_extension._runs_on_visible_devices(lib_path)
+
+    def record(gpu_architectures):
+        with open(tmp_path / "build.json", "w") as f:
+            json.dump(dict(gpu_architectures=gpu_architectures), f)
+
+    monkeypatch.setattr(torch.cuda, "is_available", lambda: True)
+    monkeypatch.setattr(torch.cuda, "device_count", lambda: 2)
+    monkeypatch.setattr(
+        torch.cuda, "get_device_capability", lambda i: [(8, 0), (8, 6)][i]
+    )
+    record([])
+    assert cpp_extension._runs_on_visible_devices(lib_path)
+    record([[7, 0]])
+    assert cpp_extension._runs_on_visible_devices(lib_path)
+    record([[8, 6]])
+    assert not cpp_extension._runs_on_visible_devices(lib_path)
@@ -0,0 +1,86 @@
+"""Compile tmol's C++/CUDA extensions ahead of time.
+
+Each module that builds an extension with tmol.utility.cpp_extension.load
+is imported, and every extension it builds is copied into the extension
+cache, keyed by the torch version, the compiler flags, and a hash of the
+sources. Later calls to load find the cached library and import it
+directly, without ninja or nvcc, so a fresh process starts in seconds
+rather than minutes.
+
+    python -m tmol.utility.build_extensions [--cache-dir DIR | --bundle]
+
+By default the cache is ~/.cache/tmol/extensions (or TMOL_EXTENSION_CACHE);
+--bundle instead writes the libraries into the package itself, for
+building a wheel with prebuilt extensions.
+"""
+
+import argparse
+import importlib
+import pathlib
+import sys
+
+import tmol.utility.cpp_extension as cpp_extension
+
+
+def extension_modules():
+    """Names of the tmol modules that compile an extension on import."""
+    import tmol
+
+    package_root = pathlib.Path(tmol.__file__).parent
+    utility_root = pathlib.Path(__file__).parent
+    for module_path in sorted(package_root.glob("**/*.py")):
+        relpath = module_path.relative_to(package_root.parent)
+        if relpath.parts[1] == "tests" or module_path.parent == utility_root:
+            continue
+        source = module_path.read_text()
+        if "cpp_extension import" in source and "load(" in source:
+            yield ".".join(relpath.with_suffix("").parts)
+
+
+def build_extensions(cache_dir, verbose=False):
+    """Build every tmol extension and store it in cache_dir."""
+    cpp_extension._populate_extension_dir = pathlib.Path(cache_dir)
+    try:
+        for module_name in extension_modules():
+            if verbose:
+                print(f"building {module_name}", file=sys.stderr)
+            if module_name in sys.modules:
+                importlib.reload(sys.modules[module_name])
+            else:
+                importlib.import_module(module_name)
+    finally:
+        cpp_extension._populate_extension_dir = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compile tmol's C++/CUDA extensions ahead of time."
+    )
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument(
+        "--cache-dir",
+        type=pathlib.Path,
+        default=None,
+        help="extension cache to populate (default: %s)"
+        % cpp_extension.extension_cache_dir(),
+    )
+    target.add_argument(
+        "--bundle",
+        action="store_true",
+        help="store the extensions in the tmol package, for building wheels",
+    )
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.bundle:
+        cache_dir = cpp_extension.bundled_extension_dir
+    elif args.cache_dir is not None:
+        cache_dir = args.cache_dir
+    else:
+        cache_dir = cpp_extension.extension_cache_dir()
+
+    build_extensions(cache_dir, verbose=args.verbose)
+
+
+if __name__ == "__main__":
+    main()
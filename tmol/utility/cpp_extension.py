@@ -1,6 +1,13 @@
 import pathlib
 import os
-from functools import wraps
+import sys
+import glob
+import json
+import shutil
+import hashlib
+import tempfile
+import importlib.util
+from functools import wraps, lru_cache
 import warnings
 
 from ..extern import include_paths as extern_include_paths
@@ -9,7 +16,6 @@ from .. import include_paths as tmol_include_paths
 import torch.utils.cpp_extension
 from torch.utils.cpp_extension import _is_cuda_file
 
-
 # Add warning filter for use of c++ (rather than g++) for extension
 # compilation. c++ is provided by g++ on our platform.
 warnings.filterwarnings(
@@ -105,11 +111,196 @@ def cuda_if_available(sources):
         return [s for s in sources if not _is_cuda_file(s)]
 
 
+# Ahead-of-time compiled extensions are kept in a cache directory (by
+# default ~/.cache/tmol/extensions, or TMOL_EXTENSION_CACHE if set) or
+# bundled with the package, one subdirectory per extension build, keyed by
+# a hash of the sources, flags and torch version the build depends on, and
+# holding a build.json recording the GPU architectures it targets. See
+# tmol.utility.build_extensions for populating the cache.
+bundled_extension_dir = pathlib.Path(__file__).parent / "prebuilt_extensions"
+
+_LIB_EXT = ".pyd" if sys.platform == "win32" else ".so"
+
+# When set (by build_extensions), load stores each extension it builds here
+_populate_extension_dir = None
+
+
+def extension_cache_dir():
+    """The directory holding ahead-of-time compiled extensions."""
+    cache_dir = os.environ.get("TMOL_EXTENSION_CACHE")
+    if cache_dir:
+        return pathlib.Path(cache_dir)
+    return pathlib.Path.home() / ".cache" / "tmol" / "extensions"
+
+
+@lru_cache(maxsize=None)
+def _tmol_headers_digest():
+    """Digest of every tmol header, which any extension source may include."""
+    digest = hashlib.sha256()
+    for root in tmol_include_paths():
+        tmol_root = os.path.join(root, "tmol")
+        for header in sorted(
+            glob.glob(os.path.join(tmol_root, "**", "*.h*"), recursive=True)
+            + glob.glob(os.path.join(tmol_root, "**", "*.cuh"), recursive=True)
+        ):
+            digest.update(header.encode())
+            with open(header, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _gpu_architectures(kwargs):
+    """The [major, minor] compute capabilities a build targets, read from
+    its --gpu-architecture=sm_XY flags."""
+    if not kwargs.get("with_cuda"):
+        return []
+    prefix = "--gpu-architecture=sm_"
+    capabilities = []
+    for flag in kwargs.get("extra_cuda_cflags", []):
+        if flag.startswith(prefix):
+            digits = flag[len(prefix) :].rstrip("abcdefghijklmnopqrstuvwxyz")
+            capabilities.append([int(digits[:-1]), int(digits[-1])])
+    return capabilities
+
+
+def _extension_build_key(name, sources, kwargs):
+    """Key identifying a build: the torch version, the interpreter, the
+    compiler flags, TORCH_CUDA_ARCH_LIST (for CUDA sources), and the
+    contents of the sources and the tmol headers.
+
+    Only what is known the same way on the build machine and on the machine
+    loading the build goes into the key. The target architecture that was
+    derived from the build machine's GPU is instead recorded next to the
+    library and checked against the visible devices when it is loaded.
+    """
+    keyed_kwargs = dict(kwargs)
+    keyed_kwargs["extra_cuda_cflags"] = [
+        flag
+        for flag in kwargs.get("extra_cuda_cflags", [])
+        if not flag.startswith("--gpu-architecture=")
+    ]
+    digest = hashlib.sha256()
+    for item in (
+        name,
+        torch.__version__,
+        str(torch.version.cuda),
+        sys.implementation.cache_tag,
+        sys.platform,
+        repr(
+            sorted(
+                (k, v)
+                for k, v in keyed_kwargs.items()
+                # the include paths depend on where tmol is installed; the
+                # contents of the tmol headers are hashed instead
+                if k not in ("verbose", "build_directory", "extra_include_paths")
+            )
+        ),
+        _tmol_headers_digest(),
+    ):
+        digest.update(item.encode())
+    if any(_is_cuda_file(source) for source in sources):
+        digest.update(os.environ.get("TORCH_CUDA_ARCH_LIST", "").encode())
+    for source in sources:
+        with open(source, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def _runs_on_visible_devices(lib_path):
+    """Whether the GPU code of a prebuilt library, as recorded in its
+    build.json, runs on every visible device. nvcc's sm_XY target embeds
+    PTX for compute_XY, which the driver compiles for any newer device."""
+    try:
+        with open(lib_path.parent / "build.json") as f:
+            gpu_architectures = json.load(f)["gpu_architectures"]
+    except (OSError, ValueError, KeyError):
+        return False
+    if not gpu_architectures or not torch.cuda.is_available():
+        return True
+    oldest = min(tuple(arch) for arch in gpu_architectures)
+    return all(
+        torch.cuda.get_device_capability(i) >= oldest
+        for i in range(torch.cuda.device_count())
+    )
+
+
+def _find_prebuilt_extension(name, key):
+    if _populate_extension_dir is not None:
+        cache_dirs = (pathlib.Path(_populate_extension_dir),)
+    else:
+        cache_dirs = (extension_cache_dir(), bundled_extension_dir)
+    for cache_dir in cache_dirs:
+        libs = glob.glob(str(cache_dir / f"{name}-{key}" / f"*{_LIB_EXT}"))
+        if libs and _runs_on_visible_devices(pathlib.Path(libs[0])):
+            return pathlib.Path(libs[0])
+    return None
+
+
+def _load_prebuilt_extension(lib_path, is_python_module):
+    # the library's module-init symbol is named for the module it was
+    # built as, which is recorded by the library's file name
+    if is_python_module:
+        spec = importlib.util.spec_from_file_location(lib_path.stem, str(lib_path))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    else:
+        torch.ops.load_library(str(lib_path))
+
+
+def _store_prebuilt_extension(name, key, kwargs):
+    # the library is named for the extension, with a "_v<n>" suffix if torch
+    # has rebuilt it in this process; the newest is the one just built
+    build_directory = kwargs["build_directory"]
+    built = max(
+        glob.glob(os.path.join(build_directory, f"{name}{_LIB_EXT}"))
+        + glob.glob(os.path.join(build_directory, f"{name}_v*{_LIB_EXT}")),
+        key=os.path.getmtime,
+    )
+    built_name = os.path.basename(built)
+
+    target_dir = pathlib.Path(_populate_extension_dir) / f"{name}-{key}"
+    target_dir.mkdir(parents=True, exist_ok=True)
+    shutil.copy2(built, target_dir / built_name)
+    with open(target_dir / "build.json", "w") as f:
+        json.dump(dict(gpu_architectures=_gpu_architectures(kwargs)), f)
+
+
 @wraps(torch.utils.cpp_extension.load)
 def load(name, sources, **kwargs):
-    """Jit-compile torch cpp_extension with tmol paths."""
+    """Jit-compile torch cpp_extension with tmol paths.
+
+    If an ahead-of-time build of the extension for the same sources, flags
+    and torch version is present in the extension cache, it is loaded
+    instead, without invoking the compiler.
+    """
+    if isinstance(sources, str):
+        sources = [sources]
     kwargs = _augment_kwargs(name, sources, **kwargs)
-    return torch.utils.cpp_extension.load(name, sources, **kwargs)
+    is_python_module = kwargs.get("is_python_module", True)
+
+    key = _extension_build_key(name, sources, kwargs)
+    prebuilt = _find_prebuilt_extension(name, key)
+    if prebuilt is not None:
+        return _load_prebuilt_extension(prebuilt, is_python_module)
+
+    if _populate_extension_dir is None:
+        return torch.utils.cpp_extension.load(name, sources, **kwargs)
+
+    # build where the library can be found without relying on torch's
+    # private default build location, and outside the populated directory,
+    # whose libraries may be bundled with the package
+    scratch_directory = None
+    if not kwargs.get("build_directory"):
+        scratch_directory = tempfile.mkdtemp(prefix=f"tmol-{name}-")
+        kwargs["build_directory"] = scratch_directory
+    try:
+        extension = torch.utils.cpp_extension.load(name, sources, **kwargs)
+        _store_prebuilt_extension(name, key, kwargs)
+    finally:
+        if scratch_directory is not None:
+            shutil.rmtree(scratch_directory, ignore_errors=True)
+    return extension
 
 
 @wraps(torch.utils.cpp_extension.load_inline)